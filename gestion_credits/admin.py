@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Count, Q
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
@@ -33,19 +34,27 @@ class ClientAdmin(admin.ModelAdmin):
 class CreditAdmin(admin.ModelAdmin):
     list_display = ['id', 'client', 'type_credit', 'montant_total', 'agent', 'date_creation', 'statut_credit']
     list_filter = ['type_credit', 'date_creation', 'agent']
-    search_fields = ['client__nom', 'client__prenom', 'description']
+    search_fields = ['numero_police', 'client__nom', 'client__prenom', 'description']
     readonly_fields = ['date_creation', 'date_modification']
     ordering = ['-date_creation']
+    list_select_related = ['client', 'agent']
+    autocomplete_fields = ['client', 'agent']
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        # Nombres d'échéances calculés dans la requête de la liste (statut_credit)
+        return super().get_queryset(request).annotate(
+            total_echeances=Count('echeances'),
+            echeances_traitees=Count('echeances', filter=Q(echeances__est_traitee=True)),
+        )
     
     def statut_credit(self, obj):
         """Afficher le statut du crédit basé sur les échéances"""
-        echeances = obj.echeances.all()
-        if not echeances:
+        total_echeances = obj.total_echeances
+        echeances_traitees = obj.echeances_traitees
+        if not total_echeances:
             return format_html('<span style="color: orange;">En attente d\'échéances</span>')
         
-        total_echeances = echeances.count()
-        echeances_traitees = echeances.filter(est_traitee=True).count()
-        
         if echeances_traitees == 0:
             return format_html('<span style="color: red;">En cours</span>')
         elif echeances_traitees == total_echeances:
@@ -76,9 +85,12 @@ class CreditAdmin(admin.ModelAdmin):
 class EcheanceAdmin(admin.ModelAdmin):
     list_display = ['numero_partie', 'credit', 'montant', 'date_echeance', 'est_especes', 'est_traitee', 'statut_echeance']
     list_filter = ['est_especes', 'est_traitee', 'date_echeance', 'credit__type_credit']
-    search_fields = ['credit__client__nom', 'credit__client__prenom']
+    search_fields = ['credit__numero_police', 'credit__client__nom', 'credit__client__prenom']
     readonly_fields = ['date_rappel']
     ordering = ['credit', 'numero_partie']
+    list_select_related = ['credit__client']
+    autocomplete_fields = ['credit']
+    show_full_result_count = False
     
     def statut_echeance(self, obj):
         """Afficher le statut de l'échéance"""
@@ -95,7 +107,7 @@ class EcheanceAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Informations générales', {
-            'fields': ('credit', 'numero_partie', 'montant', 'est_espeses')
+            'fields': ('credit', 'numero_partie', 'montant', 'est_especes')
         }),
         ('Dates', {
             'fields': ('date_echeance', 'date_rappel', 'date_traitement')
@@ -111,7 +123,11 @@ class ChequeAdmin(admin.ModelAdmin):
     list_display = ['numero_cheque', 'echeance', 'banque', 'montant', 'date_emission', 'statut', 'statut_cheque']
     list_filter = ['statut', 'banque', 'date_emission', 'date_reglement_prevu']
     search_fields = ['numero_cheque', 'banque', 'echeance__credit__client__nom']
+    readonly_fields = ['date_modification']
     ordering = ['-date_emission']
+    list_select_related = ['echeance__credit__client']
+    autocomplete_fields = ['echeance']
+    show_full_result_count = False
     
     def statut_cheque(self, obj):
         """Afficher le statut du chèque avec couleur"""
@@ -148,6 +164,9 @@ class AlerteAdmin(admin.ModelAdmin):
     search_fields = ['message', 'echeance__credit__client__nom']
     readonly_fields = ['date_alerte']
     ordering = ['-date_alerte']
+    list_select_related = ['echeance__credit__client', 'agent']
+    autocomplete_fields = ['echeance', 'agent']
+    show_full_result_count = False
     
     def statut_alerte(self, obj):
         """Afficher le statut de l'alerte avec couleur"""
@@ -182,6 +201,8 @@ class ReportEcheanceAdmin(admin.ModelAdmin):
     search_fields = ['raison', 'echeance__credit__client__nom']
     readonly_fields = ['ancienne_date', 'date_report']
     ordering = ['-date_report']
+    list_select_related = ['echeance__credit__client', 'agent']
+    autocomplete_fields = ['echeance', 'agent']
     
     fieldsets = (
         ('Informations du report', {
@@ -0,0 +1,225 @@
+"""
+Index matérialisé des alertes (modèle IndexAlerte).
+
+Une ligne par élément à suivre : chèque de garantie, échéance ou alerte saisie,
+avec son niveau d'urgence, sa date, son agent, son montant et une clé de
+recherche. L'index est tenu à jour par les signaux à chaque écriture
+(signals.py) ; comme le niveau d'urgence dépend de la date du jour, une bascule
+quotidienne (commande rafraichir_alertes, ou au premier affichage de la journée)
+fait passer les lignes d'un niveau à l'autre.
+
+La migration 0008 remplit l'index avec sa propre copie figée de ce module :
+après un changement du contenu des lignes, rafraichir_alertes --reconstruire
+réécrit l'index existant.
+"""
+
+import itertools
+from datetime import date, timedelta
+
+from django.core.cache import cache
+
+from .evenements import notifier_bascule
+from .models import Alerte, ChequeGarantie, Echeance, IndexAlerte
+
+
+# Délais (en jours) des niveaux « importante » et « informatif »
+JOURS_IMPORTANTE = 7
+JOURS_INFORMATIF = 30
+
+TAILLE_LOT_INDEX = 500
+
+# Champs recopiés lors de la mise à jour d'une ligne existante
+CHAMPS_INDEX = [
+    'type_alerte', 'statut', 'niveau', 'date_echeance', 'montant', 'libelle', 'reference',
+    'banque', 'cle_recherche', 'credit', 'client', 'agent', 'date_maj',
+]
+
+CLE_CACHE_BASCULE = 'index_alertes_bascule'
+
+
+def niveau_urgence(date_echeance, today):
+    """Niveau d'urgence d'un élément selon sa date d'échéance"""
+    if date_echeance <= today:
+        return IndexAlerte.NIVEAU_CRITIQUE
+    if date_echeance <= today + timedelta(days=JOURS_IMPORTANTE):
+        return IndexAlerte.NIVEAU_IMPORTANTE
+    if date_echeance <= today + timedelta(days=JOURS_INFORMATIF):
+        return IndexAlerte.NIVEAU_INFORMATIF
+    return IndexAlerte.NIVEAU_A_VENIR
+
+
+def _cle_recherche(*morceaux):
+    return ' '.join(str(morceau) for morceau in morceaux if morceau).lower()[:255]
+
+
+def _entrees_cheques(cheques, today, modele):
+    for cheque in cheques.values(
+        'id', 'numero', 'montant', 'banque', 'date_echeance', 'credit_id', 'credit__numero_police',
+        'credit__client_id', 'credit__client__nom', 'credit__client__prenom', 'credit__agent_id',
+    ).order_by().iterator(chunk_size=TAILLE_LOT_INDEX):
+        yield modele(
+            source='cheque_garantie',
+            objet_id=cheque['id'],
+            type_alerte='cheque_garantie',
+            statut='en_attente',
+            niveau=niveau_urgence(cheque['date_echeance'], today),
+            date_echeance=cheque['date_echeance'],
+            montant=cheque['montant'],
+            libelle=f"Chèque {cheque['numero']} de {cheque['montant']} DH",
+            reference=cheque['numero'],
+            banque=cheque['banque'],
+            cle_recherche=_cle_recherche(
+                cheque['credit__client__nom'], cheque['credit__client__prenom'],
+                cheque['credit__numero_police'], cheque['numero'],
+            ),
+            credit_id=cheque['credit_id'],
+            client_id=cheque['credit__client_id'],
+            agent_id=cheque['credit__agent_id'],
+        )
+
+
+def _entrees_echeances(echeances, today, modele):
+    for echeance in echeances.values(
+        'id', 'numero_partie', 'montant', 'date_echeance', 'est_especes', 'est_traitee', 'credit_id',
+        'credit__numero_police', 'credit__client_id', 'credit__client__nom', 'credit__client__prenom',
+        'credit__agent_id',
+    ).order_by().iterator(chunk_size=TAILLE_LOT_INDEX):
+        mode = 'espèces' if echeance['est_especes'] else 'chèque'
+        yield modele(
+            source='echeance',
+            objet_id=echeance['id'],
+            type_alerte='echeance',
+            statut='traitee' if echeance['est_traitee'] else 'en_attente',
+            niveau=niveau_urgence(echeance['date_echeance'], today),
+            date_echeance=echeance['date_echeance'],
+            montant=echeance['montant'],
+            libelle=f"Échéance {echeance['numero_partie']} de {echeance['montant']} DH ({mode})",
+            cle_recherche=_cle_recherche(
+                echeance['credit__client__nom'], echeance['credit__client__prenom'],
+                echeance['credit__numero_police'],
+            ),
+            credit_id=echeance['credit_id'],
+            client_id=echeance['credit__client_id'],
+            agent_id=echeance['credit__agent_id'],
+        )
+
+
+def _entrees_alertes(alertes, today, modele):
+    for alerte in alertes.values(
+        'id', 'type_alerte', 'message', 'date_rappel', 'date_report', 'statut', 'agent_id',
+        'echeance__montant', 'echeance__credit_id', 'echeance__credit__numero_police',
+        'echeance__credit__client_id', 'echeance__credit__client__nom', 'echeance__credit__client__prenom',
+    ).order_by().iterator(chunk_size=TAILLE_LOT_INDEX):
+        date_suivi = alerte['date_report'] if alerte['statut'] == 'reporter' and alerte['date_report'] else alerte['date_rappel']
+        yield modele(
+            source='alerte',
+            objet_id=alerte['id'],
+            type_alerte=alerte['type_alerte'],
+            statut=alerte['statut'],
+            niveau=niveau_urgence(date_suivi, today),
+            date_echeance=date_suivi,
+            montant=alerte['echeance__montant'],
+            libelle=alerte['message'],
+            cle_recherche=_cle_recherche(
+                alerte['echeance__credit__client__nom'], alerte['echeance__credit__client__prenom'],
+                alerte['echeance__credit__numero_police'], alerte['message'],
+            ),
+            credit_id=alerte['echeance__credit_id'],
+            client_id=alerte['echeance__credit__client_id'],
+            agent_id=alerte['agent_id'],
+        )
+
+
+def indexer(cheques=None, echeances=None, alertes=None, today=None, modele=IndexAlerte):
+    """Créer ou mettre à jour les lignes d'index des éléments des querysets donnés"""
+    today = today or date.today()
+    sources = []
+    if cheques is not None:
+        sources.append(_entrees_cheques(cheques, today, modele))
+    if echeances is not None:
+        sources.append(_entrees_echeances(echeances, today, modele))
+    if alertes is not None:
+        sources.append(_entrees_alertes(alertes, today, modele))
+
+    entrees = itertools.chain.from_iterable(sources)
+    nombre = 0
+    while True:
+        lot = list(itertools.islice(entrees, TAILLE_LOT_INDEX))
+        if not lot:
+            return nombre
+        modele.objects.bulk_create(
+            lot,
+            update_conflicts=True,
+            unique_fields=['source', 'objet_id'],
+            update_fields=CHAMPS_INDEX,
+        )
+        nombre += len(lot)
+
+
+def desindexer(source, objet_ids):
+    """Retirer de l'index les éléments supprimés"""
+    return IndexAlerte.objects.filter(source=source, objet_id__in=objet_ids).delete()[0]
+
+
+def indexer_credits(credit_ids, today=None):
+    """Réindexer tous les éléments rattachés aux crédits donnés"""
+    credit_ids = list(credit_ids)
+    nombre = 0
+    for i in range(0, len(credit_ids), TAILLE_LOT_INDEX):
+        lot = credit_ids[i:i + TAILLE_LOT_INDEX]
+        nombre += indexer(
+            cheques=ChequeGarantie.objects.filter(credit_id__in=lot),
+            echeances=Echeance.objects.filter(credit_id__in=lot),
+            alertes=Alerte.objects.filter(echeance__credit_id__in=lot),
+            today=today,
+        )
+    return nombre
+
+
+def reconstruire_index(today=None):
+    """Reconstruire tout l'index et retirer les lignes dont l'élément n'existe plus"""
+    nombre = indexer(
+        cheques=ChequeGarantie.objects.all(),
+        echeances=Echeance.objects.all(),
+        alertes=Alerte.objects.all(),
+        today=today,
+    )
+    for source, modele in (('cheque_garantie', ChequeGarantie), ('echeance', Echeance), ('alerte', Alerte)):
+        IndexAlerte.objects.filter(source=source).exclude(
+            objet_id__in=modele.objects.values('id')
+        ).delete()
+    return nombre
+
+
+def basculer_niveaux(today=None):
+    """Recalculer le niveau des lignes qui changent de niveau avec la date du jour"""
+    today = today or date.today()
+    limite_importante = today + timedelta(days=JOURS_IMPORTANTE)
+    limite_informatif = today + timedelta(days=JOURS_INFORMATIF)
+
+    lignes = IndexAlerte.objects.all()
+    nombre = sum([
+        lignes.filter(date_echeance__lte=today).exclude(
+            niveau=IndexAlerte.NIVEAU_CRITIQUE
+        ).update(niveau=IndexAlerte.NIVEAU_CRITIQUE),
+        lignes.filter(date_echeance__gt=today, date_echeance__lte=limite_importante).exclude(
+            niveau=IndexAlerte.NIVEAU_IMPORTANTE
+        ).update(niveau=IndexAlerte.NIVEAU_IMPORTANTE),
+        lignes.filter(date_echeance__gt=limite_importante, date_echeance__lte=limite_informatif).exclude(
+            niveau=IndexAlerte.NIVEAU_INFORMATIF
+        ).update(niveau=IndexAlerte.NIVEAU_INFORMATIF),
+        lignes.filter(date_echeance__gt=limite_informatif).exclude(
+            niveau=IndexAlerte.NIVEAU_A_VENIR
+        ).update(niveau=IndexAlerte.NIVEAU_A_VENIR),
+    ])
+    if nombre:
+        notifier_bascule(nombre)
+    return nombre
+
+
+def assurer_bascule_quotidienne(today=None):
+    """Effectuer la bascule des niveaux si elle n'a pas encore été faite aujourd'hui"""
+    today = today or date.today()
+    if cache.get(CLE_CACHE_BASCULE) != today.isoformat():
+        basculer_niveaux(today)
+        cache.set(CLE_CACHE_BASCULE, today.isoformat(), 24 * 3600)
@@ -0,0 +1,197 @@
+"""
+Archivage et conservation de l'historique des actions (ActionLog).
+
+Les actions antérieures à l'horizon (JOURNAL_HORIZON_MOIS mois complets avant
+le mois en cours) sont déplacées mois par mois, dans une transaction par mois :
+
+- vers la table ActionArchivee (INSERT ... SELECT, sans passer par Python),
+  consultable depuis l'historique lorsque le filtre de date y remonte ;
+- ou vers des fichiers JSONL compressés actions-AAAA-MM.jsonl.gz, hors base.
+
+Dans les deux cas, le nombre d'actions de chaque mois par type, statut et agent
+est ajouté à ResumeActionsMois : les répartitions de l'historique restent
+exactes sans relire les actions archivées. Les documents de recherche des
+actions déplacées sont retirés.
+
+La commande archiver_actions enchaîne l'archivage et, si
+JOURNAL_CONSERVATION_ARCHIVES_MOIS est défini, la purge des archives plus
+anciennes (les résumés mensuels sont conservés).
+"""
+
+import gzip
+import json
+import os
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.utils import timezone
+
+from .models import ActionArchivee, ActionLog, DocumentRecherche, ResumeActionsMois
+
+
+HORIZON_MOIS_DEFAUT = 12
+
+# Colonnes recopiées de ActionLog vers ActionArchivee (mêmes noms)
+COLONNES = [champ.column for champ in ActionLog._meta.concrete_fields]
+
+
+# === MOIS ===
+
+def debut_mois(jour):
+    return jour.replace(day=1)
+
+
+def mois_suivant(mois):
+    return (mois.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def mois_precedent(mois, nombre=1):
+    for _ in range(nombre):
+        mois = (mois.replace(day=1) - timedelta(days=1)).replace(day=1)
+    return mois
+
+
+def debut_journee(jour):
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def limite_horizon(horizon_mois=None, today=None):
+    """Premier jour du plus ancien mois conservé dans ActionLog"""
+    if horizon_mois is None:
+        horizon_mois = getattr(settings, 'JOURNAL_HORIZON_MOIS', HORIZON_MOIS_DEFAUT)
+    return mois_precedent(debut_mois(today or timezone.localdate()), horizon_mois)
+
+
+def limite_archive():
+    """Premier jour après le dernier mois archivé (None si rien n'est archivé)
+
+    Lue à chaque appel (une requête sur l'index unique des résumés, mois en
+    tête) : l'archivage tourne dans le processus de la commande, un cache local
+    aux processus web y resterait périmé.
+    """
+    dernier = ResumeActionsMois.objects.order_by('-mois').values_list('mois', flat=True).first()
+    return mois_suivant(dernier) if dernier else None
+
+
+# === ARCHIVAGE ===
+
+def _ajouter_resume(mois, actions):
+    """Ajouter aux résumés du mois le nombre d'actions par type, statut et agent"""
+    groupes = actions.order_by().values('type_action', 'statut', 'agent_id').annotate(nombre=Count('id'))
+    for groupe in groupes:
+        mis_a_jour = ResumeActionsMois.objects.filter(
+            mois=mois, type_action=groupe['type_action'], statut=groupe['statut'], agent_id=groupe['agent_id'],
+        ).update(nombre=F('nombre') + groupe['nombre'])
+        if not mis_a_jour:
+            ResumeActionsMois.objects.create(
+                mois=mois, type_action=groupe['type_action'], statut=groupe['statut'],
+                agent_id=groupe['agent_id'], nombre=groupe['nombre'],
+            )
+
+
+def _copier_dans_table(actions):
+    sql, params = actions.order_by().values_list(*COLONNES).query.sql_with_params()
+    colonnes = ', '.join(connection.ops.quote_name(colonne) for colonne in COLONNES)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {connection.ops.quote_name(ActionArchivee._meta.db_table)} ({colonnes}) {sql}', params,
+        )
+
+
+def _copier_dans_fichier(actions, mois, dossier):
+    os.makedirs(dossier, exist_ok=True)
+    chemin = os.path.join(dossier, f'actions-{mois:%Y-%m}.jsonl.gz')
+    # Mode ajout : un second passage sur le même mois ajoute un membre gzip, lisible à la suite
+    with gzip.open(chemin, 'at', encoding='utf-8') as fichier:
+        for action in actions.order_by('date_action', 'id').values(*COLONNES).iterator(chunk_size=2000):
+            fichier.write(json.dumps(action, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')))
+            fichier.write('\n')
+    return chemin
+
+
+def archiver_mois(mois, dossier=None):
+    """Déplacer les actions du mois vers l'archive (table, ou fichier si `dossier`) ; retourne leur nombre"""
+    actions = ActionLog.objects.filter(
+        date_action__gte=debut_journee(mois), date_action__lt=debut_journee(mois_suivant(mois)),
+    )
+    with transaction.atomic():
+        nombre = actions.count()
+        if not nombre:
+            return 0
+        _ajouter_resume(mois, actions)
+        if dossier:
+            _copier_dans_fichier(actions, mois, dossier)
+        else:
+            _copier_dans_table(actions)
+        DocumentRecherche.objects.filter(source='action', objet_id__in=actions.values('id')).delete()
+        # Suppression en une requête : delete() chargerait chaque action pour les signaux post_delete
+        actions.order_by()._raw_delete(actions.db)
+    # Pas de post_delete : les listes des filtres de l'historique sont invalidées ici
+    from .historique import invalider_filtres
+    invalider_filtres()
+    return nombre
+
+
+def mois_a_archiver(avant):
+    """Mois (premier jour) contenant des actions antérieures à `avant`"""
+    plus_ancienne = ActionLog.objects.aggregate(Min('date_action'))['date_action__min']
+    if plus_ancienne is None:
+        return []
+    mois = debut_mois(timezone.localtime(plus_ancienne).date())
+    liste = []
+    while mois < avant:
+        liste.append(mois)
+        mois = mois_suivant(mois)
+    return liste
+
+
+def purger_archives(avant):
+    """Supprimer les actions archivées antérieures à `avant` (les résumés mensuels sont conservés)"""
+    return ActionArchivee.objects.filter(date_action__lt=debut_journee(avant)).delete()[0]
+
+
+# === CONSULTATION ===
+
+def inclure_archives(date_debut):
+    """Le filtre de date remonte-t-il avant la limite de l'archive ?"""
+    limite = limite_archive()
+    return limite is not None and date_debut is not None and date_debut < limite
+
+
+def repartitions_archivees(actions, date_debut, date_fin, filtres_resume):
+    """(répartition par type, répartition par statut) des actions archivées filtrées.
+
+    Les mois entièrement couverts par la période sont lus dans ResumeActionsMois
+    (si les filtres s'y appliquent, sinon `filtres_resume` vaut None) ; seuls les
+    mois partiels sont comptés sur les actions archivées.
+    """
+    types, statuts = Counter(), Counter()
+    limite = limite_archive()
+    if limite is None:
+        return types, statuts
+
+    if filtres_resume is None:
+        partielles = actions
+    else:
+        # Mois complets : du premier mois commençant dans la période au dernier mois archivé terminé avant date_fin
+        premier = debut_mois(date_debut) if date_debut.day == 1 else mois_suivant(date_debut)
+        fin = limite if date_fin is None else min(limite, debut_mois(date_fin + timedelta(days=1)))
+        if premier < fin:
+            resumes = ResumeActionsMois.objects.filter(filtres_resume, mois__gte=premier, mois__lt=fin)
+            for champ, compteur in (('type_action', types), ('statut', statuts)):
+                for ligne in resumes.order_by().values(champ).annotate(total=Sum('nombre')):
+                    compteur[ligne[champ]] += ligne['total']
+            partielles = actions.filter(
+                Q(date_action__lt=debut_journee(premier)) | Q(date_action__gte=debut_journee(fin))
+            )
+        else:
+            partielles = actions
+
+    for champ, compteur in (('type_action', types), ('statut', statuts)):
+        for ligne in partielles.order_by().values(champ).annotate(total=Count('id')):
+            compteur[ligne[champ]] += ligne['total']
+    return types, statuts
@@ -0,0 +1,195 @@
+"""
+Audit automatique des modifications des clients, crédits, règlements, chèques
+de garantie et échéances.
+
+Au pre_save, les champs modifiés sont comparés aux valeurs chargées depuis la
+base (mémorisées par SuiviModifications.from_db, sans requête supplémentaire) ;
+seuls les champs modifiés sont retenus, sous une forme JSON compacte. Pendant
+une requête HTTP (MiddlewareAudit) :
+
+- journaliser() reprend les modifications de l'objet principal de l'action
+  (échéance, crédit ou client) comme donnees_avant / donnees_apres, et y ajoute
+  l'adresse IP, le navigateur et la session de la requête ;
+- les modifications qu'aucune action n'a reprises sont regroupées en fin de
+  requête dans une seule action « modification_donnees ».
+
+Hors requête (commandes, imports), rien n'est capturé.
+"""
+
+from contextvars import ContextVar
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+from django.db import transaction
+from django.utils import timezone
+
+
+# Longueur maximale conservée de l'en-tête User-Agent
+MAX_USER_AGENT = 500
+
+VIDES = (None, '')
+
+_contexte = ContextVar('contexte_audit', default=None)
+
+
+class ContexteAudit:
+    """Traçabilité de la requête en cours et modifications validées (commit) pendant celle-ci"""
+
+    def __init__(self, ip_adresse=None, user_agent=None, session_id=None):
+        self.ip_adresse = ip_adresse
+        self.user_agent = user_agent
+        self.session_id = session_id
+        self.modifications = {}
+        self.journalisees = set()
+
+    def tracabilite(self):
+        return {'ip_adresse': self.ip_adresse, 'user_agent': self.user_agent, 'session_id': self.session_id}
+
+    def ajouter(self, cle, avant, apres):
+        self.modifications[cle] = fusionner(self.modifications.get(cle), (avant, apres))
+
+    def resume(self):
+        """(donnees_avant, donnees_apres, objets) des modifications qu'aucune action n'a reprises"""
+        avant, apres, objets = {}, {}, []
+        for cle, (avant_objet, apres_objet) in self.modifications.items():
+            if cle in self.journalisees:
+                continue
+            objets.append(cle)
+            prefixe = f'{cle[0]}#{cle[1]}'
+            for champ, valeur in (avant_objet or {}).items():
+                avant[f'{prefixe}.{champ}'] = valeur
+            for champ, valeur in apres_objet.items():
+                apres[f'{prefixe}.{champ}'] = valeur
+        return avant, apres, objets
+
+
+def contexte_requete(request):
+    """Contexte d'audit d'une requête HTTP"""
+    session = getattr(request, 'session', None)
+    return ContexteAudit(
+        ip_adresse=request.META.get('REMOTE_ADDR') or None,
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:MAX_USER_AGENT] or None,
+        session_id=session.session_key if session is not None else None,
+    )
+
+
+def ouvrir(contexte):
+    """Activer le contexte pour le fil / la tâche en cours ; retourne le jeton à passer à fermer()"""
+    return _contexte.set(contexte)
+
+
+def fermer(jeton):
+    _contexte.reset(jeton)
+
+
+def _cle(instance):
+    return instance._meta.model_name, instance.pk
+
+
+@lru_cache(maxsize=None)
+def champs_audites(modele):
+    """(nom, attname) des champs suivis : champs éditables, hors clé primaire.
+
+    Les dates automatiques et les soldes matérialisés du crédit (non éditables)
+    sont ainsi exclus.
+    """
+    return tuple(
+        (champ.name, champ.attname) for champ in modele._meta.concrete_fields
+        if champ.editable and not champ.primary_key
+    )
+
+
+def serialiser(valeur):
+    """Valeur JSON compacte : montants et dates en texte, le reste tel quel"""
+    if isinstance(valeur, Decimal):
+        return format(valeur, 'f')
+    if isinstance(valeur, datetime):
+        if timezone.is_aware(valeur):
+            valeur = timezone.localtime(valeur)
+        return valeur.isoformat(timespec='seconds')
+    if isinstance(valeur, date):
+        return valeur.isoformat()
+    return valeur
+
+
+def fusionner(precedentes, nouvelles):
+    """Cumuler deux modifications successives : premières valeurs « avant », dernières valeurs « après »"""
+    if precedentes is None:
+        return nouvelles
+    avant_precedent, apres_precedent = precedentes
+    avant, apres = nouvelles
+    if avant_precedent is not None and avant is not None:
+        # Un champ déjà modifié garde sa valeur d'origine
+        avant = {**avant, **avant_precedent}
+    else:
+        avant = avant_precedent
+    return avant, {**apres_precedent, **apres}
+
+
+def capturer(instance, update_fields=None):
+    """pre_save : champs modifiés par rapport aux valeurs chargées (tous les champs renseignés à la création)"""
+    instance._derniere_modification = None
+    if _contexte.get() is None:
+        return
+
+    champs = champs_audites(type(instance))
+    if update_fields is not None:
+        champs = [(nom, attname) for nom, attname in champs if nom in update_fields]
+
+    if instance._state.adding:
+        apres = {}
+        for nom, attname in champs:
+            valeur = getattr(instance, attname)
+            if valeur not in VIDES:
+                apres[nom] = serialiser(valeur)
+        instance._derniere_modification = (None, apres)
+        return
+
+    chargees = getattr(instance, '_valeurs_chargees', None)
+    if chargees is None:
+        # Instance construite sans lecture en base : pas de comparaison possible
+        return
+    avant, apres = {}, {}
+    for nom, attname in champs:
+        if attname not in chargees:
+            continue
+        ancienne, nouvelle = chargees[attname], getattr(instance, attname)
+        # Un champ texte vide enregistré comme NULL puis resaisi '' n'est pas une modification
+        if ancienne != nouvelle and not (ancienne in VIDES and nouvelle in VIDES):
+            avant[nom] = serialiser(ancienne)
+            apres[nom] = serialiser(nouvelle)
+    if apres:
+        instance._derniere_modification = (avant, apres)
+
+
+def enregistrer(instance):
+    """post_save : mémoriser les modifications sur l'instance et, au commit, dans le contexte de la requête"""
+    contexte = _contexte.get()
+    modification = getattr(instance, '_derniere_modification', None)
+    if contexte is None or modification is None:
+        return
+
+    instance._derniere_modification = None
+    instance._modifications_audit = fusionner(getattr(instance, '_modifications_audit', None), modification)
+    cle = _cle(instance)
+    transaction.on_commit(lambda: contexte.ajouter(cle, *modification))
+
+
+def completer(champs):
+    """Compléter les champs d'une action journalisée pendant une requête (traçabilité, modifications)"""
+    contexte = _contexte.get()
+    if contexte is None:
+        return champs
+
+    champs = {**{nom: valeur for nom, valeur in contexte.tracabilite().items() if valeur}, **champs}
+    if 'donnees_avant' in champs or 'donnees_apres' in champs:
+        return champs
+    for nom in ('echeance', 'credit', 'client'):
+        objet = champs.get(nom)
+        modifications = getattr(objet, '_modifications_audit', None)
+        if modifications:
+            champs['donnees_avant'], champs['donnees_apres'] = modifications
+            contexte.journalisees.add(_cle(objet))
+            break
+    return champs
@@ -0,0 +1,81 @@
+"""
+Autocomplétion des clients et des crédits dans les formulaires et les filtres.
+
+Les listes déroulantes de clients et de crédits ne chargent plus toute la
+table : le widget SelectionAutocompletion ne rend que l'option choisie et
+interroge les vues client_autocompletion / credit_autocompletion (JSON) au fil
+de la saisie.
+
+Les recherches restent servies par des index quel que soit le volume :
+
+- clients : recherche par préfixe de mots dans les documents de recherche
+  (recherche.py, FTS5 ou FULLTEXT) : chaque mot saisi doit commencer un mot du
+  nom, du prénom, du CIN, du téléphone ou de l'e-mail. Un LIKE insensible à la
+  casse, combiné par OR sur plusieurs colonnes, parcourrait toute la table ;
+- crédits : intervalle sur l'index unique du numéro de police, pour la saisie
+  telle quelle, en majuscules et en minuscules (les colonnes SQLite sont
+  comparées en binaire). Sous MySQL, la collation est insensible à la casse et
+  LIKE 'saisie%' est servi par l'index.
+
+Les résultats sont triés (clients par nom, prénom, id ; crédits par numéro de
+police) et paginés par pages de TAILLE_PAGE.
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Client, Credit
+from .recherche import objets_correspondants, termes_recherche
+
+
+TAILLE_PAGE = 20
+
+# Borne haute d'un intervalle de préfixe : plus grand caractère Unicode
+FIN_PREFIXE = '\U0010ffff'
+
+
+def clients_par_prefixe(saisie):
+    """Clients dont chaque mot saisi commence un mot du nom, du prénom, du CIN, du téléphone ou de l'e-mail"""
+    clients = Client.objects.order_by('nom', 'prenom', 'id')
+    if not termes_recherche(saisie):
+        return clients
+    return clients.filter(pk__in=objets_correspondants('client', saisie))
+
+
+def credits_par_prefixe(saisie):
+    """Crédits dont le numéro de police commence par la saisie"""
+    credits = Credit.objects.select_related('client').order_by('numero_police')
+    saisie = saisie.strip()
+    if not saisie:
+        return credits
+    if connection.vendor == 'mysql':
+        return credits.filter(numero_police__istartswith=saisie)
+    return credits.filter(reduce(or_, (
+        Q(numero_police__gte=variante, numero_police__lt=variante + FIN_PREFIXE)
+        for variante in dict.fromkeys((saisie, saisie.upper(), saisie.lower()))
+    )))
+
+
+def page_resultats(objets, page, decrire):
+    """Page `page` (à partir de 1) des objets, décrits par decrire(objet) ; une ligne de plus
+    est lue pour savoir s'il existe une page suivante, sans COUNT"""
+    debut = (page - 1) * TAILLE_PAGE
+    lignes = list(objets[debut:debut + TAILLE_PAGE + 1])
+    return {
+        'resultats': [decrire(objet) for objet in lignes[:TAILLE_PAGE]],
+        'page': page,
+        'suivante': len(lignes) > TAILLE_PAGE,
+    }
+
+
+# « valeur » est la valeur des filtres de liste qui portent sur le texte (nom du client, numéro de police)
+
+def decrire_client(client):
+    return {'id': client.pk, 'texte': str(client), 'valeur': client.nom}
+
+
+def decrire_credit(credit):
+    return {'id': credit.pk, 'texte': str(credit), 'valeur': credit.numero_police}
@@ -0,0 +1,131 @@
+"""
+Cache des blocs du tableau de bord (statistiques globales, série des 30 jours,
+performance des agents, meilleurs clients, chèques à échéance).
+
+Chaque bloc est mis en cache (alias TABLEAU_CACHE, fichiers partagés entre les
+processus par défaut) sous une clé qui contient le jour et la version de chacun
+des modèles dont il dépend. Les signaux post_save / post_delete de ces modèles,
+et les écritures en masse, changent leur version : un bloc en cache n'est
+donc jamais périmé, il n'est simplement plus lu et expire après
+TABLEAU_CACHE_DUREE secondes.
+
+Les mêmes versions (instant de la dernière écriture de chaque modèle) servent
+d'ETag et de Last-Modified à l'API dashboard_stats.
+
+Les lectures trouvées (succès) et manquées (échecs) sont comptées pour le suivi
+(compteurs(), vue dashboard_cache).
+"""
+
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+ALIAS_DEFAUT = 'tableau'
+DUREE_DEFAUT = 600
+
+CLE_SUCCES = 'tableau:succes'
+CLE_ECHECS = 'tableau:echecs'
+
+
+def _cache():
+    return caches[getattr(settings, 'TABLEAU_CACHE', ALIAS_DEFAUT)]
+
+
+def _cle_version(modele):
+    return f'tableau:version:{modele._meta.label_lower}'
+
+
+def _incrementer(cache, cle, delta=1):
+    try:
+        cache.incr(cle, delta)
+    except ValueError:
+        # Clé absente (premier appel ou cache vidé) ; sans expiration
+        if not cache.add(cle, delta, None):
+            cache.incr(cle, delta)
+
+
+def _nouvelles_versions(modeles):
+    # La version est l'instant de la dernière écriture (ns) : elle ne repart pas de
+    # valeurs déjà servies après un vidage du cache et donne aussi Last-Modified
+    version = time.time_ns()
+    _cache().set_many({_cle_version(modele): version for modele in modeles}, None)
+
+
+def versions(modeles):
+    """Version courante de chaque modèle {modèle: version}, en une lecture du cache"""
+    cache = _cache()
+    lues = cache.get_many([_cle_version(modele) for modele in modeles])
+    resultat = {}
+    for modele in modeles:
+        cle = _cle_version(modele)
+        if cle not in lues:
+            cache.add(cle, time.time_ns(), None)
+            lues[cle] = cache.get(cle)
+        resultat[modele] = lues[cle]
+    return resultat
+
+
+def derniere_modification(modeles):
+    """Date de la dernière écriture connue sur ces modèles"""
+    return datetime.fromtimestamp(max(versions(modeles).values()) / 1e9, tz=dt_timezone.utc)
+
+
+def invalider(*modeles):
+    """Changer la version des modèles : les blocs qui en dépendent seront recalculés.
+
+    Tout de suite (la transaction en cours lit ses propres écritures), puis au
+    commit : une requête concurrente a pu remettre en cache entre-temps les
+    valeurs d'avant le commit.
+    """
+    _nouvelles_versions(modeles)
+    transaction.on_commit(lambda: _nouvelles_versions(modeles))
+
+
+def lire_blocs(today, blocs, calculer):
+    """Contexte des blocs {nom: modèles dont il dépend}, lus en cache ou calculés par calculer(nom)
+
+    Deux lectures du cache (versions, puis blocs) et une écriture des blocs manquants.
+    """
+    cache = _cache()
+    courantes = versions({modele for dependances in blocs.values() for modele in dependances})
+
+    cles = {}
+    for nom, dependances in blocs.items():
+        signature = '.'.join(
+            str(courantes[modele])
+            for modele in sorted(dependances, key=lambda modele: modele._meta.label_lower)
+        )
+        cles[nom] = f'tableau:{nom}:{today.isoformat()}:{signature}'
+
+    en_cache = cache.get_many(list(cles.values()))
+    contexte, manquants = {}, {}
+    for nom, cle in cles.items():
+        if cle in en_cache:
+            contexte.update(en_cache[cle])
+        else:
+            manquants[cle] = calculer(nom)
+            contexte.update(manquants[cle])
+
+    if manquants:
+        cache.set_many(manquants, getattr(settings, 'TABLEAU_CACHE_DUREE', DUREE_DEFAUT))
+    if len(manquants) < len(cles):
+        _incrementer(cache, CLE_SUCCES, len(cles) - len(manquants))
+    if manquants:
+        _incrementer(cache, CLE_ECHECS, len(manquants))
+    return contexte
+
+
+def compteurs():
+    """Lectures de blocs trouvées et manquées depuis le dernier vidage du cache"""
+    valeurs = _cache().get_many([CLE_SUCCES, CLE_ECHECS])
+    succes, echecs = valeurs.get(CLE_SUCCES, 0), valeurs.get(CLE_ECHECS, 0)
+    total = succes + echecs
+    return {
+        'succes': succes,
+        'echecs': echecs,
+        'taux_succes': round(succes / total * 100, 1) if total else None,
+    }
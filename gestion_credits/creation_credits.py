@@ -0,0 +1,158 @@
+"""
+Création d'un crédit divisé avec son paiement initial en espèces et ses
+chèques de garantie.
+
+Toutes les lignes de chèques sont validées avant la moindre écriture (avec les
+règles de ChequeGarantieForm) : une ligne invalide fait réafficher le
+formulaire avec ses erreurs et rien n'est enregistré. L'écriture se fait
+ensuite dans une seule transaction, en un nombre de requêtes qui ne dépend pas
+du nombre de chèques :
+
+- le crédit est inséré avec ses soldes déjà calculés (paiement initial
+  compris), sans mise à jour par règlement ;
+- le règlement initial, les chèques et leurs alertes sont écrits avec
+  bulk_create, puis l'index des alertes, les cumuls journaliers, le cache du
+  tableau de bord et les notifications, que bulk_create ne déclenche pas, sont
+  mis à jour une fois pour tout le lot.
+"""
+
+from datetime import date
+
+from django.db import connection, transaction
+
+from . import cache_tableau, cumuls, evenements
+from .alertes import indexer
+from .forms import ChequeGarantieForm
+from .journal import journaliser
+from .models import Alerte, ChequeGarantie, Reglement
+
+
+# Champ de ChequeGarantieForm -> champ du formulaire de crédit, suffixé par « unique » ou le numéro du chèque
+CHAMPS_LIGNE = {
+    'numero': 'numero_cheque',
+    'banque': 'banque',
+    'date_emission': 'date_emission',
+    'date_echeance': 'date_reglement_prevu',
+    'montant': 'montant_garantie',
+    'commentaire': 'commentaire',
+}
+
+
+class CreationCreditDivise:
+    """Créer un crédit divisé à partir d'un CreditDiviseCompletForm valide
+
+    Utilisation : valider() puis, s'il n'y a pas d'erreur, creer().
+    """
+
+    def __init__(self, form, donnees, agent):
+        self.form = form
+        self.donnees = donnees
+        self.agent = agent
+        self.cheques = []
+        self.erreurs = []
+
+    def _lignes(self):
+        """(numéro, données) de chaque chèque saisi, sous les noms de champs de ChequeGarantieForm"""
+        cleaned_data = self.form.cleaned_data
+        if cleaned_data.get('type_garantie') == 'unique':
+            yield None, {champ: cleaned_data.get(f'{prefixe}_unique') for champ, prefixe in CHAMPS_LIGNE.items()}
+        elif cleaned_data.get('type_garantie') == 'multiple':
+            for i in range(1, (cleaned_data.get('nombre_cheques') or 0) + 1):
+                yield i, {champ: self.donnees.get(f'{prefixe}_{i}', '') for champ, prefixe in CHAMPS_LIGNE.items()}
+
+    def valider(self):
+        """Valider toutes les lignes de chèques ; retourne True si aucune n'est en erreur"""
+        self.cheques = []
+        self.erreurs = []
+        for numero, donnees in self._lignes():
+            form = ChequeGarantieForm(data=donnees)
+            if form.is_valid():
+                self.cheques.append((numero, form.cleaned_data))
+                continue
+            libelle = f'Chèque {numero}' if numero else 'Chèque de garantie'
+            for champ, erreurs in form.errors.items():
+                if champ == '__all__':
+                    self.erreurs.append(f"{libelle} : {' '.join(erreurs)}")
+                else:
+                    self.erreurs.append(f"{libelle} - {form.fields[champ].label} : {' '.join(erreurs)}")
+        return not self.erreurs
+
+    def creer(self):
+        """Écrire le crédit, son paiement initial, ses chèques et leurs alertes ; retourne le crédit"""
+        cleaned_data = self.form.cleaned_data
+        montant_especes = cleaned_data.get('montant_especes') or 0
+        type_garantie = cleaned_data.get('type_garantie')
+        today = date.today()
+
+        with transaction.atomic():
+            credit = self.form.save(commit=False)
+            credit.type_credit = 'divise'
+            credit.agent = self.agent
+            # Soldes calculés une fois, à l'insertion : le paiement initial est écrit sans Reglement.save()
+            credit.total_verse = montant_especes
+            credit.save()
+
+            reglements = []
+            if montant_especes > 0:
+                reglements.append(Reglement(
+                    credit=credit,
+                    montant=montant_especes,
+                    date_reglement=today,
+                    mode_paiement='especes',
+                    statut=None,  # Pas de statut pour les espèces
+                    commentaire='Paiement initial en espèces lors de la création du crédit',
+                    agent=self.agent,
+                ))
+                Reglement.objects.bulk_create(reglements)
+
+            cheques, alertes = [], []
+            for numero, donnees in self.cheques:
+                cheques.append(ChequeGarantie(credit=credit, **donnees))
+                alertes.append(Alerte(
+                    echeance=None,
+                    type_alerte='cheque_garantie',
+                    message=(
+                        f'Chèque de garantie {numero} à traiter pour {credit.client.nom_complet}' if numero
+                        else f'Chèque de garantie unique à traiter pour {credit.client.nom_complet}'
+                    ),
+                    date_alerte=today,
+                    date_rappel=donnees['date_echeance'],
+                    agent=self.agent,
+                ))
+            bulk_avec_identifiants = connection.features.can_return_rows_from_bulk_insert
+            if bulk_avec_identifiants:
+                ChequeGarantie.objects.bulk_create(cheques)
+                Alerte.objects.bulk_create(alertes)
+            else:
+                # MySQL ne renvoie pas les identifiants insérés par bulk_create : les signaux
+                # indexent alors les chèques et les alertes et notifient les alertes
+                for objet in cheques + alertes:
+                    objet.save()
+
+            # bulk_create ne déclenche pas les signaux : index des alertes, cumuls,
+            # cache du tableau de bord et notifications, une fois pour tout le lot
+            if bulk_avec_identifiants and (cheques or alertes):
+                indexer(
+                    cheques=ChequeGarantie.objects.filter(credit=credit),
+                    alertes=Alerte.objects.filter(pk__in=[alerte.pk for alerte in alertes]),
+                )
+            cumuls.ajouter_objets(reglements)
+            cache_tableau.invalider(Reglement, ChequeGarantie, Alerte)
+            for reglement in reglements:
+                evenements.notifier_reglement(reglement)
+            if bulk_avec_identifiants:
+                for alerte in alertes:
+                    evenements.notifier_alerte(alerte)
+
+            journaliser(
+                type_action='credit_creation',
+                description=(
+                    f'Crédit divisé créé pour {credit.client.nom_complet} - Police {credit.numero_police} - '
+                    f'Montant: {credit.montant_total} DH - Espèces: {montant_especes} DH - Garantie: {type_garantie}'
+                ),
+                statut='succes',
+                agent=self.agent,
+                client=credit.client,
+                credit=credit,
+            )
+        return credit
@@ -0,0 +1,218 @@
+"""
+Cumuls journaliers (StatJournaliere) des règlements, crédits et actions.
+
+Chaque règlement, crédit ou action contribue au cumul de son jour, de son
+agent, de son mode (mode de paiement, type de crédit ou type d'action) et de
+son statut : une unité et son montant. Les cumuls sont tenus à jour :
+
+- par les signaux à chaque enregistrement ou suppression (l'ancienne
+  contribution est retirée, la nouvelle ajoutée) ;
+- par ajouter_objets() après les écritures en masse (bulk_create) du journal
+  et de l'import des règlements ;
+- chaque nuit par la commande cumuler_statistiques, qui recalcule les derniers
+  jours depuis les tables sources (et corrige d'éventuels écarts).
+
+Les statistiques lisent les cumuls des jours passés et complètent avec une
+petite requête sur les données à partir d'aujourd'hui, si bien que leur
+coût ne dépend plus de la taille de l'historique. Les cumuls des actions
+archivées (archives.py) sont conservés : l'archivage ne les modifie pas.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from . import cache_tableau
+from .archives import debut_journee, mois_suivant
+from .models import ActionLog, Credit, Reglement, ResumeActionsMois, StatJournaliere
+
+
+# Champs (attname) dont dépend la contribution d'un objet, par modèle
+CHAMPS = {
+    Reglement: ('date_reglement', 'agent_id', 'mode_paiement', 'statut', 'montant'),
+    Credit: ('date_creation', 'agent_id', 'type_credit', 'montant_total'),
+    ActionLog: ('date_action', 'agent_id', 'type_action', 'statut'),
+}
+
+
+# === CONTRIBUTIONS ===
+
+def contribution(instance, valeurs=None):
+    """(clé du cumul, montant) d'un objet ; `valeurs` (attname → valeur) remplace les valeurs de l'instance"""
+    def valeur(attname):
+        return valeurs[attname] if valeurs is not None else getattr(instance, attname)
+
+    if isinstance(instance, Reglement):
+        cle = ('reglement', valeur('date_reglement'), valeur('agent_id'), valeur('mode_paiement'),
+               valeur('statut') or '')
+        return cle, valeur('montant')
+    if isinstance(instance, Credit):
+        cle = ('credit', timezone.localdate(valeur('date_creation')), valeur('agent_id'), valeur('type_credit'), '')
+        return cle, valeur('montant_total')
+    cle = ('action', timezone.localdate(valeur('date_action')), valeur('agent_id'), valeur('type_action'),
+           valeur('statut'))
+    return cle, 0
+
+
+def contribution_enregistree(instance):
+    """Contribution de l'objet tel qu'il est en base (avant le save en cours), None s'il est nouveau"""
+    if instance._state.adding or instance.pk is None:
+        return None
+    champs = CHAMPS[type(instance)]
+    valeurs = getattr(instance, '_valeurs_chargees', None) or {}
+    if not all(champ in valeurs for champ in champs):
+        # Instance construite sans lecture en base (ou champs différés) : une requête
+        valeurs = type(instance)._base_manager.filter(pk=instance.pk).values(*champs).first()
+        if valeurs is None:
+            return None
+    return contribution(instance, valeurs)
+
+
+def ajuster(variations):
+    """Ajouter aux cumuls les variations {clé: (nombre, montant)}"""
+    for (categorie, jour, agent_id, mode, statut), (nombre, montant) in variations.items():
+        if not nombre and not montant:
+            continue
+        cle = dict(categorie=categorie, jour=jour, agent_id=agent_id, mode=mode, statut=statut)
+        cumul = StatJournaliere.objects.filter(**cle)
+        if cumul.update(nombre=F('nombre') + nombre, montant=F('montant') + montant):
+            continue
+        try:
+            # Point de sauvegarde : l'échec de l'insertion n'annule pas la transaction de l'appelant
+            with transaction.atomic():
+                StatJournaliere.objects.create(**cle, nombre=nombre, montant=montant)
+        except IntegrityError:
+            # Cumul créé entre-temps par une écriture concurrente du même jour : il existe maintenant
+            cumul.update(nombre=F('nombre') + nombre, montant=F('montant') + montant)
+
+
+def variations(retirees=(), ajoutees=()):
+    """Variations des cumuls pour des contributions retirées et ajoutées"""
+    resultat = defaultdict(lambda: (0, Decimal('0')))
+    for signe, contributions in ((-1, retirees), (1, ajoutees)):
+        for cle, montant in contributions:
+            nombre, total = resultat[cle]
+            resultat[cle] = (nombre + signe, total + signe * Decimal(montant or 0))
+    return resultat
+
+
+def ajouter_objets(objets):
+    """Ajouter aux cumuls des objets écrits sans signaux (bulk_create)"""
+    ajuster(variations(ajoutees=[contribution(objet) for objet in objets]))
+
+
+# === SIGNAUX ===
+
+def capturer(instance):
+    """pre_save : mémoriser la contribution actuelle de l'objet"""
+    instance._contribution_cumuls = contribution_enregistree(instance)
+
+
+def enregistrer(instance):
+    """post_save : remplacer l'ancienne contribution par la nouvelle"""
+    ancienne = getattr(instance, '_contribution_cumuls', None)
+    instance._contribution_cumuls = None
+    nouvelle = contribution(instance)
+    if ancienne == nouvelle:
+        return
+    ajuster(variations(retirees=[ancienne] if ancienne else [], ajoutees=[nouvelle]))
+
+
+def retirer(instance):
+    """post_delete : retirer la contribution de l'objet supprimé"""
+    ajuster(variations(retirees=[contribution(instance)]))
+
+
+# === RECONSTRUCTION ===
+
+def _sources(debut, fin):
+    """Requêtes groupées (clé, nombre, montant) des tables sources sur [debut, fin]"""
+    reglements = Reglement.objects.order_by()
+    if debut:
+        reglements = reglements.filter(date_reglement__gte=debut)
+    if fin:
+        reglements = reglements.filter(date_reglement__lte=fin)
+    yield 'reglement', reglements.values(
+        'agent_id', jour=F('date_reglement'), mode=F('mode_paiement'), statut_cumul=Coalesce('statut', Value('')),
+    ).annotate(nombre=Count('id'), total=Sum('montant'))
+
+    for categorie, modele, champ_date, champ_mode, champ_montant in (
+        ('credit', Credit, 'date_creation', 'type_credit', 'montant_total'),
+        ('action', ActionLog, 'date_action', 'type_action', None),
+    ):
+        objets = modele.objects.order_by()
+        if debut:
+            objets = objets.filter(**{f'{champ_date}__gte': debut_journee(debut)})
+        if fin:
+            objets = objets.filter(**{f'{champ_date}__lt': debut_journee(fin + timedelta(days=1))})
+        groupes = objets.values(
+            'agent_id', jour=TruncDate(champ_date), mode=F(champ_mode),
+            statut_cumul=F('statut') if categorie == 'action' else Value(''),
+        ).annotate(nombre=Count('id'))
+        if champ_montant:
+            groupes = groupes.annotate(total=Sum(champ_montant))
+        yield categorie, groupes
+
+
+def reconstruire_cumuls(debut=None, fin=None):
+    """Recalculer les cumuls des jours [debut, fin] (tout l'historique par défaut) ; retourne le nombre de cumuls
+
+    Les cumuls des actions des mois archivés ne sont pas touchés : leurs actions
+    ne sont plus dans ActionLog. La migration 0014 garde sa propre copie figée
+    du calcul initial.
+    """
+    dernier_archive = ResumeActionsMois.objects.order_by('-mois').values_list('mois', flat=True).first()
+
+    cumuls = []
+    with transaction.atomic():
+        for categorie, groupes in _sources(debut, fin):
+            anciens = StatJournaliere.objects.filter(categorie=categorie)
+            if debut:
+                anciens = anciens.filter(jour__gte=debut)
+            if fin:
+                anciens = anciens.filter(jour__lte=fin)
+            if categorie == 'action' and dernier_archive:
+                anciens = anciens.filter(jour__gte=mois_suivant(dernier_archive))
+            anciens.delete()
+            for groupe in groupes:
+                cumuls.append(StatJournaliere(
+                    categorie=categorie, jour=groupe['jour'], agent_id=groupe['agent_id'],
+                    mode=groupe['mode'], statut=groupe['statut_cumul'],
+                    nombre=groupe['nombre'], montant=groupe.get('total') or 0,
+                ))
+        StatJournaliere.objects.bulk_create(cumuls, batch_size=1000)
+    # Les statistiques du tableau de bord lues dans les cumuls ont pu changer
+    cache_tableau.invalider(Reglement, Credit)
+    return len(cumuls)
+
+
+# === LECTURE ===
+
+def avant_aujourd_hui(today, categories):
+    """Cumuls des jours antérieurs à `today` pour les catégories données"""
+    return StatJournaliere.objects.filter(categorie__in=categories, jour__lt=today).order_by()
+
+
+def repartitions_actions(filtre, today, debut=None, fin=None, depuis=None):
+    """(répartition par type, répartition par statut) des actions des jours passés, lues dans les cumuls.
+
+    `filtre` s'applique aux cumuls (filtres.filtre_resume_actions(..., champ_type='mode')) ;
+    les actions du jour sont comptées par l'appelant (historique.statistiques_historique).
+    `depuis` exclut les cumuls des mois archivés.
+    """
+    types, statuts = Counter(), Counter()
+    cumuls = avant_aujourd_hui(today, ['action']).filter(filtre)
+    for borne, condition in ((debut, 'jour__gte'), (depuis, 'jour__gte'), (fin, 'jour__lte')):
+        if borne:
+            cumuls = cumuls.filter(**{condition: borne})
+    for mode, statut, nombre in cumuls.values('mode', 'statut').annotate(total=Sum('nombre')).values_list(
+        'mode', 'statut', 'total'
+    ):
+        types[mode] += nombre
+        statuts[statut] += nombre
+    return types, statuts
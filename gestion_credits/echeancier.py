@@ -0,0 +1,229 @@
+"""
+Échéanciers de paiement : dates, montants et numérotation des échéances.
+
+calculer_echeancier() est une fonction pure (ni base ni horloge) : elle sert
+aux aperçus et aux simulations aussi bien qu'à l'enregistrement.
+
+- Les mois et trimestres sont des mois du calendrier, comptés depuis la
+  première échéance : une échéance du 31 tombe le 28 (ou 29) février puis à
+  nouveau le 31 mars, sans dérive.
+- Une échéance qui tombe un dimanche ou un jour férié est reportée au jour
+  ouvré suivant. Les jours fériés sont lus dans un fichier texte
+  (ECHEANCIER_JOURS_FERIES, jours_feries.txt de l'application par défaut).
+- Le montant est réparti au centime près, l'arrondi reporté sur la dernière
+  échéance : la somme des échéances est exactement le montant à répartir.
+
+enregistrer_echeancier() écrit un échéancier calculé (échéances, chèques,
+règlements et alertes) dans une seule transaction, avec bulk_create.
+"""
+
+import calendar
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import ROUND_DOWN, Decimal
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+
+from . import cache_tableau
+from .alertes import indexer
+from .models import Cheque, Echeance
+from .paiements import Paiement, PaiementService
+
+
+FICHIER_JOURS_FERIES = Path(__file__).resolve().parent / 'jours_feries.txt'
+
+# Jours de la semaine sans échéance (lundi = 0) : le dimanche
+JOURS_REPOS = (6,)
+
+# Rappel envoyé avant chaque échéance
+JOURS_RAPPEL = 3
+
+FREQUENCES = ('hebdomadaire', 'bimensuelle', 'mensuelle', 'trimestrielle')
+
+LigneEcheance = namedtuple('LigneEcheance', 'numero_partie montant date_prevue date_echeance date_rappel')
+
+
+# === CALENDRIER ===
+
+def ajouter_mois(jour, nombre):
+    """Même jour `nombre` mois plus tard, ramené au dernier jour du mois s'il n'existe pas"""
+    mois = jour.month - 1 + nombre
+    annee, mois = jour.year + mois // 12, mois % 12 + 1
+    return date(annee, mois, min(jour.day, calendar.monthrange(annee, mois)[1]))
+
+
+def lire_jours_feries(lignes):
+    """Jours fériés d'un calendrier texte : dates (AAAA-MM-JJ) et fêtes annuelles (MM-JJ, en tuples (mois, jour))"""
+    feries = set()
+    for ligne in lignes:
+        # La date, éventuellement suivie d'un libellé ; « # » commence un commentaire
+        valeur = ligne.split('#', 1)[0].strip()
+        if not valeur:
+            continue
+        valeur = valeur.split()[0]
+        if valeur.count('-') == 2:
+            feries.add(date.fromisoformat(valeur))
+        else:
+            mois, jour = valeur.split('-')
+            feries.add((int(mois), int(jour)))
+    return frozenset(feries)
+
+
+@lru_cache(maxsize=4)
+def _jours_feries_fichier(chemin, date_modification):
+    with open(chemin, encoding='utf-8') as fichier:
+        return lire_jours_feries(fichier)
+
+
+def jours_feries(chemin=None):
+    """Jours fériés du calendrier local (relu quand le fichier change)"""
+    chemin = Path(chemin or getattr(settings, 'ECHEANCIER_JOURS_FERIES', None) or FICHIER_JOURS_FERIES)
+    try:
+        date_modification = chemin.stat().st_mtime
+    except FileNotFoundError:
+        return frozenset()
+    return _jours_feries_fichier(str(chemin), date_modification)
+
+
+def est_ouvre(jour, feries):
+    return jour.weekday() not in JOURS_REPOS and jour not in feries and (jour.month, jour.day) not in feries
+
+
+def jour_ouvre(jour, feries):
+    """Le jour même s'il est ouvré, sinon le premier jour ouvré suivant"""
+    while not est_ouvre(jour, feries):
+        jour += timedelta(days=1)
+    return jour
+
+
+# === CALCUL ===
+
+def date_prevue(premiere, frequence, rang):
+    """Date théorique de l'échéance de rang `rang` (0 pour la première)"""
+    if frequence == 'hebdomadaire':
+        return premiere + timedelta(weeks=rang)
+    if frequence == 'bimensuelle':
+        # Deux échéances par mois : le jour de la première, puis quinze jours plus tard
+        jour = ajouter_mois(premiere, rang // 2)
+        return jour + timedelta(days=15) if rang % 2 else jour
+    if frequence == 'mensuelle':
+        return ajouter_mois(premiere, rang)
+    if frequence == 'trimestrielle':
+        return ajouter_mois(premiere, 3 * rang)
+    raise ValueError(f"Fréquence inconnue : {frequence}")
+
+
+def repartir(montant, nombre):
+    """Parts au centime près, l'arrondi reporté sur la dernière"""
+    montant = Decimal(montant)
+    part = (montant / nombre).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
+    return [part] * (nombre - 1) + [montant - part * (nombre - 1)]
+
+
+def calculer_echeancier(montant, nombre, premiere, frequence='mensuelle', numero_depart=1, feries=frozenset()):
+    """Lignes (LigneEcheance) d'un échéancier de `nombre` échéances à partir de la date `premiere`"""
+    lignes = []
+    for rang, part in enumerate(repartir(montant, nombre)):
+        prevue = date_prevue(premiere, frequence, rang)
+        date_echeance = jour_ouvre(prevue, feries)
+        lignes.append(LigneEcheance(
+            numero_partie=numero_depart + rang,
+            montant=part,
+            date_prevue=prevue,
+            date_echeance=date_echeance,
+            date_rappel=date_echeance - timedelta(days=JOURS_RAPPEL),
+        ))
+    return lignes
+
+
+def ligne_unique(montant, date_echeance, numero_partie=1):
+    """Ligne d'une échéance unique, à la date choisie par l'agent"""
+    return LigneEcheance(
+        numero_partie=numero_partie,
+        montant=Decimal(montant),
+        date_prevue=date_echeance,
+        date_echeance=date_echeance,
+        date_rappel=date_echeance - timedelta(days=JOURS_RAPPEL),
+    )
+
+
+# === ENREGISTREMENT ===
+
+def numero_suivant(credit):
+    """Numéro de la prochaine échéance du crédit (une requête)"""
+    return (credit.echeances.aggregate(dernier=Max('numero_partie'))['dernier'] or 0) + 1
+
+
+def enregistrer_echeancier(credit, lignes, agent, mode_paiement='especes', frequence=None, commentaire='',
+                           effet=None):
+    """Écrire les échéances et, pour chacune, son chèque (effet), son règlement et son alerte
+
+    `frequence` None : échéance unique. `effet` (numero, banque, date_emission)
+    crée un chèque par échéance, numéroté « numero-rang » pour un échéancier.
+    Retourne les échéances créées.
+    """
+    nombre = len(lignes)
+    bulk_avec_identifiants = connection.features.can_return_rows_from_bulk_insert
+
+    def libelle(rang):
+        return 'Échéance unique' if frequence is None else f'Échéance {rang}/{nombre}'
+
+    with transaction.atomic():
+        echeances = [
+            Echeance(
+                credit=credit,
+                numero_partie=ligne.numero_partie,
+                montant=ligne.montant,
+                date_echeance=ligne.date_echeance,
+                date_rappel=ligne.date_rappel,
+                est_especes=(mode_paiement == 'especes'),
+                commentaire=commentaire if frequence is None else f"{libelle(rang)} - {frequence} - {commentaire}",
+            )
+            for rang, ligne in enumerate(lignes, start=1)
+        ]
+        if bulk_avec_identifiants:
+            Echeance.objects.bulk_create(echeances)
+        else:
+            # MySQL ne renvoie pas les identifiants insérés par bulk_create (les signaux indexent les échéances)
+            for echeance in echeances:
+                echeance.save()
+
+        if effet is not None:
+            Cheque.objects.bulk_create([
+                Cheque(
+                    echeance=echeance,
+                    numero_cheque=effet['numero'] if frequence is None else f"{effet['numero']}-{rang}",
+                    banque=effet['banque'],
+                    date_emission=effet['date_emission'],
+                    date_reglement_prevu=echeance.date_echeance,
+                    montant=echeance.montant,
+                    statut='garantie',
+                    remarques=commentaire if frequence is None else f"{libelle(rang)} - {commentaire}",
+                )
+                for rang, echeance in enumerate(echeances, start=1)
+            ])
+
+        PaiementService(agent).enregistrer_paiements([
+            Paiement(
+                credit, echeance.montant, date.today(),
+                mode_paiement='especes' if mode_paiement == 'especes' else 'cheque',
+                commentaire=f"{libelle(rang)} - {commentaire if frequence is None else frequence}",
+                alerte={
+                    'echeance': echeance,
+                    'type_alerte': 'echeance',
+                    'message': f'{libelle(rang)} pour {credit.client.nom_complet} - {echeance.montant} DH',
+                    'date_rappel': echeance.date_echeance,
+                },
+            )
+            for rang, echeance in enumerate(echeances, start=1)
+        ])
+
+        # bulk_create ne déclenche pas les signaux des échéances
+        if bulk_avec_identifiants:
+            indexer(echeances=Echeance.objects.filter(pk__in=[echeance.pk for echeance in echeances]))
+            cache_tableau.invalider(Echeance)
+    return echeances
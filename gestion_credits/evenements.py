@@ -0,0 +1,155 @@
+"""
+Notifications en direct (server-sent events) : nouvelles alertes, nouveaux
+règlements et bascule des niveaux d'urgence des alertes.
+
+Les signaux publient, au commit de la transaction, un événement sur le canal
+du processus (canal.publier) ; chaque connexion SSE ouverte (vue
+flux_evenements, servie par l'application ASGI) y est abonnée avec une file
+asyncio et ne reçoit que les événements de son agent (tous pour l'équipe).
+Une connexion inactive ne coûte qu'une coroutine en attente sur sa file : ni
+requête en base ni sondage, et un commentaire « battement » toutes les
+EVENEMENTS_BATTEMENT secondes maintient la connexion ouverte à travers les
+proxys.
+
+Le canal est propre au processus : avec plusieurs processus ASGI, un agent
+reçoit les événements des écritures faites par le processus qui le sert.
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+
+BATTEMENT_DEFAUT = 15
+
+# Événements en attente par connexion ; au-delà, les suivants sont perdus pour cette connexion
+TAILLE_MAX_FILE = 100
+
+# Délai de reconnexion proposé au navigateur (millisecondes)
+DELAI_RECONNEXION_MS = 5000
+
+
+class Abonnement:
+    """File des événements destinés à une connexion"""
+
+    def __init__(self, agent_id, tout_voir=False):
+        self.agent_id = agent_id
+        self.tout_voir = tout_voir
+        self.boucle = asyncio.get_running_loop()
+        self.file = asyncio.Queue(maxsize=TAILLE_MAX_FILE)
+        self.perdus = 0
+
+    def accepte(self, evenement):
+        agents = evenement['agents']
+        return self.tout_voir or agents is None or self.agent_id in agents
+
+    def deposer(self, evenement):
+        """Appelé dans la boucle de l'abonnement"""
+        try:
+            self.file.put_nowait(evenement)
+        except asyncio.QueueFull:
+            self.perdus += 1
+
+
+class Canal:
+    """Publication / abonnement en mémoire, utilisable depuis n'importe quel fil"""
+
+    def __init__(self):
+        self._abonnements = set()
+        self._verrou = threading.Lock()
+        self._identifiants = itertools.count(1)
+
+    def abonner(self, agent_id, tout_voir=False):
+        """Abonner une connexion (à appeler dans sa boucle asyncio)"""
+        abonnement = Abonnement(agent_id, tout_voir)
+        with self._verrou:
+            self._abonnements.add(abonnement)
+        return abonnement
+
+    def desabonner(self, abonnement):
+        with self._verrou:
+            self._abonnements.discard(abonnement)
+
+    def nombre_abonnes(self):
+        return len(self._abonnements)
+
+    def publier(self, type_evenement, donnees, agents=None):
+        """Transmettre un événement aux connexions concernées (`agents` : identifiants, None pour tous)"""
+        evenement = {
+            'id': next(self._identifiants),
+            'type': type_evenement,
+            'donnees': donnees,
+            'agents': frozenset(agent for agent in agents if agent is not None) if agents is not None else None,
+        }
+        with self._verrou:
+            abonnements = list(self._abonnements)
+        for abonnement in abonnements:
+            if not abonnement.accepte(evenement):
+                continue
+            try:
+                abonnement.boucle.call_soon_threadsafe(abonnement.deposer, evenement)
+            except RuntimeError:
+                # Boucle fermée : la connexion n'existe plus
+                self.desabonner(abonnement)
+        return evenement
+
+
+canal = Canal()
+
+
+def publier_au_commit(type_evenement, donnees, agents=None):
+    """Publier l'événement une fois la transaction en cours validée (rien si elle est annulée)"""
+    transaction.on_commit(lambda: canal.publier(type_evenement, donnees, agents))
+
+
+def notifier_alerte(alerte):
+    publier_au_commit('alerte', {
+        'id': alerte.pk,
+        'type_alerte': alerte.type_alerte,
+        'message': alerte.message,
+        'date_rappel': alerte.date_rappel,
+    }, agents=[alerte.agent_id])
+
+
+def notifier_reglement(reglement):
+    credit = reglement.credit
+    publier_au_commit('reglement', {
+        'id': reglement.pk,
+        'credit_id': credit.pk,
+        'numero_police': credit.numero_police,
+        'montant': reglement.montant,
+        'mode_paiement': reglement.mode_paiement,
+        'date_reglement': reglement.date_reglement,
+    }, agents=[reglement.agent_id, credit.agent_id])
+
+
+def notifier_bascule(nombre):
+    publier_au_commit('niveaux_alertes', {'lignes': nombre})
+
+
+def format_sse(evenement):
+    donnees = json.dumps(evenement['donnees'], cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"id: {evenement['id']}\nevent: {evenement['type']}\ndata: {donnees}\n\n"
+
+
+async def flux(agent_id, tout_voir=False, battement=None):
+    """Flux SSE d'une connexion, jusqu'à sa fermeture par le client"""
+    if battement is None:
+        battement = getattr(settings, 'EVENEMENTS_BATTEMENT', BATTEMENT_DEFAUT)
+    abonnement = canal.abonner(agent_id, tout_voir)
+    try:
+        yield f'retry: {DELAI_RECONNEXION_MS}\n\n'
+        while True:
+            try:
+                evenement = await asyncio.wait_for(abonnement.file.get(), battement)
+            except asyncio.TimeoutError:
+                yield ': battement\n\n'
+                continue
+            yield format_sse(evenement)
+    finally:
+        canal.desabonner(abonnement)
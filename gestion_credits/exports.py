@@ -0,0 +1,233 @@
+"""
+Exports CSV / XLSX en flux des listes (crédits, règlements, chèques, historique).
+
+Les lignes sont lues par pages de TAILLE_PAGE sur la clé primaire (pagination
+par clé, sans OFFSET) et envoyées au fur et à mesure : la mémoire utilisée ne
+dépend pas du nombre de lignes exportées, y compris sous MySQL où le pilote
+charge sinon tout le résultat d'une requête en mémoire. Chaque export est
+journalisé (ActionLog « export_donnees ») avec son nombre de lignes et sa durée.
+"""
+
+import csv
+import io
+import tempfile
+import time
+from datetime import date, datetime
+from itertools import chain
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .journal import journaliser
+from .models import ActionLog, Credit, Reglement
+
+
+# Nombre de lignes lues par requête
+TAILLE_PAGE = 2000
+
+# Nombre de lignes CSV regroupées dans un même morceau de réponse
+LIGNES_PAR_MORCEAU = 500
+
+
+class Export:
+    """Description d'un export : colonnes (intitulé, champ) et libellés des choix"""
+
+    def __init__(self, nom, colonnes, choix=None, descendant=False):
+        self.nom = nom
+        self.colonnes = colonnes
+        self.choix = choix or {}
+        self.descendant = descendant
+
+    @property
+    def entetes(self):
+        return [intitule for intitule, champ in self.colonnes]
+
+    @property
+    def champs(self):
+        return [champ for intitule, champ in self.colonnes]
+
+
+EXPORT_CREDITS = Export('credits', [
+    ('Numéro de police', 'numero_police'),
+    ('Nom', 'client__nom'),
+    ('Prénom', 'client__prenom'),
+    ('CIN', 'client__cin'),
+    ('Type', 'type_credit'),
+    ('Montant total', 'montant_total'),
+    ('Total versé', 'total_verse'),
+    ('Chèques non versés', 'total_cheques_non_verses'),
+    ('Reste à payer', 'reste_a_payer'),
+    ('Statut', 'statut_reglement'),
+    ('Agent', 'agent__username'),
+    ('Date de création', 'date_creation'),
+], choix={
+    'type_credit': dict(Credit.TYPE_CHOICES),
+    'statut_reglement': dict(Credit.STATUT_REGLEMENT_CHOICES),
+}, descendant=True)
+
+EXPORT_REGLEMENTS = Export('reglements', [
+    ('Date', 'date_reglement'),
+    ('Numéro de police', 'credit__numero_police'),
+    ('Nom', 'credit__client__nom'),
+    ('Prénom', 'credit__client__prenom'),
+    ('Montant', 'montant'),
+    ('Mode', 'mode_paiement'),
+    ('Statut', 'statut'),
+    ('Agent', 'agent__username'),
+    ('Commentaire', 'commentaire'),
+    ('Saisi le', 'date_creation'),
+], choix={
+    'mode_paiement': dict(Reglement.MODE_PAIEMENT_CHOICES),
+    'statut': dict(Reglement.STATUT_CHOICES),
+})
+
+EXPORT_CHEQUES_GARANTIE = Export('cheques_garantie', [
+    ('Numéro', 'numero'),
+    ('Banque', 'banque'),
+    ('Montant', 'montant'),
+    ("Date d'émission", 'date_emission'),
+    ("Date d'échéance", 'date_echeance'),
+    ('Numéro de police', 'credit__numero_police'),
+    ('Nom', 'credit__client__nom'),
+    ('Prénom', 'credit__client__prenom'),
+    ('Commentaire', 'commentaire'),
+])
+
+EXPORT_ACTIONS = Export('historique_actions', [
+    ('Date', 'date_action'),
+    ('Type', 'type_action'),
+    ('Statut', 'statut'),
+    ('Agent', 'agent__username'),
+    ('Nom client', 'client__nom'),
+    ('Prénom client', 'client__prenom'),
+    ('Numéro de police', 'credit__numero_police'),
+    ('Description', 'description'),
+    ('Adresse IP', 'ip_adresse'),
+], choix={
+    'type_action': dict(ActionLog.TYPE_ACTION_CHOICES),
+    'statut': dict(ActionLog.STATUT_CHOICES),
+}, descendant=True)
+
+
+def parcourir(queryset, export, taille_page=TAILLE_PAGE):
+    """Itérer sur les lignes de l'export, page par page sur la clé primaire"""
+    champs = export.champs
+    ordre = '-pk' if export.descendant else 'pk'
+    dernier = None
+
+    while True:
+        page = queryset.order_by(ordre)
+        if dernier is not None:
+            page = page.filter(pk__lt=dernier) if export.descendant else page.filter(pk__gt=dernier)
+        lignes = list(page.values_list('pk', *champs)[:taille_page])
+
+        for ligne in lignes:
+            yield [
+                export.choix[champ].get(valeur, valeur) if champ in export.choix else valeur
+                for champ, valeur in zip(champs, ligne[1:])
+            ]
+
+        if len(lignes) < taille_page:
+            return
+        dernier = lignes[-1][0]
+
+
+def _cellule(valeur):
+    """Valeur affichable d'une cellule (dates locales, vide pour None)"""
+    if valeur is None:
+        return ''
+    if isinstance(valeur, datetime):
+        return timezone.localtime(valeur).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valeur, date):
+        return valeur.isoformat()
+    return valeur
+
+
+def journaliser_export(agent, export, format_fichier, nombre_lignes, duree, filtres):
+    journaliser(
+        type_action='export_donnees',
+        description=f'Export {export.nom} ({format_fichier.upper()}) : {nombre_lignes} ligne(s) en {duree:.2f} s',
+        statut='succes',
+        agent=agent,
+        donnees_apres={
+            'export': export.nom,
+            'format': format_fichier,
+            'lignes': nombre_lignes,
+            'duree_secondes': round(duree, 3),
+            'filtres': filtres,
+        },
+    )
+
+
+def _flux_csv(lignes, export, agent, filtres, debut):
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon, delimiter=';')
+    nombre_lignes = 0
+    try:
+        # BOM pour qu'Excel détecte l'UTF-8
+        tampon.write('\ufeff')
+        ecrivain.writerow(export.entetes)
+        for ligne in lignes:
+            ecrivain.writerow([_cellule(valeur) for valeur in ligne])
+            nombre_lignes += 1
+            if nombre_lignes % LIGNES_PAR_MORCEAU == 0:
+                yield tampon.getvalue()
+                tampon.seek(0)
+                tampon.truncate()
+        yield tampon.getvalue()
+    finally:
+        journaliser_export(agent, export, 'csv', nombre_lignes, time.monotonic() - debut, filtres)
+
+
+def _fichier_xlsx(lignes, export):
+    """Écrire le classeur (mode écriture seule) dans un fichier temporaire ; retourne (fichier, nombre de lignes)"""
+    from openpyxl import Workbook
+
+    classeur = Workbook(write_only=True)
+    feuille = classeur.create_sheet(export.nom[:31])
+    feuille.append(export.entetes)
+    nombre_lignes = 0
+    for ligne in lignes:
+        feuille.append([_cellule(valeur) for valeur in ligne])
+        nombre_lignes += 1
+
+    fichier = tempfile.TemporaryFile()
+    classeur.save(fichier)
+    fichier.seek(0)
+    return fichier, nombre_lignes
+
+
+def xlsx_disponible():
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def reponse_export(request, export, queryset, format_fichier='csv'):
+    """Réponse HTTP contenant l'export du queryset au format demandé
+
+    `queryset` peut être une liste de querysets, exportés l'un après l'autre
+    (historique courant puis archivé).
+    """
+    debut = time.monotonic()
+    filtres = {cle: valeur for cle, valeur in request.GET.items() if cle not in ('format', 'page', 'curseur') and valeur}
+    nom_fichier = f"{export.nom}_{date.today().strftime('%Y%m%d')}.{format_fichier}"
+    querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+    lignes = chain.from_iterable(parcourir(qs, export) for qs in querysets)
+
+    if format_fichier == 'xlsx':
+        fichier, nombre_lignes = _fichier_xlsx(lignes, export)
+        journaliser_export(request.user, export, 'xlsx', nombre_lignes, time.monotonic() - debut, filtres)
+        return FileResponse(
+            fichier, as_attachment=True, filename=nom_fichier,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+
+    response = StreamingHttpResponse(
+        _flux_csv(lignes, export, request.user, filtres, debut),
+        content_type='text/csv; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    return response
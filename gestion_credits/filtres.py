@@ -0,0 +1,163 @@
+"""
+Filtres des listes (clients, crédits, règlements, chèques, historique) partagés entre
+les pages de liste et les exports, pour qu'un export reprenne exactement la sélection
+affichée à l'écran. Les champs « recherche » passent par l'index plein texte (recherche.py).
+"""
+
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+
+from .archives import debut_journee
+from .models import ActionLog, ChequeGarantie, Client, Credit, Reglement
+from .recherche import objets_correspondants
+
+
+def date_ou_none(valeur):
+    """Date au format AAAA-MM-JJ, None si vide ou invalide"""
+    try:
+        return datetime.strptime(valeur, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def filtrer_clients(params):
+    """Clients correspondant à la recherche (nom, prénom, CIN, téléphone)"""
+    search_query = params.get('search', '')
+
+    clients = Client.objects.all()
+
+    if search_query:
+        clients = clients.filter(pk__in=objets_correspondants('client', search_query))
+
+    return clients
+
+
+def filtrer_credits(params):
+    """Crédits correspondant à la recherche et au type demandés"""
+    search_query = params.get('search', '')
+    type_filter = params.get('type', '')
+
+    credits = Credit.objects.all()
+
+    if search_query:
+        credits = credits.filter(pk__in=objets_correspondants('credit', search_query))
+
+    if type_filter:
+        credits = credits.filter(type_credit=type_filter)
+
+    return credits
+
+
+def filtrer_par_statut_reglement(credits, statut_filter):
+    """Restreindre aux crédits payés ou non réglés (statut_reglement matérialisé)"""
+    if statut_filter == 'payes':
+        return credits.filter(statut_reglement='regle')
+    if statut_filter == 'non_regles':
+        return credits.filter(statut_reglement='non_regle')
+    return credits
+
+
+def filtrer_actions(params, modele=ActionLog):
+    """Actions de l'historique correspondant à tous les filtres de la page
+
+    `modele` vaut ActionArchivee pour filtrer l'historique archivé, dont les
+    actions ne sont plus dans l'index plein texte : la recherche porte alors
+    sur la description.
+    """
+    type_action_filter = params.get('type_action', '')
+    statut_filter = params.get('statut', '')
+    agent_filter = params.get('agent', '')
+    client_filter = params.get('client', '')
+    search_query = params.get('search', '')
+    date_debut = date_ou_none(params.get('date_debut'))
+    date_fin = date_ou_none(params.get('date_fin'))
+
+    actions = modele.objects.all()
+
+    if type_action_filter:
+        actions = actions.filter(type_action=type_action_filter)
+
+    if statut_filter:
+        actions = actions.filter(statut=statut_filter)
+
+    if agent_filter:
+        actions = actions.filter(agent__username__icontains=agent_filter)
+
+    if client_filter:
+        actions = actions.filter(
+            Q(client__nom__icontains=client_filter) |
+            Q(client__prenom__icontains=client_filter)
+        )
+
+    # Bornes sur date_action elle-même (et non sa date) : l'index de date_action reste utilisable
+    if date_debut:
+        actions = actions.filter(date_action__gte=debut_journee(date_debut))
+
+    if date_fin:
+        actions = actions.filter(date_action__lt=debut_journee(date_fin + timedelta(days=1)))
+
+    if search_query and modele is ActionLog:
+        actions = actions.filter(pk__in=objets_correspondants('action', search_query))
+    elif search_query:
+        for terme in search_query.split():
+            actions = actions.filter(description__icontains=terme)
+
+    return actions
+
+
+def filtre_resume_actions(params, champ_type='type_action'):
+    """Filtre équivalent sur ResumeActionsMois, ou sur StatJournaliere avec champ_type='mode'
+    (None si les filtres de client ou de recherche l'empêchent)"""
+    if params.get('client') or params.get('search'):
+        return None
+    filtre = Q()
+    if params.get('type_action'):
+        filtre &= Q(**{champ_type: params['type_action']})
+    if params.get('statut'):
+        filtre &= Q(statut=params['statut'])
+    if params.get('agent'):
+        filtre &= Q(agent__username__icontains=params['agent'])
+    return filtre
+
+
+def filtrer_reglements(params):
+    """Règlements du grand livre filtrés par période, mode, statut et police"""
+    date_debut = date_ou_none(params.get('date_debut'))
+    date_fin = date_ou_none(params.get('date_fin'))
+    mode_paiement = params.get('mode_paiement', '')
+    statut = params.get('statut', '')
+    police = params.get('police', '')
+
+    reglements = Reglement.objects.all()
+
+    if date_debut:
+        reglements = reglements.filter(date_reglement__gte=date_debut)
+    if date_fin:
+        reglements = reglements.filter(date_reglement__lte=date_fin)
+    if mode_paiement:
+        reglements = reglements.filter(mode_paiement=mode_paiement)
+    if statut:
+        reglements = reglements.filter(statut=statut)
+    if police:
+        reglements = reglements.filter(credit__numero_police__icontains=police)
+
+    return reglements
+
+
+def filtrer_cheques_garantie(params):
+    """Chèques de garantie filtrés par période d'échéance et police"""
+    date_debut = date_ou_none(params.get('date_debut'))
+    date_fin = date_ou_none(params.get('date_fin'))
+    police = params.get('police', '')
+
+    cheques = ChequeGarantie.objects.all()
+
+    if date_debut:
+        cheques = cheques.filter(date_echeance__gte=date_debut)
+    if date_fin:
+        cheques = cheques.filter(date_echeance__lte=date_fin)
+    if police:
+        cheques = cheques.filter(credit__numero_police__icontains=police)
+
+    return cheques
@@ -1,10 +1,40 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from django.urls import reverse
 from .models import Client, Credit, Echeance, Cheque, Alerte, ReportEcheance, Reglement, ChequeGarantie
 from datetime import date, timedelta
 
 
+class SelectionAutocompletion(forms.Select):
+    """Liste déroulante d'un ModelChoiceField alimentée à la demande (autocompletion.py)
+
+    Seule l'option choisie est rendue, sans parcourir le queryset du champ ;
+    les autres options sont demandées à la vue JSON `url` au fil de la saisie
+    (script d'autocomplétion de base.html).
+    """
+
+    def __init__(self, url, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocompletion'] = reverse(self.url)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        selection = [valeur for valeur in value if valeur]
+        champ = self.choices.field
+        options = [self.create_option(name, '', champ.empty_label or '', not selection, 0)]
+        if selection:
+            for index, objet in enumerate(self.choices.queryset.filter(pk__in=selection), start=1):
+                options.append(self.create_option(
+                    name, str(objet.pk), champ.label_from_instance(objet), True, index, attrs=attrs,
+                ))
+        return [(None, options, 0)]
+
+
 class ClientForm(forms.ModelForm):
     """Formulaire pour créer/modifier un client"""
     
@@ -40,7 +70,7 @@ class CreditForm(forms.ModelForm):
         model = Credit
         fields = ['client', 'numero_police', 'montant_total', 'description']
         widgets = {
-            'client': forms.Select(attrs={'class': 'form-control'}),
+            'client': SelectionAutocompletion('gestion_credits:client_autocompletion', attrs={'class': 'form-control'}),
             'numero_police': forms.TextInput(attrs={
                 'class': 'form-control', 
                 'placeholder': 'Ex: POL-2024-001',
@@ -1069,3 +1099,37 @@ class AjoutPaiementForm(forms.Form):
                 self.add_error('date_emission_effet', 'La date d\'émission de l\'effet est obligatoire.')
         
         return cleaned_data
+
+
+class ImportReglementsForm(forms.Form):
+    """Formulaire d'import en masse de règlements (relevé CSV ou XLSX)"""
+    
+    fichier = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,.txt,.xlsx'
+        }),
+        label="Fichier de règlements",
+        help_text="Colonnes : numero_police, mode_paiement, montant, date_paiement, numero_effet, banque_emetteur, date_emission_effet, commentaire"
+    )
+    
+    taille_lot = forms.IntegerField(
+        min_value=1,
+        max_value=10000,
+        initial=1000,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+        label="Taille des lots",
+        help_text="Nombre de lignes enregistrées par requête"
+    )
+    
+    simulation = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+        label="Simulation (valider le fichier sans rien enregistrer)"
+    )
+    
+    def clean_fichier(self):
+        fichier = self.cleaned_data['fichier']
+        if not fichier.name.lower().endswith(('.csv', '.txt', '.xlsx')):
+            raise forms.ValidationError("Format de fichier non supporté (CSV ou XLSX attendu).")
+        return fichier
@@ -0,0 +1,412 @@
+"""
+Génération d'un portefeuille synthétique pour les tests de charge et les mesures.
+
+GenerateurPortefeuille crée des clients, leurs crédits (uniques ou divisés),
+les échéances, les chèques de garantie (1 à 10 par crédit divisé), les
+règlements en espèces et par chèque (versés ou non), les alertes et
+l'historique des actions, avec des répartitions proches de la production :
+montants log-normaux, crédits datés régulièrement sur la période, règlements
+étalés entre la création du crédit et aujourd'hui, échéances traitées dans
+l'ordre au fil des règlements.
+
+Les données ne dépendent que de la graine : le générateur aléatoire est tiré
+dans un ordre fixe, indépendant des identifiants attribués par la base, et les
+CIN, téléphones et numéros de police portent un préfixe propre à la graine.
+
+L'écriture se fait par lots de clients, une transaction par lot, avec
+bulk_create. Les dates de création (auto_now_add), remplacées à l'insertion
+par l'instant courant, sont remises aux dates générées par bulk_update. Les
+soldes des crédits sont calculés en mémoire ; les index (alertes, recherche)
+sont tenus lot par lot, les cumuls journaliers sont reconstruits sur la
+période à la fin.
+"""
+
+import math
+import random
+import time
+from datetime import datetime, time as heure, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import alertes, cache_tableau, cumuls, historique, recherche
+from .echeancier import ajouter_mois, calculer_echeancier, jours_feries, ligne_unique, repartir
+from .models import ActionLog, Alerte, ChequeGarantie, Client, Credit, Echeance, Reglement
+
+
+# Nombre de clients écrits par transaction
+TAILLE_LOT_DEFAUT = 1000
+
+# Nombre de lignes par requête d'insertion
+TAILLE_REQUETE = 1000
+
+# Part des crédits divisés, nombre de parties (5 au plus, voir Echeance.numero_partie)
+PART_DIVISES = 0.4
+PARTIES_DIVISE = (2, 5)
+
+# Chèques de garantie d'un crédit divisé ; un crédit unique en a un sur deux
+CHEQUES_DIVISE = (1, 10)
+PART_UNIQUES_GARANTIS = 0.5
+
+# Montant des crédits (DH) : log-normal autour de 15 000 DH
+MONTANT_MEDIAN = 15000
+DISPERSION_MONTANT = 0.7
+MONTANT_MIN, MONTANT_MAX = Decimal('1000'), Decimal('500000')
+
+# Règlements : part des crédits soldés, des paiements par chèque et des chèques versés
+PART_SOLDES = 0.3
+PART_CHEQUES = 0.4
+PART_CHEQUES_VERSES = 0.75
+
+# Montant minimal d'un règlement (DH)
+REGLEMENT_MIN = 50
+
+# Alertes en attente pour les échéances non traitées à moins de JOURS_ALERTE jours (ou en retard)
+JOURS_ALERTE = 30
+# Part des échéances traitées qui ont eu une alerte de rappel
+PART_RAPPELS_TRAITES = 0.2
+
+NOMS = (
+    'Alaoui', 'Benjelloun', 'Tazi', 'Bennani', 'El Idrissi', 'Chraibi', 'Fassi', 'Berrada', 'Lahlou', 'Sqalli',
+    'Amrani', 'Ouazzani', 'Benkirane', 'Kettani', 'Naciri', 'Zniber', 'Cherkaoui', 'Hajji', 'Tahiri', 'Mernissi',
+)
+PRENOMS = (
+    'Ahmed', 'Fatima', 'Karim', 'Khadija', 'Mohamed', 'Amina', 'Youssef', 'Salma', 'Omar', 'Hiba',
+    'Hassan', 'Nadia', 'Rachid', 'Imane', 'Mehdi', 'Sanaa', 'Yassine', 'Laila', 'Hamza', 'Zineb',
+)
+VILLES = ('Casablanca', 'Rabat', 'Marrakech', 'Fès', 'Tanger', 'Agadir', 'Meknès', 'Oujda', 'Kénitra', 'Tétouan')
+BANQUES = (
+    'Attijariwafa Bank', 'Banque Populaire', 'BMCE Bank of Africa', 'CIH Bank', 'Crédit Agricole du Maroc',
+    'Société Générale Maroc', 'BMCI', 'Crédit du Maroc', 'Al Barid Bank', 'CFG Bank',
+)
+
+
+# Champ de date de création (auto_now_add) de chaque modèle généré
+CHAMPS_DATES_CREATION = {
+    Client: 'date_creation',
+    Credit: 'date_creation',
+    Reglement: 'date_creation',
+    ChequeGarantie: 'date_creation',
+    ActionLog: 'date_action',
+}
+
+
+class GenerateurPortefeuille:
+    """Générer `nombre_clients` clients de `credits_par_client` crédits chacun, sur les `jours` derniers jours"""
+
+    def __init__(self, nombre_clients, credits_par_client=2, reglements_par_credit=5, graine=0, jours=730,
+                 nombre_agents=5, taille_lot=TAILLE_LOT_DEFAUT, prefixe=None, today=None, on_lot=None):
+        self.nombre_clients = nombre_clients
+        self.credits_par_client = credits_par_client
+        self.reglements_par_credit = reglements_par_credit
+        self.graine = graine
+        self.jours = jours
+        self.nombre_agents = nombre_agents
+        self.taille_lot = taille_lot
+        self.prefixe = prefixe or f'GEN{graine}'
+        self.today = today or timezone.localdate()
+        self.debut = self.today - timedelta(days=jours - 1)
+        self.on_lot = on_lot
+        self.aleatoire = random.Random(graine)
+        self.feries = jours_feries()
+        self.agents = []
+        self.compteurs = dict.fromkeys(
+            ('clients', 'credits', 'echeances', 'cheques_garantie', 'reglements', 'alertes', 'actions'), 0
+        )
+
+    # === ÉCRITURE ===
+
+    def deja_genere(self):
+        return Client.objects.filter(cin__startswith=self.prefixe).exists()
+
+    def generer(self):
+        """Écrire tout le portefeuille ; retourne les compteurs et la durée"""
+        debut = time.monotonic()
+        self.agents = self.charger_agents()
+        for premier in range(0, self.nombre_clients, self.taille_lot):
+            dernier = min(premier + self.taille_lot, self.nombre_clients)
+            with transaction.atomic():
+                self.ecrire_lot(premier, dernier)
+            if self.on_lot:
+                self.on_lot(dernier, self.compteurs)
+
+        # bulk_create ne déclenche pas les signaux : cumuls, tableau de bord et filtres de l'historique
+        cumuls.reconstruire_cumuls(self.debut)
+        cache_tableau.invalider(Client, Credit, Reglement, ChequeGarantie, Echeance, Alerte)
+        historique.invalider_filtres()
+        return {**self.compteurs, 'duree_secondes': round(time.monotonic() - debut, 1)}
+
+    def charger_agents(self):
+        """Agents de la génération (agent_generation_1, ...), créés s'ils n'existent pas, sans mot de passe"""
+        noms = [f'agent_generation_{rang}' for rang in range(1, self.nombre_agents + 1)]
+        User.objects.bulk_create([
+            User(username=nom, first_name='Agent', last_name=f'Génération {rang}', password=make_password(None))
+            for rang, nom in enumerate(noms, start=1)
+        ], ignore_conflicts=True)
+        agents = {agent.username: agent for agent in User.objects.filter(username__in=noms)}
+        return [agents[nom] for nom in noms]
+
+    def _creer(self, modele, objets, champs_cle=(), **filtre):
+        """bulk_create puis remise des dates de création générées (bulk_update)
+
+        Sous MySQL, qui ne renvoie pas les identifiants insérés, ils sont relus par
+        clé naturelle, ou sans clé dans l'ordre d'insertion (`filtre` ne doit alors
+        retenir que les objets du lot).
+        """
+        champ_date = CHAMPS_DATES_CREATION.get(modele)
+        dates = [getattr(objet, champ_date) for objet in objets] if champ_date else None
+        modele.objects.bulk_create(objets, batch_size=TAILLE_REQUETE)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            if champs_cle:
+                identifiants = {
+                    tuple(ligne[1:]): ligne[0]
+                    for ligne in modele.objects.filter(**filtre).values_list('pk', *champs_cle).iterator()
+                }
+                for objet in objets:
+                    objet.pk = identifiants[tuple(getattr(objet, champ) for champ in champs_cle)]
+            else:
+                identifiants = modele.objects.filter(**filtre).order_by('pk').values_list('pk', flat=True)
+                for objet, identifiant in zip(objets, identifiants.iterator()):
+                    objet.pk = identifiant
+        if champ_date:
+            for objet, valeur in zip(objets, dates):
+                setattr(objet, champ_date, valeur)
+            modele.objects.bulk_update(objets, [champ_date], batch_size=TAILLE_REQUETE)
+
+    def ecrire_lot(self, premier, dernier):
+        """Générer puis écrire les clients [premier, dernier) et tout ce qui s'y rattache"""
+        lot = self.generer_lot(premier, dernier)
+        clients, credits = lot['clients'], lot['credits']
+        self._creer(Client, clients, ('cin',), cin__in=[client.cin for client in clients])
+        self._creer(Credit, credits, ('numero_police',),
+                    numero_police__in=[credit.numero_police for credit in credits])
+        credit_ids = [credit.pk for credit in credits]
+        self._creer(Echeance, lot['echeances'], ('credit_id', 'numero_partie'), credit_id__in=credit_ids)
+        self._creer(ChequeGarantie, lot['cheques_garantie'], ('credit_id', 'numero'), credit_id__in=credit_ids)
+        self._creer(Reglement, lot['reglements'], credit_id__in=credit_ids)
+        Alerte.objects.bulk_create(lot['alertes'], batch_size=TAILLE_REQUETE)
+        client_ids = [client.pk for client in clients]
+        self._creer(ActionLog, lot['actions'], client_id__in=client_ids)
+
+        alertes.indexer_credits(credit_ids, today=self.today)
+        recherche.indexer(
+            clients=Client.objects.filter(pk__in=client_ids),
+            credits=Credit.objects.filter(pk__in=credit_ids),
+            actions=ActionLog.objects.filter(client_id__in=client_ids),
+        )
+        for nom, objets in lot.items():
+            self.compteurs[nom] += len(objets)
+
+    # === GÉNÉRATION (en mémoire, sans accès à la base) ===
+
+    def generer_lot(self, premier, dernier):
+        lot = {nom: [] for nom in self.compteurs}
+        for rang_client in range(premier, dernier):
+            self.generer_client(rang_client, lot)
+        return lot
+
+    def moment(self, jour):
+        """Date et heure (heures ouvrables) du jour donné"""
+        return timezone.make_aware(datetime.combine(jour, heure(8 + self.aleatoire.randrange(10),
+                                                                 self.aleatoire.randrange(60))))
+
+    def jour_credit(self, rang_credit):
+        """Jour de création du crédit : les crédits sont répartis régulièrement sur la période"""
+        total = self.nombre_clients * self.credits_par_client
+        return self.debut + timedelta(days=rang_credit * self.jours // total)
+
+    def generer_client(self, rang, lot):
+        aleatoire = self.aleatoire
+        agent = aleatoire.choice(self.agents)
+        nom, prenom = aleatoire.choice(NOMS), aleatoire.choice(PRENOMS)
+        date_creation = self.moment(self.jour_credit(rang * self.credits_par_client))
+        client = Client(
+            nom=nom,
+            prenom=prenom,
+            cin=f'{self.prefixe}-{rang:07d}',
+            telephone=f'{self.prefixe}-06{rang:08d}',
+            email=f'{prenom.lower()}.{nom.lower().replace(" ", "")}{rang}@exemple.ma',
+            adresse=f'{aleatoire.randrange(1, 300)} Rue {aleatoire.choice(NOMS)}, {aleatoire.choice(VILLES)}',
+            date_creation=date_creation,
+        )
+        lot['clients'].append(client)
+        lot['actions'].append(ActionLog(
+            type_action='client_creation',
+            description=f'Création du client {client.nom_complet} (CIN: {client.cin})',
+            agent=agent,
+            client=client,
+            date_action=date_creation,
+        ))
+        for rang_credit in range(rang * self.credits_par_client, (rang + 1) * self.credits_par_client):
+            self.generer_credit(client, agent, rang_credit, lot)
+
+    def montant_credit(self):
+        montant = Decimal(round(self.aleatoire.lognormvariate(math.log(MONTANT_MEDIAN), DISPERSION_MONTANT), -2))
+        return min(max(montant, MONTANT_MIN), MONTANT_MAX)
+
+    def generer_credit(self, client, agent, rang, lot):
+        aleatoire = self.aleatoire
+        jour = self.jour_credit(rang)
+        montant = self.montant_credit()
+        credit = Credit(
+            client=client,
+            numero_police=f'{self.prefixe}-{rang:08d}',
+            montant_total=montant,
+            agent=agent,
+            date_creation=self.moment(jour),
+        )
+        if aleatoire.random() < PART_DIVISES:
+            credit.type_credit = 'divise'
+            credit.description = 'Crédit divisé (généré)'
+            lignes = calculer_echeancier(montant, aleatoire.randint(*PARTIES_DIVISE), ajouter_mois(jour, 1),
+                                         feries=self.feries)
+            nombre_cheques = aleatoire.randint(*CHEQUES_DIVISE)
+        else:
+            credit.type_credit = 'unique'
+            credit.description = 'Crédit unique (généré)'
+            credit.duree_mois = aleatoire.choice((1, 3, 6, 12))
+            credit.date_echeance = ajouter_mois(jour, credit.duree_mois)
+            lignes = [ligne_unique(montant, credit.date_echeance)]
+            nombre_cheques = 1 if aleatoire.random() < PART_UNIQUES_GARANTIS else 0
+        lot['credits'].append(credit)
+        lot['actions'].append(ActionLog(
+            type_action='credit_creation',
+            description=f'Création du crédit {credit.numero_police} de {montant} DH pour {client.nom_complet}',
+            agent=agent,
+            client=client,
+            credit=credit,
+            donnees_apres={'numero_police': credit.numero_police, 'type_credit': credit.type_credit,
+                           'montant_total': str(montant)},
+            date_action=credit.date_creation,
+        ))
+
+        echeances = [
+            Echeance(
+                credit=credit,
+                numero_partie=ligne.numero_partie,
+                montant=ligne.montant,
+                date_echeance=ligne.date_echeance,
+                date_rappel=ligne.date_rappel,
+                est_especes=True,
+                commentaire=f'Échéance {ligne.numero_partie}/{len(lignes)}',
+            )
+            for ligne in lignes
+        ]
+        lot['echeances'].extend(echeances)
+
+        cheques = []
+        if nombre_cheques:
+            numero = aleatoire.randrange(1000000, 9000000)
+            banque = aleatoire.choice(BANQUES)
+            cheques = [
+                ChequeGarantie(
+                    credit=credit,
+                    numero=str(numero + rang_cheque),
+                    montant=part,
+                    banque=banque,
+                    date_emission=jour,
+                    date_echeance=ajouter_mois(jour, rang_cheque + 1),
+                    date_creation=credit.date_creation,
+                )
+                for rang_cheque, part in enumerate(repartir(montant, nombre_cheques))
+            ]
+            lot['cheques_garantie'].extend(cheques)
+
+        self.generer_reglements(credit, client, agent, jour, echeances, cheques, lot)
+        self.generer_alertes(client, agent, echeances, lot)
+
+    def generer_reglements(self, credit, client, agent, jour, echeances, cheques, lot):
+        """Règlements étalés de la création du crédit à aujourd'hui ; soldes du crédit et échéances traitées"""
+        aleatoire = self.aleatoire
+        montant = credit.montant_total
+        nombre = aleatoire.randint(0, 2 * self.reglements_par_credit)
+        paye = Decimal('0')
+        if nombre:
+            fraction = 1 if aleatoire.random() < PART_SOLDES else aleatoire.uniform(0.1, 0.95)
+            paye = (montant * Decimal(fraction)).quantize(Decimal('0.01'))
+            nombre = max(1, min(nombre, int(paye // REGLEMENT_MIN)))
+        duree = (self.today - jour).days
+        dates = sorted(jour + timedelta(days=aleatoire.randint(0, duree)) for _ in range(nombre))
+
+        verse = non_verse = cumul = Decimal('0')
+        cheques_libres = iter(cheques)
+        a_traiter = iter(echeances)
+        echeance = next(a_traiter, None)
+        seuil = echeance.montant if echeance else None
+        for date_reglement, part in zip(dates, repartir(paye, nombre) if nombre else ()):
+            reglement = Reglement(
+                credit=credit,
+                montant=part,
+                date_reglement=date_reglement,
+                agent=agent,
+                date_creation=self.moment(date_reglement),
+            )
+            if aleatoire.random() < PART_CHEQUES:
+                reglement.mode_paiement = 'cheque'
+                reglement.statut = 'verse' if aleatoire.random() < PART_CHEQUES_VERSES else 'non_verse'
+                reglement.cheque_garantie = next(cheques_libres, None)
+                reglement.commentaire = 'Paiement par chèque'
+            else:
+                reglement.mode_paiement = 'especes'
+                reglement.commentaire = 'Paiement en espèces'
+            if reglement.statut == 'non_verse':
+                non_verse += part
+            else:
+                verse += part
+            lot['reglements'].append(reglement)
+            lot['actions'].append(ActionLog(
+                type_action='echeance_paiement',
+                description=f'Paiement de {part} DH ({reglement.mode_paiement}) pour le crédit {credit.numero_police}',
+                agent=agent,
+                client=client,
+                credit=credit,
+                donnees_apres={'montant': str(part), 'mode_paiement': reglement.mode_paiement,
+                               'date_paiement': str(date_reglement)},
+                date_action=reglement.date_creation,
+            ))
+
+            # Les échéances sont traitées dans l'ordre, dès que le cumul des règlements les couvre
+            cumul += part
+            while echeance is not None and cumul >= seuil:
+                echeance.est_traitee = True
+                echeance.date_traitement = reglement.date_creation
+                echeance.est_especes = reglement.mode_paiement == 'especes'
+                echeance = next(a_traiter, None)
+                if echeance is not None:
+                    seuil += echeance.montant
+
+        # Soldes matérialisés, comme les calcule soldes.recalculer_soldes()
+        credit.total_verse = verse
+        credit.total_cheques_non_verses = non_verse
+        credit.reste_a_payer = max(Decimal('0'), montant - paye)
+        credit.statut_reglement = 'regle' if montant <= verse else 'non_regle'
+
+    def generer_alertes(self, client, agent, echeances, lot):
+        """Alertes en attente des échéances proches ou en retard, rappels traités d'une partie des autres"""
+        limite = self.today + timedelta(days=JOURS_ALERTE)
+        for echeance in echeances:
+            if not echeance.est_traitee and echeance.date_echeance <= limite:
+                en_retard = echeance.date_echeance < self.today
+                lot['alertes'].append(Alerte(
+                    echeance=echeance,
+                    type_alerte='retard' if en_retard else 'echeance',
+                    message=f'Échéance {echeance.numero_partie} pour {client.nom_complet} - {echeance.montant} DH',
+                    date_alerte=echeance.date_rappel,
+                    date_rappel=echeance.date_rappel,
+                    agent=agent,
+                ))
+            elif echeance.est_traitee and self.aleatoire.random() < PART_RAPPELS_TRAITES:
+                lot['alertes'].append(Alerte(
+                    echeance=echeance,
+                    type_alerte='rappel',
+                    message=f'Rappel échéance {echeance.numero_partie} pour {client.nom_complet}',
+                    date_alerte=echeance.date_rappel,
+                    date_rappel=echeance.date_rappel,
+                    statut='traitee',
+                    agent=agent,
+                    date_traitement=echeance.date_traitement,
+                    commentaire_traitement='Échéance réglée',
+                ))
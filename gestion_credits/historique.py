@@ -0,0 +1,156 @@
+"""
+Statistiques et listes de filtres de la page historique des actions.
+
+statistiques_historique() construit les compteurs (total, aujourd'hui, 7
+derniers jours) et les répartitions par type et par statut des actions
+filtrées en une seule requête groupée sur ActionLog, avec des agrégats
+conditionnels :
+
+- si les filtres s'appliquent aux cumuls journaliers (cumuls.py), la requête ne
+  porte que sur les actions des 7 derniers jours (index de date_action) et les
+  répartitions des jours passés sont lues dans les cumuls ;
+- sinon (filtre client ou recherche), elle parcourt une seule fois les actions
+  filtrées, au lieu d'un COUNT par compteur et d'un GROUP BY par répartition.
+
+filtres_disponibles() met en cache les agents ayant un historique (liste
+déroulante du filtre ; les clients sont proposés par l'autocomplétion), dans le
+cache partagé entre les processus du tableau de bord (alias TABLEAU_CACHE) et
+sous une clé qui contient une version. Les signaux (modification d'un
+utilisateur, suppression d'une action), l'archivage et l'écriture d'une action
+qui fait apparaître un agent absent de la liste changent cette version : la
+liste n'est plus lue par aucun processus, même si l'un d'eux la remet en cache
+après l'invalidation.
+"""
+
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .archives import debut_journee, repartitions_archivees
+from .cache_tableau import ALIAS_DEFAUT
+from .cumuls import repartitions_actions
+
+
+# Nombre de jours du compteur « cette semaine »
+JOURS_SEMAINE = 7
+
+CLE_FILTRES = 'historique:filtres'
+CLE_VERSION_FILTRES = 'historique:filtres:version'
+
+# Filet de sécurité pour les écritures hors signaux (update(), SQL brut)
+DUREE_FILTRES = 3600
+
+
+# === STATISTIQUES ===
+
+def _compter(actions, today):
+    """Lignes (statut, type_action, total, aujourd'hui, semaine) des actions, en une requête groupée"""
+    # Groupement par statut d'abord : sinon SQLite parcourt toute la table par l'index de type_action
+    # (pour éviter le tri du GROUP BY) au lieu de l'index de date_action
+    return actions.order_by().values_list('statut', 'type_action').annotate(
+        total=Count('id'),
+        aujourd_hui=Count('id', filter=Q(date_action__gte=debut_journee(today))),
+        semaine=Count('id', filter=Q(date_action__gte=debut_journee(today - timedelta(days=JOURS_SEMAINE)))),
+    )
+
+
+def statistiques_historique(actions, today, filtre_cumuls=None, debut=None, fin=None, depuis=None,
+                            archivees=None, filtres_resume=None):
+    """Compteurs et répartitions des actions filtrées (et des actions archivées si `archivees`)
+
+    `filtre_cumuls` est le filtre équivalent sur les cumuls journaliers
+    (filtres.filtre_resume_actions(..., champ_type='mode')), None s'il n'existe pas.
+    """
+    types, statuts = Counter(), Counter()
+    total = aujourd_hui = semaine = 0
+
+    if filtre_cumuls is not None:
+        # Jours passés dans les cumuls ; seules les actions récentes sont lues
+        types, statuts = repartitions_actions(filtre_cumuls, today, debut, fin, depuis)
+        total = sum(statuts.values())
+        recentes = actions.filter(date_action__gte=debut_journee(today - timedelta(days=JOURS_SEMAINE)))
+        for statut, type_action, _, nombre_jour, nombre_semaine in _compter(recentes, today):
+            types[type_action] += nombre_jour
+            statuts[statut] += nombre_jour
+            total += nombre_jour
+            aujourd_hui += nombre_jour
+            semaine += nombre_semaine
+    else:
+        for statut, type_action, nombre, nombre_jour, nombre_semaine in _compter(actions, today):
+            types[type_action] += nombre
+            statuts[statut] += nombre
+            total += nombre
+            aujourd_hui += nombre_jour
+            semaine += nombre_semaine
+
+    if archivees is not None:
+        types_archives, statuts_archives = repartitions_archivees(archivees, debut, fin, filtres_resume)
+        types.update(types_archives)
+        statuts.update(statuts_archives)
+        total += sum(statuts_archives.values())
+
+    # Les cumuls d'un groupe entièrement retiré restent à zéro
+    types, statuts = +types, +statuts
+    return {
+        'total_actions': total,
+        'actions_aujourd_hui': aujourd_hui,
+        'actions_cette_semaine': semaine,
+        'repartition_types': [{'type_action': cle, 'count': nombre} for cle, nombre in types.most_common(10)],
+        'repartition_statuts': [{'statut': cle, 'count': nombre} for cle, nombre in statuts.most_common()],
+    }
+
+
+# === LISTE DES AGENTS ===
+
+def _calculer_filtres():
+    agents = list(User.objects.filter(actions_effectuees__isnull=False).distinct().order_by('username'))
+    return {'agents': agents, 'agent_ids': {agent.pk for agent in agents}}
+
+
+def _cache():
+    return caches[getattr(settings, 'TABLEAU_CACHE', ALIAS_DEFAUT)]
+
+
+def _cle_filtres(cache):
+    version = cache.get(CLE_VERSION_FILTRES)
+    if version is None:
+        cache.add(CLE_VERSION_FILTRES, time.time_ns(), None)
+        version = cache.get(CLE_VERSION_FILTRES)
+    return f'{CLE_FILTRES}:{version}'
+
+
+def filtres_disponibles():
+    """Agents ayant un historique, pour la liste déroulante du filtre"""
+    cache = _cache()
+    cle = _cle_filtres(cache)
+    listes = cache.get(cle)
+    if listes is None:
+        listes = _calculer_filtres()
+        cache.set(cle, listes, DUREE_FILTRES)
+    return {'agents_disponibles': listes['agents']}
+
+
+def _nouvelle_version():
+    _cache().set(CLE_VERSION_FILTRES, time.time_ns(), None)
+
+
+def invalider_filtres():
+    """Changer la version de la liste, tout de suite puis au commit (comme cache_tableau.invalider)"""
+    _nouvelle_version()
+    transaction.on_commit(_nouvelle_version)
+
+
+def actions_ajoutees(actions):
+    """Invalider la liste des agents si les nouvelles actions y ajoutent un agent"""
+    cache = _cache()
+    listes = cache.get(_cle_filtres(cache))
+    if listes is not None and any(
+        action.agent_id is not None and action.agent_id not in listes['agent_ids'] for action in actions
+    ):
+        invalider_filtres()
@@ -0,0 +1,358 @@
+"""
+Import en masse de règlements depuis un relevé (CSV ou XLSX).
+
+Le fichier est lu ligne par ligne : seuls l'index des crédits (numéro de police
+-> identifiants et reste à payer) et le lot en cours sont gardés en mémoire, ce
+qui permet d'importer des fichiers de plusieurs centaines de milliers de lignes.
+Chaque ligne est validée avec les règles d'AjoutPaiementForm ; les lignes
+valides sont écrites par lots par PaiementService.enregistrer_paiements()
+(bulk_create), une transaction par lot : l'import ne bloque pas les autres
+écritures pendant toute la durée du fichier.
+
+Pendant l'import, les soldes des crédits sont tenus par delta (une requête par
+lot) ; ils sont recalculés à partir des règlements une seule fois par crédit
+touché, à la fin. Si un agent enregistre un paiement sur un crédit du lot entre
+la lecture de l'index et l'écriture, le lot refusé est repris ligne par ligne :
+seules les lignes qui dépassent le nouveau reste à payer sont rejetées.
+"""
+
+import csv
+import io
+import itertools
+import time
+import unicodedata
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import cumuls, historique, recherche
+from .forms import AjoutPaiementForm
+from .journal import journaliser
+from .models import ActionLog, Credit
+from .paiements import ErreurPaiement, Paiement, PaiementService
+from .soldes import recalculer_soldes_credits
+
+
+# Nombre de lignes écrites par bulk_create
+TAILLE_LOT_DEFAUT = 1000
+
+# Nombre de rejets détaillés conservés dans le rapport (les suivants sont seulement comptés)
+MAX_REJETS_CONSERVES = 100
+
+# Colonnes reconnues (noms des champs d'AjoutPaiementForm + numéro de police)
+COLONNES = (
+    'numero_police', 'mode_paiement', 'montant', 'date_paiement',
+    'numero_effet', 'banque_emetteur', 'date_emission_effet', 'commentaire',
+)
+
+# Autres intitulés acceptés dans l'en-tête du fichier
+ALIAS_COLONNES = {
+    'police': 'numero_police',
+    'n_police': 'numero_police',
+    'mode': 'mode_paiement',
+    'date': 'date_paiement',
+    'date_reglement': 'date_paiement',
+    'banque': 'banque_emetteur',
+    'numero_cheque': 'numero_effet',
+    'n_cheque': 'numero_effet',
+    'reference': 'numero_effet',
+    'date_emission': 'date_emission_effet',
+}
+
+# Valeurs acceptées pour le mode de paiement
+ALIAS_MODES = {
+    'especes': 'especes',
+    'espece': 'especes',
+    'cash': 'especes',
+    'effets': 'effets',
+    'effet': 'effets',
+    'cheque': 'effets',
+    'cheques': 'effets',
+    'virement': 'effets',
+}
+
+
+class ErreurImport(Exception):
+    """Fichier illisible ou mal formé (l'import n'est pas lancé)"""
+
+
+def _normaliser(texte):
+    """Minuscules, sans accents ni espaces superflus"""
+    texte = unicodedata.normalize('NFKD', str(texte)).encode('ascii', 'ignore').decode('ascii')
+    return texte.strip().lower()
+
+
+def _nom_colonne(intitule):
+    nom = _normaliser(intitule or '').replace(' ', '_').replace('-', '_')
+    return ALIAS_COLONNES.get(nom, nom)
+
+
+def _lignes_csv(fichier):
+    texte = io.TextIOWrapper(fichier, encoding='utf-8-sig', newline='')
+    premiere_ligne = texte.readline()
+    try:
+        dialecte = csv.Sniffer().sniff(premiere_ligne, delimiters=',;\t')
+    except csv.Error:
+        dialecte = csv.excel
+    yield from csv.reader(itertools.chain([premiere_ligne], texte), dialecte)
+
+
+def _lignes_xlsx(fichier):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErreurImport("L'import de fichiers Excel nécessite le paquet openpyxl.")
+
+    classeur = load_workbook(fichier, read_only=True, data_only=True)
+    try:
+        yield from classeur.active.iter_rows(values_only=True)
+    finally:
+        classeur.close()
+
+
+def lire_lignes(fichier, nom_fichier):
+    """Itérer sur les lignes du fichier sous forme de dictionnaires (numéro de ligne, données)"""
+    if nom_fichier.lower().endswith('.xlsx'):
+        lignes = _lignes_xlsx(fichier)
+    elif nom_fichier.lower().endswith(('.csv', '.txt')):
+        lignes = _lignes_csv(fichier)
+    else:
+        raise ErreurImport("Format de fichier non supporté (CSV ou XLSX attendu).")
+
+    entete = next(lignes, None)
+    if not entete:
+        raise ErreurImport("Le fichier est vide.")
+    colonnes = [_nom_colonne(intitule) for intitule in entete]
+    manquantes = {'numero_police', 'mode_paiement', 'montant', 'date_paiement'} - set(colonnes)
+    if manquantes:
+        raise ErreurImport(f"Colonnes obligatoires manquantes : {', '.join(sorted(manquantes))}.")
+
+    for numero, valeurs in enumerate(lignes, start=2):
+        if not any(valeur not in (None, '') for valeur in valeurs):
+            continue
+        yield numero, {
+            colonne: valeur for colonne, valeur in zip(colonnes, valeurs)
+            if colonne in COLONNES and valeur is not None
+        }
+
+
+class ImportateurReglements:
+    """Importer un relevé de règlements pour le compte d'un agent"""
+
+    def __init__(self, agent, taille_lot=TAILLE_LOT_DEFAUT, on_rejet=None):
+        self.agent = agent
+        self.taille_lot = max(1, int(taille_lot))
+        self.on_rejet = on_rejet
+
+        self.nombre_lignes = 0
+        self.nombre_importes = 0
+        self.nombre_rejets = 0
+        self.montant_importe = Decimal('0')
+        self.rejets = []
+        self.credits_touches = set()
+        self.duree = 0
+
+        self.simulation = False
+        self._index = None
+        self._lot = []
+        # Pas de notification en direct pour chacune des lignes importées
+        self.service = PaiementService(agent, notifier=False)
+
+    def charger_index(self):
+        """Index en mémoire : numéro de police -> [id du crédit, id du client, reste à payer]"""
+        self._index = {
+            numero_police: [credit_id, client_id, reste]
+            for numero_police, credit_id, client_id, reste in Credit.objects.order_by().values_list(
+                'numero_police', 'id', 'client_id', 'reste_a_payer'
+            ).iterator(chunk_size=2000)
+        }
+
+    def _rejeter(self, numero_ligne, donnees, motif):
+        self.nombre_rejets += 1
+        if len(self.rejets) < MAX_REJETS_CONSERVES:
+            self.rejets.append({'ligne': numero_ligne, 'police': donnees.get('numero_police', ''), 'motif': motif})
+        if self.on_rejet:
+            self.on_rejet(numero_ligne, donnees, motif)
+
+    def traiter_ligne(self, numero_ligne, donnees):
+        """Valider une ligne et l'ajouter au lot en cours ; retourne True si elle est acceptée"""
+        self.nombre_lignes += 1
+
+        numero_police = str(donnees.get('numero_police', '')).strip()
+        entree = self._index.get(numero_police)
+        if entree is None:
+            self._rejeter(numero_ligne, donnees, f"Aucun crédit avec le numéro de police « {numero_police} ».")
+            return False
+
+        donnees = dict(donnees)
+        donnees['mode_paiement'] = ALIAS_MODES.get(
+            _normaliser(donnees.get('mode_paiement', '')), donnees.get('mode_paiement')
+        )
+        if isinstance(donnees.get('montant'), str):
+            donnees['montant'] = donnees['montant'].replace(' ', '').replace(',', '.')
+
+        form = AjoutPaiementForm(data=donnees)
+        if not form.is_valid():
+            motif = ' ; '.join(
+                f"{champ} : {' '.join(erreurs)}" if champ != '__all__' else ' '.join(erreurs)
+                for champ, erreurs in form.errors.items()
+            )
+            self._rejeter(numero_ligne, donnees, motif)
+            return False
+
+        credit_id, client_id, reste = entree
+        montant = form.cleaned_data['montant']
+        if montant <= 0:
+            self._rejeter(numero_ligne, donnees, "Le montant doit être supérieur à 0.")
+            return False
+        if montant > reste:
+            self._rejeter(
+                numero_ligne, donnees,
+                f"Le montant ({montant} DH) ne peut pas dépasser le reste à payer ({reste} DH).",
+            )
+            return False
+
+        entree[2] = reste - montant
+        self._lot.append((numero_ligne, donnees, numero_police, credit_id, client_id, reste, form.cleaned_data))
+        self.credits_touches.add(credit_id)
+        self.nombre_importes += 1
+        self.montant_importe += montant
+
+        if len(self._lot) >= self.taille_lot:
+            self.ecrire_lot()
+        return True
+
+    def ecrire_lot(self):
+        """Écrire le lot en cours dans sa propre transaction ; en cas de refus, le reprendre ligne par ligne"""
+        lot, self._lot = self._lot, []
+        if not lot or self.simulation:
+            return
+        try:
+            with transaction.atomic():
+                self._ecrire(lot)
+        except ErreurPaiement:
+            # Un paiement saisi pendant l'import a réduit le reste à payer d'un crédit du lot
+            for ligne in lot:
+                try:
+                    with transaction.atomic():
+                        self._ecrire([ligne])
+                except ErreurPaiement as e:
+                    self._annuler(ligne, str(e))
+            self._resynchroniser({ligne[3] for ligne in lot})
+
+    def _annuler(self, ligne, motif):
+        """Rejeter une ligne acceptée à la validation mais refusée à l'écriture"""
+        numero_ligne, donnees, _, _, _, _, valeurs = ligne
+        self.nombre_importes -= 1
+        self.montant_importe -= valeurs['montant']
+        self._rejeter(numero_ligne, donnees, motif)
+
+    def _resynchroniser(self, credit_ids):
+        """Relire le reste à payer des crédits dans l'index"""
+        restes = dict(Credit.objects.filter(pk__in=credit_ids).values_list('pk', 'reste_a_payer'))
+        for entree in self._index.values():
+            if entree[0] in restes:
+                entree[2] = restes[entree[0]]
+
+    def _ecrire(self, lot):
+        """Écrire des lignes (règlements, effets et historique) avec bulk_create"""
+        paiements = []
+        logs = []
+        for _, _, numero_police, credit_id, client_id, reste_avant, donnees in lot:
+            mode_paiement = donnees['mode_paiement']
+            montant = donnees['montant']
+            date_paiement = donnees['date_paiement']
+            commentaire = donnees.get('commentaire', '')
+
+            effet = None
+            if mode_paiement == 'effets':
+                effet = {
+                    'numero': donnees['numero_effet'],
+                    'montant': montant,
+                    'banque': donnees['banque_emetteur'],
+                    'date_emission': donnees['date_emission_effet'],
+                    'date_echeance': date_paiement,
+                    'commentaire': f"Effet pour paiement: {commentaire}",
+                }
+
+            paiements.append(Paiement(
+                credit_id=credit_id,
+                montant=montant,
+                date_reglement=date_paiement,
+                mode_paiement='especes' if mode_paiement == 'especes' else 'cheque',
+                commentaire=commentaire,
+                effet=effet,
+            ))
+
+            logs.append(ActionLog(
+                type_action='echeance_paiement',
+                description=f'Paiement importé de {montant} DH ({mode_paiement}) pour le crédit {numero_police}',
+                statut='succes',
+                agent=self.agent,
+                client_id=client_id,
+                credit_id=credit_id,
+                donnees_avant={'reste_a_payer': str(reste_avant)},
+                donnees_apres={
+                    'numero_police': numero_police,
+                    'mode_paiement': mode_paiement,
+                    'montant': str(montant),
+                    'date_paiement': str(date_paiement),
+                    'reste_a_payer': str(reste_avant - montant),
+                },
+            ))
+
+        # Effets et règlements par le chemin commun des paiements (soldes par delta jusqu'au recalcul final)
+        self.service.enregistrer_paiements(paiements)
+        ActionLog.objects.bulk_create(logs, batch_size=self.taille_lot)
+        # bulk_create ne déclenche pas les signaux qui tiennent les cumuls journaliers et les filtres de l'historique
+        cumuls.ajouter_objets(logs)
+        historique.actions_ajoutees(logs)
+
+    def importer(self, lignes, nom_fichier='', simulation=False):
+        """Importer toutes les lignes, une transaction par lot, et journaliser l'opération
+
+        En simulation, les lignes sont seulement validées : rien n'est écrit.
+        """
+        debut = time.monotonic()
+        date_debut = timezone.now()
+        self.simulation = simulation
+
+        self.charger_index()
+        for numero_ligne, donnees in lignes:
+            self.traiter_ligne(numero_ligne, donnees)
+        self.ecrire_lot()
+        self.duree = time.monotonic() - debut
+        if simulation:
+            return self.rapport(nom_fichier)
+
+        # Recalcul complet, une fois par crédit touché
+        recalculer_soldes_credits(self.credits_touches)
+        # Les actions journalisées par bulk_create sont indexées pour la recherche
+        recherche.indexer(actions=ActionLog.objects.filter(
+            agent=self.agent, type_action='echeance_paiement', date_action__gte=date_debut,
+        ))
+
+        self.duree = time.monotonic() - debut
+        journaliser(
+            type_action='import_donnees',
+            description=(
+                f'Import de règlements : {self.nombre_importes} ligne(s) importée(s), '
+                f'{self.nombre_rejets} rejet(s) - {self.montant_importe} DH'
+            ),
+            statut='echec' if self.nombre_rejets and not self.nombre_importes else 'succes',
+            agent=self.agent,
+            donnees_apres=self.rapport(nom_fichier),
+        )
+        return self.rapport(nom_fichier)
+
+    def rapport(self, nom_fichier=''):
+        return {
+            'fichier': nom_fichier,
+            'lignes': self.nombre_lignes,
+            'importes': self.nombre_importes,
+            'rejets': self.nombre_rejets,
+            'montant_importe': str(self.montant_importe),
+            'credits_touches': len(self.credits_touches),
+            'duree_secondes': round(self.duree, 3),
+        }
@@ -0,0 +1,246 @@
+"""
+Écriture de l'historique des actions (ActionLog) par lots, en arrière-plan.
+
+Les vues appellent journaliser(...) au lieu de ActionLog.objects.create(...) :
+l'action est mise en file au commit de la transaction en cours
+(transaction.on_commit), si bien qu'une opération annulée ne laisse aucune
+trace. Un fil d'écriture vide la file avec bulk_create tous les
+JOURNAL_TAILLE_LOT enregistrements ou toutes les JOURNAL_DELAI_MS
+millisecondes, puis met à jour les documents de la recherche plein texte, les
+cumuls journaliers et les listes des filtres de l'historique (bulk_create ne
+déclenche pas les signaux).
+
+L'écriture redevient synchrone quand la file est pleine, après l'arrêt du fil
+(fin du processus : la file restante est écrite par atexit) et quand
+JOURNAL_ASYNCHRONE vaut False ; dans ce dernier cas l'action est écrite
+directement dans la transaction en cours, comme auparavant.
+
+Une base momentanément indisponible (verrou, connexion perdue) ne fait pas
+perdre le lot : l'écriture est réessayée TENTATIVES fois avec une attente
+doublée à chaque essai, puis le fil d'écriture garde le lot et le réessaie
+jusqu'au retour de la base.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from . import audit, cumuls, historique, recherche
+from .models import ActionLog
+
+
+logger = logging.getLogger(__name__)
+
+# Valeurs par défaut des réglages JOURNAL_* (voir settings.py)
+TAILLE_LOT_DEFAUT = 100
+DELAI_MS_DEFAUT = 200
+TAILLE_MAX_FILE_DEFAUT = 10000
+
+# Essais d'écriture d'un lot quand la base est indisponible (OperationalError),
+# attente avant le deuxième essai puis doublée jusqu'à ATTENTE_MAX secondes
+TENTATIVES = 5
+ATTENTE_INITIALE = 0.1
+ATTENTE_MAX = 5
+
+# Marqueur de fin déposé dans la file par arreter()
+_ARRET = object()
+
+
+def _avec_reprises(fonction, *args):
+    """Appeler fonction(*args) en réessayant tant que la base est indisponible (TENTATIVES essais au plus)"""
+    attente = ATTENTE_INITIALE
+    for tentative in range(1, TENTATIVES + 1):
+        try:
+            return fonction(*args)
+        except OperationalError:
+            if tentative == TENTATIVES:
+                raise
+            logger.warning("Base indisponible pour le journal (essai %s/%s), nouvel essai dans %.2f s",
+                           tentative, TENTATIVES, attente)
+            time.sleep(attente)
+            attente = min(attente * 2, ATTENTE_MAX)
+            if not connection.in_atomic_block:
+                # Connexion éventuellement perdue : une nouvelle est ouverte à la requête suivante
+                connection.close()
+
+
+def _ecrire_lot(actions):
+    debut = timezone.now()
+    for action in actions:
+        # Un essai précédent annulé a pu laisser des identifiants attribués par bulk_create
+        action.pk = None
+    with transaction.atomic():
+        ActionLog.objects.bulk_create(actions)
+        if connection.features.can_return_rows_from_bulk_insert:
+            ecrites = ActionLog.objects.filter(pk__in=[action.pk for action in actions])
+        else:
+            # MySQL ne renvoie pas les identifiants insérés par bulk_create
+            ecrites = ActionLog.objects.filter(date_action__gte=debut)
+        recherche.indexer(actions=ecrites)
+        cumuls.ajouter_objets(actions)
+        historique.actions_ajoutees(actions)
+
+
+def _enregistrer(action):
+    action.pk = None
+    action.save()
+
+
+def ecrire(actions):
+    """Écrire un lot d'actions et indexer leurs documents de recherche
+
+    Lève OperationalError si la base reste indisponible après TENTATIVES essais.
+    """
+    if not actions:
+        return 0
+    try:
+        _avec_reprises(_ecrire_lot, actions)
+    except OperationalError:
+        raise
+    except Exception:
+        # Un enregistrement invalide (objet supprimé entre-temps...) ne doit pas faire perdre tout le lot
+        logger.exception("Échec de l'écriture d'un lot du journal, écriture une par une")
+        nombre = 0
+        for action in actions:
+            try:
+                _avec_reprises(_enregistrer, action)
+                nombre += 1
+            except Exception:
+                logger.exception("Action non journalisée : %s", action.description)
+        return nombre
+    return len(actions)
+
+
+class EcrivainJournal:
+    """File des actions à journaliser et fil qui l'écrit par lots"""
+
+    def __init__(self, taille_lot=TAILLE_LOT_DEFAUT, delai_ms=DELAI_MS_DEFAUT,
+                 taille_max_file=TAILLE_MAX_FILE_DEFAUT):
+        self.taille_lot = max(1, int(taille_lot))
+        self.delai = max(0, delai_ms) / 1000
+        self.taille_max_file = taille_max_file
+        self.arrete = False
+        self._verrou = threading.Lock()
+        self._file = None
+        self._fil = None
+        self._pid = None
+
+    def _demarrer(self):
+        """Démarrer le fil d'écriture (à nouveau après un fork : le fil n'y survit pas)"""
+        with self._verrou:
+            if self._fil is not None and self._fil.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._file = queue.Queue(maxsize=self.taille_max_file)
+            self._pid = os.getpid()
+            self._fil = threading.Thread(target=self._boucle, name='ecrivain-journal', daemon=True)
+            self._fil.start()
+
+    def ajouter(self, action):
+        """Mettre une action en file (écriture immédiate si la file est pleine ou le fil arrêté)"""
+        if self.arrete:
+            ecrire([action])
+            return
+        self._demarrer()
+        try:
+            self._file.put_nowait(action)
+        except queue.Full:
+            ecrire([action])
+
+    def _prochain_lot(self):
+        """Attendre une action puis compléter le lot jusqu'à la taille ou au délai maximal"""
+        premiere = self._file.get()
+        if premiere is _ARRET:
+            return None
+        lot = [premiere]
+        limite = time.monotonic() + self.delai
+        while len(lot) < self.taille_lot:
+            reste = limite - time.monotonic()
+            if reste <= 0:
+                break
+            try:
+                action = self._file.get(timeout=reste)
+            except queue.Empty:
+                break
+            if action is _ARRET:
+                self._file.put(_ARRET)
+                break
+            lot.append(action)
+        return lot
+
+    def _boucle(self):
+        try:
+            while True:
+                lot = self._prochain_lot()
+                if lot is None:
+                    return
+                self._ecrire_sans_perte(lot)
+        finally:
+            connection.close()
+
+    def _ecrire_sans_perte(self, lot):
+        """Écrire le lot, en le gardant tant que la base reste indisponible (sauf arrêt du processus)"""
+        while True:
+            close_old_connections()
+            try:
+                return ecrire(lot)
+            except OperationalError:
+                if self.arrete:
+                    raise
+                logger.exception("Base indisponible : lot de %s action(s) conservé, nouvel essai dans %s s",
+                                 len(lot), ATTENTE_MAX)
+                connection.close()
+                time.sleep(ATTENTE_MAX)
+
+    def vider(self):
+        """Écrire tout de suite, dans le fil appelant, les actions encore en file"""
+        if self._file is None:
+            return 0
+        lot = []
+        while True:
+            try:
+                action = self._file.get_nowait()
+            except queue.Empty:
+                break
+            if action is _ARRET:
+                self._file.put(_ARRET)
+                break
+            lot.append(action)
+        return sum(ecrire(lot[i:i + self.taille_lot]) for i in range(0, len(lot), self.taille_lot))
+
+    def arreter(self, delai=5):
+        """Arrêter le fil et écrire la file restante ; les actions suivantes sont écrites directement"""
+        self.arrete = True
+        if self._fil is not None and self._fil.is_alive() and self._pid == os.getpid():
+            self._file.put(_ARRET)
+            self._fil.join(delai)
+        self.vider()
+
+
+ecrivain = EcrivainJournal(
+    taille_lot=getattr(settings, 'JOURNAL_TAILLE_LOT', TAILLE_LOT_DEFAUT),
+    delai_ms=getattr(settings, 'JOURNAL_DELAI_MS', DELAI_MS_DEFAUT),
+    taille_max_file=getattr(settings, 'JOURNAL_TAILLE_MAX_FILE', TAILLE_MAX_FILE_DEFAUT),
+)
+atexit.register(ecrivain.arreter)
+
+
+def journaliser(**champs):
+    """Journaliser une action (mêmes champs que ActionLog) au commit de la transaction en cours
+
+    Pendant une requête, l'action est complétée par audit.completer() :
+    adresse IP, navigateur, session et modifications de l'objet concerné.
+    """
+    action = ActionLog(**audit.completer(champs))
+    if not getattr(settings, 'JOURNAL_ASYNCHRONE', True):
+        action.save()
+        return action
+    transaction.on_commit(lambda: ecrivain.ajouter(action))
+    return action
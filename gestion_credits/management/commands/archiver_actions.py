@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion_credits.archives import (
+    archiver_mois, limite_horizon, mois_a_archiver, mois_precedent, purger_archives
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Archiver l'historique des actions antérieur à l'horizon (mois complets) et purger "
+        "les archives au-delà de la durée de conservation (à planifier chaque mois)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizon', type=int, default=None,
+            help="Nombre de mois complets conservés dans l'historique courant (défaut : JOURNAL_HORIZON_MOIS)",
+        )
+        parser.add_argument(
+            '--fichiers', metavar='DOSSIER',
+            help="Écrire les actions archivées dans DOSSIER/actions-AAAA-MM.jsonl.gz au lieu de la table d'archive",
+        )
+        parser.add_argument(
+            '--conservation', type=int, default=None,
+            help="Durée (mois) de conservation des actions archivées (défaut : JOURNAL_CONSERVATION_ARCHIVES_MOIS)",
+        )
+
+    def handle(self, *args, **options):
+        horizon = options['horizon']
+        if horizon is not None and horizon < 0:
+            raise CommandError("L'horizon doit être positif.")
+
+        avant = limite_horizon(horizon)
+        total = 0
+        for mois in mois_a_archiver(avant):
+            nombre = archiver_mois(mois, options['fichiers'])
+            total += nombre
+            self.stdout.write(f'{mois:%m/%Y} : {nombre} action(s) archivée(s).')
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} action(s) antérieure(s) au {avant:%d/%m/%Y} archivée(s)."
+        ))
+
+        conservation = options['conservation']
+        if conservation is None:
+            conservation = getattr(settings, 'JOURNAL_CONSERVATION_ARCHIVES_MOIS', None)
+        if conservation is not None:
+            limite = mois_precedent(avant, conservation)
+            nombre = purger_archives(limite)
+            self.stdout.write(self.style.SUCCESS(
+                f"{nombre} action(s) archivée(s) antérieure(s) au {limite:%d/%m/%Y} supprimée(s)."
+            ))
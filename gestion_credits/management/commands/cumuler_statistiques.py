@@ -0,0 +1,46 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from gestion_credits.cumuls import reconstruire_cumuls
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculer les cumuls journaliers des statistiques (StatJournaliere) des derniers jours "
+        "depuis les règlements, crédits et actions (à planifier chaque nuit)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jours', type=int, default=2,
+            help="Nombre de jours recalculés, aujourd'hui compris (défaut : 2)",
+        )
+        parser.add_argument(
+            '--depuis', metavar='AAAA-MM-JJ',
+            help="Recalculer à partir de cette date (remplace --jours)",
+        )
+        parser.add_argument(
+            '--tout', action='store_true',
+            help="Recalculer les cumuls de tout l'historique",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['tout']:
+            debut = None
+        elif options['depuis']:
+            try:
+                debut = date.fromisoformat(options['depuis'])
+            except ValueError:
+                raise CommandError("Date invalide pour --depuis (format AAAA-MM-JJ).")
+        else:
+            if options['jours'] < 1:
+                raise CommandError("Le nombre de jours doit être positif.")
+            debut = today - timedelta(days=options['jours'] - 1)
+
+        # Sans borne de fin : les règlements datés dans le futur sont aussi recalculés
+        nombre = reconstruire_cumuls(debut)
+        periode = "de tout l'historique" if debut is None else f"depuis le {debut:%d/%m/%Y}"
+        self.stdout.write(self.style.SUCCESS(f"{nombre} cumul(s) journalier(s) recalculé(s) {periode}."))
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion_credits.generation import TAILLE_LOT_DEFAUT, GenerateurPortefeuille
+
+
+# CIN et téléphone (20 caractères au plus) sont « préfixe-rang »
+LONGUEUR_MAX_PREFIXE = 8
+
+
+class Command(BaseCommand):
+    help = (
+        "Générer un portefeuille synthétique (clients, crédits, échéances, chèques de garantie, règlements, "
+        "alertes, historique) pour les tests de charge ; les données ne dépendent que de la graine "
+        "(à lancer sur une base de test)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, required=True, help="Nombre de clients à générer")
+        parser.add_argument(
+            '--credits-per-client', type=int, default=2,
+            help="Nombre de crédits par client (défaut : 2)",
+        )
+        parser.add_argument(
+            '--reglements-per-credit', type=int, default=5,
+            help="Nombre moyen de règlements par crédit (défaut : 5)",
+        )
+        parser.add_argument('--seed', type=int, default=0, help="Graine du générateur aléatoire (défaut : 0)")
+        parser.add_argument(
+            '--jours', type=int, default=730,
+            help="Nombre de jours couverts par les crédits générés, jusqu'à aujourd'hui (défaut : 730)",
+        )
+        parser.add_argument('--agents', type=int, default=5, help="Nombre d'agents du portefeuille (défaut : 5)")
+        parser.add_argument(
+            '--taille-lot', type=int, default=TAILLE_LOT_DEFAUT,
+            help=f"Nombre de clients écrits par transaction (défaut : {TAILLE_LOT_DEFAUT})",
+        )
+        parser.add_argument(
+            '--prefixe', default=None,
+            help="Préfixe des CIN, téléphones et numéros de police (défaut : GEN<graine>)",
+        )
+
+    def handle(self, *args, **options):
+        if min(options['clients'], options['credits_per_client'], options['jours'], options['agents'],
+               options['taille_lot']) < 1 or options['reglements_per_credit'] < 0:
+            raise CommandError("Les nombres de clients, crédits, jours, agents et la taille de lot doivent être positifs.")
+
+        generateur = GenerateurPortefeuille(
+            options['clients'],
+            credits_par_client=options['credits_per_client'],
+            reglements_par_credit=options['reglements_per_credit'],
+            graine=options['seed'],
+            jours=options['jours'],
+            nombre_agents=options['agents'],
+            taille_lot=options['taille_lot'],
+            prefixe=options['prefixe'],
+            on_lot=self.afficher_avancement,
+        )
+        if len(generateur.prefixe) > LONGUEUR_MAX_PREFIXE:
+            raise CommandError(f"Le préfixe {generateur.prefixe} dépasse {LONGUEUR_MAX_PREFIXE} caractères.")
+        if generateur.deja_genere():
+            raise CommandError(
+                f"Un portefeuille de préfixe {generateur.prefixe} existe déjà : choisir une autre graine ou --prefixe."
+            )
+
+        rapport = generateur.generer()
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['clients']} client(s), {rapport['credits']} crédit(s), {rapport['echeances']} échéance(s), "
+            f"{rapport['cheques_garantie']} chèque(s) de garantie, {rapport['reglements']} règlement(s), "
+            f"{rapport['alertes']} alerte(s) et {rapport['actions']} action(s) générés "
+            f"en {rapport['duree_secondes']} s."
+        ))
+
+    def afficher_avancement(self, clients, compteurs):
+        self.stdout.write(f"{clients} client(s), {compteurs['reglements']} règlement(s) écrits.")
@@ -0,0 +1,72 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion_credits.imports import COLONNES, TAILLE_LOT_DEFAUT, ErreurImport, ImportateurReglements, lire_lignes
+
+
+class Command(BaseCommand):
+    help = "Importer un relevé de règlements (CSV ou XLSX) : une ligne par paiement, rattachée par numéro de police"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Chemin du fichier CSV ou XLSX à importer")
+        parser.add_argument(
+            '--agent', required=True,
+            help="Nom d'utilisateur de l'agent auquel les règlements sont attribués",
+        )
+        parser.add_argument(
+            '--taille-lot', type=int, default=TAILLE_LOT_DEFAUT,
+            help=f"Nombre de lignes écrites par requête (défaut : {TAILLE_LOT_DEFAUT})",
+        )
+        parser.add_argument(
+            '--rejets', default=None,
+            help="Fichier CSV où écrire toutes les lignes rejetées avec leur motif",
+        )
+        parser.add_argument(
+            '--simulation', action='store_true',
+            help="Valider le fichier sans rien enregistrer",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            agent = User.objects.get(username=options['agent'])
+        except User.DoesNotExist:
+            raise CommandError(f"Agent introuvable : {options['agent']}")
+
+        fichier_rejets = None
+        on_rejet = None
+        if options['rejets']:
+            fichier_rejets = open(options['rejets'], 'w', encoding='utf-8', newline='')
+            ecrivain = csv.writer(fichier_rejets, delimiter=';')
+            ecrivain.writerow(['ligne', *COLONNES, 'motif'])
+
+            def on_rejet(numero_ligne, donnees, motif):
+                ecrivain.writerow([numero_ligne, *(donnees.get(colonne, '') for colonne in COLONNES), motif])
+
+        importateur = ImportateurReglements(agent, taille_lot=options['taille_lot'], on_rejet=on_rejet)
+        try:
+            with open(options['fichier'], 'rb') as fichier:
+                rapport = importateur.importer(
+                    lire_lignes(fichier, options['fichier']),
+                    nom_fichier=options['fichier'],
+                    simulation=options['simulation'],
+                )
+        except (ErreurImport, OSError) as e:
+            raise CommandError(str(e))
+        finally:
+            if fichier_rejets:
+                fichier_rejets.close()
+
+        if not options['rejets']:
+            for rejet in importateur.rejets:
+                self.stdout.write(f"Ligne {rejet['ligne']} ({rejet['police']}) : {rejet['motif']}")
+
+        message = (
+            f"{rapport['importes']} règlement(s) importé(s) sur {rapport['lignes']} ligne(s), "
+            f"{rapport['rejets']} rejet(s), {rapport['montant_importe']} DH, "
+            f"{rapport['credits_touches']} crédit(s) mis à jour en {rapport['duree_secondes']} s."
+        )
+        if options['simulation']:
+            message = f"Simulation : {message} Aucune donnée enregistrée."
+        self.stdout.write(self.style.SUCCESS(message) if not rapport['rejets'] else self.style.WARNING(message))
@@ -0,0 +1,142 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from gestion_credits.cumuls import reconstruire_cumuls
+from gestion_credits.historique import invalider_filtres
+from gestion_credits.models import ActionLog, Client
+from gestion_credits.views import historique_actions
+
+
+TAILLE_LOT = 10000
+
+
+def scenarios(today):
+    """Filtres mesurés : sans filtre, filtres applicables aux cumuls, filtres lus sur les actions"""
+    return [
+        ('sans filtre', {}),
+        ('type et statut', {'type_action': 'client_contact', 'statut': 'succes'}),
+        ('agent', {'agent': 'a'}),
+        ('client', {'client': 'a'}),
+        ('30 jours', {'date_debut': (today - timedelta(days=30)).isoformat(), 'date_fin': today.isoformat()}),
+    ]
+
+
+def percentile(valeurs, rang):
+    """Percentile (0-100) d'une liste de mesures, au plus proche rang"""
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, max(0, round(rang / 100 * len(valeurs)) - 1))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesurer la page historique des actions : nombre de requêtes et latences (p50, p95) "
+        "par filtre, après avoir éventuellement généré un historique synthétique "
+        "(à lancer sur une copie de la base)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--generer', type=int, default=0, metavar='N',
+            help="Ajouter N actions synthétiques réparties sur --jours jours avant la mesure (ex. 1000000)",
+        )
+        parser.add_argument(
+            '--jours', type=int, default=365,
+            help="Nombre de jours couverts par les actions générées (défaut : 365)",
+        )
+        parser.add_argument(
+            '--repetitions', type=int, default=20,
+            help="Nombre de requêtes mesurées par filtre (défaut : 20)",
+        )
+        parser.add_argument(
+            '--graine', type=int, default=0,
+            help="Graine du générateur aléatoire (défaut : 0)",
+        )
+
+    def handle(self, *args, **options):
+        if options['generer'] < 0 or options['jours'] < 1 or options['repetitions'] < 1:
+            raise CommandError("Les nombres d'actions, de jours et de répétitions doivent être positifs.")
+
+        agent = User.objects.filter(is_active=True).order_by('pk').first()
+        if agent is None:
+            raise CommandError("Aucun utilisateur actif pour consulter l'historique.")
+
+        if options['generer']:
+            self.generer(options['generer'], options['jours'], random.Random(options['graine']))
+
+        total = ActionLog.objects.count()
+        self.stdout.write(f"{total} action(s) dans l'historique.")
+        today = timezone.localdate()
+        url = reverse('gestion_credits:historique_actions')
+        facteur = RequestFactory()
+
+        for nom, params in scenarios(today):
+            durees, requetes = [], 0
+            # Une requête de chauffe (caches des listes de filtres, de la limite d'archive...)
+            for repetition in range(options['repetitions'] + 1):
+                request = facteur.get(url, params)
+                request.user = agent
+                with CaptureQueriesContext(connection) as capture:
+                    debut = time.perf_counter()
+                    response = historique_actions(request)
+                    duree = time.perf_counter() - debut
+                if response.status_code != 200:
+                    raise CommandError(f"Réponse {response.status_code} pour le filtre « {nom} ».")
+                if repetition:
+                    durees.append(duree * 1000)
+                    requetes = len(capture)
+            self.stdout.write(
+                f"{nom:<16} {requetes:>3} requête(s)   "
+                f"p50 {percentile(durees, 50):8.1f} ms   p95 {percentile(durees, 95):8.1f} ms"
+            )
+
+    def generer(self, nombre, jours, aleatoire):
+        """Ajouter `nombre` actions réparties sur les `jours` derniers jours, par lots de bulk_create"""
+        types = [cle for cle, _ in ActionLog.TYPE_ACTION_CHOICES]
+        statuts = [cle for cle, _ in ActionLog.STATUT_CHOICES]
+        agent_ids = list(User.objects.values_list('pk', flat=True))
+        client_ids = list(Client.objects.values_list('pk', flat=True)[:1000]) or [None]
+        today = timezone.localdate()
+        debut = today - timedelta(days=jours - 1)
+
+        par_jour, reste = divmod(nombre, jours)
+        for i in range(jours):
+            jour = debut + timedelta(days=i)
+            restant = par_jour + (1 if i < reste else 0)
+            while restant:
+                taille = min(restant, TAILLE_LOT)
+                restant -= taille
+                with transaction.atomic():
+                    dernier = ActionLog.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+                    ActionLog.objects.bulk_create([
+                        ActionLog(
+                            type_action=aleatoire.choice(types),
+                            statut=aleatoire.choice(statuts),
+                            description='Action synthétique (mesure de performance)',
+                            agent_id=aleatoire.choice(agent_ids),
+                            client_id=aleatoire.choice(client_ids),
+                        )
+                        for _ in range(taille)
+                    ])
+                    # date_action est renseignée à l'insertion (auto_now_add) : datée ensuite
+                    ActionLog.objects.filter(pk__gt=dernier).update(
+                        date_action=timezone.make_aware(datetime.combine(jour, datetime.min.time()) + timedelta(
+                            seconds=aleatoire.randrange(86400)
+                        ))
+                    )
+            if (i + 1) % 30 == 0:
+                self.stdout.write(f"{jour:%d/%m/%Y} : actions générées.")
+
+        # bulk_create ne tient ni les cumuls journaliers (recalculés sur la période générée)
+        # ni les listes des filtres de l'historique
+        reconstruire_cumuls(debut)
+        invalider_filtres()
+        self.stdout.write(self.style.SUCCESS(f"{nombre} action(s) synthétique(s) générée(s)."))
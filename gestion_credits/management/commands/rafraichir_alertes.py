@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gestion_credits.alertes import CLE_CACHE_BASCULE, basculer_niveaux, reconstruire_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Bascule quotidienne de l'index des alertes : recalcule le niveau d'urgence des "
+        "éléments selon la date du jour (à planifier chaque nuit)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reconstruire', action='store_true',
+            help="Reconstruire entièrement l'index à partir des chèques, échéances et alertes",
+        )
+
+    def handle(self, *args, **options):
+        today = date.today()
+
+        with transaction.atomic():
+            if options['reconstruire']:
+                nombre = reconstruire_index(today)
+                self.stdout.write(self.style.SUCCESS(f'{nombre} élément(s) indexé(s).'))
+            else:
+                nombre = basculer_niveaux(today)
+                self.stdout.write(self.style.SUCCESS(f"{nombre} élément(s) ont changé de niveau d'urgence."))
+
+        cache.set(CLE_CACHE_BASCULE, today.isoformat(), 24 * 3600)
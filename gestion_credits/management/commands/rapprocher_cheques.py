@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gestion_credits.models import ChequeGarantie, Reglement
+from gestion_credits.rapprochement import rapprocher_cheques
+
+
+class Command(BaseCommand):
+    help = (
+        "Rattacher les règlements par chèque à leur chèque de garantie d'après leur "
+        "commentaire (« Effet {numero} - ... ») ou, à défaut, leur montant et leur date, "
+        "et lister les cas ambigus et les règlements sans chèque"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--simulation', action='store_true',
+            help="Afficher le rapport sans enregistrer les rattachements",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rapport = rapprocher_cheques(
+                Reglement.objects.all(), ChequeGarantie.objects.all(), appliquer=not options['simulation']
+            )
+
+        for reglement_id, numero, motif in rapport['ambigus'] + rapport['sans_cheque']:
+            effet = f' (effet {numero})' if numero else ''
+            self.stdout.write(self.style.WARNING(f'Règlement {reglement_id}{effet} : {motif}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['lies']} règlement(s) rattaché(s), {len(rapport['ambigus'])} ambigu(s), "
+            f"{len(rapport['sans_cheque'])} sans chèque correspondant."
+        ))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gestion_credits.models import Credit
+from gestion_credits.soldes import credits_incoherents, recalculer_soldes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculer entièrement les soldes matérialisés des crédits "
+        "(reste à payer, total versé, chèques non versés, statut)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--police', nargs='+', default=None,
+            help="Limiter le recalcul aux numéros de police indiqués",
+        )
+        parser.add_argument(
+            '--verifier', action='store_true',
+            help="Lister les crédits dont les soldes enregistrés sont faux, sans rien modifier",
+        )
+
+    def handle(self, *args, **options):
+        credits = Credit.objects.all()
+        if options['police']:
+            credits = credits.filter(numero_police__in=options['police'])
+
+        if options['verifier']:
+            self.verifier(credits)
+            return
+
+        with transaction.atomic():
+            nombre = recalculer_soldes(credits)
+
+        self.stdout.write(self.style.SUCCESS(f'{nombre} crédit(s) recalculé(s).'))
+
+    def verifier(self, credits):
+        incoherents = credits_incoherents(credits).values_list(
+            'numero_police', 'reste_a_payer', 'reste_reel', 'total_verse', 'verse_reel'
+        )
+
+        nombre = 0
+        for numero_police, reste, reste_reel, total_verse, verse_reel in incoherents.iterator():
+            nombre += 1
+            self.stdout.write(
+                f'Police {numero_police} : reste à payer {reste} DH (attendu {reste_reel} DH), '
+                f'total versé {total_verse} DH (attendu {verse_reel} DH)'
+            )
+
+        if nombre:
+            self.stdout.write(self.style.WARNING(f'{nombre} crédit(s) incohérent(s).'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Tous les soldes sont cohérents.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gestion_credits.recherche import moteur_recherche, reconstruire_index_recherche
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruire les documents de la recherche plein texte (clients, crédits, historique), "
+        "par exemple après un chargement de données sans signaux"
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            nombre = reconstruire_index_recherche()
+        moteur = moteur_recherche() or 'LIKE (aucun index plein texte)'
+        self.stdout.write(self.style.SUCCESS(f'{nombre} document(s) indexé(s) - moteur : {moteur}.'))
@@ -0,0 +1,50 @@
+"""
+Middleware de l'application.
+"""
+
+from django.db import transaction
+
+from . import audit
+from .journal import journaliser
+
+
+class MiddlewareAudit:
+    """Activer l'audit des modifications (audit.py) pendant chaque requête.
+
+    Les modifications validées qu'aucune action n'a reprises sont journalisées
+    en fin de requête dans une seule action « modification_donnees ».
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        contexte = audit.contexte_requete(request)
+        jeton = audit.ouvrir(contexte)
+        try:
+            response = self.get_response(request)
+        finally:
+            audit.fermer(jeton)
+
+        user = getattr(request, 'user', None)
+        agent = user if user is not None and user.is_authenticated else None
+        # Après les ajouts au contexte, eux-mêmes faits au commit des transactions de la vue
+        transaction.on_commit(lambda: journaliser_modifications(contexte, agent))
+        return response
+
+
+def journaliser_modifications(contexte, agent=None):
+    """Journaliser les modifications de la requête qu'aucune action n'a reprises"""
+    avant, apres, objets = contexte.resume()
+    if not objets:
+        return None
+    libelles = ', '.join(f'{modele} #{pk}' for modele, pk in objets)
+    return journaliser(
+        type_action='modification_donnees',
+        description=f'Modification de données : {libelles} ({len(apres)} champ(s))',
+        statut='succes',
+        agent=agent,
+        donnees_avant=avant or None,
+        donnees_apres=apres,
+        **contexte.tracabilite(),
+    )
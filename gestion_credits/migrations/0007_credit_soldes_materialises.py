@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:53
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def calculer_soldes(apps, schema_editor):
+    """Initialiser les soldes matérialisés à partir des règlements existants"""
+    Credit = apps.get_model('gestion_credits', 'Credit')
+    Reglement = apps.get_model('gestion_credits', 'Reglement')
+
+    def somme_reglements(filtre):
+        sous_requete = Reglement.objects.filter(filtre, credit=OuterRef('pk')).order_by().values(
+            'credit'
+        ).annotate(total=Sum('montant')).values('total')
+        return Coalesce(Subquery(sous_requete), Value(Decimal('0')), output_field=models.DecimalField())
+
+    Credit.objects.update(
+        total_verse=somme_reglements(Q(mode_paiement='especes') | Q(mode_paiement='cheque', statut='verse')),
+        total_cheques_non_verses=somme_reglements(Q(mode_paiement='cheque', statut='non_verse')),
+    )
+    Credit.objects.update(statut_reglement=Case(
+        When(montant_total__lte=F('total_verse'), then=Value('regle')),
+        default=Value('non_regle'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_credits', '0006_alter_alerte_echeance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='credit',
+            name='statut_reglement',
+            field=models.CharField(choices=[('non_regle', 'Non réglé'), ('regle', 'Réglé')], db_index=True, default='non_regle', editable=False, max_length=10, verbose_name='Statut de règlement'),
+        ),
+        migrations.AddField(
+            model_name='credit',
+            name='total_cheques_non_verses',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Total chèques non versés'),
+        ),
+        migrations.AddField(
+            model_name='credit',
+            name='total_verse',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Total versé'),
+        ),
+        migrations.RunPython(calculer_soldes, migrations.RunPython.noop),
+    ]
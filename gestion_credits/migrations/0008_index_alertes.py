@@ -0,0 +1,159 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:03
+
+import itertools
+from datetime import date, timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Copie figée de l'alimentation de l'index (gestion_credits.alertes) à la date de la
+# migration : une évolution de l'index passe par rafraichir_alertes --reconstruire
+TAILLE_LOT = 500
+JOURS_IMPORTANTE = 7
+JOURS_INFORMATIF = 30
+CRITIQUE, IMPORTANTE, INFORMATIF, A_VENIR = 0, 1, 2, 3
+
+
+def niveau_urgence(date_echeance, today):
+    if date_echeance <= today:
+        return CRITIQUE
+    if date_echeance <= today + timedelta(days=JOURS_IMPORTANTE):
+        return IMPORTANTE
+    if date_echeance <= today + timedelta(days=JOURS_INFORMATIF):
+        return INFORMATIF
+    return A_VENIR
+
+
+def cle_recherche(*morceaux):
+    return ' '.join(str(morceau) for morceau in morceaux if morceau).lower()[:255]
+
+
+def _entrees(apps, IndexAlerte, today):
+    ChequeGarantie = apps.get_model('gestion_credits', 'ChequeGarantie')
+    Echeance = apps.get_model('gestion_credits', 'Echeance')
+    Alerte = apps.get_model('gestion_credits', 'Alerte')
+
+    for cheque in ChequeGarantie.objects.values(
+        'id', 'numero', 'montant', 'banque', 'date_echeance', 'credit_id', 'credit__numero_police',
+        'credit__client_id', 'credit__client__nom', 'credit__client__prenom', 'credit__agent_id',
+    ).order_by().iterator(chunk_size=TAILLE_LOT):
+        yield IndexAlerte(
+            source='cheque_garantie',
+            objet_id=cheque['id'],
+            type_alerte='cheque_garantie',
+            statut='en_attente',
+            niveau=niveau_urgence(cheque['date_echeance'], today),
+            date_echeance=cheque['date_echeance'],
+            montant=cheque['montant'],
+            libelle=f"Chèque {cheque['numero']} de {cheque['montant']} DH",
+            reference=cheque['numero'],
+            banque=cheque['banque'],
+            cle_recherche=cle_recherche(
+                cheque['credit__client__nom'], cheque['credit__client__prenom'],
+                cheque['credit__numero_police'], cheque['numero'],
+            ),
+            credit_id=cheque['credit_id'],
+            client_id=cheque['credit__client_id'],
+            agent_id=cheque['credit__agent_id'],
+        )
+
+    for echeance in Echeance.objects.values(
+        'id', 'numero_partie', 'montant', 'date_echeance', 'est_especes', 'est_traitee', 'credit_id',
+        'credit__numero_police', 'credit__client_id', 'credit__client__nom', 'credit__client__prenom',
+        'credit__agent_id',
+    ).order_by().iterator(chunk_size=TAILLE_LOT):
+        mode = 'espèces' if echeance['est_especes'] else 'chèque'
+        yield IndexAlerte(
+            source='echeance',
+            objet_id=echeance['id'],
+            type_alerte='echeance',
+            statut='traitee' if echeance['est_traitee'] else 'en_attente',
+            niveau=niveau_urgence(echeance['date_echeance'], today),
+            date_echeance=echeance['date_echeance'],
+            montant=echeance['montant'],
+            libelle=f"Échéance {echeance['numero_partie']} de {echeance['montant']} DH ({mode})",
+            cle_recherche=cle_recherche(
+                echeance['credit__client__nom'], echeance['credit__client__prenom'],
+                echeance['credit__numero_police'],
+            ),
+            credit_id=echeance['credit_id'],
+            client_id=echeance['credit__client_id'],
+            agent_id=echeance['credit__agent_id'],
+        )
+
+    for alerte in Alerte.objects.values(
+        'id', 'type_alerte', 'message', 'date_rappel', 'date_report', 'statut', 'agent_id',
+        'echeance__montant', 'echeance__credit_id', 'echeance__credit__numero_police',
+        'echeance__credit__client_id', 'echeance__credit__client__nom', 'echeance__credit__client__prenom',
+    ).order_by().iterator(chunk_size=TAILLE_LOT):
+        date_suivi = alerte['date_report'] if alerte['statut'] == 'reporter' and alerte['date_report'] else alerte['date_rappel']
+        yield IndexAlerte(
+            source='alerte',
+            objet_id=alerte['id'],
+            type_alerte=alerte['type_alerte'],
+            statut=alerte['statut'],
+            niveau=niveau_urgence(date_suivi, today),
+            date_echeance=date_suivi,
+            montant=alerte['echeance__montant'],
+            libelle=alerte['message'],
+            cle_recherche=cle_recherche(
+                alerte['echeance__credit__client__nom'], alerte['echeance__credit__client__prenom'],
+                alerte['echeance__credit__numero_police'], alerte['message'],
+            ),
+            credit_id=alerte['echeance__credit_id'],
+            client_id=alerte['echeance__credit__client_id'],
+            agent_id=alerte['agent_id'],
+        )
+
+
+def construire_index(apps, schema_editor):
+    """Remplir l'index des alertes à partir des chèques, échéances et alertes existants"""
+    IndexAlerte = apps.get_model('gestion_credits', 'IndexAlerte')
+    entrees = _entrees(apps, IndexAlerte, date.today())
+    while True:
+        lot = list(itertools.islice(entrees, TAILLE_LOT))
+        if not lot:
+            return
+        IndexAlerte.objects.bulk_create(lot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_credits', '0007_credit_soldes_materialises'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexAlerte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('cheque_garantie', 'Chèque de garantie'), ('echeance', 'Échéance'), ('alerte', 'Alerte')], max_length=20)),
+                ('objet_id', models.PositiveIntegerField()),
+                ('type_alerte', models.CharField(choices=[('echeance', 'Échéance de paiement'), ('rappel', 'Rappel de paiement'), ('cheque_garantie', 'Chèque de garantie à échéance'), ('retard', 'Paiement en retard')], max_length=20)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('traitee', 'Traitée'), ('reporter', 'Reportée')], default='en_attente', max_length=15)),
+                ('niveau', models.PositiveSmallIntegerField(choices=[(0, 'Critique'), (1, 'Importante'), (2, 'Informatif'), (3, 'À venir')], verbose_name='Urgence')),
+                ('date_echeance', models.DateField()),
+                ('montant', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('libelle', models.TextField()),
+                ('reference', models.CharField(blank=True, max_length=50)),
+                ('banque', models.CharField(blank=True, max_length=100)),
+                ('cle_recherche', models.CharField(blank=True, max_length=255)),
+                ('date_maj', models.DateTimeField(auto_now=True)),
+                ('agent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion_credits.client')),
+                ('credit', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion_credits.credit')),
+            ],
+            options={
+                'verbose_name': "Index d'alerte",
+                'verbose_name_plural': 'Index des alertes',
+                'ordering': ['niveau', 'date_echeance', 'id'],
+                'indexes': [models.Index(fields=['statut', 'niveau', 'date_echeance'], name='index_alerte_liste'), models.Index(fields=['agent', 'statut', 'niveau'], name='index_alerte_agent'), models.Index(fields=['date_echeance'], name='index_alerte_echeance')],
+                'constraints': [models.UniqueConstraint(fields=('source', 'objet_id'), name='index_alerte_source_objet_unique')],
+            },
+        ),
+        migrations.RunPython(construire_index, migrations.RunPython.noop),
+    ]
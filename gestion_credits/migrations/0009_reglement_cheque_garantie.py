@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:06
+
+import logging
+import re
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+logger = logging.getLogger(__name__)
+
+# Copie figée de gestion_credits.rapprochement à la date de la migration : les
+# évolutions de la commande rapprocher_cheques ne changent pas ce rattachement
+MOTIF_EFFET = re.compile(r'^Effet (?P<numero>.+?) - ')
+
+
+def rattacher_cheques(apps, schema_editor):
+    """Rattacher les règlements existants à leur chèque d'après le commentaire « Effet {numero} - ... »
+    ou, à défaut, leur montant et leur date ; les cas restants sont listés par la commande
+    rapprocher_cheques --simulation"""
+    Reglement = apps.get_model('gestion_credits', 'Reglement')
+    ChequeGarantie = apps.get_model('gestion_credits', 'ChequeGarantie')
+
+    # (crédit, numéro) -> chèques ; (crédit, montant, échéance) -> chèques
+    par_numero = defaultdict(list)
+    par_montant = defaultdict(list)
+    for cheque_id, credit_id, numero, montant, date_echeance in ChequeGarantie.objects.order_by('id').values_list(
+        'id', 'credit_id', 'numero', 'montant', 'date_echeance'
+    ).iterator():
+        par_numero[(credit_id, numero.strip())].append((cheque_id, montant, date_echeance))
+        par_montant[(credit_id, montant, date_echeance)].append(cheque_id)
+
+    lies = set()
+    liens = []
+    sans_numero = []
+    non_rattaches = 0
+    for reglement_id, credit_id, montant, date_reglement, commentaire in Reglement.objects.filter(
+        mode_paiement='cheque'
+    ).order_by('id').values_list('id', 'credit_id', 'montant', 'date_reglement', 'commentaire').iterator():
+        correspondance = MOTIF_EFFET.match(commentaire or '')
+        tous = par_numero.get((credit_id, correspondance.group('numero').strip()), []) if correspondance else []
+        if not tous:
+            sans_numero.append((reglement_id, credit_id, montant, date_reglement))
+            continue
+        candidats = [cheque for cheque in tous if cheque[0] not in lies]
+        if len(candidats) > 1:
+            candidats = [cheque for cheque in candidats if cheque[1] == montant and cheque[2] == date_reglement]
+        if len(candidats) == 1:
+            lies.add(candidats[0][0])
+            liens.append((reglement_id, candidats[0][0]))
+        else:
+            non_rattaches += 1
+
+    for reglement_id, credit_id, montant, date_reglement in sans_numero:
+        candidats = [cheque_id for cheque_id in par_montant.get((credit_id, montant, date_reglement), [])
+                     if cheque_id not in lies]
+        if len(candidats) == 1:
+            lies.add(candidats[0])
+            liens.append((reglement_id, candidats[0]))
+        else:
+            non_rattaches += 1
+
+    for i in range(0, len(liens), 500):
+        Reglement.objects.bulk_update(
+            [Reglement(pk=reglement_id, cheque_garantie_id=cheque_id) for reglement_id, cheque_id in liens[i:i + 500]],
+            ['cheque_garantie'],
+        )
+    if non_rattaches:
+        logger.warning(
+            "%s règlement(s) rattaché(s) à leur chèque, %s non rattaché(s) : voir manage.py rapprocher_cheques "
+            "--simulation", len(liens), non_rattaches,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_credits', '0008_index_alertes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reglement',
+            name='cheque_garantie',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reglement', to='gestion_credits.chequegarantie', verbose_name='Chèque / effet réglé'),
+        ),
+        migrations.RunPython(rattacher_cheques, migrations.RunPython.noop),
+    ]
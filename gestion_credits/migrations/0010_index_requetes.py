@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_credits', '0009_reglement_cheque_garantie'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alerte',
+            index=models.Index(fields=['statut', 'date_rappel'], name='alerte_statut_rappel'),
+        ),
+        migrations.AddIndex(
+            model_name='chequegarantie',
+            index=models.Index(fields=['date_echeance'], name='cheque_garantie_echeance'),
+        ),
+        migrations.AddIndex(
+            model_name='chequegarantie',
+            index=models.Index(fields=['credit', 'date_echeance'], name='cheque_garantie_credit'),
+        ),
+        migrations.AddIndex(
+            model_name='echeance',
+            index=models.Index(fields=['est_traitee', 'date_echeance'], name='echeance_traitee_date'),
+        ),
+        migrations.AddIndex(
+            model_name='reglement',
+            index=models.Index(fields=['mode_paiement', 'statut', 'date_reglement', 'montant'], name='reglement_mode_statut'),
+        ),
+        migrations.AddIndex(
+            model_name='reglement',
+            index=models.Index(fields=['date_reglement', 'montant'], name='reglement_date'),
+        ),
+        migrations.AddIndex(
+            model_name='reglement',
+            index=models.Index(fields=['credit', 'date_reglement'], name='reglement_credit_date'),
+        ),
+        migrations.AddIndex(
+            model_name='reglement',
+            index=models.Index(fields=['agent', 'montant'], name='reglement_agent'),
+        ),
+        migrations.AddIndex(
+            model_name='reglement',
+            index=models.Index(condition=models.Q(('mode_paiement', 'cheque'), ('statut', 'non_verse')), fields=['credit', 'montant'], name='reglement_cheques_attente'),
+        ),
+    ]
@@ -0,0 +1,163 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:12
+
+import itertools
+import re
+import unicodedata
+
+from django.db import DatabaseError, migrations, models, transaction
+
+
+TABLE_DOCUMENTS = 'gestion_credits_documentrecherche'
+TABLE_FTS = 'gestion_credits_recherche_fts'
+
+# Table FTS5 à contenu externe : elle indexe les colonnes source et texte des
+# documents, tenue à jour par des triggers (y compris les upserts de bulk_create)
+SQL_FTS5 = [
+    f"""CREATE VIRTUAL TABLE {TABLE_FTS} USING fts5(
+        source, texte, content='{TABLE_DOCUMENTS}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER {TABLE_FTS}_ai AFTER INSERT ON {TABLE_DOCUMENTS} BEGIN
+        INSERT INTO {TABLE_FTS}(rowid, source, texte) VALUES (new.id, new.source, new.texte);
+    END""",
+    f"""CREATE TRIGGER {TABLE_FTS}_ad AFTER DELETE ON {TABLE_DOCUMENTS} BEGIN
+        INSERT INTO {TABLE_FTS}({TABLE_FTS}, rowid, source, texte) VALUES ('delete', old.id, old.source, old.texte);
+    END""",
+    f"""CREATE TRIGGER {TABLE_FTS}_au AFTER UPDATE OF texte ON {TABLE_DOCUMENTS} BEGIN
+        INSERT INTO {TABLE_FTS}({TABLE_FTS}, rowid, source, texte) VALUES ('delete', old.id, old.source, old.texte);
+        INSERT INTO {TABLE_FTS}(rowid, source, texte) VALUES (new.id, new.source, new.texte);
+    END""",
+]
+
+
+def creer_index_plein_texte(apps, schema_editor):
+    """FTS5 sous SQLite, FULLTEXT sous MySQL ; sans index, la recherche se fait par LIKE"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                for sql in SQL_FTS5:
+                    schema_editor.execute(sql)
+        except DatabaseError:
+            # SQLite compilé sans FTS5
+            pass
+    elif vendor == 'mysql':
+        schema_editor.execute(f'CREATE FULLTEXT INDEX document_recherche_texte ON {TABLE_DOCUMENTS} (texte)')
+
+
+def supprimer_index_plein_texte(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for trigger in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {TABLE_FTS}_{trigger}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE_FTS}')
+    elif vendor == 'mysql':
+        schema_editor.execute(f'DROP INDEX document_recherche_texte ON {TABLE_DOCUMENTS}')
+
+
+# Copie figée de l'alimentation des documents (gestion_credits.recherche) à la date de la
+# migration : une évolution du format des documents passe par reconstruire_recherche
+TAILLE_LOT = 500
+MAX_MOTS_FORME_ACCOLEE = 5
+
+
+def normaliser_texte(*champs):
+    mots = []
+    for champ in champs:
+        if not champ:
+            continue
+        texte = unicodedata.normalize('NFKD', str(champ)).encode('ascii', 'ignore').decode('ascii').lower()
+        parties = re.findall(r'[a-z0-9]+', texte)
+        mots.extend(parties)
+        if 1 < len(parties) <= MAX_MOTS_FORME_ACCOLEE:
+            mots.append(''.join(parties))
+    return ' '.join(mots)
+
+
+def _documents(apps, DocumentRecherche):
+    Client = apps.get_model('gestion_credits', 'Client')
+    Credit = apps.get_model('gestion_credits', 'Credit')
+    ActionLog = apps.get_model('gestion_credits', 'ActionLog')
+
+    for client in Client.objects.values('id', 'nom', 'prenom', 'cin', 'telephone', 'email').order_by().iterator(
+        chunk_size=TAILLE_LOT
+    ):
+        yield DocumentRecherche(
+            source='client',
+            objet_id=client['id'],
+            titre=f"{client['prenom']} {client['nom']}"[:255],
+            detail=f"CIN {client['cin']} - {client['telephone']}",
+            texte=normaliser_texte(
+                client['nom'], client['prenom'], client['cin'], client['telephone'], client['email'],
+            ),
+        )
+
+    for credit in Credit.objects.values(
+        'id', 'numero_police', 'description', 'montant_total', 'client__nom', 'client__prenom', 'client__cin',
+    ).order_by().iterator(chunk_size=TAILLE_LOT):
+        yield DocumentRecherche(
+            source='credit',
+            objet_id=credit['id'],
+            titre=f"Police {credit['numero_police']}"[:255],
+            detail=f"{credit['client__prenom']} {credit['client__nom']} - {credit['montant_total']} DH"[:255],
+            texte=normaliser_texte(
+                credit['numero_police'], credit['client__nom'], credit['client__prenom'],
+                credit['client__cin'], credit['description'],
+            ),
+        )
+
+    libelles = dict(ActionLog._meta.get_field('type_action').choices)
+    for action in ActionLog.objects.values(
+        'id', 'type_action', 'description', 'agent__username', 'client__nom', 'client__prenom',
+        'credit__numero_police',
+    ).order_by().iterator(chunk_size=TAILLE_LOT):
+        yield DocumentRecherche(
+            source='action',
+            objet_id=action['id'],
+            titre=libelles.get(action['type_action'], action['type_action']),
+            detail=action['description'][:255],
+            texte=normaliser_texte(
+                action['description'], action['agent__username'], action['client__nom'],
+                action['client__prenom'], action['credit__numero_police'],
+            ),
+        )
+
+
+def construire_documents(apps, schema_editor):
+    """Indexer les clients, crédits et actions existants"""
+    DocumentRecherche = apps.get_model('gestion_credits', 'DocumentRecherche')
+    documents = _documents(apps, DocumentRecherche)
+    while True:
+        lot = list(itertools.islice(documents, TAILLE_LOT))
+        if not lot:
+            return
+        DocumentRecherche.objects.bulk_create(lot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_credits', '0010_index_requetes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentRecherche',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('client', 'Client'), ('credit', 'Crédit'), ('action', 'Action')], max_length=10)),
+                ('objet_id', models.PositiveIntegerField()),
+                ('titre', models.CharField(max_length=255)),
+                ('detail', models.CharField(blank=True, max_length=255)),
+                ('texte', models.TextField()),
+                ('date_maj', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Document de recherche',
+                'verbose_name_plural': 'Documents de recherche',
+                'constraints': [models.UniqueConstraint(fields=('source', 'objet_id'), name='document_recherche_source_objet_unique')],
+            },
+        ),
+        migrations.RunPython(creer_index_plein_texte, supprimer_index_plein_texte),
+        migrations.RunPython(construire_documents, migrations.RunPython.noop),
+    ]
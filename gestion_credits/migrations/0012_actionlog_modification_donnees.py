@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_credits', '0011_recherche_plein_texte'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='actionlog',
+            name='type_action',
+            field=models.CharField(choices=[('credit_creation', 'Création de crédit'), ('credit_modification', 'Modification de crédit'), ('credit_suppression', 'Suppression de crédit'), ('credit_validation', 'Validation de crédit'), ('echeance_creation', "Création d'échéance"), ('echeance_paiement', "Paiement d'échéance"), ('echeance_report', "Report d'échéance"), ('echeance_annulation', "Annulation d'échéance"), ('cheque_encaissement', 'Encaissement de chèque'), ('cheque_report', 'Report de chèque'), ('cheque_annulation', 'Annulation de chèque'), ('alerte_creation', "Création d'alerte"), ('alerte_traitement', "Traitement d'alerte"), ('alerte_rappel', 'Envoi de rappel'), ('client_creation', 'Création de client'), ('client_modification', 'Modification de client'), ('client_contact', 'Contact client'), ('connexion', 'Connexion agent'), ('deconnexion', 'Déconnexion agent'), ('export_donnees', 'Export de données'), ('import_donnees', 'Import de données'), ('modification_donnees', 'Modification de données')], max_length=50, verbose_name="Type d'action"),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:29
+
+import django.db.models.deletion
+import gestion_credits.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_credits', '0012_actionlog_modification_donnees'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActionArchivee',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('type_action', models.CharField(choices=[('credit_creation', 'Création de crédit'), ('credit_modification', 'Modification de crédit'), ('credit_suppression', 'Suppression de crédit'), ('credit_validation', 'Validation de crédit'), ('echeance_creation', "Création d'échéance"), ('echeance_paiement', "Paiement d'échéance"), ('echeance_report', "Report d'échéance"), ('echeance_annulation', "Annulation d'échéance"), ('cheque_encaissement', 'Encaissement de chèque'), ('cheque_report', 'Report de chèque'), ('cheque_annulation', 'Annulation de chèque'), ('alerte_creation', "Création d'alerte"), ('alerte_traitement', "Traitement d'alerte"), ('alerte_rappel', 'Envoi de rappel'), ('client_creation', 'Création de client'), ('client_modification', 'Modification de client'), ('client_contact', 'Contact client'), ('connexion', 'Connexion agent'), ('deconnexion', 'Déconnexion agent'), ('export_donnees', 'Export de données'), ('import_donnees', 'Import de données'), ('modification_donnees', 'Modification de données')], max_length=50, verbose_name="Type d'action")),
+                ('description', models.TextField(verbose_name='Description détaillée')),
+                ('statut', models.CharField(choices=[('succes', 'Succès'), ('echec', 'Échec'), ('en_cours', 'En cours'), ('annule', 'Annulé'), ('en_attente', 'En attente')], default='succes', max_length=20, verbose_name='Statut')),
+                ('donnees_avant', models.JSONField(blank=True, null=True, verbose_name='Données avant modification')),
+                ('donnees_apres', models.JSONField(blank=True, null=True, verbose_name='Données après modification')),
+                ('date_action', models.DateTimeField(verbose_name="Date et heure de l'action")),
+                ('ip_adresse', models.GenericIPAddressField(blank=True, null=True, verbose_name='Adresse IP')),
+                ('user_agent', models.TextField(blank=True, null=True, verbose_name='Navigateur/Appareil')),
+                ('session_id', models.CharField(blank=True, max_length=100, null=True, verbose_name='ID de session')),
+                ('remarques', models.TextField(blank=True, null=True, verbose_name='Remarques additionnelles')),
+                ('agent', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Agent responsable')),
+                ('client', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='gestion_credits.client', verbose_name='Client concerné')),
+                ('credit', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='gestion_credits.credit', verbose_name='Crédit concerné')),
+                ('echeance', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='gestion_credits.echeance', verbose_name='Échéance concernée')),
+            ],
+            options={
+                'verbose_name': 'Action archivée',
+                'verbose_name_plural': 'Actions archivées',
+                'ordering': ['-date_action'],
+                'indexes': [models.Index(fields=['date_action'], name='action_archivee_date'), models.Index(fields=['type_action', 'date_action'], name='action_archivee_type'), models.Index(fields=['agent', 'date_action'], name='action_archivee_agent'), models.Index(fields=['client'], name='action_archivee_client')],
+            },
+            bases=(gestion_credits.models.AffichageAction, models.Model),
+        ),
+        migrations.CreateModel(
+            name='ResumeActionsMois',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mois', models.DateField(verbose_name='Mois (premier jour)')),
+                ('type_action', models.CharField(choices=[('credit_creation', 'Création de crédit'), ('credit_modification', 'Modification de crédit'), ('credit_suppression', 'Suppression de crédit'), ('credit_validation', 'Validation de crédit'), ('echeance_creation', "Création d'échéance"), ('echeance_paiement', "Paiement d'échéance"), ('echeance_report', "Report d'échéance"), ('echeance_annulation', "Annulation d'échéance"), ('cheque_encaissement', 'Encaissement de chèque'), ('cheque_report', 'Report de chèque'), ('cheque_annulation', 'Annulation de chèque'), ('alerte_creation', "Création d'alerte"), ('alerte_traitement', "Traitement d'alerte"), ('alerte_rappel', 'Envoi de rappel'), ('client_creation', 'Création de client'), ('client_modification', 'Modification de client'), ('client_contact', 'Contact client'), ('connexion', 'Connexion agent'), ('deconnexion', 'Déconnexion agent'), ('export_donnees', 'Export de données'), ('import_donnees', 'Import de données'), ('modification_donnees', 'Modification de données')], max_length=50)),
+                ('statut', models.CharField(choices=[('succes', 'Succès'), ('echec', 'Échec'), ('en_cours', 'En cours'), ('annule', 'Annulé'), ('en_attente', 'En attente')], max_length=20)),
+                ('nombre', models.PositiveIntegerField(default=0)),
+                ('agent', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Résumé mensuel des actions archivées',
+                'verbose_name_plural': 'Résumés mensuels des actions archivées',
+                'ordering': ['-mois'],
+                'constraints': [models.UniqueConstraint(fields=('mois', 'type_action', 'statut', 'agent'), name='resume_actions_mois_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def construire_cumuls(apps, schema_editor):
+    """Calculer les cumuls journaliers de tout l'historique existant
+
+    Copie figée de gestion_credits.cumuls.reconstruire_cumuls à la date de la
+    migration ; les recalculs suivants passent par cumuler_statistiques.
+    """
+    StatJournaliere = apps.get_model('gestion_credits', 'StatJournaliere')
+    Reglement = apps.get_model('gestion_credits', 'Reglement')
+    Credit = apps.get_model('gestion_credits', 'Credit')
+    ActionLog = apps.get_model('gestion_credits', 'ActionLog')
+
+    sources = [
+        ('reglement', Reglement.objects.order_by().values(
+            'agent_id', jour=F('date_reglement'), mode=F('mode_paiement'),
+            statut_cumul=Coalesce('statut', Value('')),
+        ).annotate(nombre=Count('id'), total=Sum('montant'))),
+        ('credit', Credit.objects.order_by().values(
+            'agent_id', jour=TruncDate('date_creation'), mode=F('type_credit'), statut_cumul=Value(''),
+        ).annotate(nombre=Count('id'), total=Sum('montant_total'))),
+        ('action', ActionLog.objects.order_by().values(
+            'agent_id', jour=TruncDate('date_action'), mode=F('type_action'), statut_cumul=F('statut'),
+        ).annotate(nombre=Count('id'))),
+    ]
+    StatJournaliere.objects.bulk_create([
+        StatJournaliere(
+            categorie=categorie, jour=groupe['jour'], agent_id=groupe['agent_id'], mode=groupe['mode'],
+            statut=groupe['statut_cumul'], nombre=groupe['nombre'], montant=groupe.get('total') or 0,
+        )
+        for categorie, groupes in sources
+        for groupe in groupes
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_credits', '0013_archives_actions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatJournaliere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('categorie', models.CharField(choices=[('reglement', 'Règlements'), ('credit', 'Crédits'), ('action', 'Actions')], max_length=10)),
+                ('mode', models.CharField(blank=True, help_text="Mode de paiement, type de crédit ou type d'action selon la catégorie", max_length=50)),
+                ('statut', models.CharField(blank=True, max_length=20)),
+                ('nombre', models.IntegerField(default=0)),
+                ('montant', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('agent', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Statistique journalière',
+                'verbose_name_plural': 'Statistiques journalières',
+                'ordering': ['-jour'],
+                'indexes': [models.Index(fields=['categorie', 'jour'], name='stat_journaliere_jour')],
+                'constraints': [models.UniqueConstraint(fields=('categorie', 'jour', 'agent', 'mode', 'statut'), name='stat_journaliere_unique')],
+            },
+        ),
+        migrations.RunPython(construire_cumuls, migrations.RunPython.noop),
+    ]
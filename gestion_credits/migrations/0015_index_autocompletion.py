@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_credits', '0014_stat_journaliere'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['nom', 'prenom', 'id'], name='client_nom'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['prenom'], name='client_prenom'),
+        ),
+    ]
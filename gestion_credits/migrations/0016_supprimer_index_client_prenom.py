@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_credits', '0015_index_autocompletion'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='client',
+            name='client_prenom',
+        ),
+    ]
@@ -1,11 +1,58 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import Greatest, Round
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
 
 
-class Client(models.Model):
+def au_centime(expression):
+    """Arrondir au centime une expression de montant calculée en SQL
+
+    Sous SQLite, les décimaux sont stockés et additionnés en virgule flottante :
+    2257.16 + 6 x 2257.14 n'y vaut pas exactement 15800.00. Tout solde est
+    arrondi avant d'être enregistré ou comparé.
+    """
+    return Round(expression, 2)
+
+
+class SuiviModifications:
+    """Mémoriser les valeurs chargées depuis la base (puis enregistrées), comparées au save()
+    par l'audit (audit.py) et les cumuls journaliers (cumuls.py)"""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._valeurs_chargees = dict(zip(field_names, values))
+        return instance
+
+    def _memoriser_valeurs(self, champs=None):
+        """Les valeurs des champs donnés (tous par défaut) deviennent la référence des comparaisons"""
+        if champs:
+            champs = [self._meta.get_field(nom) for nom in champs]
+        else:
+            champs = self._meta.concrete_fields
+        valeurs = getattr(self, '_valeurs_chargees', None)
+        if valeurs is None:
+            valeurs = self._valeurs_chargees = {}
+        for champ in champs:
+            if champ.concrete:
+                valeurs[champ.attname] = getattr(self, champ.attname)
+
+    def save(self, *args, **kwargs):
+        # Les signaux post_save voient encore les valeurs d'avant l'enregistrement
+        super().save(*args, **kwargs)
+        self._memoriser_valeurs(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if hasattr(self, '_valeurs_chargees'):
+            self._memoriser_valeurs(fields)
+
+
+class Client(SuiviModifications, models.Model):
     """Modèle pour gérer les clients"""
     nom = models.CharField(max_length=100)
     prenom = models.CharField(max_length=100)
@@ -20,6 +67,10 @@ class Client(models.Model):
         verbose_name = "Client"
         verbose_name_plural = "Clients"
         ordering = ['nom', 'prenom']
+        indexes = [
+            # Liste de l'autocomplétion (saisie vide) paginée par (nom, prénom, id)
+            models.Index(fields=['nom', 'prenom', 'id'], name='client_nom'),
+        ]
 
     def __str__(self):
         return f"{self.prenom} {self.nom} ({self.cin})"
@@ -29,13 +80,21 @@ class Client(models.Model):
         return f"{self.prenom} {self.nom}"
 
 
-class Credit(models.Model):
+class Credit(SuiviModifications, models.Model):
     """Modèle pour gérer les crédits"""
     TYPE_CHOICES = [
         ('divise', 'Crédit divisé en plusieurs parties'),
         ('unique', 'Crédit unique avec date ou durée'),
     ]
     
+    STATUT_REGLEMENT_CHOICES = [
+        ('non_regle', 'Non réglé'),
+        ('regle', 'Réglé'),
+    ]
+    
+    # Soldes matérialisés, tenus à jour par Reglement.save()/delete()
+    CHAMPS_SOLDES = ('reste_a_payer', 'total_verse', 'total_cheques_non_verses', 'statut_reglement')
+    
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='credits')
     numero_police = models.CharField(max_length=100, default='0000', unique=True, verbose_name="Numéro de police", help_text="Numéro de police unique attribué par l'agent Sanlam")
     type_credit = models.CharField(max_length=10, choices=TYPE_CHOICES)
@@ -46,6 +105,14 @@ class Credit(models.Model):
     date_modification = models.DateTimeField(auto_now=True)
     agent = models.ForeignKey(User, on_delete=models.CASCADE, related_name='credits_geres')
     
+    # Soldes matérialisés (espèces + chèques versés / chèques non versés)
+    total_verse = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False,
+                                      verbose_name="Total versé")
+    total_cheques_non_verses = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False,
+                                                   verbose_name="Total chèques non versés")
+    statut_reglement = models.CharField(max_length=10, choices=STATUT_REGLEMENT_CHOICES, default='non_regle',
+                                        editable=False, db_index=True, verbose_name="Statut de règlement")
+    
     # Pour le type unique
     duree_jours = models.PositiveIntegerField(blank=True, null=True, 
                                             validators=[MinValueValidator(1), MaxValueValidator(3650)])
@@ -63,6 +130,13 @@ class Credit(models.Model):
     def __str__(self):
         return f"Police {self.numero_police} - {self.client.nom_complet} ({self.montant_total} DH)"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mémoriser le montant chargé pour détecter un changement lors du save()
+        instance._montant_total_initial = instance.__dict__.get('montant_total')
+        return instance
+
     def save(self, *args, **kwargs):
         if self.type_credit == 'unique' and not self.date_echeance:
             # Calculer la date d'échéance basée sur la durée
@@ -71,14 +145,31 @@ class Credit(models.Model):
             elif self.duree_semaines:
                 self.date_echeance = timezone.now().date() + timedelta(weeks=self.duree_semaines)
             elif self.duree_mois:
-                # Approximation : 30 jours par mois
-                self.date_echeance = timezone.now().date() + timedelta(days=self.duree_mois * 30)
+                from .echeancier import ajouter_mois
+                self.date_echeance = ajouter_mois(timezone.now().date(), self.duree_mois)
         
-        # Calculer le reste à payer si c'est une nouvelle instance
+        # Calculer le reste à payer si c'est une nouvelle instance (versements déjà
+        # renseignés compris : voir creation_credits)
         if not self.pk:
-            self.reste_a_payer = self.montant_total
+            self.reste_a_payer = max(0, self.montant_total - self.total_verse - self.total_cheques_non_verses)
+            self.statut_reglement = 'regle' if self.montant_total <= self.total_verse else 'non_regle'
+        
+        montant_modifie = False
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # Les soldes sont mis à jour par F-expressions : ne jamais les écraser
+            # avec les valeurs (potentiellement périmées) de cette instance
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.CHAMPS_SOLDES
+            ]
+            montant_modifie = getattr(self, '_montant_total_initial', self.montant_total) != self.montant_total
         
         super().save(*args, **kwargs)
+        self._montant_total_initial = self.montant_total
+        
+        if montant_modifie:
+            Credit.objects.filter(pk=self.pk).update(statut_reglement=self._expression_statut_reglement())
+            self.recalculer_reste_a_payer()
     
     @property
     def nombre_parties(self):
@@ -105,14 +196,57 @@ class Credit(models.Model):
         """Calculer le total payé"""
         return self.montant_total - self.reste_a_payer
     
+    @staticmethod
+    def _expression_statut_reglement(delta_verse=0):
+        """Expression SQL du statut de règlement après ajout de `delta_verse` au total versé"""
+        return Case(
+            When(montant_total__lte=au_centime(F('total_verse') + delta_verse), then=Value('regle')),
+            default=Value('non_regle'),
+        )
+    
+    def verrouiller(self):
+        """Verrouiller la ligne du crédit jusqu'à la fin de la transaction et retourner son reste à payer"""
+        return Credit.objects.select_for_update().filter(pk=self.pk).values_list(
+            'reste_a_payer', flat=True
+        ).get()
+    
+    def appliquer_delta_soldes(self, delta_montant, delta_verse, delta_non_verses, reste_verrouille):
+        """
+        Mettre à jour les soldes par incrément (F-expressions), sans recompter les règlements.
+        
+        Doit être appelé dans la transaction qui a verrouillé le crédit avec verrouiller(),
+        `reste_verrouille` étant la valeur retournée par celui-ci.
+        """
+        mises_a_jour = {}
+        if delta_verse or delta_non_verses:
+            # Le statut est calculé en premier : sous MySQL, les affectations d'un
+            # UPDATE voient les colonnes déjà modifiées à leur gauche
+            mises_a_jour['statut_reglement'] = self._expression_statut_reglement(delta_verse)
+            mises_a_jour['total_verse'] = au_centime(F('total_verse') + delta_verse)
+            mises_a_jour['total_cheques_non_verses'] = au_centime(F('total_cheques_non_verses') + delta_non_verses)
+        
+        # Un reste à 0 peut masquer un trop-perçu : si des règlements sont retirés,
+        # seul un recalcul complet donne la bonne valeur
+        recalcul_complet = delta_montant < 0 and reste_verrouille <= 0
+        if delta_montant and not recalcul_complet:
+            mises_a_jour['reste_a_payer'] = Greatest(au_centime(F('reste_a_payer') - delta_montant), Value(Decimal('0')))
+        
+        if mises_a_jour:
+            Credit.objects.filter(pk=self.pk).update(**mises_a_jour)
+        if recalcul_complet:
+            self.recalculer_reste_a_payer()
+        self.refresh_from_db(fields=list(self.CHAMPS_SOLDES))
+    
     def recalculer_reste_a_payer(self):
-        """Recalculer le reste à payer basé sur les règlements"""
-        total_reglements = sum(reglement.montant for reglement in self.reglements.all())
-        self.reste_a_payer = max(0, self.montant_total - total_reglements)
-        self.save(update_fields=['reste_a_payer'])
+        """Recalcul complet du reste à payer à partir des règlements (vérification/réparation)"""
+        with transaction.atomic():
+            self.verrouiller()
+            total_reglements = self.reglements.aggregate(total=Sum('montant'))['total'] or 0
+            self.reste_a_payer = max(0, self.montant_total - total_reglements)
+            self.save(update_fields=['reste_a_payer'])
 
 
-class Reglement(models.Model):
+class Reglement(SuiviModifications, models.Model):
     """Modèle pour gérer les règlements de crédit"""
     MODE_PAIEMENT_CHOICES = [
         ('especes', 'Espèces'),
@@ -133,33 +267,106 @@ class Reglement(models.Model):
     commentaire = models.TextField(blank=True, null=True)
     date_creation = models.DateTimeField(auto_now_add=True)
     agent = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reglements_crees')
+    cheque_garantie = models.OneToOneField('ChequeGarantie', on_delete=models.SET_NULL, null=True, blank=True,
+                                           related_name='reglement', verbose_name="Chèque / effet réglé")
     
     class Meta:
         verbose_name = "Règlement"
         verbose_name_plural = "Règlements"
         ordering = ['-date_reglement']
+        indexes = [
+            # Totaux du tableau de bord par mode et statut (index couvrant : montant inclus)
+            models.Index(fields=['mode_paiement', 'statut', 'date_reglement', 'montant'],
+                         name='reglement_mode_statut'),
+            # Paiements du jour et série des 30 derniers jours
+            models.Index(fields=['date_reglement', 'montant'], name='reglement_date'),
+            # Règlements d'un crédit, du plus récent au plus ancien (détail du crédit)
+            models.Index(fields=['credit', 'date_reglement'], name='reglement_credit_date'),
+            # Performance des agents (index couvrant)
+            models.Index(fields=['agent', 'montant'], name='reglement_agent'),
+            # Chèques en attente de versement, par crédit (index partiel, ignoré sous MySQL)
+            models.Index(fields=['credit', 'montant'], name='reglement_cheques_attente',
+                         condition=Q(mode_paiement='cheque', statut='non_verse')),
+        ]
     
     def __str__(self):
         return f"Règlement {self.montant} DH - {self.credit} ({self.get_mode_paiement_display()})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mémoriser l'apport initial aux soldes du crédit pour calculer le delta au save()
+        if all(champ in field_names for champ in ('credit_id', 'montant', 'mode_paiement', 'statut')):
+            instance._soldes_initiaux = (instance.credit_id, *instance.contribution_soldes())
+        return instance
+    
+    def contribution_soldes(self):
+        """Retourner (montant, montant versé, montant en chèques non versés) apporté par ce règlement"""
+        if self.mode_paiement == 'especes':
+            # Les paiements en espèces comptent toujours
+            return self.montant, self.montant, 0
+        if self.mode_paiement == 'cheque' and self.statut == 'verse':
+            return self.montant, self.montant, 0
+        if self.mode_paiement == 'cheque' and self.statut == 'non_verse':
+            return self.montant, 0, self.montant
+        return self.montant, 0, 0
+    
+    def _charger_soldes_initiaux(self):
+        """Apport aux soldes de la version enregistrée en base (None pour un nouveau règlement)"""
+        if self._state.adding:
+            return None
+        if hasattr(self, '_soldes_initiaux'):
+            return self._soldes_initiaux
+        ancien = Reglement.objects.filter(pk=self.pk).only(
+            'credit_id', 'montant', 'mode_paiement', 'statut'
+        ).first()
+        return ancien._soldes_initiaux if ancien else None
+    
     def save(self, *args, **kwargs):
         # Le statut n'est applicable que pour les chèques
         if self.mode_paiement != 'cheque':
             self.statut = None
         
-        super().save(*args, **kwargs)
+        soldes_initiaux = self._charger_soldes_initiaux()
+        
+        with transaction.atomic():
+            # Verrouiller le crédit avant d'écrire le règlement : deux agents qui
+            # enregistrent un paiement sur le même crédit sont ainsi sérialisés
+            ancien_credit = None
+            if soldes_initiaux and soldes_initiaux[0] != self.credit_id:
+                ancien_credit = Credit.objects.get(pk=soldes_initiaux[0])
+                ancien_reste = ancien_credit.verrouiller()
+            reste_verrouille = self.credit.verrouiller()
+            
+            super().save(*args, **kwargs)
+            
+            # Mettre à jour les soldes du crédit par delta
+            montant, verse, non_verses = self.contribution_soldes()
+            if ancien_credit is not None:
+                _, ancien_montant, ancien_verse, ancien_non_verses = soldes_initiaux
+                ancien_credit.appliquer_delta_soldes(-ancien_montant, -ancien_verse, -ancien_non_verses, ancien_reste)
+            elif soldes_initiaux:
+                _, ancien_montant, ancien_verse, ancien_non_verses = soldes_initiaux
+                montant -= ancien_montant
+                verse -= ancien_verse
+                non_verses -= ancien_non_verses
+            self.credit.appliquer_delta_soldes(montant, verse, non_verses, reste_verrouille)
         
-        # Recalculer le reste à payer du crédit
-        self.credit.recalculer_reste_a_payer()
+        self._soldes_initiaux = (self.credit_id, *self.contribution_soldes())
     
     def delete(self, *args, **kwargs):
         credit = self.credit
-        super().delete(*args, **kwargs)
-        # Recalculer le reste à payer après suppression
-        credit.recalculer_reste_a_payer()
+        soldes_initiaux = self._charger_soldes_initiaux()
+        with transaction.atomic():
+            reste_verrouille = credit.verrouiller()
+            resultat = super().delete(*args, **kwargs)
+            if soldes_initiaux:
+                _, montant, verse, non_verses = soldes_initiaux
+                credit.appliquer_delta_soldes(-montant, -verse, -non_verses, reste_verrouille)
+        return resultat
 
 
-class ChequeGarantie(models.Model):
+class ChequeGarantie(SuiviModifications, models.Model):
     """Modèle pour gérer les chèques de garantie"""
     credit = models.ForeignKey(Credit, on_delete=models.CASCADE, related_name='cheques_garantie')
     numero = models.CharField(max_length=50, verbose_name="Numéro de chèque")
@@ -174,6 +381,12 @@ class ChequeGarantie(models.Model):
         verbose_name = "Chèque de garantie"
         verbose_name_plural = "Chèques de garantie"
         ordering = ['date_echeance']
+        indexes = [
+            # Chèques à échéance proche ou en retard (tableau de bord)
+            models.Index(fields=['date_echeance'], name='cheque_garantie_echeance'),
+            # Chèques d'un crédit par date d'échéance (détail du crédit)
+            models.Index(fields=['credit', 'date_echeance'], name='cheque_garantie_credit'),
+        ]
     
     def __str__(self):
         return f"Chèque {self.numero} - {self.montant} DH - {self.credit}"
@@ -182,9 +395,18 @@ class ChequeGarantie(models.Model):
     def est_en_retard(self):
         """Vérifier si le chèque est en retard"""
         return self.date_echeance < timezone.now().date()
+    
+    @staticmethod
+    def expression_statut_versement():
+        """Expression SQL du statut de versement : celui du règlement par chèque rattaché, « non_verse » sinon"""
+        return Case(
+            When(reglement__mode_paiement='cheque', reglement__statut='verse', then=Value('verse')),
+            default=Value('non_verse'),
+            output_field=models.CharField(),
+        )
 
 
-class Echeance(models.Model):
+class Echeance(SuiviModifications, models.Model):
     """Modèle pour gérer les échéances de paiement"""
     credit = models.ForeignKey(Credit, on_delete=models.CASCADE, related_name='echeances')
     numero_partie = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
@@ -201,6 +423,10 @@ class Echeance(models.Model):
         verbose_name_plural = "Échéances"
         ordering = ['date_echeance']
         unique_together = ['credit', 'numero_partie']
+        indexes = [
+            # Échéances du jour, de la semaine et en retard (dashboard_stats)
+            models.Index(fields=['est_traitee', 'date_echeance'], name='echeance_traitee_date'),
+        ]
 
     def __str__(self):
         return f"Échéance {self.numero_partie} - {self.credit} ({self.date_echeance})"
@@ -287,11 +513,101 @@ class Alerte(models.Model):
         verbose_name = "Alerte"
         verbose_name_plural = "Alertes"
         ordering = ['-date_alerte']
+        indexes = [
+            # Alertes en attente par date de rappel (tableau de bord)
+            models.Index(fields=['statut', 'date_rappel'], name='alerte_statut_rappel'),
+        ]
 
     def __str__(self):
         return f"Alerte {self.type_alerte} - {self.echeance} ({self.date_alerte})"
 
 
+class IndexAlerte(models.Model):
+    """Index matérialisé des éléments à suivre (chèques, échéances, alertes) pour la page des alertes"""
+    SOURCE_CHOICES = [
+        ('cheque_garantie', 'Chèque de garantie'),
+        ('echeance', 'Échéance'),
+        ('alerte', 'Alerte'),
+    ]
+    
+    # Niveaux d'urgence, dans l'ordre d'affichage
+    NIVEAU_CRITIQUE = 0
+    NIVEAU_IMPORTANTE = 1
+    NIVEAU_INFORMATIF = 2
+    NIVEAU_A_VENIR = 3
+    NIVEAU_CHOICES = [
+        (NIVEAU_CRITIQUE, 'Critique'),
+        (NIVEAU_IMPORTANTE, 'Importante'),
+        (NIVEAU_INFORMATIF, 'Informatif'),
+        (NIVEAU_A_VENIR, 'À venir'),
+    ]
+    CODES_URGENCE = {
+        NIVEAU_CRITIQUE: 'critique',
+        NIVEAU_IMPORTANTE: 'importante',
+        NIVEAU_INFORMATIF: 'informatif',
+        NIVEAU_A_VENIR: 'a_venir',
+    }
+    
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    objet_id = models.PositiveIntegerField()
+    type_alerte = models.CharField(max_length=20, choices=Alerte.TYPE_CHOICES)
+    statut = models.CharField(max_length=15, choices=Alerte.STATUT_CHOICES, default='en_attente')
+    niveau = models.PositiveSmallIntegerField(choices=NIVEAU_CHOICES, verbose_name="Urgence")
+    date_echeance = models.DateField()
+    montant = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    libelle = models.TextField()
+    reference = models.CharField(max_length=50, blank=True)
+    banque = models.CharField(max_length=100, blank=True)
+    cle_recherche = models.CharField(max_length=255, blank=True)
+    
+    credit = models.ForeignKey(Credit, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    agent = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    date_maj = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Index d'alerte"
+        verbose_name_plural = "Index des alertes"
+        ordering = ['niveau', 'date_echeance', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'objet_id'], name='index_alerte_source_objet_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['statut', 'niveau', 'date_echeance'], name='index_alerte_liste'),
+            models.Index(fields=['agent', 'statut', 'niveau'], name='index_alerte_agent'),
+            models.Index(fields=['date_echeance'], name='index_alerte_echeance'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_source_display()} {self.objet_id} - {self.get_niveau_display()} ({self.date_echeance})"
+    
+    @property
+    def urgence(self):
+        return self.CODES_URGENCE[self.niveau]
+    
+    @property
+    def jours_restants(self):
+        """Nombre de jours avant l'échéance (négatif si en retard)"""
+        return (self.date_echeance - timezone.now().date()).days
+    
+    @property
+    def jours_retard(self):
+        return max(0, -self.jours_restants)
+    
+    @property
+    def titre(self):
+        if self.source == 'alerte':
+            prefixe = self.get_type_alerte_display()
+        else:
+            prefixe = dict(self.SOURCE_CHOICES)[self.source]
+        jours = self.jours_restants
+        if jours < 0:
+            return f"{prefixe} en retard de {-jours} jour(s)"
+        if jours == 0:
+            return f"{prefixe} à échéance aujourd'hui"
+        return f"{prefixe} à échéance dans {jours} jour(s)"
+
+
 class ReportEcheance(models.Model):
     """Modèle pour gérer les reports d'échéances"""
     echeance = models.ForeignKey(Echeance, on_delete=models.CASCADE, related_name='reports')
@@ -310,7 +626,75 @@ class ReportEcheance(models.Model):
         return f"Report {self.echeance} : {self.ancienne_date} → {self.nouvelle_date}"
 
 
-class ActionLog(models.Model):
+class AffichageAction:
+    """Affichage commun des actions de l'historique, courantes (ActionLog) ou archivées (ActionArchivee)"""
+    
+    def __str__(self):
+        return f"{self.get_type_action_display()} - {self.agent.username if self.agent else 'Système'} - {self.date_action.strftime('%d/%m/%Y %H:%M')}"
+    
+    @property
+    def duree_action(self):
+        """Calculer la durée de l'action si elle est en cours"""
+        if self.statut == 'en_cours':
+            return timezone.now() - self.date_action
+        return None
+    
+    @property
+    def est_urgent(self):
+        """Déterminer si l'action nécessite une attention immédiate"""
+        actions_urgentes = ['echeance_paiement', 'alerte_creation', 'credit_validation']
+        return self.type_action in actions_urgentes and self.statut in ['en_cours', 'en_attente']
+    
+    def get_icone_action(self):
+        """Retourner l'icône appropriée selon le type d'action"""
+        icones = {
+            'credit_creation': 'bi-plus-circle-fill',
+            'credit_modification': 'bi-pencil-square',
+            'credit_suppression': 'bi-trash-fill',
+            'credit_validation': 'bi-check-circle-fill',
+            'echeance_creation': 'bi-calendar-plus',
+            'echeance_paiement': 'bi-cash-coin',
+            'echeance_report': 'bi-calendar-x',
+            'echeance_annulation': 'bi-x-circle-fill',
+            'cheque_encaissement': 'bi-bank',
+            'cheque_report': 'bi-calendar-range',
+            'cheque_annulation': 'bi-x-octagon-fill',
+            'alerte_creation': 'bi-exclamation-triangle-fill',
+            'alerte_traitement': 'bi-check2-all',
+            'alerte_rappel': 'bi-bell-fill',
+            'client_creation': 'bi-person-plus-fill',
+            'client_modification': 'bi-person-gear',
+            'client_contact': 'bi-telephone-fill',
+            'connexion': 'bi-box-arrow-in-right',
+            'deconnexion': 'bi-box-arrow-left',
+            'export_donnees': 'bi-download',
+            'import_donnees': 'bi-upload',
+            'modification_donnees': 'bi-pencil',
+        }
+        return icones.get(self.type_action, 'bi-info-circle')
+    
+    def get_couleur_statut(self):
+        """Retourner la couleur Bootstrap appropriée pour le statut"""
+        couleurs = {
+            'succes': 'success',
+            'echec': 'danger',
+            'en_cours': 'warning',
+            'annule': 'secondary',
+            'en_attente': 'info',
+        }
+        return couleurs.get(self.statut, 'primary')
+    
+    def get_resume_action(self):
+        """Retourner un résumé concis de l'action"""
+        if self.client:
+            return f"{self.get_type_action_display()} pour {self.client.nom_complet}"
+        elif self.credit:
+            return f"{self.get_type_action_display()} - Police {self.credit.numero_police}"
+        else:
+            return self.get_type_action_display()
+
+
+class ActionLog(SuiviModifications, AffichageAction, models.Model):
     """Modèle pour tracer l'historique des actions des agents et clients"""
     
     TYPE_ACTION_CHOICES = [
@@ -346,6 +730,7 @@ class ActionLog(models.Model):
         ('deconnexion', 'Déconnexion agent'),
         ('export_donnees', 'Export de données'),
         ('import_donnees', 'Import de données'),
+        ('modification_donnees', 'Modification de données'),
     ]
     
     STATUT_CHOICES = [
@@ -397,66 +782,127 @@ class ActionLog(models.Model):
             models.Index(fields=['client']),
             models.Index(fields=['credit']),
         ]
+
+
+class ActionArchivee(AffichageAction, models.Model):
+    """Action de l'historique déplacée hors de ActionLog par la commande archiver_actions.
+
+    L'identifiant d'origine est conservé. Les relations ne portent pas de
+    contrainte : l'archive survit à la suppression des clients ou crédits.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    type_action = models.CharField(max_length=50, choices=ActionLog.TYPE_ACTION_CHOICES, verbose_name="Type d'action")
+    description = models.TextField(verbose_name="Description détaillée")
+    statut = models.CharField(max_length=20, choices=ActionLog.STATUT_CHOICES, default='succes', verbose_name="Statut")
+    agent = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                              related_name='+', verbose_name="Agent responsable")
+    client = models.ForeignKey(Client, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                               related_name='+', verbose_name="Client concerné")
+    credit = models.ForeignKey(Credit, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                               related_name='+', verbose_name="Crédit concerné")
+    echeance = models.ForeignKey(Echeance, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                                 related_name='+', verbose_name="Échéance concernée")
+    donnees_avant = models.JSONField(null=True, blank=True, verbose_name="Données avant modification")
+    donnees_apres = models.JSONField(null=True, blank=True, verbose_name="Données après modification")
+    date_action = models.DateTimeField(verbose_name="Date et heure de l'action")
+    ip_adresse = models.GenericIPAddressField(null=True, blank=True, verbose_name="Adresse IP")
+    user_agent = models.TextField(null=True, blank=True, verbose_name="Navigateur/Appareil")
+    session_id = models.CharField(max_length=100, null=True, blank=True, verbose_name="ID de session")
+    remarques = models.TextField(null=True, blank=True, verbose_name="Remarques additionnelles")
     
-    def __str__(self):
-        return f"{self.get_type_action_display()} - {self.agent.username if self.agent else 'Système'} - {self.date_action.strftime('%d/%m/%Y %H:%M')}"
-    
-    @property
-    def duree_action(self):
-        """Calculer la durée de l'action si elle est en cours"""
-        if self.statut == 'en_cours':
-            return timezone.now() - self.date_action
-        return None
+    class Meta:
+        verbose_name = "Action archivée"
+        verbose_name_plural = "Actions archivées"
+        ordering = ['-date_action']
+        indexes = [
+            models.Index(fields=['date_action'], name='action_archivee_date'),
+            models.Index(fields=['type_action', 'date_action'], name='action_archivee_type'),
+            models.Index(fields=['agent', 'date_action'], name='action_archivee_agent'),
+            models.Index(fields=['client'], name='action_archivee_client'),
+        ]
+
+
+class ResumeActionsMois(models.Model):
+    """Nombre d'actions archivées par mois, type, statut et agent (statistiques de l'historique)"""
+    mois = models.DateField(verbose_name="Mois (premier jour)")
+    type_action = models.CharField(max_length=50, choices=ActionLog.TYPE_ACTION_CHOICES)
+    statut = models.CharField(max_length=20, choices=ActionLog.STATUT_CHOICES)
+    agent = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                              related_name='+')
+    nombre = models.PositiveIntegerField(default=0)
     
-    @property
-    def est_urgent(self):
-        """Déterminer si l'action nécessite une attention immédiate"""
-        actions_urgentes = ['echeance_paiement', 'alerte_creation', 'credit_validation']
-        return self.type_action in actions_urgentes and self.statut in ['en_cours', 'en_attente']
+    class Meta:
+        verbose_name = "Résumé mensuel des actions archivées"
+        verbose_name_plural = "Résumés mensuels des actions archivées"
+        ordering = ['-mois']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['mois', 'type_action', 'statut', 'agent'], name='resume_actions_mois_unique',
+            ),
+        ]
+
+
+class StatJournaliere(models.Model):
+    """Cumul journalier des règlements, crédits et actions par agent, mode (ou type) et statut.
+
+    Tenu à jour par les signaux (cumuls.py) et reconstruit chaque nuit par la
+    commande cumuler_statistiques ; les statistiques y lisent les jours passés.
+    """
+    CATEGORIE_CHOICES = [
+        ('reglement', 'Règlements'),
+        ('credit', 'Crédits'),
+        ('action', 'Actions'),
+    ]
+
+    jour = models.DateField()
+    categorie = models.CharField(max_length=10, choices=CATEGORIE_CHOICES)
+    agent = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                              related_name='+')
+    mode = models.CharField(max_length=50, blank=True,
+                            help_text="Mode de paiement, type de crédit ou type d'action selon la catégorie")
+    statut = models.CharField(max_length=20, blank=True)
+    nombre = models.IntegerField(default=0)
+    montant = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Statistique journalière"
+        verbose_name_plural = "Statistiques journalières"
+        ordering = ['-jour']
+        indexes = [
+            models.Index(fields=['categorie', 'jour'], name='stat_journaliere_jour'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['categorie', 'jour', 'agent', 'mode', 'statut'], name='stat_journaliere_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_categorie_display()} {self.jour} - {self.mode} {self.statut} : {self.nombre}"
+
+
+class DocumentRecherche(models.Model):
+    """Texte normalisé d'un client, d'un crédit ou d'une action, indexé en plein texte pour la recherche"""
+    SOURCE_CHOICES = [
+        ('client', 'Client'),
+        ('credit', 'Crédit'),
+        ('action', 'Action'),
+    ]
     
-    def get_icone_action(self):
-        """Retourner l'icône appropriée selon le type d'action"""
-        icones = {
-            'credit_creation': 'bi-plus-circle-fill',
-            'credit_modification': 'bi-pencil-square',
-            'credit_suppression': 'bi-trash-fill',
-            'credit_validation': 'bi-check-circle-fill',
-            'echeance_creation': 'bi-calendar-plus',
-            'echeance_paiement': 'bi-cash-coin',
-            'echeance_report': 'bi-calendar-x',
-            'echeance_annulation': 'bi-x-circle-fill',
-            'cheque_encaissement': 'bi-bank',
-            'cheque_report': 'bi-calendar-range',
-            'cheque_annulation': 'bi-x-octagon-fill',
-            'alerte_creation': 'bi-exclamation-triangle-fill',
-            'alerte_traitement': 'bi-check2-all',
-            'alerte_rappel': 'bi-bell-fill',
-            'client_creation': 'bi-person-plus-fill',
-            'client_modification': 'bi-person-gear',
-            'client_contact': 'bi-telephone-fill',
-            'connexion': 'bi-box-arrow-in-right',
-            'deconnexion': 'bi-box-arrow-left',
-            'export_donnees': 'bi-download',
-            'import_donnees': 'bi-upload',
-        }
-        return icones.get(self.type_action, 'bi-info-circle')
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    objet_id = models.PositiveIntegerField()
+    titre = models.CharField(max_length=255)
+    detail = models.CharField(max_length=255, blank=True)
+    # Minuscules sans accents ; index FTS5 (SQLite) ou FULLTEXT (MySQL) créé par la migration
+    texte = models.TextField()
+    date_maj = models.DateTimeField(auto_now=True)
     
-    def get_couleur_statut(self):
-        """Retourner la couleur Bootstrap appropriée pour le statut"""
-        couleurs = {
-            'succes': 'success',
-            'echec': 'danger',
-            'en_cours': 'warning',
-            'annule': 'secondary',
-            'en_attente': 'info',
-        }
-        return couleurs.get(self.statut, 'primary')
+    class Meta:
+        verbose_name = "Document de recherche"
+        verbose_name_plural = "Documents de recherche"
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'objet_id'], name='document_recherche_source_objet_unique'),
+        ]
     
-    def get_resume_action(self):
-        """Retourner un résumé concis de l'action"""
-        if self.client:
-            return f"{self.get_type_action_display()} pour {self.client.nom_complet}"
-        elif self.credit:
-            return f"{self.get_type_action_display()} - Police {self.credit.numero_police}"
-        else:
-            return self.get_type_action_display()
+    def __str__(self):
+        return f"{self.get_source_display()} {self.objet_id} - {self.titre}"
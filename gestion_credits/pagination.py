@@ -0,0 +1,198 @@
+"""
+Pagination par clé (curseur) des grandes listes : historique des actions,
+clients, règlements.
+
+Au lieu de COUNT(*) + OFFSET n (de plus en plus lent sur les pages profondes),
+chaque page reprend après la dernière ligne affichée : WHERE (date, id) < (d, i)
+ORDER BY date DESC, id DESC LIMIT n, servi directement par l'index de la date
+(qui contient aussi la clé primaire). Les liens « précédent » et « suivant »
+portent un curseur opaque ; le total affiché est un comptage mis en cache.
+"""
+
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Q
+
+
+# Durée de validité (secondes) des comptages mis en cache
+DUREE_CACHE_COMPTAGE = 300
+
+SUIVANT = 's'
+PRECEDENT = 'p'
+
+
+class CurseurInvalide(ValueError):
+    """Curseur illisible ou ne correspondant pas à l'ordre de la liste"""
+
+
+def total_approximatif(queryset, duree=DUREE_CACHE_COMPTAGE):
+    """Nombre de lignes du queryset, mis en cache quelques minutes par requête SQL"""
+    sql, params = queryset.order_by().query.sql_with_params()
+    empreinte = hashlib.md5(f'{sql}|{params}'.encode('utf-8')).hexdigest()
+    cle = f'pagination_total:{queryset.model._meta.label_lower}:{empreinte}'
+    total = cache.get(cle)
+    if total is None:
+        total = queryset.count()
+        cache.set(cle, total, duree)
+    return total
+
+
+class PageCurseur:
+    """Page d'une liste paginée par curseur"""
+
+    def __init__(self, object_list, curseur_precedent, curseur_suivant, paginateur):
+        self.object_list = object_list
+        self.curseur_precedent = curseur_precedent
+        self.curseur_suivant = curseur_suivant
+        self.paginator = paginateur
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_previous(self):
+        return self.curseur_precedent is not None
+
+    @property
+    def has_next(self):
+        return self.curseur_suivant is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+
+class PaginateurCurseur:
+    """Paginer un queryset selon un ordre total (le dernier champ doit être unique, ex. 'id').
+
+    Les champs de l'ordre ne doivent pas être nuls : la comparaison de tuples
+    n'a pas de sens avec NULL.
+    """
+
+    def __init__(self, queryset, ordre, par_page=25):
+        self.queryset = queryset
+        self.ordre = list(ordre)
+        self.par_page = par_page
+        self.champs = [champ.lstrip('-') for champ in self.ordre]
+
+    @property
+    def count(self):
+        """Total approximatif (comptage mis en cache)"""
+        return total_approximatif(self.queryset)
+
+    def _encoder(self, sens, objet):
+        valeurs = [
+            self.queryset.model._meta.get_field(champ).value_to_string(objet)
+            for champ in self.champs
+        ]
+        donnees = json.dumps([sens, *valeurs], separators=(',', ':'))
+        return base64.urlsafe_b64encode(donnees.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def curseur_fin(self):
+        """Curseur de la dernière page"""
+        donnees = json.dumps([PRECEDENT], separators=(',', ':'))
+        return base64.urlsafe_b64encode(donnees.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def _decoder(self, curseur):
+        try:
+            donnees = json.loads(base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4)))
+            sens, *valeurs = donnees
+            if sens == PRECEDENT and not valeurs:
+                # Dernière page
+                return sens, None
+            if sens not in (SUIVANT, PRECEDENT) or len(valeurs) != len(self.champs):
+                raise ValueError
+            valeurs = [
+                self.queryset.model._meta.get_field(champ).to_python(valeur)
+                for champ, valeur in zip(self.champs, valeurs)
+            ]
+        except (ValueError, TypeError) as e:
+            raise CurseurInvalide(str(e))
+        return sens, valeurs
+
+    def _apres(self, ordre, valeurs):
+        """Filtre des lignes situées après `valeurs` dans l'ordre donné (comparaison lexicographique)"""
+        condition = Q()
+        egalites = {}
+        for champ, valeur in zip(ordre, valeurs):
+            nom = champ.lstrip('-')
+            operateur = 'lt' if champ.startswith('-') else 'gt'
+            condition |= Q(**egalites, **{f'{nom}__{operateur}': valeur})
+            egalites[nom] = valeur
+        return condition
+
+    def page(self, curseur=None):
+        """Page désignée par le curseur (première page si absent ou invalide)"""
+        sens, valeurs = SUIVANT, None
+        if curseur:
+            try:
+                sens, valeurs = self._decoder(curseur)
+            except CurseurInvalide:
+                sens, valeurs = SUIVANT, None
+
+        if sens == PRECEDENT:
+            # Parcourir à rebours puis remettre les lignes dans l'ordre d'affichage
+            ordre = [champ[1:] if champ.startswith('-') else f'-{champ}' for champ in self.ordre]
+        else:
+            ordre = self.ordre
+
+        lignes = self.queryset.order_by(*ordre)
+        if valeurs is not None:
+            lignes = lignes.filter(self._apres(ordre, valeurs))
+        lignes = list(lignes[:self.par_page + 1])
+        encore = len(lignes) > self.par_page
+        lignes = lignes[:self.par_page]
+
+        if sens == PRECEDENT:
+            lignes.reverse()
+            a_precedent, a_suivant = encore, valeurs is not None
+        else:
+            a_precedent, a_suivant = valeurs is not None, encore
+
+        return PageCurseur(
+            lignes,
+            self._encoder(PRECEDENT, lignes[0]) if lignes and a_precedent else None,
+            self._encoder(SUIVANT, lignes[-1]) if lignes and a_suivant else None,
+            self,
+        )
+
+
+class PaginateurCurseurEnchaine:
+    """Paginer à la suite plusieurs querysets de même ordre (chaque page reste dans un seul queryset).
+
+    Le curseur est préfixé par le rang du queryset : « 1. » désigne la première
+    page du deuxième.
+    """
+
+    def __init__(self, querysets, ordre, par_page=25):
+        self.paginateurs = [PaginateurCurseur(queryset, ordre, par_page) for queryset in querysets]
+
+    @property
+    def count(self):
+        return sum(paginateur.count for paginateur in self.paginateurs)
+
+    def page(self, curseur=None):
+        rang, curseur_rang = 0, None
+        if curseur:
+            prefixe, separateur, reste = curseur.partition('.')
+            if separateur and prefixe.isdigit() and int(prefixe) < len(self.paginateurs):
+                rang, curseur_rang = int(prefixe), reste or None
+
+        page = self.paginateurs[rang].page(curseur_rang)
+
+        precedent = f'{rang}.{page.curseur_precedent}' if page.curseur_precedent else None
+        if precedent is None and rang > 0:
+            precedent = f'{rang - 1}.{self.paginateurs[rang - 1].curseur_fin()}'
+        suivant = f'{rang}.{page.curseur_suivant}' if page.curseur_suivant else None
+        if suivant is None and rang + 1 < len(self.paginateurs) and self.paginateurs[rang + 1].queryset.exists():
+            suivant = f'{rang + 1}.'
+        return PageCurseur(page.object_list, precedent, suivant, self)
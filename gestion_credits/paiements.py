@@ -0,0 +1,221 @@
+"""
+Enregistrement des paiements (règlements) sur les crédits.
+
+Toutes les saisies de paiement (vues, import de relevés) passent par
+PaiementService :
+
+- enregistrer_paiements(paiements) écrit un lot de paiements dans une seule
+  transaction : les crédits concernés sont verrouillés (SELECT ... FOR UPDATE,
+  dans l'ordre des identifiants pour éviter les interblocages), chaque montant
+  est contrôlé contre le reste à payer verrouillé, puis les effets (chèques de
+  garantie), les règlements et les alertes sont écrits avec bulk_create et les
+  montants du lot sont ajoutés aux soldes des crédits touchés (deltas sur les
+  lignes verrouillées, en une requête) ; le recalcul complet à partir de tous
+  les règlements reste réservé à la vérification (recalculer_soldes) ;
+- enregistrer_paiement(paiement) enregistre un seul paiement par le même
+  chemin ;
+- payer_cheque_en_especes() remplace un chèque de garantie par un paiement en
+  espèces.
+
+bulk_create ne déclenche pas les signaux : l'index des alertes, les cumuls
+journaliers, le cache du tableau de bord et les notifications sont mis à jour
+pour tout le lot. L'historique reste à la charge de l'appelant (journaliser),
+chaque saisie ayant son propre type d'action.
+"""
+
+from datetime import date
+
+from django.db import connection, transaction
+
+from . import cache_tableau, cumuls, evenements
+from .alertes import indexer
+from .models import Alerte, ChequeGarantie, Credit, Reglement
+from .soldes import appliquer_deltas
+
+
+class ErreurPaiement(Exception):
+    """Paiement refusé (montant invalide, supérieur au reste à payer, chèque déjà versé...)"""
+
+
+class Paiement:
+    """Un paiement à enregistrer sur un crédit.
+
+    `effet` (champs de ChequeGarantie : numero, banque, date_emission,
+    date_echeance, commentaire) crée le chèque auquel le règlement est rattaché ;
+    `alerte` (champs d'Alerte : type_alerte, message, date_rappel...) crée une
+    alerte pour l'agent. Le crédit est donné par son instance (dont les soldes
+    sont relus après l'enregistrement) ou par son identifiant.
+    """
+
+    def __init__(self, credit=None, montant=None, date_reglement=None, mode_paiement='especes', statut=None,
+                 commentaire='', effet=None, alerte=None, credit_id=None):
+        self.credit = credit
+        self.credit_id = credit.pk if credit is not None else credit_id
+        self.montant = montant
+        self.date_reglement = date_reglement or date.today()
+        self.mode_paiement = mode_paiement
+        # Le statut n'est applicable que pour les chèques
+        self.statut = (statut or 'non_verse') if mode_paiement == 'cheque' else None
+        self.commentaire = commentaire or ''
+        self.effet = effet
+        self.alerte = alerte
+        self.reglement = None
+        self.cheque = None
+
+
+class PaiementService:
+    """Enregistrer les paiements saisis par un agent"""
+
+    def __init__(self, agent, notifier=True):
+        self.agent = agent
+        self.notifier = notifier
+
+    def verrouiller(self, credit_ids):
+        """Verrouiller les crédits jusqu'à la fin de la transaction ; retourne {identifiant: reste à payer}"""
+        restes = dict(
+            Credit.objects.select_for_update().filter(pk__in=credit_ids).order_by('pk').values_list(
+                'pk', 'reste_a_payer'
+            )
+        )
+        manquants = set(credit_ids) - set(restes)
+        if manquants:
+            raise ErreurPaiement(f"Crédit introuvable : {', '.join(str(pk) for pk in sorted(manquants))}.")
+        return restes
+
+    def controler(self, paiements, restes):
+        """Contrôler les montants, dans l'ordre du lot, contre les restes à payer verrouillés"""
+        for paiement in paiements:
+            if paiement.montant is None or paiement.montant <= 0:
+                raise ErreurPaiement("Le montant doit être supérieur à 0.")
+            reste = restes[paiement.credit_id]
+            if paiement.montant > reste:
+                raise ErreurPaiement(
+                    f"Le montant ({paiement.montant} DH) ne peut pas dépasser le reste à payer ({reste} DH)."
+                )
+            restes[paiement.credit_id] = reste - paiement.montant
+
+    def enregistrer_paiement(self, paiement):
+        """Enregistrer un paiement ; retourne le règlement créé"""
+        return self.enregistrer_paiements([paiement])[0]
+
+    def enregistrer_paiements(self, paiements):
+        """Enregistrer un lot de paiements (tout ou rien) ; retourne les règlements créés, dans l'ordre du lot
+
+        Les paiements du lot sont ajoutés aux soldes des crédits touchés, verrouillés
+        pendant toute l'écriture, en une requête (soldes.appliquer_deltas).
+        """
+        paiements = list(paiements)
+        if not paiements:
+            return []
+        bulk_avec_identifiants = connection.features.can_return_rows_from_bulk_insert
+
+        with transaction.atomic():
+            credit_ids = sorted({paiement.credit_id for paiement in paiements})
+            self.controler(paiements, self.verrouiller(credit_ids))
+
+            # Les effets d'abord : les règlements y sont rattachés par leur identifiant
+            for paiement in paiements:
+                if paiement.effet is not None:
+                    paiement.cheque = ChequeGarantie(credit_id=paiement.credit_id, **paiement.effet)
+            cheques = [paiement.cheque for paiement in paiements if paiement.cheque is not None]
+            if bulk_avec_identifiants:
+                ChequeGarantie.objects.bulk_create(cheques)
+            else:
+                # MySQL ne renvoie pas les identifiants insérés par bulk_create (les signaux indexent les chèques)
+                for cheque in cheques:
+                    cheque.save()
+
+            for paiement in paiements:
+                paiement.reglement = Reglement(
+                    credit_id=paiement.credit_id,
+                    montant=paiement.montant,
+                    date_reglement=paiement.date_reglement,
+                    mode_paiement=paiement.mode_paiement,
+                    statut=paiement.statut,
+                    commentaire=paiement.commentaire,
+                    cheque_garantie=paiement.cheque,
+                    agent=self.agent,
+                )
+            reglements = [paiement.reglement for paiement in paiements]
+            Reglement.objects.bulk_create(reglements)
+
+            alertes = [
+                Alerte(date_alerte=date.today(), agent=self.agent, **paiement.alerte)
+                for paiement in paiements if paiement.alerte is not None
+            ]
+            if bulk_avec_identifiants:
+                Alerte.objects.bulk_create(alertes)
+            else:
+                for alerte in alertes:
+                    alerte.save()
+
+            # Apports du lot ajoutés aux soldes de chaque crédit en une requête, puis relus sur les instances
+            deltas = {}
+            for reglement in reglements:
+                apport = deltas.get(reglement.credit_id, (0, 0, 0))
+                deltas[reglement.credit_id] = tuple(
+                    total + valeur for total, valeur in zip(apport, reglement.contribution_soldes())
+                )
+            appliquer_deltas(deltas)
+            self._relire_soldes(paiements)
+
+            # bulk_create ne déclenche pas les signaux
+            if bulk_avec_identifiants and (cheques or alertes):
+                indexer(
+                    cheques=ChequeGarantie.objects.filter(pk__in=[cheque.pk for cheque in cheques]),
+                    alertes=Alerte.objects.filter(pk__in=[alerte.pk for alerte in alertes]),
+                )
+            cumuls.ajouter_objets(reglements)
+            cache_tableau.invalider(Reglement, *([ChequeGarantie] if cheques else []), *([Alerte] if alertes else []))
+            if self.notifier:
+                for paiement in paiements:
+                    if paiement.credit is not None:
+                        paiement.reglement.credit = paiement.credit
+                        evenements.notifier_reglement(paiement.reglement)
+                if bulk_avec_identifiants:
+                    for alerte in alertes:
+                        evenements.notifier_alerte(alerte)
+        return reglements
+
+    def _relire_soldes(self, paiements):
+        credits = {}
+        for paiement in paiements:
+            if paiement.credit is not None:
+                credits.setdefault(paiement.credit_id, []).append(paiement.credit)
+        if not credits:
+            return
+        for credit_id, *soldes in Credit.objects.filter(pk__in=credits).values_list('pk', *Credit.CHAMPS_SOLDES):
+            for credit in credits[credit_id]:
+                for champ, valeur in zip(Credit.CHAMPS_SOLDES, soldes):
+                    setattr(credit, champ, valeur)
+
+    def payer_cheque_en_especes(self, cheque, montant, date_paiement, commentaire=''):
+        """Remplacer un chèque de garantie non versé par un paiement en espèces ; retourne le règlement"""
+        commentaire = f"Paiement en espèces du chèque {cheque.numero} - {commentaire}"
+        with transaction.atomic():
+            reglement = getattr(cheque, 'reglement', None)
+            if reglement is not None:
+                if reglement.statut == 'verse':
+                    raise ErreurPaiement('Ce chèque est déjà versé.')
+                # Le règlement de l'effet devient un paiement en espèces (soldes mis à jour par delta au save)
+                reglement.mode_paiement = 'especes'
+                reglement.statut = 'verse'
+                reglement.date_reglement = date_paiement
+                reglement.commentaire = commentaire
+                reglement.save()
+            else:
+                reglement = self.enregistrer_paiement(Paiement(
+                    cheque.credit, montant, date_paiement, mode_paiement='especes', commentaire=commentaire,
+                ))
+
+            # Le règlement en espèces remplace complètement le chèque
+            cheque.delete()
+            Alerte.objects.create(
+                echeance=None,
+                type_alerte='paiement_especes_cheque',
+                message=f'Chèque {cheque.numero} payé en espèces de {montant:.2f} DH par {cheque.credit.client.nom_complet}',
+                date_alerte=date.today(),
+                date_rappel=date_paiement,
+                agent=self.agent,
+            )
+        return reglement
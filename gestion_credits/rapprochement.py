@@ -0,0 +1,109 @@
+"""
+Rattachement des règlements par chèque à leur chèque de garantie.
+
+Avant Reglement.cheque_garantie, le lien n'existait que dans le commentaire du
+règlement (« Effet {numero} - {banque} - ... », écrit par
+echeance_create_for_credit). Ce module retrouve ce lien pour les données
+existantes, par correspondance exacte du numéro au sein du même crédit, et
+signale les cas ambigus au lieu de deviner. Il sert la commande
+rapprocher_cheques ; la migration 0009 en garde sa propre copie figée.
+
+Les règlements dont le commentaire ne donne pas de numéro connu du crédit
+(saisie libre, import) sont rattachés, dans un second temps, au seul chèque
+encore libre du crédit de même montant dont l'échéance est la date du
+règlement. Les règlements restés sans chèque sont listés dans le rapport.
+"""
+
+import re
+from collections import defaultdict
+
+MOTIF_EFFET = re.compile(r'^Effet (?P<numero>.+?) - ')
+
+TAILLE_LOT = 500
+
+
+def rapprocher_cheques(reglements, cheques, appliquer=True):
+    """
+    Rattacher les règlements par chèque non rattachés au chèque de garantie dont le
+    numéro figure dans leur commentaire, à défaut au chèque de même crédit, montant
+    et échéance (= date du règlement). Retourne un rapport :
+    {'lies': nombre, 'ambigus': [(id règlement, numéro, motif), ...],
+     'sans_cheque': [(id règlement, numéro, motif), ...]} (numéro None si le commentaire n'en donne pas)
+    """
+    # (crédit, numéro) -> chèques candidats ; (crédit, montant, échéance) -> chèques candidats
+    index = defaultdict(list)
+    index_montants = defaultdict(list)
+    for cheque_id, credit_id, numero, montant, date_echeance in cheques.order_by('id').values_list(
+        'id', 'credit_id', 'numero', 'montant', 'date_echeance'
+    ).iterator():
+        index[(credit_id, numero.strip())].append((cheque_id, montant, date_echeance))
+        index_montants[(credit_id, montant, date_echeance)].append(cheque_id)
+
+    deja_lies = set(
+        reglements.exclude(cheque_garantie=None).values_list('cheque_garantie_id', flat=True)
+    )
+
+    rapport = {'lies': 0, 'ambigus': [], 'sans_cheque': []}
+    liens = []
+    # Règlements sans numéro connu du crédit : (id, crédit, montant, date, numéro), pour le second temps
+    sans_numero = []
+    a_rattacher = reglements.filter(
+        mode_paiement='cheque', cheque_garantie=None
+    ).order_by('id').values_list('id', 'credit_id', 'montant', 'date_reglement', 'commentaire')
+
+    for reglement_id, credit_id, montant, date_reglement, commentaire in a_rattacher.iterator():
+        correspondance = MOTIF_EFFET.match(commentaire or '')
+        numero = correspondance.group('numero').strip() if correspondance else None
+
+        tous = index.get((credit_id, numero), []) if numero else []
+        if not tous:
+            sans_numero.append((reglement_id, credit_id, montant, date_reglement, numero))
+            continue
+
+        candidats = [cheque for cheque in tous if cheque[0] not in deja_lies]
+        if len(candidats) > 1:
+            # Départager par le montant et la date d'échéance (= date du règlement à la saisie)
+            candidats = [
+                cheque for cheque in candidats if cheque[1] == montant and cheque[2] == date_reglement
+            ]
+
+        if len(candidats) == 1:
+            cheque_id = candidats[0][0]
+            deja_lies.add(cheque_id)
+            liens.append((reglement_id, cheque_id))
+            rapport['lies'] += 1
+        elif not candidats and len(tous) == 1:
+            rapport['ambigus'].append((reglement_id, numero, 'chèque déjà rattaché à un autre règlement'))
+        else:
+            rapport['ambigus'].append((reglement_id, numero, f'{len(tous)} chèques portent ce numéro sur le crédit'))
+
+    # Second temps : les chèques rattachés par leur numéro ne sont plus candidats
+    for reglement_id, credit_id, montant, date_reglement, numero in sans_numero:
+        candidats = [
+            cheque_id for cheque_id in index_montants.get((credit_id, montant, date_reglement), [])
+            if cheque_id not in deja_lies
+        ]
+        if len(candidats) == 1:
+            deja_lies.add(candidats[0])
+            liens.append((reglement_id, candidats[0]))
+            rapport['lies'] += 1
+        elif candidats:
+            rapport['ambigus'].append(
+                (reglement_id, numero, f'{len(candidats)} chèques libres de ce montant à cette échéance')
+            )
+        elif numero:
+            rapport['sans_cheque'].append((reglement_id, numero, 'aucun chèque de ce numéro sur le crédit'))
+        else:
+            rapport['sans_cheque'].append(
+                (reglement_id, None, 'pas de numéro dans le commentaire ni de chèque de ce montant à cette échéance')
+            )
+
+    if appliquer:
+        for i in range(0, len(liens), TAILLE_LOT):
+            reglements.model.objects.bulk_update(
+                [reglements.model(pk=reglement_id, cheque_garantie_id=cheque_id)
+                 for reglement_id, cheque_id in liens[i:i + TAILLE_LOT]],
+                ['cheque_garantie'],
+            )
+
+    return rapport
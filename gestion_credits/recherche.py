@@ -0,0 +1,284 @@
+"""
+Recherche plein texte sur les clients, les crédits et l'historique des actions.
+
+Chaque objet est résumé par un DocumentRecherche dont le texte est normalisé
+(minuscules, sans accents) et indexé en plein texte : table virtuelle FTS5 sous
+SQLite, index FULLTEXT sous MySQL (voir la migration 0011). Les documents sont
+tenus à jour par les signaux (signals.py) ; les termes recherchés sont des
+préfixes (« bena » trouve « Benali ») et tous doivent être présents.
+
+La migration 0011 remplit les documents avec sa propre copie figée de ce
+module : après un changement de leur format (normaliser_texte, champs
+indexés), la commande reconstruire_recherche réécrit les documents existants.
+
+Le classement de la recherche globale est calculé sur un nombre borné de
+candidats par source plutôt que par bm25 / MATCH sur toutes les correspondances,
+dont le coût croît avec la fréquence des termes.
+
+Sous MySQL, les mots plus courts que innodb_ft_min_token_size (3 par défaut)
+ne sont pas indexés : ces termes sont recherchés par LIKE sur le texte.
+"""
+
+import itertools
+import re
+import unicodedata
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from .models import ActionLog, Client, Credit, DocumentRecherche
+
+
+TABLE_FTS = 'gestion_credits_recherche_fts'
+
+TAILLE_LOT_RECHERCHE = 500
+
+# Nombre maximal de termes pris en compte dans une recherche
+MAX_TERMES = 8
+
+# Longueur minimale d'un mot indexé par MySQL (innodb_ft_min_token_size)
+TAILLE_MIN_TERME_MYSQL = 3
+
+# Un champ d'au plus ce nombre de mots est aussi indexé sous sa forme accolée
+MAX_MOTS_FORME_ACCOLEE = 5
+
+CHAMPS_DOCUMENT = ['titre', 'detail', 'texte', 'date_maj']
+
+# Recherche globale : documents examinés par source et poids de chaque source dans le classement
+MAX_CANDIDATS_PAR_SOURCE = 200
+POIDS_SOURCES = {'client': 2, 'credit': 1, 'action': 0}
+
+
+def _sans_accents(texte):
+    texte = unicodedata.normalize('NFKD', str(texte)).encode('ascii', 'ignore').decode('ascii')
+    return texte.lower()
+
+
+def normaliser_texte(*champs):
+    """Texte indexé : mots en minuscules sans accents, séparés par des espaces.
+
+    Les noms composés (M'hamed, Aït-Ben Haddou, El Idrissi) sont aussi indexés
+    sous leur forme accolée (mhamed, aitbenhaddou, elidrissi), pour que les deux
+    saisies retrouvent le client.
+    """
+    mots = []
+    for champ in champs:
+        if not champ:
+            continue
+        parties = re.findall(r'[a-z0-9]+', _sans_accents(champ))
+        mots.extend(parties)
+        if 1 < len(parties) <= MAX_MOTS_FORME_ACCOLEE:
+            mots.append(''.join(parties))
+    return ' '.join(mots)
+
+
+def termes_recherche(recherche):
+    """Termes (préfixes) de la recherche saisie"""
+    return re.findall(r'[a-z0-9]+', _sans_accents(recherche or ''))[:MAX_TERMES]
+
+
+# === ALIMENTATION DES DOCUMENTS ===
+
+def _documents_clients(clients, modele):
+    for client in clients.values(
+        'id', 'nom', 'prenom', 'cin', 'telephone', 'email',
+    ).order_by().iterator(chunk_size=TAILLE_LOT_RECHERCHE):
+        yield modele(
+            source='client',
+            objet_id=client['id'],
+            titre=f"{client['prenom']} {client['nom']}"[:255],
+            detail=f"CIN {client['cin']} - {client['telephone']}",
+            texte=normaliser_texte(
+                client['nom'], client['prenom'], client['cin'], client['telephone'], client['email'],
+            ),
+        )
+
+
+def _documents_credits(credits, modele):
+    for credit in credits.values(
+        'id', 'numero_police', 'description', 'montant_total',
+        'client__nom', 'client__prenom', 'client__cin',
+    ).order_by().iterator(chunk_size=TAILLE_LOT_RECHERCHE):
+        yield modele(
+            source='credit',
+            objet_id=credit['id'],
+            titre=f"Police {credit['numero_police']}"[:255],
+            detail=f"{credit['client__prenom']} {credit['client__nom']} - {credit['montant_total']} DH"[:255],
+            texte=normaliser_texte(
+                credit['numero_police'], credit['client__nom'], credit['client__prenom'],
+                credit['client__cin'], credit['description'],
+            ),
+        )
+
+
+def _documents_actions(actions, modele):
+    libelles = dict(ActionLog.TYPE_ACTION_CHOICES)
+    for action in actions.values(
+        'id', 'type_action', 'description', 'agent__username',
+        'client__nom', 'client__prenom', 'credit__numero_police',
+    ).order_by().iterator(chunk_size=TAILLE_LOT_RECHERCHE):
+        yield modele(
+            source='action',
+            objet_id=action['id'],
+            titre=libelles.get(action['type_action'], action['type_action']),
+            detail=action['description'][:255],
+            texte=normaliser_texte(
+                action['description'], action['agent__username'], action['client__nom'],
+                action['client__prenom'], action['credit__numero_police'],
+            ),
+        )
+
+
+def indexer(clients=None, credits=None, actions=None, modele=DocumentRecherche):
+    """Créer ou mettre à jour les documents des objets des querysets donnés"""
+    sources = []
+    if clients is not None:
+        sources.append(_documents_clients(clients, modele))
+    if credits is not None:
+        sources.append(_documents_credits(credits, modele))
+    if actions is not None:
+        sources.append(_documents_actions(actions, modele))
+
+    documents = itertools.chain.from_iterable(sources)
+    nombre = 0
+    while True:
+        lot = list(itertools.islice(documents, TAILLE_LOT_RECHERCHE))
+        if not lot:
+            return nombre
+        modele.objects.bulk_create(
+            lot,
+            update_conflicts=True,
+            unique_fields=['source', 'objet_id'],
+            update_fields=CHAMPS_DOCUMENT,
+        )
+        nombre += len(lot)
+
+
+def desindexer(source, objet_ids):
+    """Retirer les documents des objets supprimés"""
+    return DocumentRecherche.objects.filter(source=source, objet_id__in=objet_ids).delete()[0]
+
+
+def reconstruire_index_recherche():
+    """Reconstruire tous les documents et retirer ceux dont l'objet n'existe plus"""
+    nombre = indexer(
+        clients=Client.objects.all(),
+        credits=Credit.objects.all(),
+        actions=ActionLog.objects.all(),
+    )
+    for source, modele in (('client', Client), ('credit', Credit), ('action', ActionLog)):
+        DocumentRecherche.objects.filter(source=source).exclude(
+            objet_id__in=modele.objects.values('id')
+        ).delete()
+    return nombre
+
+
+# === RECHERCHE ===
+
+@lru_cache(maxsize=None)
+def _table_fts_presente(nom_base):
+    return TABLE_FTS in connection.introspection.table_names()
+
+
+def moteur_recherche():
+    """'fts5', 'mysql' ou None (recherche par LIKE) selon la base utilisée"""
+    if connection.vendor == 'mysql':
+        return 'mysql'
+    if connection.vendor == 'sqlite' and _table_fts_presente(connection.settings_dict['NAME']):
+        return 'fts5'
+    return None
+
+
+def _expression_fts5(termes, source=None):
+    expression = 'texte : (' + ' '.join(f'"{terme}"*' for terme in termes) + ')'
+    if source:
+        expression = f'source : "{source}" AND {expression}'
+    return expression
+
+
+def _expression_mysql(termes):
+    return ' '.join(f'+{terme}*' for terme in termes)
+
+
+def documents_correspondants(recherche, sources=None):
+    """Documents contenant tous les termes de la recherche (chaque terme étant un préfixe)"""
+    termes = termes_recherche(recherche)
+    documents = DocumentRecherche.objects.all()
+    if sources:
+        documents = documents.filter(source__in=sources)
+    if not termes:
+        return documents.none()
+
+    moteur = moteur_recherche()
+    if moteur == 'fts5':
+        source = sources[0] if sources and len(sources) == 1 else None
+        if source:
+            # La source est dans l'expression MATCH : sans filtre SQL sur la source, SQLite lit les documents
+            # par leur rowid au lieu de parcourir tous ceux de la source
+            documents = DocumentRecherche.objects.all()
+        return documents.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {TABLE_FTS} WHERE {TABLE_FTS} MATCH %s', [_expression_fts5(termes, source)],
+        ))
+
+    if moteur == 'mysql':
+        termes_indexes = [terme for terme in termes if len(terme) >= TAILLE_MIN_TERME_MYSQL]
+        if termes_indexes:
+            documents = documents.annotate(pertinence=RawSQL(
+                'MATCH (texte) AGAINST (%s IN BOOLEAN MODE)', [_expression_mysql(termes_indexes)],
+                output_field=FloatField(),
+            )).filter(pertinence__gt=0)
+        termes = [terme for terme in termes if terme not in termes_indexes]
+
+    for terme in termes:
+        documents = documents.filter(texte__contains=terme)
+    return documents
+
+
+def objets_correspondants(source, recherche):
+    """Sous-requête des identifiants des objets de la source correspondant à la recherche"""
+    return documents_correspondants(recherche, [source]).values('objet_id')
+
+
+def score_document(document, termes):
+    """Pertinence d'un document : mots trouvés en entier plutôt qu'en préfixe, puis poids de la source"""
+    mots = set(document.texte.split())
+    score = sum(2 if terme in mots else 1 for terme in termes)
+    return score + POIDS_SOURCES.get(document.source, 0)
+
+
+def _candidats(termes, source, nombre):
+    """Documents les plus récents de la source contenant tous les termes"""
+    if moteur_recherche() == 'fts5':
+        # Jointure directe sur la table FTS5 : le parcours par rowid décroissant s'arrête à `nombre`
+        table = DocumentRecherche._meta.db_table
+        return list(DocumentRecherche.objects.raw(
+            f'SELECT d.id, d.source, d.objet_id, d.titre, d.detail, d.texte '
+            f'FROM {TABLE_FTS} f JOIN {table} d ON d.id = f.rowid '
+            f'WHERE {TABLE_FTS} MATCH %s ORDER BY f.rowid DESC LIMIT %s',
+            [_expression_fts5(termes, source), nombre],
+        ))
+    return list(documents_correspondants(' '.join(termes), [source]).only(
+        'id', 'source', 'objet_id', 'titre', 'detail', 'texte',
+    ).order_by('-id')[:nombre])
+
+
+def rechercher(recherche, sources=None, limite=20):
+    """Documents les plus pertinents pour la recherche globale (attribut `score`)
+
+    Les candidats sont les documents les plus récents de chaque source (au plus
+    MAX_CANDIDATS_PAR_SOURCE) : le coût ne dépend pas du nombre de documents
+    correspondants, même pour un terme présent dans la moitié de l'historique.
+    """
+    termes = termes_recherche(recherche)
+    if not termes:
+        return []
+
+    documents = []
+    for source in sources or [source for source, libelle in DocumentRecherche.SOURCE_CHOICES]:
+        documents.extend(_candidats(termes, source, MAX_CANDIDATS_PAR_SOURCE))
+    for document in documents:
+        document.score = score_document(document, termes)
+    documents.sort(key=lambda document: (document.score, document.id), reverse=True)
+    return documents[:limite]
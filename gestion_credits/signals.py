@@ -0,0 +1,184 @@
+"""
+Signaux de l'application : maintien des données dérivées (index des alertes,
+documents de la recherche plein texte, cumuls journaliers, versions du cache
+du tableau de bord) à chaque écriture des modèles sources, audit des
+modifications (audit.py), notifications en direct (evenements.py) et listes
+des filtres de l'historique (historique.py).
+"""
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import audit, cache_tableau, cumuls, evenements, historique, recherche
+from .alertes import desindexer, indexer, indexer_credits
+from .models import ActionLog, Alerte, ChequeGarantie, Client, Credit, Echeance, Reglement
+
+
+MODELES_AUDITES = (Client, Credit, Reglement, ChequeGarantie, Echeance)
+
+MODELES_CUMULES = (Reglement, Credit, ActionLog)
+
+MODELES_TABLEAU = (Client, Credit, Reglement, ChequeGarantie, Echeance, Alerte)
+
+# Modèles affichés dans les listes des filtres de l'historique
+MODELES_FILTRES_HISTORIQUE = (User,)
+
+
+@receiver(pre_save)
+def capturer_modifications(sender, instance, raw=False, update_fields=None, **kwargs):
+    if sender in MODELES_AUDITES and not raw:
+        audit.capturer(instance, update_fields)
+
+
+@receiver(post_save)
+def enregistrer_modifications(sender, instance, raw=False, **kwargs):
+    if sender in MODELES_AUDITES and not raw:
+        audit.enregistrer(instance)
+
+
+def capturer_cumuls(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cumuls.capturer(instance)
+
+
+def enregistrer_cumuls(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cumuls.enregistrer(instance)
+
+
+def retirer_cumuls(sender, instance, **kwargs):
+    cumuls.retirer(instance)
+
+
+# Récepteurs connectés modèle par modèle : un récepteur post_delete sans
+# expéditeur empêche la suppression rapide (sans chargement des lignes ni
+# signaux) de tous les modèles, index et sessions compris
+for modele in MODELES_CUMULES:
+    pre_save.connect(capturer_cumuls, sender=modele)
+    post_save.connect(enregistrer_cumuls, sender=modele)
+    post_delete.connect(retirer_cumuls, sender=modele)
+
+
+def invalider_tableau(sender, raw=False, **kwargs):
+    if not raw:
+        cache_tableau.invalider(sender)
+
+
+for modele in MODELES_TABLEAU:
+    post_save.connect(invalider_tableau, sender=modele)
+    post_delete.connect(invalider_tableau, sender=modele)
+
+
+def invalider_filtres_historique(sender, raw=False, **kwargs):
+    if not raw:
+        historique.invalider_filtres()
+
+
+for modele in MODELES_FILTRES_HISTORIQUE:
+    post_save.connect(invalider_filtres_historique, sender=modele)
+    post_delete.connect(invalider_filtres_historique, sender=modele)
+
+
+@receiver(post_save, sender=ActionLog)
+def completer_filtres_historique(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        historique.actions_ajoutees([instance])
+
+
+@receiver(post_delete, sender=ActionLog)
+def retirer_filtres_historique(sender, **kwargs):
+    historique.invalider_filtres()
+
+
+@receiver(post_save, sender=Alerte)
+def notifier_alerte(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        evenements.notifier_alerte(instance)
+
+
+@receiver(post_save, sender=Reglement)
+def notifier_reglement(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        evenements.notifier_reglement(instance)
+
+
+@receiver(post_save, sender=ChequeGarantie)
+def indexer_cheque_garantie(sender, instance, raw=False, **kwargs):
+    if not raw:
+        indexer(cheques=ChequeGarantie.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Echeance)
+def indexer_echeance(sender, instance, raw=False, **kwargs):
+    if not raw:
+        indexer(echeances=Echeance.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Alerte)
+def indexer_alerte(sender, instance, raw=False, **kwargs):
+    if not raw:
+        indexer(alertes=Alerte.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=ChequeGarantie)
+def desindexer_cheque_garantie(sender, instance, **kwargs):
+    desindexer('cheque_garantie', [instance.pk])
+
+
+@receiver(post_delete, sender=Echeance)
+def desindexer_echeance(sender, instance, **kwargs):
+    desindexer('echeance', [instance.pk])
+
+
+@receiver(post_delete, sender=Alerte)
+def desindexer_alerte(sender, instance, **kwargs):
+    desindexer('alerte', [instance.pk])
+
+
+@receiver(post_save, sender=Credit)
+def reindexer_credit(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # La mise à jour des soldes ne change ni l'index des alertes ni la recherche
+    if raw or (update_fields and set(update_fields) <= set(Credit.CHAMPS_SOLDES)):
+        return
+    recherche.indexer(credits=Credit.objects.filter(pk=instance.pk))
+    # Un nouveau crédit n'a encore ni alerte ni action à indexer
+    if not created:
+        indexer_credits([instance.pk])
+        recherche.indexer(actions=ActionLog.objects.filter(credit=instance))
+
+
+@receiver(post_save, sender=Client)
+def reindexer_client(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    recherche.indexer(clients=Client.objects.filter(pk=instance.pk))
+    if created:
+        return
+    credit_ids = list(Credit.objects.filter(client=instance).values_list('pk', flat=True))
+    indexer_credits(credit_ids)
+    recherche.indexer(
+        credits=Credit.objects.filter(pk__in=credit_ids),
+        actions=ActionLog.objects.filter(client=instance),
+    )
+
+
+@receiver(post_save, sender=ActionLog)
+def indexer_action(sender, instance, raw=False, **kwargs):
+    if not raw:
+        recherche.indexer(actions=ActionLog.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Client)
+def desindexer_client(sender, instance, **kwargs):
+    recherche.desindexer('client', [instance.pk])
+
+
+@receiver(post_delete, sender=Credit)
+def desindexer_credit(sender, instance, **kwargs):
+    recherche.desindexer('credit', [instance.pk])
+
+
+@receiver(post_delete, sender=ActionLog)
+def desindexer_action(sender, instance, **kwargs):
+    recherche.desindexer('action', [instance.pk])
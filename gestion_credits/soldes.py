@@ -0,0 +1,103 @@
+"""
+Recalcul complet, en SQL, des soldes matérialisés des crédits.
+
+En temps normal les soldes sont tenus à jour par delta dans Reglement.save() et
+Reglement.delete() ; ces fonctions servent à la réparation et aux écritures en
+masse (bulk_create) qui contournent save().
+"""
+
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Credit, Reglement, au_centime
+
+
+FILTRE_TOUS = Q()
+FILTRE_VERSE = Q(mode_paiement='especes') | Q(mode_paiement='cheque', statut='verse')
+FILTRE_NON_VERSE = Q(mode_paiement='cheque', statut='non_verse')
+
+# Nombre d'identifiants par requête lors d'un recalcul ciblé
+TAILLE_LOT_RECALCUL = 500
+
+
+def somme_reglements(filtre):
+    """Sous-requête : somme des règlements du crédit courant correspondant au filtre"""
+    sous_requete = Reglement.objects.filter(filtre, credit=OuterRef('pk')).order_by().values(
+        'credit'
+    ).annotate(total=Sum('montant')).values('total')
+    return au_centime(Coalesce(Subquery(sous_requete), Value(Decimal('0')), output_field=models.DecimalField()))
+
+
+def reste_a_payer_reel():
+    """Expression du reste à payer recalculé à partir de tous les règlements"""
+    return Greatest(au_centime(F('montant_total') - somme_reglements(FILTRE_TOUS)), Value(Decimal('0')))
+
+
+def recalculer_soldes(credits):
+    """Recalculer les soldes des crédits du queryset ; retourne le nombre de crédits mis à jour"""
+    nombre = credits.update(
+        reste_a_payer=reste_a_payer_reel(),
+        total_verse=somme_reglements(FILTRE_VERSE),
+        total_cheques_non_verses=somme_reglements(FILTRE_NON_VERSE),
+    )
+    credits.update(statut_reglement=Case(
+        When(montant_total__lte=F('total_verse'), then=Value('regle')),
+        default=Value('non_regle'),
+    ))
+    return nombre
+
+
+def recalculer_soldes_credits(credit_ids):
+    """Recalculer les soldes d'une liste d'identifiants de crédits, par lots"""
+    credit_ids = list(credit_ids)
+    nombre = 0
+    for i in range(0, len(credit_ids), TAILLE_LOT_RECALCUL):
+        lot = credit_ids[i:i + TAILLE_LOT_RECALCUL]
+        nombre += recalculer_soldes(Credit.objects.filter(pk__in=lot))
+    return nombre
+
+
+def appliquer_deltas(deltas):
+    """Ajouter aux soldes des crédits les apports {identifiant: (montant, versé, chèques non versés)}, en une requête
+
+    Chemin de tous les paiements (paiements.PaiementService), sur les crédits
+    verrouillés ; le recalcul complet reste celui de recalculer_soldes.
+    """
+    if not deltas:
+        return 0
+
+    def par_credit(rang):
+        return Case(
+            *(When(pk=credit_id, then=Value(valeurs[rang])) for credit_id, valeurs in deltas.items()),
+            default=Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+
+    montant, verse, non_verses = par_credit(0), par_credit(1), par_credit(2)
+    # Le statut est calculé en premier : sous MySQL, les affectations d'un
+    # UPDATE voient les colonnes déjà modifiées à leur gauche
+    return Credit.objects.filter(pk__in=list(deltas)).update(
+        statut_reglement=Case(
+            When(montant_total__lte=au_centime(F('total_verse') + verse), then=Value('regle')),
+            default=Value('non_regle'),
+        ),
+        total_verse=au_centime(F('total_verse') + verse),
+        total_cheques_non_verses=au_centime(F('total_cheques_non_verses') + non_verses),
+        reste_a_payer=Greatest(au_centime(F('reste_a_payer') - montant), Value(Decimal('0'))),
+    )
+
+
+def credits_incoherents(credits):
+    """Crédits dont les soldes enregistrés diffèrent des règlements"""
+    return credits.annotate(
+        reste_reel=reste_a_payer_reel(),
+        verse_reel=somme_reglements(FILTRE_VERSE),
+        non_verse_reel=somme_reglements(FILTRE_NON_VERSE),
+    ).exclude(
+        reste_a_payer=F('reste_reel'),
+        total_verse=F('verse_reel'),
+        total_cheques_non_verses=F('non_verse_reel'),
+    )
@@ -0,0 +1,290 @@
+"""
+Moteur de statistiques du tableau de bord.
+
+Construit tout le contexte du tableau de bord à partir de quelques requêtes
+groupées au lieu d'une requête par indicateur et par jour. Les totaux des
+crédits et des règlements, la performance des agents et la série des 30
+derniers jours sont lus dans les cumuls journaliers (cumuls.py) pour les jours
+passés, complétés par les règlements et crédits à partir d'aujourd'hui : leur
+coût ne dépend plus de la taille de l'historique. Les blocs du tableau de bord
+sont mis en cache par cache_tableau.py.
+"""
+
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Q, Sum
+
+from .archives import debut_journee
+from .cache_tableau import lire_blocs
+from .cumuls import avant_aujourd_hui
+from .models import Alerte, ChequeGarantie, Client, Credit, Echeance, Reglement
+
+
+# Nombre de jours affichés dans le graphique des paiements
+NOMBRE_JOURS_SERIE = 30
+
+
+def _pourcentage(valeur, total):
+    """Pourcentage de `valeur` sur `total`, 0 si le total est nul"""
+    if not total:
+        return 0
+    return (valeur / total) * 100
+
+
+def _lignes(today):
+    """Nombres et montants par catégorie, agent, mode et statut, en trois requêtes groupées :
+    cumuls journaliers des jours passés, puis règlements et crédits à partir d'aujourd'hui"""
+    agent = ('agent_id', 'agent__username', 'agent__first_name', 'agent__last_name')
+    lignes = [
+        {**ligne, 'jour': None}
+        for ligne in avant_aujourd_hui(today, ['reglement', 'credit'])
+        .values('categorie', *agent, 'mode', 'statut')
+        .annotate(total_nombre=Sum('nombre'), total_montant=Sum('montant'))
+    ]
+    for ligne in (
+        Reglement.objects.filter(date_reglement__gte=today).order_by()
+        .values(*agent, jour=F('date_reglement'), mode=F('mode_paiement'), statut_reglement=F('statut'))
+        .annotate(total_nombre=Count('id'), total_montant=Sum('montant'))
+    ):
+        ligne['statut'] = ligne.pop('statut_reglement') or ''
+        lignes.append({**ligne, 'categorie': 'reglement'})
+    for ligne in (
+        Credit.objects.filter(date_creation__gte=debut_journee(today)).order_by()
+        .values(*agent, mode=F('type_credit'))
+        .annotate(total_nombre=Count('id'), total_montant=Sum('montant_total'))
+    ):
+        lignes.append({**ligne, 'categorie': 'credit', 'statut': '', 'jour': today})
+    return lignes
+
+
+def _somme(lignes, categorie, valeur='total_montant', **criteres):
+    """Somme de `valeur` sur les lignes de la catégorie qui vérifient les critères"""
+    return sum(
+        (ligne[valeur] or 0 for ligne in lignes
+         if ligne['categorie'] == categorie and all(ligne[cle] == attendu for cle, attendu in criteres.items())),
+        0,
+    )
+
+
+def statistiques_credits(lignes):
+    """Nombre et montant des crédits, répartis par type"""
+    return {
+        'total_credits': _somme(lignes, 'credit', 'total_nombre'),
+        'montant_total_credits': _somme(lignes, 'credit'),
+        'credits_uniques': _somme(lignes, 'credit', 'total_nombre', mode='unique'),
+        'credits_divises': _somme(lignes, 'credit', 'total_nombre', mode='divise'),
+    }
+
+
+def statistiques_reglements(lignes, today):
+    """Totaux des règlements par mode et statut"""
+    return {
+        'total_paiements_especes': _somme(lignes, 'reglement', mode='especes'),
+        'total_paiements_cheques_verses': _somme(lignes, 'reglement', mode='cheque', statut='verse'),
+        'total_cheques_en_attente': _somme(lignes, 'reglement', mode='cheque', statut='non_verse'),
+        'montant_paiements_aujourd_hui': _somme(lignes, 'reglement', jour=today),
+    }
+
+
+def performance_agents(lignes, nombre=5):
+    """Agents ayant encaissé le plus (total et nombre de paiements), sans requête supplémentaire"""
+    agents = {}
+    for ligne in lignes:
+        if ligne['categorie'] != 'reglement' or ligne['agent_id'] is None:
+            continue
+        agent = agents.get(ligne['agent_id'])
+        if agent is None:
+            agent = agents[ligne['agent_id']] = User(
+                pk=ligne['agent_id'],
+                username=ligne['agent__username'] or '',
+                first_name=ligne['agent__first_name'] or '',
+                last_name=ligne['agent__last_name'] or '',
+            )
+            agent.total_paiements, agent.nb_paiements = 0, 0
+        agent.total_paiements += ligne['total_montant'] or 0
+        agent.nb_paiements += ligne['total_nombre']
+    agents = [agent for agent in agents.values() if agent.nb_paiements > 0]
+    return sorted(agents, key=lambda agent: (-agent.total_paiements, agent.pk))[:nombre]
+
+
+def serie_paiements(today, lignes, nombre_jours=NOMBRE_JOURS_SERIE):
+    """Montant encaissé par jour sur la période, du plus ancien au plus récent"""
+    debut = today - timedelta(days=nombre_jours - 1)
+    totaux = dict(
+        avant_aujourd_hui(today, ['reglement'])
+        .filter(jour__gte=debut)
+        .values('jour')
+        .annotate(total=Sum('montant'))
+        .values_list('jour', 'total')
+    )
+    totaux[today] = _somme(lignes, 'reglement', jour=today)
+
+    serie = []
+    for i in range(nombre_jours):
+        date_calcul = debut + timedelta(days=i)
+        serie.append({
+            'date': date_calcul.strftime('%d/%m'),
+            'montant': float(totaux.get(date_calcul) or 0),
+        })
+    return serie
+
+
+def statistiques_cheques(today):
+    """Nombre de chèques à échéance proche (7 jours) et en retard, en une requête"""
+    return ChequeGarantie.objects.aggregate(
+        nb_cheques_echeance_proche=Count(
+            'id', filter=Q(date_echeance__range=[today, today + timedelta(days=7)])
+        ),
+        nb_cheques_en_retard=Count('id', filter=Q(date_echeance__lt=today)),
+    )
+
+
+# Indicateurs de l'API dashboard_stats : modèle compté et filtre du jour
+INDICATEURS = {
+    'echeances_aujourd_hui': (Echeance, lambda today: Q(date_echeance=today, est_traitee=False)),
+    'echeances_semaine': (
+        Echeance, lambda today: Q(date_echeance__range=[today, today + timedelta(days=7)], est_traitee=False)
+    ),
+    'echeances_retard': (Echeance, lambda today: Q(date_echeance__lt=today, est_traitee=False)),
+    'alertes_en_attente': (Alerte, lambda today: Q(statut='en_attente')),
+}
+
+
+def compter_indicateurs(today, noms):
+    """Valeur des indicateurs demandés, une requête COUNT (indexée) par indicateur"""
+    return {nom: INDICATEURS[nom][0].objects.filter(INDICATEURS[nom][1](today)).count() for nom in noms}
+
+
+def bloc_statistiques(today, lignes):
+    """Statistiques globales, types de crédits et pourcentages des barres de progression"""
+    stats_credits = statistiques_credits(lignes)
+    stats_reglements = statistiques_reglements(lignes, today)
+
+    montant_total_credits = stats_credits['montant_total_credits']
+    total_credits = stats_credits['total_credits']
+    total_paiements_especes = stats_reglements['total_paiements_especes']
+    total_paiements_cheques_verses = stats_reglements['total_paiements_cheques_verses']
+    total_cheques_en_attente = stats_reglements['total_cheques_en_attente']
+    total_paiements_verses = total_paiements_especes + total_paiements_cheques_verses
+
+    return {
+        # Statistiques globales
+        'total_credits': total_credits,
+        'total_clients': Client.objects.count(),
+        'montant_total_credits': montant_total_credits,
+        'total_paiements_verses': total_paiements_verses,
+        'total_paiements_especes': total_paiements_especes,
+        'total_paiements_cheques_verses': total_paiements_cheques_verses,
+        'total_cheques_en_attente': total_cheques_en_attente,
+        'taux_recouvrement': _pourcentage(total_paiements_verses, montant_total_credits),
+        'montant_paiements_aujourd_hui': stats_reglements['montant_paiements_aujourd_hui'],
+
+        # Types de crédits
+        'credits_uniques': stats_credits['credits_uniques'],
+        'credits_divises': stats_credits['credits_divises'],
+
+        # Pourcentages pour les barres de progression
+        'pourcentage_especes': _pourcentage(total_paiements_especes, montant_total_credits),
+        'pourcentage_cheques_verses': _pourcentage(total_paiements_cheques_verses, montant_total_credits),
+        'pourcentage_cheques_en_attente': _pourcentage(total_cheques_en_attente, montant_total_credits),
+        'pourcentage_credits_uniques': _pourcentage(stats_credits['credits_uniques'], total_credits),
+        'pourcentage_credits_divises': _pourcentage(stats_credits['credits_divises'], total_credits),
+    }
+
+
+def bloc_cheques(today):
+    """Chèques à échéance dans les 7 jours et en retard (nombres et trois premiers de chaque)"""
+    stats_cheques = statistiques_cheques(today)
+    return {
+        'cheques_echeance_proche': list(
+            ChequeGarantie.objects.filter(
+                date_echeance__range=[today, today + timedelta(days=7)]
+            ).select_related('credit__client').order_by('date_echeance')[:3]
+        ),
+        'cheques_en_retard': list(
+            ChequeGarantie.objects.filter(
+                date_echeance__lt=today
+            ).select_related('credit__client').order_by('date_echeance')[:3]
+        ),
+        'nb_cheques_echeance_proche': stats_cheques['nb_cheques_echeance_proche'],
+        'nb_cheques_en_retard': stats_cheques['nb_cheques_en_retard'],
+    }
+
+
+def bloc_top_clients():
+    return {
+        'top_clients': list(
+            Client.objects.annotate(
+                total_credits=Sum('credits__montant_total'),
+                nb_credits=Count('credits'),
+            ).filter(total_credits__isnull=False).order_by('-total_credits')[:5]
+        ),
+    }
+
+
+# Blocs du tableau de bord mis en cache et modèles dont ils dépendent (cache_tableau.py)
+BLOCS = {
+    'statistiques': (Client, Credit, Reglement),
+    'serie': (Reglement,),
+    'agents': (Reglement,),
+    'top_clients': (Client, Credit),
+    'cheques': (ChequeGarantie, Credit, Client),
+}
+
+
+def calculer_bloc(nom, today, lignes):
+    """Contexte d'un bloc ; `lignes` est appelée au plus une fois pour tous les blocs"""
+    if nom == 'statistiques':
+        return bloc_statistiques(today, lignes())
+    if nom == 'serie':
+        return {'paiements_30_jours': serie_paiements(today, lignes())}
+    if nom == 'agents':
+        return {'agents_performance': performance_agents(lignes())}
+    if nom == 'top_clients':
+        return bloc_top_clients()
+    return bloc_cheques(today)
+
+
+def construire_contexte_dashboard(today=None, avec_cache=False):
+    """Construire le contexte complet du tableau de bord
+
+    Avec `avec_cache`, les blocs sont lus dans le cache du tableau de bord
+    (cache_tableau.py) et seuls les blocs absents ou périmés sont recalculés.
+    """
+    today = today or date.today()
+
+    memo = []
+
+    def lignes():
+        if not memo:
+            memo.append(_lignes(today))
+        return memo[0]
+
+    if avec_cache:
+        context = lire_blocs(today, BLOCS, lambda nom: calculer_bloc(nom, today, lignes))
+    else:
+        context = {}
+        for nom in BLOCS:
+            context.update(calculer_bloc(nom, today, lignes))
+
+    # === LISTES DU JOUR (non mises en cache) ===
+    context.update({
+        # Paiements du jour
+        'paiements_aujourd_hui': list(
+            Reglement.objects.filter(date_reglement=today)
+            .select_related('credit__client')
+            .order_by('-montant')
+        ),
+
+        # Alertes
+        'alertes_en_attente': list(
+            Alerte.objects.filter(
+                statut='en_attente'
+            ).select_related('echeance__credit__client', 'agent').order_by('date_rappel')[:10]
+        ),
+
+        # Date
+        'today': today,
+    })
+    return context
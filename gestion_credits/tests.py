@@ -1,3 +1,1979 @@
-from django.test import TestCase
+import asyncio
+from datetime import date, timedelta
+from decimal import Decimal
+import gzip
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, transaction
+from django.db.models.deletion import Collector
+from django.db.models import QuerySet, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import cumuls, evenements, historique, journal
+from .alertes import basculer_niveaux
+from .archives import limite_archive, limite_horizon, mois_suivant
+from .cache_tableau import compteurs as compteurs_cache_tableau
+from .echeancier import ajouter_mois, calculer_echeancier, lire_jours_feries
+from .generation import GenerateurPortefeuille
+from .imports import ImportateurReglements, lire_lignes
+from .models import (
+    ActionArchivee, ActionLog, Alerte, Cheque, ChequeGarantie, Client, Credit, DocumentRecherche, Echeance,
+    IndexAlerte, Reglement, ReportEcheance, ResumeActionsMois, StatJournaliere
+)
+from .paiements import ErreurPaiement, Paiement, PaiementService
+from .recherche import documents_correspondants, moteur_recherche
+from .soldes import recalculer_soldes_credits
+from .statistiques import construire_contexte_dashboard
+
+
+def creer_portefeuille(nombre_clients=3, reglements_par_credit=4):
+    """Créer un petit portefeuille de test (clients, crédits, règlements, chèques)"""
+    today = date.today()
+    agent = User.objects.create_user(username=f'agent{User.objects.count()}', password='secret')
+    debut = Client.objects.count()
+
+    for i in range(debut, debut + nombre_clients):
+        client = Client.objects.create(
+            nom=f'Nom{i}', prenom=f'Prenom{i}', cin=f'CIN{i}', telephone=f'0600000{i:03d}'
+        )
+        credit = Credit.objects.create(
+            client=client,
+            numero_police=f'POL-{i:04d}',
+            type_credit='divise' if i % 2 else 'unique',
+            montant_total=Decimal('10000.00'),
+            agent=agent,
+        )
+        for j in range(reglements_par_credit):
+            mode = 'especes' if j % 2 == 0 else 'cheque'
+            Reglement.objects.create(
+                credit=credit,
+                montant=Decimal('100.00'),
+                date_reglement=today - timedelta(days=j),
+                mode_paiement=mode,
+                statut='verse' if j % 4 == 1 else 'non_verse',
+                agent=agent,
+            )
+        for jours in (-5, 0, 3, 20):
+            ChequeGarantie.objects.create(
+                credit=credit,
+                numero=f'CH{i}{jours}',
+                montant=Decimal('500.00'),
+                banque='BMCE',
+                date_emission=today,
+                date_echeance=today + timedelta(days=jours),
+            )
+        Alerte.objects.create(
+            type_alerte='cheque_garantie',
+            message=f'Chèque à traiter pour {client.nom_complet}',
+            date_alerte=today,
+            date_rappel=today,
+            agent=agent,
+        )
+    return agent
+
+
+@override_settings(TABLEAU_CACHE='default')
+class DashboardStatistiquesTests(TestCase):
+    """Statistiques du tableau de bord"""
+
+    # Nombre maximal de requêtes autorisées pour afficher le tableau de bord
+    # (session + utilisateur + requêtes groupées du moteur de statistiques)
+    MAX_REQUETES_DASHBOARD = 13
+
+    def setUp(self):
+        cache.clear()
+        self.agent = creer_portefeuille()
+        self.client.force_login(self.agent)
+
+    def test_totaux(self):
+        context = construire_contexte_dashboard(date.today())
+
+        self.assertEqual(context['total_credits'], 3)
+        self.assertEqual(context['total_clients'], 3)
+        self.assertEqual(context['credits_uniques'], 2)
+        self.assertEqual(context['credits_divises'], 1)
+        self.assertEqual(context['montant_total_credits'], Decimal('30000.00'))
+        self.assertEqual(context['total_paiements_especes'], Decimal('600.00'))
+        self.assertEqual(context['total_paiements_cheques_verses'], Decimal('300.00'))
+        self.assertEqual(context['total_cheques_en_attente'], Decimal('300.00'))
+        self.assertEqual(context['total_paiements_verses'], Decimal('900.00'))
+        self.assertEqual(context['montant_paiements_aujourd_hui'], Decimal('300.00'))
+        self.assertEqual(context['nb_cheques_echeance_proche'], 6)
+        self.assertEqual(context['nb_cheques_en_retard'], 3)
+
+    def test_serie_30_jours(self):
+        serie = construire_contexte_dashboard(date.today())['paiements_30_jours']
+
+        self.assertEqual(len(serie), 30)
+        self.assertEqual(serie[-1]['date'], date.today().strftime('%d/%m'))
+        self.assertEqual(serie[-1]['montant'], 300.0)
+        self.assertEqual(serie[-4]['montant'], 300.0)
+        self.assertEqual(serie[0]['montant'], 0.0)
+
+    def test_nombre_de_requetes_borne(self):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('gestion_credits:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(requetes), self.MAX_REQUETES_DASHBOARD)
+
+        # Le nombre de requêtes ne dépend pas du volume de données (les blocs en cache sont invalidés)
+        creer_portefeuille(nombre_clients=5, reglements_par_credit=8)
+        with CaptureQueriesContext(connection) as requetes_apres:
+            self.client.get(reverse('gestion_credits:dashboard'))
+        self.assertEqual(len(requetes_apres), len(requetes))
+
+
+class SoldesMaterialisesTests(TestCase):
+    """Soldes matérialisés des crédits (total versé, chèques non versés, statut)"""
+
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent', password='secret')
+        client = Client.objects.create(nom='Alaoui', prenom='Sara', cin='AB123', telephone='0611111111')
+        self.credit = Credit.objects.create(
+            client=client, numero_police='POL-1', type_credit='unique',
+            montant_total=Decimal('1000.00'), agent=self.agent,
+        )
+
+    def ajouter_reglement(self, montant, mode_paiement='especes', statut=None):
+        return Reglement.objects.create(
+            credit=self.credit, montant=Decimal(montant), date_reglement=date.today(),
+            mode_paiement=mode_paiement, statut=statut, agent=self.agent,
+        )
+
+    def assertSoldes(self, total_verse, total_non_verses, statut):
+        self.credit.refresh_from_db()
+        self.assertEqual(self.credit.total_verse, Decimal(total_verse))
+        self.assertEqual(self.credit.total_cheques_non_verses, Decimal(total_non_verses))
+        self.assertEqual(self.credit.statut_reglement, statut)
+
+    def test_creation_modification_suppression(self):
+        self.ajouter_reglement('400.00')
+        cheque = self.ajouter_reglement('600.00', 'cheque', 'non_verse')
+        self.assertSoldes('400.00', '600.00', 'non_regle')
+
+        cheque = Reglement.objects.get(pk=cheque.pk)
+        cheque.statut = 'verse'
+        cheque.save()
+        self.assertSoldes('1000.00', '0.00', 'regle')
+
+        cheque.delete()
+        self.assertSoldes('400.00', '0.00', 'non_regle')
+
+    def test_sauvegarde_credit_n_ecrase_pas_les_soldes(self):
+        credit_perime = Credit.objects.get(pk=self.credit.pk)
+        self.ajouter_reglement('1000.00')
+
+        credit_perime.description = 'Modifié'
+        credit_perime.save()
+        self.assertSoldes('1000.00', '0.00', 'regle')
+
+        credit_perime.montant_total = Decimal('2000.00')
+        credit_perime.save()
+        self.assertSoldes('1000.00', '0.00', 'non_regle')
+
+    def test_reste_a_payer_incremental(self):
+        reglement = self.ajouter_reglement('300.00')
+        self.assertEqual(self.credit.reste_a_payer, Decimal('700.00'))
+
+        reglement = Reglement.objects.get(pk=reglement.pk)
+        reglement.montant = Decimal('250.00')
+        reglement.save()
+        self.credit.refresh_from_db()
+        self.assertEqual(self.credit.reste_a_payer, Decimal('750.00'))
+
+        reglement.delete()
+        self.credit.refresh_from_db()
+        self.assertEqual(self.credit.reste_a_payer, Decimal('1000.00'))
+
+    def test_reste_a_payer_apres_trop_percu(self):
+        self.ajouter_reglement('800.00')
+        surplus = self.ajouter_reglement('500.00')
+        self.assertEqual(self.credit.reste_a_payer, Decimal('0.00'))
+
+        # Retirer un règlement d'un crédit soldé déclenche un recalcul complet
+        surplus.delete()
+        self.credit.refresh_from_db()
+        self.assertEqual(self.credit.reste_a_payer, Decimal('200.00'))
+
+    def test_commande_recalculer_soldes(self):
+        self.ajouter_reglement('1000.00')
+        Credit.objects.filter(pk=self.credit.pk).update(
+            reste_a_payer=500, total_verse=0, statut_reglement='non_regle'
+        )
+
+        sortie = StringIO()
+        call_command('recalculer_soldes', '--verifier', stdout=sortie)
+        self.assertIn('POL-1', sortie.getvalue())
+
+        call_command('recalculer_soldes', stdout=StringIO())
+        self.assertSoldes('1000.00', '0.00', 'regle')
+        self.assertEqual(self.credit.reste_a_payer, Decimal('0.00'))
+
+        sortie = StringIO()
+        call_command('recalculer_soldes', '--verifier', stdout=sortie)
+        self.assertIn('cohérents', sortie.getvalue())
+
+    def test_montants_non_representables_en_binaire(self):
+        # 2257.16 + 6 x 2257.14 = 15800.00 : en flottants, les sommes SQLite ne tombent pas juste
+        self.credit.montant_total = Decimal('15800.00')
+        self.credit.save()
+        self.ajouter_reglement('2257.16')
+        for _ in range(3):
+            self.ajouter_reglement('2257.14')
+        PaiementService(self.agent).enregistrer_paiements([
+            Paiement(self.credit, Decimal('2257.14')) for _ in range(3)
+        ])
+        self.assertSoldes('15800.00', '0.00', 'regle')
+        self.assertEqual(self.credit.reste_a_payer, Decimal('0.00'))
+        self.assertEqual(Credit.objects.filter(reste_a_payer=0, statut_reglement='regle').count(), 1)
+
+        sortie = StringIO()
+        call_command('recalculer_soldes', '--verifier', stdout=sortie)
+        self.assertIn('cohérents', sortie.getvalue())
+        call_command('recalculer_soldes', stdout=StringIO())
+        self.assertSoldes('15800.00', '0.00', 'regle')
+        self.assertEqual(Credit.objects.filter(reste_a_payer=0, statut_reglement='regle').count(), 1)
+
+    def test_liste_des_credits_filtre_en_sql(self):
+        self.ajouter_reglement('1000.00')
+        self.client.force_login(self.agent)
+
+        response = self.client.get(reverse('gestion_credits:credit_list'), {'statut': 'payes'})
+        self.assertEqual(response.context['total_payes'], 1)
+        self.assertEqual(response.context['total_non_regles'], 0)
+        self.assertEqual(list(response.context['page_obj']), [self.credit])
+
+
+@override_settings(JOURNAL_ASYNCHRONE=False)
+class ImportReglementsTests(TestCase):
+    """Import en masse de règlements depuis un relevé"""
+
+    CONTENU = (
+        "Police;Mode;Montant;Date;N° chèque;Banque;Date émission;Commentaire\n"
+        "POL-1;Espèces;300,00;01/03/2025;;;;Caisse\n"
+        "POL-1;cheque;200.00;2025-03-05;CH-9;BMCE;2025-03-01;\n"
+        "POL-1;effets;100.00;2025-03-05;;;;Sans banque\n"
+        "POL-X;especes;50.00;2025-03-05;;;;\n"
+        "POL-1;especes;900.00;2025-03-06;;;;Trop élevé\n"
+        "POL-2;especes;abc;2025-03-06;;;;\n"
+    )
+
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent', password='secret')
+        client = Client.objects.create(nom='Alaoui', prenom='Sara', cin='AB123', telephone='0611111111')
+        self.credit = Credit.objects.create(
+            client=client, numero_police='POL-1', type_credit='unique',
+            montant_total=Decimal('1000.00'), agent=self.agent,
+        )
+        Credit.objects.create(
+            client=client, numero_police='POL-2', type_credit='unique',
+            montant_total=Decimal('1000.00'), agent=self.agent,
+        )
+
+    def importer(self, *options):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as fichier:
+            fichier.write(self.CONTENU)
+        self.addCleanup(os.remove, fichier.name)
+        sortie = StringIO()
+        call_command('import_reglements', fichier.name, '--agent', 'agent', '--taille-lot', '1', *options, stdout=sortie)
+        return sortie.getvalue()
+
+    def test_commande_import(self):
+        sortie = self.importer()
+
+        self.assertIn('2 règlement(s) importé(s) sur 6 ligne(s), 4 rejet(s)', sortie)
+        self.assertIn('Ligne 5 (POL-X)', sortie)
+        self.assertIn('POL-X', sortie)
+
+        self.credit.refresh_from_db()
+        self.assertEqual(self.credit.reste_a_payer, Decimal('500.00'))
+        self.assertEqual(self.credit.total_verse, Decimal('300.00'))
+        self.assertEqual(self.credit.total_cheques_non_verses, Decimal('200.00'))
+        self.assertEqual(Reglement.objects.count(), 2)
+        self.assertEqual(ChequeGarantie.objects.get().numero, 'CH-9')
+        self.assertEqual(ActionLog.objects.filter(type_action='echeance_paiement').count(), 2)
+        # Les actions écrites par bulk_create sont indexées pour la recherche
+        self.assertEqual(documents_correspondants('paiement importe', ['action']).count(), 2)
+
+        journal = ActionLog.objects.get(type_action='import_donnees')
+        self.assertEqual(journal.donnees_apres['importes'], 2)
+        self.assertEqual(journal.donnees_apres['rejets'], 4)
+
+    def test_simulation(self):
+        sortie = self.importer('--simulation')
+
+        self.assertIn('Simulation', sortie)
+        self.assertFalse(Reglement.objects.exists())
+        self.assertFalse(ActionLog.objects.exists())
+
+    def test_paiement_saisi_pendant_l_import(self):
+        importateur = ImportateurReglements(self.agent, taille_lot=2)
+        charger_index = importateur.charger_index
+
+        def charger_puis_payer():
+            charger_index()
+            # Un agent encaisse 600 DH sur POL-1 après la lecture de l'index : reste 400 DH
+            Reglement.objects.create(
+                credit=self.credit, montant=Decimal('600.00'), date_reglement=date.today(),
+                mode_paiement='especes', agent=self.agent,
+            )
+
+        importateur.charger_index = charger_puis_payer
+        with mock.patch('gestion_credits.imports.recalculer_soldes_credits', wraps=recalculer_soldes_credits) as recalcul:
+            rapport = importateur.importer(lire_lignes(io.BytesIO(self.CONTENU.encode('utf-8')), 'releve.csv'))
+
+        # Le lot (300 + 200 DH) est refusé puis repris ligne par ligne : seule la ligne de 200 DH est rejetée
+        self.assertEqual((rapport['importes'], rapport['rejets']), (1, 5))
+        self.assertEqual(rapport['montant_importe'], '300.00')
+        self.assertIn('ne peut pas dépasser le reste à payer (100.00 DH)', importateur.rejets[0]['motif'])
+        self.credit.refresh_from_db()
+        self.assertEqual((self.credit.reste_a_payer, self.credit.total_verse), (Decimal('100.00'), Decimal('900.00')))
+        self.assertEqual(ActionLog.objects.filter(type_action='echeance_paiement').count(), 1)
+
+        # Soldes recalculés une seule fois, à la fin, pour les crédits touchés
+        recalcul.assert_called_once()
+
+    def test_vue_import(self):
+        self.client.force_login(self.agent)
+        fichier = SimpleUploadedFile('releve.csv', self.CONTENU.encode('utf-8'), content_type='text/csv')
+
+        response = self.client.post(
+            reverse('gestion_credits:import_reglements'), {'fichier': fichier, 'taille_lot': 1000}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['rapport']['importes'], 2)
+        self.assertEqual(len(response.context['rejets']), 4)
+        self.credit.refresh_from_db()
+        self.assertEqual(self.credit.reste_a_payer, Decimal('500.00'))
+
+
+@override_settings(JOURNAL_ASYNCHRONE=False)
+class ExportsTests(TestCase):
+    """Exports CSV en flux et journalisation"""
+
+    def setUp(self):
+        self.agent = creer_portefeuille(nombre_clients=3, reglements_par_credit=2)
+        self.client.force_login(self.agent)
+
+    def telecharger(self, nom_vue, params=None):
+        response = self.client.get(reverse(f'gestion_credits:{nom_vue}'), params or {})
+        self.assertEqual(response.status_code, 200)
+        contenu = b''.join(response.streaming_content).decode('utf-8-sig')
+        return [ligne.split(';') for ligne in contenu.splitlines()]
+
+    def test_export_credits_avec_filtres(self):
+        lignes = self.telecharger('credit_export', {'type': 'unique'})
+
+        self.assertEqual(lignes[0][0], 'Numéro de police')
+        self.assertEqual([ligne[0] for ligne in lignes[1:]], ['POL-0002', 'POL-0000'])
+        self.assertEqual(lignes[1][4], 'Crédit unique avec date ou durée')
+
+        journal = ActionLog.objects.get(type_action='export_donnees')
+        self.assertEqual(journal.donnees_apres['lignes'], 2)
+        self.assertEqual(journal.donnees_apres['filtres'], {'type': 'unique'})
+
+    def test_exports_reglements_cheques_historique(self):
+        self.assertEqual(len(self.telecharger('reglement_export')), 1 + 6)
+        self.assertEqual(len(self.telecharger('reglement_export', {'mode_paiement': 'cheque'})), 1 + 3)
+        self.assertEqual(len(self.telecharger('cheque_garantie_export', {'police': 'POL-0001'})), 1 + 4)
+
+        lignes = self.telecharger('historique_export', {'type_action': 'export_donnees'})
+        self.assertEqual(len(lignes), 1 + 3)
+        self.assertEqual(ActionLog.objects.filter(type_action='export_donnees').count(), 4)
+
+    def test_parcours_par_pages(self):
+        from .exports import EXPORT_REGLEMENTS, parcourir
+
+        lignes = list(parcourir(Reglement.objects.all(), EXPORT_REGLEMENTS, taille_page=4))
+        self.assertEqual(len(lignes), 6)
+        self.assertEqual(len({(ligne[1], ligne[0], ligne[4]) for ligne in lignes}), 6)
+
+
+class IndexAlertesTests(TestCase):
+    """Index matérialisé des alertes et page des alertes"""
+
+    def setUp(self):
+        self.agent = creer_portefeuille(nombre_clients=3, reglements_par_credit=1)
+        self.client.force_login(self.agent)
+
+    def test_index_tenu_a_jour(self):
+        # 4 chèques par crédit + 1 alerte par client
+        self.assertEqual(IndexAlerte.objects.filter(source='cheque_garantie').count(), 12)
+        self.assertEqual(IndexAlerte.objects.filter(source='alerte').count(), 3)
+
+        cheque = ChequeGarantie.objects.filter(date_echeance__gt=date.today() + timedelta(days=10)).first()
+        ligne = IndexAlerte.objects.get(source='cheque_garantie', objet_id=cheque.pk)
+        self.assertEqual(ligne.urgence, 'informatif')
+
+        cheque.date_echeance = date.today()
+        cheque.save()
+        ligne.refresh_from_db()
+        self.assertEqual(ligne.urgence, 'critique')
+
+        cheque.delete()
+        self.assertFalse(IndexAlerte.objects.filter(source='cheque_garantie', objet_id=cheque.pk).exists())
+
+    def test_migration_sans_code_de_l_application(self):
+        migration = importlib.import_module('gestion_credits.migrations.0008_index_alertes')
+        champs = ('source', 'objet_id', 'type_alerte', 'statut', 'niveau', 'date_echeance', 'montant', 'libelle',
+                  'reference', 'banque', 'cle_recherche', 'credit_id', 'client_id', 'agent_id')
+        lignes = sorted(IndexAlerte.objects.values_list(*champs))
+        IndexAlerte.objects.all().delete()
+
+        with mock.patch('gestion_credits.alertes.indexer', side_effect=AssertionError):
+            migration.construire_index(django_apps, None)
+
+        self.assertEqual(sorted(IndexAlerte.objects.values_list(*champs)), lignes)
+
+    def test_bascule_quotidienne(self):
+        IndexAlerte.objects.update(niveau=IndexAlerte.NIVEAU_A_VENIR)
+
+        call_command('rafraichir_alertes', stdout=StringIO())
+        self.assertEqual(IndexAlerte.objects.filter(niveau=IndexAlerte.NIVEAU_CRITIQUE).count(), 9)
+
+        # Trois jours plus tard, les chèques à J+3 deviennent critiques
+        basculer_niveaux(date.today() + timedelta(days=3))
+        self.assertEqual(IndexAlerte.objects.filter(niveau=IndexAlerte.NIVEAU_CRITIQUE).count(), 12)
+
+    def test_liste_des_alertes(self):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('gestion_credits:alerte_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_alertes'], 15)
+        # 4 chèques par crédit : J-5 et J0 critiques, J+3 important, J+20 informatif (+ 3 alertes du jour)
+        self.assertEqual(response.context['alertes_critiques'], 9)
+        self.assertEqual(response.context['alertes_importantes'], 3)
+        self.assertEqual(response.context['alertes_informatives'], 3)
+        self.assertEqual(response.context['montant_total_urgent'], Decimal('3000.00'))
+        self.assertLessEqual(len(requetes), 12)
+
+        response = self.client.get(reverse('gestion_credits:alerte_list'), {'type': 'cheque_garantie', 'urgence': 'critique', 'search': 'pol-0001'})
+        self.assertEqual(response.context['total_alertes'], 2)
+        self.assertEqual([alerte.credit.numero_police for alerte in response.context['page_obj']], ['POL-0001'] * 2)
+
+        for alerte in Alerte.objects.all():
+            alerte.statut = 'traitee'
+            alerte.save()
+        response = self.client.get(reverse('gestion_credits:alerte_list'), {'statut': 'traitee'})
+        self.assertEqual(response.context['total_alertes'], 3)
+
+
+class ChequeReglementTests(TestCase):
+    """Rattachement des règlements par chèque à leur chèque de garantie"""
+
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent', password='secret')
+        client = Client.objects.create(nom='Alaoui', prenom='Sara', cin='AB123', telephone='0611111111')
+        self.credit = Credit.objects.create(
+            client=client, numero_police='POL-1', type_credit='divise',
+            montant_total=Decimal('5000.00'), agent=self.agent,
+        )
+
+    def creer_effet(self, numero, statut='non_verse', montant='100.00', lier=False):
+        cheque = ChequeGarantie.objects.create(
+            credit=self.credit, numero=numero, montant=Decimal(montant), banque='BMCE',
+            date_emission=date.today(), date_echeance=date.today(),
+        )
+        reglement = Reglement.objects.create(
+            credit=self.credit, montant=Decimal(montant), date_reglement=date.today(),
+            mode_paiement='cheque', statut=statut, commentaire=f'Effet {numero} - BMCE - ',
+            cheque_garantie=cheque if lier else None, agent=self.agent,
+        )
+        return cheque, reglement
+
+    def test_rapprochement_par_numero_exact(self):
+        cheque_1, reglement_1 = self.creer_effet('CH1', statut='verse')
+        cheque_12, reglement_12 = self.creer_effet('CH12')
+        # Deux chèques identiques sur le même crédit, un seul règlement : ambigu
+        ChequeGarantie.objects.create(
+            credit=self.credit, numero='CH7', montant=Decimal('70.00'), banque='BMCE',
+            date_emission=date.today(), date_echeance=date.today(),
+        )
+        self.creer_effet('CH7', montant='70.00')
+
+        sortie = StringIO()
+        call_command('rapprocher_cheques', stdout=sortie)
+
+        reglement_1.refresh_from_db()
+        reglement_12.refresh_from_db()
+        self.assertEqual(reglement_1.cheque_garantie, cheque_1)
+        self.assertEqual(reglement_12.cheque_garantie, cheque_12)
+        self.assertIn('2 règlement(s) rattaché(s), 1 ambigu(s)', sortie.getvalue())
+        self.assertIn('effet CH7', sortie.getvalue())
+
+    def test_rapprochement_par_montant_et_echeance(self):
+        cheque, _ = self.creer_effet('CH3', montant='300.00')
+        libre = ChequeGarantie.objects.create(
+            credit=self.credit, numero='CH4', montant=Decimal('400.00'), banque='BMCE',
+            date_emission=date.today(), date_echeance=date.today(),
+        )
+        # Commentaire libre (sans numéro) ou numéro mal saisi : rattachés par montant et échéance
+        saisi = Reglement.objects.create(
+            credit=self.credit, montant=Decimal('400.00'), date_reglement=date.today(), mode_paiement='cheque',
+            commentaire='Paiement par chèque', agent=self.agent,
+        )
+        mal_saisi = Reglement.objects.create(
+            credit=self.credit, montant=Decimal('300.00'), date_reglement=date.today(), mode_paiement='cheque',
+            commentaire='Effet CH 3 - BMCE - ', agent=self.agent,
+        )
+        cheque_5 = ChequeGarantie.objects.create(
+            credit=self.credit, numero='CH5', montant=Decimal('500.00'), banque='BMCE',
+            date_emission=date.today(), date_echeance=date.today(),
+        )
+        numero_errone = Reglement.objects.create(
+            credit=self.credit, montant=Decimal('500.00'), date_reglement=date.today(), mode_paiement='cheque',
+            commentaire='Effet CH 5 - BMCE - ', agent=self.agent,
+        )
+        orphelin = Reglement.objects.create(
+            credit=self.credit, montant=Decimal('999.00'), date_reglement=date.today(), mode_paiement='cheque',
+            commentaire='Effet CH9 - BMCE - ', agent=self.agent,
+        )
+
+        sortie = StringIO()
+        call_command('rapprocher_cheques', stdout=sortie)
+
+        saisi.refresh_from_db()
+        mal_saisi.refresh_from_db()
+        numero_errone.refresh_from_db()
+        self.assertEqual(saisi.cheque_garantie, libre)
+        self.assertEqual(numero_errone.cheque_garantie, cheque_5)
+        # CH3 est déjà rattaché par son numéro : le numéro mal saisi n'a plus de chèque libre
+        self.assertIsNone(mal_saisi.cheque_garantie)
+        self.assertEqual(cheque.reglement.commentaire, 'Effet CH3 - BMCE - ')
+        self.assertIn('3 règlement(s) rattaché(s), 0 ambigu(s), 2 sans chèque correspondant', sortie.getvalue())
+        self.assertIn(f'Règlement {orphelin.pk} (effet CH9)', sortie.getvalue())
+
+    def test_migration_sans_code_de_l_application(self):
+        migration = importlib.import_module('gestion_credits.migrations.0009_reglement_cheque_garantie')
+        cheque, reglement = self.creer_effet('CH1')
+        libre = ChequeGarantie.objects.create(
+            credit=self.credit, numero='CH2', montant=Decimal('250.00'), banque='BMCE',
+            date_emission=date.today(), date_echeance=date.today(),
+        )
+        saisi = Reglement.objects.create(
+            credit=self.credit, montant=Decimal('250.00'), date_reglement=date.today(), mode_paiement='cheque',
+            commentaire='Paiement par chèque', agent=self.agent,
+        )
+
+        with mock.patch('gestion_credits.rapprochement.rapprocher_cheques', side_effect=AssertionError):
+            migration.rattacher_cheques(django_apps, None)
+
+        reglement.refresh_from_db()
+        saisi.refresh_from_db()
+        self.assertEqual((reglement.cheque_garantie, saisi.cheque_garantie), (cheque, libre))
+
+    def test_statut_des_cheques_dans_le_detail(self):
+        cheque_1, _ = self.creer_effet('CH1', statut='verse', lier=True)
+        cheque_12, _ = self.creer_effet('CH12', lier=True)
+        self.client.force_login(self.agent)
+
+        for nom_vue, kwargs in (('credit_detail', {'pk': self.credit.pk}),
+                                ('echeance_create_for_credit', {'credit_id': self.credit.pk})):
+            response = self.client.get(reverse(f'gestion_credits:{nom_vue}', kwargs=kwargs))
+            self.assertEqual(response.context['cheques_verses'], [cheque_1])
+            self.assertEqual(response.context['cheques_non_verses'], [cheque_12])
+
+    def test_paiement_especes_d_un_cheque(self):
+        cheque, reglement = self.creer_effet('CH1', lier=True)
+        self.client.force_login(self.agent)
+
+        self.client.post(reverse('gestion_credits:payer_cheque_especes', kwargs={'credit_id': self.credit.pk}), {
+            'cheque_id': cheque.pk, 'montant': '100.00', 'date_paiement': date.today().isoformat(),
+        })
+
+        reglement.refresh_from_db()
+        self.assertEqual(reglement.mode_paiement, 'especes')
+        self.assertIsNone(reglement.cheque_garantie)
+        self.assertFalse(ChequeGarantie.objects.filter(pk=cheque.pk).exists())
+
+
+@override_settings(TABLEAU_CACHE='default')
+class PlansDeRequeteTests(TestCase):
+    """Les requêtes des pages principales passent par un index (EXPLAIN sur un jeu de données)"""
+
+    # Tables qui ne doivent jamais être parcourues en entier
+    TABLES_INDEXEES = [
+        modele._meta.db_table for modele in (Reglement, ChequeGarantie, Echeance, Alerte, IndexAlerte)
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.agent = creer_portefeuille(nombre_clients=40, reglements_par_credit=4)
+        today = date.today()
+        Echeance.objects.bulk_create([
+            Echeance(
+                credit=credit, numero_partie=numero, montant=Decimal('1000.00'),
+                date_echeance=today + timedelta(days=30 * (numero - 2)),
+                date_rappel=today + timedelta(days=30 * (numero - 2) - 3),
+                est_traitee=numero == 1,
+            )
+            for credit in Credit.objects.all() for numero in range(1, 5)
+        ])
+        # Règlements par chèque rattachés à leur chèque de garantie, comme après rapprochement
+        for credit in Credit.objects.all():
+            cheques = credit.cheques_garantie.order_by('pk')
+            for reglement, cheque in zip(credit.reglements.filter(mode_paiement='cheque'), cheques):
+                Reglement.objects.filter(pk=reglement.pk).update(cheque_garantie=cheque)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.client.force_login(self.agent)
+
+    def parcours_complets(self, sql):
+        """Tables surveillées lues en entier par la requête, d'après le plan d'exécution"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                # ex. « SCAN gestion_credits_reglement » (sans index) ou
+                # « SCAN gestion_credits_reglement USING COVERING INDEX ... »
+                details = [ligne[-1] for ligne in cursor.fetchall()]
+                return [
+                    table for table in self.TABLES_INDEXEES
+                    for detail in details
+                    if detail.split(' ')[:2] == ['SCAN', table] and 'INDEX' not in detail
+                ]
+            cursor.execute(f'EXPLAIN {sql}')
+            colonnes = [colonne[0] for colonne in cursor.description]
+            lignes = [dict(zip(colonnes, ligne)) for ligne in cursor.fetchall()]
+            return [ligne['table'] for ligne in lignes if ligne['table'] in self.TABLES_INDEXEES and ligne['type'] == 'ALL']
+
+    def verifier_plans(self, url, params=None):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        for requete in requetes:
+            if requete['sql'].startswith('SELECT'):
+                self.assertEqual(self.parcours_complets(requete['sql']), [], requete['sql'])
+
+    def test_tableau_de_bord(self):
+        self.verifier_plans(reverse('gestion_credits:dashboard'))
+        self.verifier_plans(reverse('gestion_credits:dashboard_stats'))
+
+    def test_liste_des_alertes(self):
+        self.verifier_plans(reverse('gestion_credits:alerte_list'))
+        self.verifier_plans(reverse('gestion_credits:alerte_list'), {'urgence': 'critique', 'type': 'cheque_garantie'})
+
+    def test_detail_credit(self):
+        credit = Credit.objects.order_by('pk').last()
+        self.verifier_plans(reverse('gestion_credits:credit_detail', kwargs={'pk': credit.pk}))
+
+
+class RechercheTests(TestCase):
+    """Recherche plein texte (clients, crédits, historique) et recherche globale"""
+
+    def setUp(self):
+        self.agent = creer_portefeuille(nombre_clients=3, reglements_par_credit=1)
+        self.client_haddou = Client.objects.create(
+            nom="Aït-Ben Haddou", prenom="M'hamed", cin='JK4455', telephone='0655443322'
+        )
+        self.credit_haddou = Credit.objects.create(
+            client=self.client_haddou, numero_police='POL-2024-777', type_credit='unique',
+            montant_total=Decimal('8000.00'), description='Équipement agricole', agent=self.agent,
+        )
+        ActionLog.objects.create(
+            type_action='client_contact', description='Appel pour relance du règlement',
+            agent=self.agent, client=self.client_haddou, credit=self.credit_haddou,
+        )
+        self.client.force_login(self.agent)
+
+    def ids(self, source, recherche_saisie):
+        return sorted(documents.objet_id for documents in documents_correspondants(recherche_saisie, [source]))
+
+    def test_prefixes_accents_et_noms_composes(self):
+        if connection.vendor == 'sqlite':
+            self.assertEqual(moteur_recherche(), 'fts5')
+        for saisie in ('ait ben', 'AÏT', 'aitbenhaddou', 'mhamed', "M'hamed", 'hadd', 'jk44', '0655'):
+            self.assertEqual(self.ids('client', saisie), [self.client_haddou.pk], saisie)
+        self.assertEqual(self.ids('credit', 'pol-2024'), [self.credit_haddou.pk])
+        self.assertEqual(self.ids('credit', 'equipement haddou'), [self.credit_haddou.pk])
+        self.assertEqual(self.ids('client', 'haddou benali'), [])
+        self.assertEqual(self.ids('client', '--'), [])
+
+    def test_migration_sans_code_de_l_application(self):
+        migration = importlib.import_module('gestion_credits.migrations.0011_recherche_plein_texte')
+        champs = ('source', 'objet_id', 'titre', 'detail', 'texte')
+        documents = sorted(DocumentRecherche.objects.values_list(*champs))
+        DocumentRecherche.objects.all().delete()
+
+        with mock.patch('gestion_credits.recherche.indexer', side_effect=AssertionError):
+            migration.construire_documents(django_apps, None)
+
+        # Même format qu'aujourd'hui ; la table FTS5 est tenue par ses triggers
+        self.assertEqual(sorted(DocumentRecherche.objects.values_list(*champs)), documents)
+        self.assertEqual(self.ids('client', 'mhamed'), [self.client_haddou.pk])
+
+    def test_documents_tenus_a_jour(self):
+        self.client_haddou.nom = 'Ouazzani'
+        self.client_haddou.save()
+        self.assertEqual(self.ids('credit', 'ouazz'), [self.credit_haddou.pk])
+        self.assertEqual(self.ids('action', 'ouazz'), list(
+            ActionLog.objects.filter(client=self.client_haddou).values_list('pk', flat=True)
+        ))
+        self.assertEqual(self.ids('credit', 'haddou'), [])
+
+        self.credit_haddou.delete()
+        self.assertEqual(self.ids('credit', 'pol-2024'), [])
+
+    def test_listes_filtrees(self):
+        response = self.client.get(reverse('gestion_credits:client_list'), {'search': 'mhamed'})
+        self.assertEqual([client.pk for client in response.context['page_obj']], [self.client_haddou.pk])
+
+        response = self.client.get(reverse('gestion_credits:credit_list'), {'search': 'Haddou'})
+        self.assertEqual([credit.pk for credit in response.context['page_obj']], [self.credit_haddou.pk])
+
+        response = self.client.get(reverse('gestion_credits:historique_actions'), {'search': 'relance'})
+        self.assertEqual(response.context['total_actions'], 1)
+
+    def test_recherche_globale(self):
+        response = self.client.get(reverse('gestion_credits:recherche_globale'), {'q': 'haddou'})
+        resultats = response.json()['resultats']
+        self.assertEqual(
+            sorted(resultat['source'] for resultat in resultats), ['action', 'client', 'credit']
+        )
+        action = next(resultat for resultat in resultats if resultat['source'] == 'action')
+        self.assertEqual(action['url'], reverse('gestion_credits:credit_detail', kwargs={'pk': self.credit_haddou.pk}))
+
+        response = self.client.get(reverse('gestion_credits:recherche_globale'), {'q': 'haddou', 'source': 'client'})
+        self.assertEqual([resultat['id'] for resultat in response.json()['resultats']], [self.client_haddou.pk])
+
+    def test_reconstruction(self):
+        DocumentRecherche.objects.all().delete()
+        DocumentRecherche.objects.create(source='client', objet_id=999999, titre='Orphelin', texte='orphelin')
+
+        sortie = StringIO()
+        call_command('reconstruire_recherche', stdout=sortie)
+
+        self.assertIn('document(s) indexé(s)', sortie.getvalue())
+        self.assertFalse(DocumentRecherche.objects.filter(objet_id=999999).exists())
+        self.assertEqual(self.ids('client', 'haddou'), [self.client_haddou.pk])
+
+
+class PaginationCurseurTests(TestCase):
+    """Pagination par curseur de l'historique, des clients et des règlements"""
+
+    def setUp(self):
+        self.agent = creer_portefeuille(nombre_clients=25, reglements_par_credit=5)
+        ActionLog.objects.bulk_create([
+            ActionLog(type_action='client_contact', description=f'Contact {i}', agent=self.agent)
+            for i in range(60)
+        ])
+        self.client.force_login(self.agent)
+
+    def parcourir(self, nom_vue, params=None):
+        """Suivre les liens « suivant » puis « précédent » ; retourne (pages aller, pages retour)"""
+        params = dict(params or {})
+        aller = []
+        curseur = None
+        while True:
+            response = self.client.get(reverse(f'gestion_credits:{nom_vue}'), {**params, 'curseur': curseur or ''})
+            page = response.context['page_obj']
+            aller.append([objet.pk for objet in page])
+            if not page.has_next:
+                break
+            curseur = page.curseur_suivant
+
+        retour = [aller[-1]]
+        while page.has_previous:
+            response = self.client.get(reverse(f'gestion_credits:{nom_vue}'), {**params, 'curseur': page.curseur_precedent})
+            page = response.context['page_obj']
+            retour.append([objet.pk for objet in page])
+        return aller, retour[::-1]
+
+    def test_historique_par_date_et_id(self):
+        # Plusieurs actions à la même date : l'id départage
+        ActionLog.objects.update(date_action=timezone.now())
+        attendu = list(ActionLog.objects.order_by('-date_action', '-id').values_list('pk', flat=True))
+
+        aller, retour = self.parcourir('historique_actions')
+
+        self.assertEqual(sum(aller, []), attendu)
+        self.assertEqual(retour, aller)
+        self.assertEqual([len(page) for page in aller[:-1]], [25] * (len(aller) - 1))
+
+    def test_clients_et_reglements(self):
+        aller, retour = self.parcourir('client_list')
+        self.assertEqual(sum(aller, []), list(Client.objects.order_by('nom', 'prenom', 'id').values_list('pk', flat=True)))
+        self.assertEqual(len(aller), 2)
+        self.assertEqual(retour, aller)
+
+        aller, retour = self.parcourir('reglement_list', {'mode_paiement': 'cheque'})
+        attendu = Reglement.objects.filter(mode_paiement='cheque').order_by('-date_reglement', '-id')
+        self.assertEqual(sum(aller, []), list(attendu.values_list('pk', flat=True)))
+        self.assertEqual(len(aller), 2)
+        self.assertEqual(retour, aller)
+
+    def test_sans_count_ni_offset(self):
+        response = self.client.get(reverse('gestion_credits:historique_actions'))
+        curseur = response.context['page_obj'].curseur_suivant
+
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('gestion_credits:historique_actions'), {'curseur': curseur})
+        self.assertEqual(response.status_code, 200)
+        sql = [requete['sql'] for requete in requetes]
+        self.assertFalse([requete for requete in sql if 'OFFSET' in requete])
+        # Total servi par le cache
+        self.assertFalse([requete for requete in sql if requete.startswith('SELECT COUNT(*)') and 'actionlog' in requete and 'date_action' not in requete])
+
+    def test_curseur_invalide(self):
+        response = self.client.get(reverse('gestion_credits:client_list'), {'curseur': 'n0n-valide'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous)
+
+
+class JournalActionsTests(TransactionTestCase):
+    """Écriture du journal des actions par lots en arrière-plan"""
+
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent', password='secret')
+        self.ecrivain = journal.EcrivainJournal(taille_lot=3, delai_ms=50)
+        self.addCleanup(self.ecrivain.arreter)
+
+    def action(self, numero):
+        return ActionLog(type_action='client_contact', description=f'Contact {numero}', agent=self.agent)
+
+    def test_ecriture_par_lots(self):
+        lots = []
+        ecrire = journal.ecrire
+
+        def ecrire_lot(actions):
+            nombre = ecrire(actions)
+            lots.append(len(actions))
+            return nombre
+
+        with mock.patch.object(journal, 'ecrire', ecrire_lot):
+            for numero in range(4):
+                self.ecrivain.ajouter(self.action(numero))
+            limite = time.monotonic() + 5
+            while sum(lots) < 4 and time.monotonic() < limite:
+                time.sleep(0.01)
+
+        # Un lot complet de 3, puis le dernier à l'expiration du délai
+        self.assertEqual(lots, [3, 1])
+        self.assertEqual(ActionLog.objects.count(), 4)
+        self.assertEqual(documents_correspondants('contact', ['action']).count(), 4)
+
+    def test_ecriture_synchrone_apres_arret(self):
+        self.ecrivain.ajouter(self.action(1))
+        self.ecrivain.arreter()
+        self.assertEqual(ActionLog.objects.count(), 1)
+
+        self.ecrivain.ajouter(self.action(2))
+        self.assertEqual(ActionLog.objects.count(), 2)
+
+    def bulk_create_indisponible(self, echecs):
+        """bulk_create de ActionLog levant OperationalError lors des `echecs` premiers appels"""
+        bulk_create = ActionLog.objects.bulk_create
+        appels = []
+
+        def remplacement(*args, **kwargs):
+            appels.append(1)
+            if len(appels) <= echecs:
+                raise OperationalError('database is locked')
+            return bulk_create(*args, **kwargs)
+
+        return mock.patch.object(ActionLog.objects, 'bulk_create', remplacement)
+
+    @mock.patch.object(journal, 'ATTENTE_INITIALE', 0)
+    def test_base_momentanement_indisponible(self):
+        with self.bulk_create_indisponible(2):
+            self.assertEqual(journal.ecrire([self.action(1), self.action(2)]), 2)
+        self.assertEqual(ActionLog.objects.count(), 2)
+
+        with self.bulk_create_indisponible(journal.TENTATIVES), self.assertRaises(OperationalError):
+            journal.ecrire([self.action(3)])
+        self.assertEqual(ActionLog.objects.count(), 2)
+
+    @mock.patch.object(journal, 'ATTENTE_INITIALE', 0)
+    @mock.patch.object(journal, 'ATTENTE_MAX', 0.01)
+    def test_lot_conserve_par_le_fil(self):
+        ecrites = []
+        ecrire = journal.ecrire
+
+        def ecrire_lot(actions):
+            nombre = ecrire(actions)
+            ecrites.append(nombre)
+            return nombre
+
+        # Plus d'échecs que d'essais par écriture : le fil garde le lot et le réessaie
+        with self.bulk_create_indisponible(journal.TENTATIVES + 2), mock.patch.object(journal, 'ecrire', ecrire_lot):
+            self.ecrivain.ajouter(self.action(1))
+            limite = time.monotonic() + 5
+            while not ecrites and time.monotonic() < limite:
+                time.sleep(0.01)
+
+        self.assertEqual(list(ActionLog.objects.values_list('description', flat=True)), ['Contact 1'])
+
+    def test_transaction_annulee(self):
+        with mock.patch.object(journal, 'ecrivain', self.ecrivain):
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    journal.journaliser(type_action='client_contact', description='Annulée', agent=self.agent)
+                    raise ValueError
+            with transaction.atomic():
+                journal.journaliser(type_action='client_contact', description='Validée', agent=self.agent)
+            self.ecrivain.arreter()
+
+        self.assertEqual(list(ActionLog.objects.values_list('description', flat=True)), ['Validée'])
+
+
+@override_settings(JOURNAL_ASYNCHRONE=False)
+class AuditModificationsTests(TestCase):
+    """Audit automatique des modifications et traçabilité des requêtes"""
+
+    def setUp(self):
+        self.agent = creer_portefeuille(nombre_clients=1, reglements_par_credit=1)
+        self.client.force_login(self.agent)
+        self.client_credit = Client.objects.get()
+
+    def test_modification_client(self):
+        donnees = {
+            'nom': self.client_credit.nom, 'prenom': self.client_credit.prenom,
+            'cin': self.client_credit.cin, 'telephone': '0699999999', 'email': '', 'adresse': '',
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('gestion_credits:client_update', args=[self.client_credit.pk]), donnees,
+                HTTP_USER_AGENT='Navigateur de test',
+            )
+
+        action = ActionLog.objects.get()
+        self.assertEqual(action.type_action, 'client_modification')
+        # Seul le champ modifié est retenu (email et adresse vides restent inchangés)
+        self.assertEqual(action.donnees_avant, {'telephone': '0600000000'})
+        self.assertEqual(action.donnees_apres, {'telephone': '0699999999'})
+        self.assertEqual(action.ip_adresse, '127.0.0.1')
+        self.assertEqual(action.user_agent, 'Navigateur de test')
+        self.assertEqual(action.session_id, self.client.session.session_key)
+
+    def test_modification_non_journalisee(self):
+        reglement = Reglement.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('gestion_credits:reglement_update', args=[reglement.pk]), {
+                'montant': '150.00', 'date_reglement': reglement.date_reglement.isoformat(),
+                'mode_paiement': 'especes', 'commentaire': '',
+            })
+
+        action = ActionLog.objects.get()
+        self.assertEqual(action.type_action, 'modification_donnees')
+        self.assertEqual(action.agent, self.agent)
+        self.assertEqual(action.donnees_avant, {f'reglement#{reglement.pk}.montant': '100.00'})
+        self.assertEqual(action.donnees_apres, {f'reglement#{reglement.pk}.montant': '150.00'})
+
+    def test_hors_requete(self):
+        Client.objects.create(nom='Hors', prenom='Requete', cin='HR1', telephone='0611112222')
+        self.assertFalse(ActionLog.objects.exists())
+
+
+class ArchivesActionsTests(TestCase):
+    """Archivage de l'historique des actions et consultation transparente de l'archive"""
+
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent', password='secret')
+        maintenant = timezone.now()
+        for jours, nombre, statut in ((600, 3, 'succes'), (455, 2, 'echec'), (0, 4, 'succes')):
+            ActionLog.objects.bulk_create([
+                ActionLog(type_action='client_contact', description=f'Contact {jours}-{i}', statut=statut, agent=self.agent)
+                for i in range(nombre)
+            ])
+            ActionLog.objects.filter(date_action__gte=maintenant).update(date_action=maintenant - timedelta(days=jours))
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_archivage_table(self):
+        sortie = StringIO()
+        call_command('archiver_actions', '--horizon', '12', stdout=sortie)
+
+        self.assertIn('5 action(s)', sortie.getvalue())
+        self.assertEqual(ActionLog.objects.count(), 4)
+        self.assertEqual(ActionArchivee.objects.count(), 5)
+        self.assertEqual(ActionArchivee.objects.filter(statut='echec').count(), 2)
+        self.assertEqual(sum(ResumeActionsMois.objects.values_list('nombre', flat=True)), 5)
+        # Limite de l'archive : fin du dernier mois archivé contenant des actions
+        dernier_mois = timezone.localdate(timezone.now() - timedelta(days=455)).replace(day=1)
+        self.assertEqual(limite_archive(), mois_suivant(dernier_mois))
+        self.assertLessEqual(limite_archive(), limite_horizon(12))
+
+        # Un second passage n'archive plus rien
+        call_command('archiver_actions', '--horizon', '12', stdout=StringIO())
+        self.assertEqual(ActionArchivee.objects.count(), 5)
+
+    def test_limite_lue_en_base(self):
+        self.assertIsNone(limite_archive())
+        # Archivage fait par un autre processus (la commande) : aucun cache local ne doit masquer le mois
+        ResumeActionsMois.objects.create(
+            mois=date(2024, 1, 1), type_action='client_contact', statut='succes', agent=self.agent, nombre=1,
+        )
+        self.assertEqual(limite_archive(), date(2024, 2, 1))
+
+    def test_archivage_fichiers(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            call_command('archiver_actions', '--horizon', '12', '--fichiers', dossier, stdout=StringIO())
+            lignes = []
+            for nom in sorted(os.listdir(dossier)):
+                with gzip.open(os.path.join(dossier, nom), 'rt', encoding='utf-8') as fichier:
+                    lignes.extend(json.loads(ligne) for ligne in fichier)
+
+        self.assertEqual(len(lignes), 5)
+        self.assertFalse(ActionArchivee.objects.exists())
+        self.assertEqual(ActionLog.objects.count(), 4)
+        self.assertEqual(sum(ResumeActionsMois.objects.values_list('nombre', flat=True)), 5)
+
+    def test_historique_avec_archives(self):
+        call_command('archiver_actions', '--horizon', '12', stdout=StringIO())
+        self.client.force_login(self.agent)
+        url = reverse('gestion_credits:historique_actions')
+
+        response = self.client.get(url)
+        self.assertFalse(response.context['avec_archives'])
+        self.assertEqual(len(response.context['page_obj']), 4)
+        self.assertEqual(response.context['total_actions'], 4)
+
+        debut = (date.today() - timedelta(days=700)).isoformat()
+        response = self.client.get(url, {'date_debut': debut})
+        self.assertTrue(response.context['avec_archives'])
+        self.assertEqual(response.context['total_actions'], 9)
+        self.assertEqual(
+            {ligne['statut']: ligne['count'] for ligne in response.context['repartition_statuts']},
+            {'succes': 7, 'echec': 2},
+        )
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 4)
+
+        # Les actions archivées viennent à la suite des actions courantes
+        response = self.client.get(url, {'date_debut': debut, 'curseur': page.curseur_suivant})
+        page = response.context['page_obj']
+        self.assertEqual([action.statut for action in page], ['echec', 'echec', 'succes', 'succes', 'succes'])
+        self.assertFalse(page.has_next)
+        self.assertTrue(page.has_previous)
+
+    def test_export_avec_archives(self):
+        call_command('archiver_actions', '--horizon', '12', stdout=StringIO())
+        self.client.force_login(self.agent)
+        url = reverse('gestion_credits:historique_export')
+
+        def statuts(params):
+            response = self.client.get(url, {'type_action': 'client_contact', **params})
+            contenu = b''.join(response.streaming_content).decode('utf-8-sig')
+            return [ligne.split(';')[2] for ligne in contenu.splitlines()[1:]]
+
+        self.assertEqual(statuts({}), ['Succès'] * 4)
+        # Comme sur la page, les actions archivées suivent les actions courantes
+        debut = (date.today() - timedelta(days=700)).isoformat()
+        self.assertEqual(statuts({'date_debut': debut}), ['Succès'] * 4 + ['Échec'] * 2 + ['Succès'] * 3)
+
+
+class CumulsJournaliersTests(TestCase):
+    """Cumuls journaliers (StatJournaliere) tenus par les signaux et recalculés chaque nuit"""
+
+    def setUp(self):
+        self.agent = creer_portefeuille()
+
+    def cumuls(self):
+        return list(
+            StatJournaliere.objects.exclude(nombre=0, montant=0)
+            .order_by('categorie', 'jour', 'agent_id', 'mode', 'statut')
+            .values_list('categorie', 'jour', 'agent_id', 'mode', 'statut', 'nombre', 'montant')
+        )
+
+    def test_tenus_a_jour_par_les_signaux(self):
+        reglement = Reglement.objects.filter(mode_paiement='especes').first()
+        reglement.montant = Decimal('250.00')
+        reglement.date_reglement = date.today() - timedelta(days=40)
+        reglement.save()
+        Reglement.objects.filter(mode_paiement='cheque').first().delete()
+        Credit.objects.exclude(pk=reglement.credit_id).last().delete()
+        ActionLog.objects.create(type_action='client_contact', description='Appel', agent=self.agent)
+        journal.ecrire([ActionLog(type_action='client_contact', description='Relance', statut='echec')])
+
+        incrementaux = self.cumuls()
+        call_command('cumuler_statistiques', '--tout', stdout=StringIO())
+        self.assertEqual(incrementaux, self.cumuls())
+        cumul = StatJournaliere.objects.get(categorie='reglement', jour=date.today() - timedelta(days=40))
+        self.assertEqual((cumul.nombre, cumul.montant), (1, Decimal('250.00')))
+
+    def test_migration_sans_code_de_l_application(self):
+        migration = importlib.import_module('gestion_credits.migrations.0014_stat_journaliere')
+        cumuls = self.cumuls()
+        StatJournaliere.objects.all().delete()
+
+        with mock.patch('gestion_credits.cumuls.reconstruire_cumuls', side_effect=AssertionError):
+            migration.construire_cumuls(django_apps, None)
+
+        self.assertEqual(self.cumuls(), cumuls)
+
+    def test_premiere_ecriture_concurrente(self):
+        cle = ('reglement', date.today(), self.agent.pk, 'virement', '')
+        StatJournaliere.objects.create(
+            categorie='reglement', jour=date.today(), agent=self.agent, mode='virement', statut='',
+            nombre=2, montant=Decimal('50.00'),
+        )
+        update = QuerySet.update
+        appels = []
+
+        def update_concurrent(queryset, **valeurs):
+            appels.append(valeurs)
+            # La première mise à jour ne voit pas encore le cumul créé par une autre transaction
+            return 0 if len(appels) == 1 else update(queryset, **valeurs)
+
+        with mock.patch.object(QuerySet, 'update', update_concurrent):
+            cumuls.ajuster({cle: (1, Decimal('100.00'))})
+        cumul = StatJournaliere.objects.get(categorie='reglement', mode='virement')
+        self.assertEqual((cumul.nombre, cumul.montant), (3, Decimal('150.00')))
+
+    def test_commande_nocturne(self):
+        # Écriture hors signaux : les cumuls des jours passés ne la voient pas
+        Reglement.objects.filter(mode_paiement='especes').update(montant=Decimal('200.00'))
+        self.assertEqual(construire_contexte_dashboard(date.today())['total_paiements_especes'], Decimal('900.00'))
+
+        sortie = StringIO()
+        call_command('cumuler_statistiques', '--jours', '5', stdout=sortie)
+        self.assertIn('cumul(s) journalier(s)', sortie.getvalue())
+        context = construire_contexte_dashboard(date.today())
+        self.assertEqual(context['total_paiements_especes'], Decimal('1200.00'))
+        self.assertEqual(context['agents_performance'][0].nb_paiements, 12)
+
+    def test_repartitions_de_l_historique(self):
+        ActionLog.objects.create(type_action='client_contact', description='Appel', statut='echec', agent=self.agent)
+        hier = ActionLog.objects.create(type_action='client_contact', description='Rappel', agent=self.agent)
+        ActionLog.objects.filter(pk=hier.pk).update(date_action=timezone.now() - timedelta(days=1))
+        call_command('cumuler_statistiques', stdout=StringIO())
+
+        self.client.force_login(self.agent)
+        response = self.client.get(reverse('gestion_credits:historique_actions'), {'type_action': 'client_contact'})
+        self.assertEqual(response.context['total_actions'], 2)
+        self.assertEqual(
+            {ligne['statut']: ligne['count'] for ligne in response.context['repartition_statuts']},
+            {'succes': 1, 'echec': 1},
+        )
+
+
+@override_settings(TABLEAU_CACHE='default')
+class CacheTableauTests(TestCase):
+    """Blocs du tableau de bord en cache, invalidés par les écritures"""
+
+    def setUp(self):
+        cache.clear()
+        self.agent = creer_portefeuille()
+        self.client.force_login(self.agent)
+        self.url = reverse('gestion_credits:dashboard')
+
+    def test_blocs_en_cache_et_invalidation(self):
+        with CaptureQueriesContext(connection) as premiere:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as seconde:
+            response = self.client.get(self.url)
+        self.assertLess(len(seconde), len(premiere))
+        self.assertEqual(response.context['total_paiements_especes'], Decimal('600.00'))
+        self.assertEqual(compteurs_cache_tableau(), {'succes': 5, 'echecs': 5, 'taux_succes': 50.0})
+
+        # Un règlement invalide les blocs qui en dépendent, pas les autres
+        Reglement.objects.create(
+            credit=Credit.objects.first(), montant=Decimal('50.00'), date_reglement=date.today(),
+            mode_paiement='especes', agent=self.agent,
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['total_paiements_especes'], Decimal('650.00'))
+        self.assertEqual(response.context['paiements_30_jours'][-1]['montant'], 350.0)
+        self.assertEqual(compteurs_cache_tableau()['echecs'], 8)
+
+    def test_compteurs_reserves_a_l_equipe(self):
+        url = reverse('gestion_credits:dashboard_cache')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.agent.is_staff = True
+        self.agent.save()
+        self.client.get(self.url)
+        self.assertEqual(self.client.get(url).json()['echecs'], 5)
+
+    def test_suppression_rapide_des_tables_derivees(self):
+        # Les signaux sont reliés modèle par modèle : un receveur post_delete sans
+        # expéditeur ferait charger chaque ligne avant de la supprimer
+        for modele in (IndexAlerte, DocumentRecherche, StatJournaliere, ActionArchivee, Session):
+            self.assertTrue(Collector(using='default').can_fast_delete(modele.objects.all()), modele)
+
+
+@override_settings(TABLEAU_CACHE='default')
+class DashboardStatsApiTests(TestCase):
+    """API dashboard_stats : ETag / Last-Modified, 304 sans comptage, sélection des champs"""
+
+    def setUp(self):
+        cache.clear()
+        self.agent = creer_portefeuille()
+        self.client.force_login(self.agent)
+        self.url = reverse('gestion_credits:dashboard_stats')
+        self.credit = Credit.objects.first()
+
+    def requetes_de_comptage(self, requetes):
+        tables = (Echeance._meta.db_table, Alerte._meta.db_table)
+        return [requete for requete in requetes if any(table in requete['sql'] for table in tables)]
+
+    def test_etag_et_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['alertes_en_attente'], 3)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.requetes_de_comptage(requetes), [])
+
+        # Une nouvelle échéance change la version
+        Echeance.objects.create(
+            credit=self.credit, numero_partie=1, montant=Decimal('100.00'),
+            date_echeance=date.today(), date_rappel=date.today(),
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['echeances_aujourd_hui'], 1)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_selection_des_champs(self):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(self.url, {'fields': 'alertes_en_attente'})
+        self.assertEqual(response.json(), {'alertes_en_attente': 3})
+        self.assertEqual(len(self.requetes_de_comptage(requetes)), 1)
+
+        # Les champs font partie de l'ETag ; une échéance ne change pas celui des alertes
+        etag = response['ETag']
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+        Echeance.objects.create(
+            credit=self.credit, numero_partie=1, montant=Decimal('100.00'),
+            date_echeance=date.today(), date_rappel=date.today(),
+        )
+        response = self.client.get(self.url, {'fields': 'alertes_en_attente'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(self.client.get(self.url, {'fields': 'inconnu'}).status_code, 400)
+
+
+class NotificationsEnDirectTests(TestCase):
+    """Notifications en direct (server-sent events) : canal en mémoire et flux par agent"""
+
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent', password='secret')
+        self.autre = User.objects.create_user(username='autre', password='secret')
+        client = Client.objects.create(nom='Alaoui', prenom='Sara', cin='AB123', telephone='0611111111')
+        self.credit = Credit.objects.create(
+            client=client, numero_police='POL-1', type_credit='unique',
+            montant_total=Decimal('1000.00'), agent=self.agent,
+        )
+
+    def test_publication_au_commit_et_filtrage_par_agent(self):
+        # Les connexions vivent dans une boucle asyncio à part ; l'écriture se fait dans ce fil, comme une vue
+        boucle = asyncio.new_event_loop()
+        fil = threading.Thread(target=boucle.run_forever, daemon=True)
+        fil.start()
+        self.addCleanup(lambda: (boucle.call_soon_threadsafe(boucle.stop), fil.join(1), boucle.close()))
+
+        def suivant(flux, delai=1):
+            return asyncio.run_coroutine_threadsafe(asyncio.wait_for(anext(flux), delai), boucle).result()
+
+        flux = {
+            'agent': evenements.flux(self.agent.pk, battement=60),
+            'autre': evenements.flux(self.autre.pk, battement=60),
+            'equipe': evenements.flux(None, tout_voir=True, battement=60),
+        }
+        for nom in flux:
+            self.assertTrue(suivant(flux[nom]).startswith('retry:'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Reglement.objects.create(
+                credit=self.credit, montant=Decimal('100.00'), date_reglement=date.today(),
+                mode_paiement='especes', agent=self.agent,
+            )
+
+        recu = suivant(flux['agent'])
+        self.assertIn('event: reglement', recu)
+        self.assertIn('"numero_police": "POL-1"', recu)
+        self.assertEqual(suivant(flux['equipe']), recu)
+        with self.assertRaises(asyncio.TimeoutError):
+            suivant(flux['autre'], 0.2)
+
+        for nom in flux:
+            asyncio.run_coroutine_threadsafe(flux[nom].aclose(), boucle).result()
+        self.assertEqual(evenements.canal.nombre_abonnes(), 0)
+
+    def test_battement(self):
+        async def scenario():
+            flux = evenements.flux(self.agent.pk, battement=0.01)
+            await anext(flux)
+            battement = await anext(flux)
+            await flux.aclose()
+            return battement
+
+        self.assertEqual(asyncio.run(scenario()), ': battement\n\n')
+
+    def test_transaction_annulee(self):
+        publies = []
+        with mock.patch.object(evenements.canal, 'publier', side_effect=lambda *args, **kwargs: publies.append(args)):
+            with self.captureOnCommitCallbacks(execute=True):
+                Alerte.objects.create(
+                    type_alerte='cheque_garantie', message='Déposer le chèque',
+                    date_alerte=date.today(), date_rappel=date.today(), agent=self.agent,
+                )
+            try:
+                with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+                    Alerte.objects.create(
+                        type_alerte='cheque_garantie', message='Annulée',
+                        date_alerte=date.today(), date_rappel=date.today(), agent=self.agent,
+                    )
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual([(type_evenement, donnees['message']) for type_evenement, donnees, _ in publies],
+                         [('alerte', 'Déposer le chèque')])
+
+    def test_vue_hors_asgi(self):
+        self.client.force_login(self.agent)
+        response = self.client.get(reverse('gestion_credits:flux_evenements'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(response.content.startswith(b'retry:'))
+
+
+@override_settings(JOURNAL_ASYNCHRONE=False)
+class CreationCreditDiviseTests(TestCase):
+    """Création transactionnelle d'un crédit divisé et de ses chèques de garantie"""
+
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent', password='secret')
+        self.client_credit = Client.objects.create(nom='Alaoui', prenom='Sara', cin='AB123', telephone='0611111111')
+        self.client.force_login(self.agent)
+
+    def donnees(self, numero_police, nombre_cheques, **lignes):
+        today = date.today()
+        donnees = {
+            'client': self.client_credit.pk,
+            'numero_police': numero_police,
+            'montant_total': '10000.00',
+            'montant_especes': '1000.00',
+            'type_garantie': 'multiple',
+            'nombre_cheques': nombre_cheques,
+        }
+        for i in range(1, nombre_cheques + 1):
+            donnees.update({
+                f'numero_cheque_{i}': f'CH-{i}',
+                f'banque_{i}': 'BMCE',
+                f'date_emission_{i}': today.isoformat(),
+                f'date_reglement_prevu_{i}': (today + timedelta(days=30 * i)).isoformat(),
+                f'montant_garantie_{i}': '900.00',
+            })
+        donnees.update(lignes)
+        return donnees
+
+    def creer(self, donnees):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('gestion_credits:credit_create_divise_complet'), donnees)
+
+    def test_creation(self):
+        response = self.creer(self.donnees('POL-D1', 3))
+
+        credit = Credit.objects.get(numero_police='POL-D1')
+        self.assertRedirects(response, reverse('gestion_credits:credit_detail', args=[credit.pk]))
+        self.assertEqual(credit.type_credit, 'divise')
+        self.assertEqual(credit.total_verse, Decimal('1000.00'))
+        self.assertEqual(credit.reste_a_payer, Decimal('9000.00'))
+        self.assertEqual(credit.statut_reglement, 'non_regle')
+        self.assertEqual(Reglement.objects.get(credit=credit).mode_paiement, 'especes')
+        self.assertEqual(credit.cheques_garantie.count(), 3)
+        self.assertEqual(Alerte.objects.filter(type_alerte='cheque_garantie').count(), 3)
+        # Les écritures en masse sont reportées dans l'index des alertes, les cumuls et le journal
+        self.assertEqual(IndexAlerte.objects.filter(source='cheque_garantie', credit=credit).count(), 3)
+        self.assertEqual(IndexAlerte.objects.filter(source='alerte').count(), 3)
+        self.assertEqual(StatJournaliere.objects.get(categorie='reglement').montant, Decimal('1000.00'))
+        self.assertTrue(ActionLog.objects.filter(type_action='credit_creation', credit=credit).exists())
+
+    def test_creation_sans_identifiants_en_masse(self):
+        # Sans identifiants renvoyés par bulk_create (MySQL), chaque objet est enregistré par save()
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert',
+                               new_callable=mock.PropertyMock, return_value=False):
+            self.creer(self.donnees('POL-D2', 3))
+
+        credit = Credit.objects.get(numero_police='POL-D2')
+        alertes = Alerte.objects.filter(type_alerte='cheque_garantie')
+        self.assertEqual(credit.cheques_garantie.count(), 3)
+        self.assertEqual(IndexAlerte.objects.filter(source='cheque_garantie', credit=credit).count(), 3)
+        self.assertEqual(
+            set(IndexAlerte.objects.filter(source='alerte').values_list('objet_id', flat=True)),
+            set(alertes.values_list('pk', flat=True)),
+        )
+
+    def test_cheque_invalide(self):
+        response = self.creer(self.donnees('POL-D2', 4, montant_garantie_3='abc', banque_4=''))
+
+        self.assertEqual(response.status_code, 200)
+        erreurs = response.context['form'].non_field_errors()
+        self.assertEqual(len(erreurs), 2)
+        self.assertTrue(erreurs[0].startswith('Chèque 3'))
+        # Rien n'est enregistré
+        self.assertFalse(Credit.objects.exists())
+        self.assertFalse(Reglement.objects.exists())
+        self.assertFalse(ChequeGarantie.objects.exists())
+        self.assertFalse(Alerte.objects.exists())
+
+    def test_nombre_de_requetes_constant(self):
+        # Première création : cumuls du jour et session créés
+        self.creer(self.donnees('POL-D3', 2))
+        nombres = []
+        for numero_police, nombre_cheques in (('POL-D4', 2), ('POL-D5', 10)):
+            with CaptureQueriesContext(connection) as requetes:
+                self.creer(self.donnees(numero_police, nombre_cheques))
+            nombres.append(len(requetes))
+        self.assertEqual(nombres[0], nombres[1])
+        self.assertEqual(ChequeGarantie.objects.filter(credit__numero_police='POL-D5').count(), 10)
+
+
+class PaiementServiceTests(TestCase):
+    """Chemin commun d'enregistrement des paiements"""
+
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent', password='secret')
+        client = Client.objects.create(nom='Alaoui', prenom='Sara', cin='AB123', telephone='0611111111')
+        self.credits = [
+            Credit.objects.create(
+                client=client, numero_police=f'POL-{i}', type_credit='unique',
+                montant_total=Decimal('1000.00'), agent=self.agent,
+            )
+            for i in range(3)
+        ]
+        self.service = PaiementService(self.agent)
+
+    def effet(self, numero, montant):
+        return {
+            'numero': numero, 'montant': Decimal(montant), 'banque': 'BMCE',
+            'date_emission': date.today(), 'date_echeance': date.today() + timedelta(days=10),
+        }
+
+    def test_enregistrer_paiement(self):
+        credit = self.credits[0]
+        reglement = self.service.enregistrer_paiement(Paiement(
+            credit, Decimal('300.00'), mode_paiement='cheque', effet=self.effet('CH1', '300.00'),
+            alerte={'type_alerte': 'cheque_garantie', 'message': 'Effet CH1 à encaisser', 'date_rappel': date.today()},
+        ))
+
+        # Soldes recalculés en base et relus sur l'instance
+        self.assertEqual(credit.reste_a_payer, Decimal('700.00'))
+        self.assertEqual(credit.total_cheques_non_verses, Decimal('300.00'))
+        credit.refresh_from_db()
+        self.assertEqual(credit.reste_a_payer, Decimal('700.00'))
+        self.assertEqual(reglement.statut, 'non_verse')
+        self.assertEqual(Reglement.objects.get().cheque_garantie.numero, 'CH1')
+        self.assertEqual(IndexAlerte.objects.filter(source='cheque_garantie').count(), 1)
+        self.assertEqual(IndexAlerte.objects.filter(source='alerte').count(), 1)
+        self.assertEqual(StatJournaliere.objects.get(categorie='reglement').montant, Decimal('300.00'))
+
+    def test_lot_tout_ou_rien(self):
+        credit = self.credits[0]
+        with self.assertRaises(ErreurPaiement):
+            self.service.enregistrer_paiements([
+                Paiement(credit, Decimal('600.00')),
+                Paiement(self.credits[1], Decimal('100.00')),
+                # Le reste du premier crédit n'est plus que de 400 DH
+                Paiement(credit, Decimal('500.00')),
+            ])
+        self.assertFalse(Reglement.objects.exists())
+        credit.refresh_from_db()
+        self.assertEqual(credit.reste_a_payer, Decimal('1000.00'))
+
+    def test_nombre_de_requetes_constant(self):
+        # Premier paiement par chèque : cumul du jour créé
+        self.service.enregistrer_paiement(Paiement(
+            self.credits[0], Decimal('10.00'), mode_paiement='cheque', effet=self.effet('CH0', '10.00'),
+        ))
+        nombres = []
+        for numero, nombre in ((1, 3), (2, 30)):
+            paiements = [
+                Paiement(self.credits[i % 3], Decimal('5.00'), mode_paiement='cheque',
+                         effet=self.effet(f'CH{numero}-{i}', '5.00'))
+                for i in range(nombre)
+            ]
+            with CaptureQueriesContext(connection) as requetes:
+                self.service.enregistrer_paiements(paiements)
+            nombres.append(len(requetes))
+        self.assertEqual(nombres[0], nombres[1])
+        # Soldes tenus par delta : aucune somme des règlements du crédit
+        self.assertFalse([requete['sql'] for requete in requetes if 'SUM(' in requete['sql'].upper()])
+        self.assertEqual(Reglement.objects.count(), 34)
+        self.assertEqual(self.credits[0].reste_a_payer, Decimal('1000.00') - Decimal('10.00') - 11 * Decimal('5.00'))
+
+    def test_vue_refuse_un_montant_superieur_au_reste(self):
+        credit = self.credits[0]
+        self.client.force_login(self.agent)
+
+        response = self.client.post(reverse('gestion_credits:ajout_paiement_create', args=[credit.pk]), {
+            'mode_paiement': 'especes', 'montant': '1500.00', 'date_paiement': date.today().isoformat(),
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('reste à payer', str(response.context['form'].errors['montant']))
+        self.assertFalse(Reglement.objects.exists())
+
+
+class EcheancierTests(TestCase):
+    """Échéanciers calendaires et leur enregistrement en masse"""
+
+    def test_mois_du_calendrier(self):
+        self.assertEqual(ajouter_mois(date(2025, 1, 31), 1), date(2025, 2, 28))
+        self.assertEqual(ajouter_mois(date(2024, 1, 31), 1), date(2024, 2, 29))
+        self.assertEqual(ajouter_mois(date(2025, 11, 30), 3), date(2026, 2, 28))
+
+        lignes = calculer_echeancier(Decimal('1000.00'), 4, date(2025, 1, 31), 'mensuelle', numero_depart=3)
+        # Pas de dérive après février ; le 31 mai 2025 est un samedi, le 30 mars un dimanche
+        self.assertEqual([ligne.date_prevue for ligne in lignes],
+                         [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)])
+        self.assertEqual([ligne.numero_partie for ligne in lignes], [3, 4, 5, 6])
+
+    def test_montants_et_jours_feries(self):
+        feries = lire_jours_feries(['# Calendrier', '', '01-01  Nouvel an', '2025-04-01 Aïd (exemple)'])
+        lignes = calculer_echeancier(
+            Decimal('1000.00'), 3, date(2025, 1, 1), 'trimestrielle', feries=feries,
+        )
+        self.assertEqual([ligne.montant for ligne in lignes],
+                         [Decimal('333.33'), Decimal('333.33'), Decimal('333.34')])
+        # 1er janvier férié, 1er avril férié, 1er juillet ouvré
+        self.assertEqual([ligne.date_echeance for ligne in lignes],
+                         [date(2025, 1, 2), date(2025, 4, 2), date(2025, 7, 1)])
+        self.assertEqual(lignes[0].date_rappel, date(2024, 12, 30))
+
+    def test_duree_en_mois_du_credit(self):
+        agent = User.objects.create_user(username='agent', password='secret')
+        client = Client.objects.create(nom='Alaoui', prenom='Sara', cin='AB123', telephone='0611111111')
+        credit = Credit.objects.create(
+            client=client, numero_police='POL-1', type_credit='unique', montant_total=Decimal('1000.00'),
+            duree_mois=1, agent=agent,
+        )
+        self.assertEqual(credit.date_echeance, ajouter_mois(timezone.now().date(), 1))
+
+    def test_vue_echeancier(self):
+        agent = User.objects.create_user(username='agent', password='secret')
+        client = Client.objects.create(nom='Alaoui', prenom='Sara', cin='AB123', telephone='0611111111')
+        credits = [
+            Credit.objects.create(
+                client=client, numero_police=f'POL-{i}', type_credit='divise',
+                montant_total=Decimal('1000.00'), agent=agent,
+            )
+            for i in range(3)
+        ]
+        self.client.force_login(agent)
+
+        def creer(credit, nombre):
+            with CaptureQueriesContext(connection) as requetes:
+                response = self.client.post(reverse('gestion_credits:paiement_echeance_create', args=[credit.pk]), {
+                    'mode_paiement': 'effets', 'type_echeance': 'multiple', 'montant_total': '1000.00',
+                    'nombre_echeances': nombre, 'frequence_paiement': 'mensuelle',
+                    'date_premiere_echeance': date(2030, 1, 31).isoformat(), 'numero_effet': 'EF',
+                    'banque_emetteur': 'BMCE', 'date_emission_effet': date.today().isoformat(),
+                })
+            self.assertEqual(response.status_code, 302)
+            return len(requetes)
+
+        creer(credits[0], 2)
+        self.assertEqual(creer(credits[1], 2), creer(credits[2], 12))
+
+        echeances = list(Echeance.objects.filter(credit=credits[2]).order_by('numero_partie'))
+        self.assertEqual([echeance.numero_partie for echeance in echeances], list(range(1, 13)))
+        self.assertEqual(sum(echeance.montant for echeance in echeances), Decimal('1000.00'))
+        self.assertEqual(echeances[1].date_echeance, date(2030, 2, 28))
+        self.assertEqual(echeances[1].cheque.numero_cheque, 'EF-2')
+        self.assertEqual(IndexAlerte.objects.filter(source='echeance', credit=credits[2]).count(), 12)
+        credits[2].refresh_from_db()
+        self.assertEqual(credits[2].reste_a_payer, Decimal('0.00'))
+
+
+@override_settings(TABLEAU_CACHE='default')
+class StatistiquesHistoriqueTests(TestCase):
+    """Compteurs et répartitions de l'historique en une requête groupée, liste des agents en cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.agent = creer_portefeuille(nombre_clients=2)
+        self.client_credit = Client.objects.order_by('pk').first()
+        maintenant = timezone.now()
+        for jours, type_action, statut in ((0, 'client_contact', 'succes'), (0, 'client_contact', 'echec'),
+                                           (3, 'export_donnees', 'succes'), (20, 'client_contact', 'succes')):
+            action = ActionLog.objects.create(
+                type_action=type_action, description='Appel', statut=statut, agent=self.agent,
+                client=self.client_credit,
+            )
+            ActionLog.objects.filter(pk=action.pk).update(date_action=maintenant - timedelta(days=jours))
+        call_command('cumuler_statistiques', '--jours', '30', stdout=StringIO())
+        self.client.force_login(self.agent)
+
+    def consulter(self, params):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('gestion_credits:historique_actions'), params)
+        lectures = [
+            requete['sql'] for requete in requetes
+            if f'FROM "{ActionLog._meta.db_table}"' in requete['sql'] and requete['sql'].startswith('SELECT')
+        ]
+        return response.context, lectures
+
+    def test_une_requete_groupee(self):
+        # Filtre applicable aux cumuls, puis filtre client lu sur les actions
+        for params in ({'type_action': 'client_contact'}, {'type_action': 'client_contact', 'client': 'Nom0'}):
+            context, lectures = self.consulter(params)
+            self.assertEqual(context['total_actions'], 3)
+            self.assertEqual(context['actions_aujourd_hui'], 2)
+            self.assertEqual(context['actions_cette_semaine'], 2)
+            self.assertEqual(
+                {ligne['statut']: ligne['count'] for ligne in context['repartition_statuts']},
+                {'succes': 2, 'echec': 1},
+            )
+            # Statistiques, actions urgentes et page
+            self.assertEqual(len(lectures), 3, lectures)
+
+        context, _ = self.consulter({})
+        self.assertEqual((context['total_actions'], context['actions_cette_semaine']), (4, 3))
+
+    def test_listes_des_filtres_en_cache(self):
+        context, _ = self.consulter({})
+        self.assertEqual([agent.pk for agent in context['agents_disponibles']], [self.agent.pk])
+        with self.assertNumQueries(0):
+            historique.filtres_disponibles()
+
+        # Action d'un agent et d'un client déjà listés : le cache est conservé
+        journal.ecrire([ActionLog(type_action='connexion', description='Connexion', agent=self.agent)])
+        with self.assertNumQueries(0):
+            historique.filtres_disponibles()
+
+        autre = User.objects.create_user(username='autre', password='secret')
+        historique.filtres_disponibles()
+        journal.ecrire([ActionLog(type_action='connexion', description='Connexion', agent=autre)])
+        context, _ = self.consulter({})
+        self.assertEqual({agent.pk for agent in context['agents_disponibles']}, {self.agent.pk, autre.pk})
+
+    def test_liste_perimee_remise_en_cache(self):
+        perimee = historique.filtres_disponibles()
+        cle = f"{historique.CLE_FILTRES}:{cache.get(historique.CLE_VERSION_FILTRES)}"
+        autre = User.objects.create_user(username='autre', password='secret')
+        ActionLog.objects.create(type_action='connexion', description='Connexion', agent=autre)
+        # Un autre processus, qui a lu la liste avant l'invalidation, la remet en cache ensuite
+        cache.set(cle, {'agents': perimee['agents_disponibles'], 'agent_ids': {self.agent.pk}})
+
+        agents = historique.filtres_disponibles()['agents_disponibles']
+        self.assertEqual({agent.pk for agent in agents}, {self.agent.pk, autre.pk})
+
+    def test_commande_de_mesure(self):
+        sortie = StringIO()
+        call_command('mesurer_historique', '--generer', '40', '--jours', '4', '--repetitions', '2', stdout=sortie)
+        self.assertEqual(ActionLog.objects.filter(description__startswith='Action synthétique').count(), 40)
+        self.assertIn('p95', sortie.getvalue())
+        self.assertEqual(sortie.getvalue().count('requête(s)'), 5)
+
+
+@override_settings(TABLEAU_CACHE='default')
+class RequetesDesListesTests(TestCase):
+    """Le nombre de requêtes des pages de liste ne dépend pas du nombre de lignes affichées (pas de N+1 dans les gabarits)"""
+
+    # (nom de l'URL, paramètres) de chaque page de liste
+    LISTES = [
+        ('client_list', {}),
+        ('credit_list', {}),
+        ('credit_list', {'statut': 'payes'}),
+        ('credit_list', {'statut': 'non_regles'}),
+        ('reglement_list', {}),
+        ('alerte_list', {}),
+        ('historique_actions', {}),
+    ]
+
+    def semer(self, nombre_clients):
+        """Ajouter des clients, crédits (dont un réglé), échéances, règlements, chèques, alertes et actions"""
+        agent = creer_portefeuille(nombre_clients=nombre_clients)
+        credits = list(Credit.objects.filter(agent=agent))
+        Echeance.objects.bulk_create([
+            Echeance(
+                credit=credit, numero_partie=numero, montant=Decimal('500.00'),
+                date_echeance=date.today() + timedelta(days=30 * numero),
+                date_rappel=date.today() + timedelta(days=30 * numero - 3), est_traitee=numero == 1,
+            )
+            for credit in credits for numero in (1, 2)
+        ])
+        Reglement.objects.create(
+            credit=credits[0], montant=credits[0].reste_a_payer, date_reglement=date.today(),
+            mode_paiement='especes', agent=agent,
+        )
+        for credit in credits:
+            ActionLog.objects.create(
+                type_action='client_contact', description='Appel', agent=agent, client=credit.client, credit=credit,
+            )
+        return agent
+
+    def compter(self, nom, params):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse(f'gestion_credits:{nom}'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(requetes)
+
+    def mesurer(self):
+        # Premier passage : caches (listes de filtres, bascule quotidienne des alertes...) remplis
+        for nom, params in self.LISTES:
+            self.compter(nom, params)
+        return [self.compter(nom, params) for nom, params in self.LISTES]
+
+    def test_requetes_independantes_du_nombre_de_lignes(self):
+        cache.clear()
+        self.client.force_login(self.semer(2))
+        avant = self.mesurer()
+        self.semer(10)
+        for (nom, params), nombre, apres in zip(self.LISTES, avant, self.mesurer()):
+            with self.subTest(nom=nom, params=params):
+                self.assertEqual(apres, nombre)
+
+
+class AdministrationTests(TestCase):
+    """Listes de l'administration sans requête par ligne, formulaires avec autocomplétion"""
+
+    MODELES = (Client, Credit, Echeance, Cheque, Alerte, ReportEcheance)
+
+    def semer(self, nombre_clients):
+        agent = creer_portefeuille(nombre_clients=nombre_clients)
+        for credit in Credit.objects.filter(agent=agent):
+            for numero in (1, 2):
+                echeance = Echeance.objects.create(
+                    credit=credit, numero_partie=numero, montant=Decimal('500.00'),
+                    date_echeance=date.today() + timedelta(days=30 * numero), est_traitee=numero == 1,
+                )
+                Cheque.objects.create(
+                    echeance=echeance, numero_cheque=f'EF-{echeance.pk}', banque='BMCE',
+                    date_emission=date.today(), montant=echeance.montant,
+                )
+                Alerte.objects.create(
+                    echeance=echeance, type_alerte='echeance', message='Échéance', date_alerte=date.today(),
+                    date_rappel=echeance.date_rappel, agent=agent,
+                )
+                ReportEcheance.objects.create(
+                    echeance=echeance, ancienne_date=echeance.date_echeance,
+                    nouvelle_date=echeance.date_echeance + timedelta(days=7), raison='Demande du client', agent=agent,
+                )
+
+    def url(self, modele, vue='changelist', *args):
+        return reverse(f'admin:gestion_credits_{modele._meta.model_name}_{vue}', args=args)
+
+    def compter(self):
+        nombres = []
+        for modele in self.MODELES:
+            with CaptureQueriesContext(connection) as requetes:
+                response = self.client.get(self.url(modele))
+            self.assertEqual(response.status_code, 200)
+            nombres.append(len(requetes))
+        return nombres
+
+    def test_listes_sans_requete_par_ligne(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.semer(2)
+        avant = self.compter()
+        self.semer(10)
+        for modele, nombre, apres in zip(self.MODELES, avant, self.compter()):
+            with self.subTest(modele=modele.__name__):
+                self.assertEqual(apres, nombre)
+
+        response = self.client.get(self.url(Credit))
+        self.assertContains(response, 'Partiellement traité (1/2)')
+
+    def test_formulaires_avec_autocompletion(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.semer(1)
+        for modele in (Credit, Echeance, Cheque, Alerte, ReportEcheance):
+            with self.subTest(modele=modele.__name__):
+                response = self.client.get(self.url(modele, 'change', modele.objects.first().pk))
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'admin-autocomplete')
+
+
+class AutocompletionTests(TestCase):
+    """Recherche par préfixe des clients et des crédits, widgets chargés à la demande"""
+
+    def setUp(self):
+        self.agent = User.objects.create_user(username='agent', password='secret')
+        self.clients = [
+            Client.objects.create(nom=f'Bennani{i:02d}', prenom='Karim', cin=f'BK{i:03d}', telephone=f'0661000{i:03d}')
+            for i in range(25)
+        ]
+        self.sara = Client.objects.create(nom='Alaoui', prenom='Sara', cin='AB123', telephone='0611111111')
+        Credit.objects.create(
+            client=self.sara, numero_police='POL-2024-001', type_credit='divise',
+            montant_total=Decimal('1000.00'), agent=self.agent,
+        )
+        self.client.force_login(self.agent)
+
+    def chercher(self, nom, **params):
+        response = self.client.get(reverse(f'gestion_credits:{nom}'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_clients_par_prefixe_et_pages(self):
+        for saisie in ('ala', 'sara', 'AB1', '0611', 'sara ala'):
+            with self.subTest(saisie=saisie):
+                self.assertEqual([resultat['id'] for resultat in self.chercher('client_autocompletion', q=saisie)['resultats']],
+                                 [self.sara.pk])
+        self.assertEqual(self.chercher('client_autocompletion', q='laoui')['resultats'], [])
+
+        premiere = self.chercher('client_autocompletion', q='benn')
+        seconde = self.chercher('client_autocompletion', q='benn', page=2)
+        self.assertEqual((len(premiere['resultats']), premiere['suivante']), (20, True))
+        self.assertEqual((len(seconde['resultats']), seconde['suivante']), (5, False))
+        self.assertEqual(premiere['resultats'][0], {
+            'id': self.clients[0].pk, 'texte': str(self.clients[0]), 'valeur': 'Bennani00',
+        })
+
+    def test_credits_par_numero_de_police(self):
+        resultats = self.chercher('credit_autocompletion', q='pol-2024')['resultats']
+        self.assertEqual([resultat['valeur'] for resultat in resultats], ['POL-2024-001'])
+        self.assertEqual(self.chercher('credit_autocompletion', q='2024')['resultats'], [])
+
+    def plans(self, nom, table, **params):
+        """Lignes du plan d'exécution (SQLite) des requêtes de la vue qui lisent la table"""
+        with CaptureQueriesContext(connection) as requetes:
+            self.chercher(nom, **params)
+        details = []
+        with connection.cursor() as cursor:
+            for requete in requetes:
+                if requete['sql'].startswith('SELECT') and f'"{table}"' in requete['sql']:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {requete['sql']}")
+                    details.extend(ligne[-1] for ligne in cursor.fetchall())
+        return details
+
+    def test_recherches_servies_par_un_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plans d\'exécution SQLite')
+        for nom, table, saisie in (
+            ('client_autocompletion', Client._meta.db_table, 'benn karim'),
+            ('credit_autocompletion', Credit._meta.db_table, 'pol-20'),
+        ):
+            with self.subTest(nom=nom):
+                details = self.plans(nom, table, q=saisie)
+                # Ni parcours de la table ni parcours complet d'un de ses index
+                self.assertFalse([detail for detail in details if detail.startswith(f'SCAN {table}')], details)
+                self.assertTrue([detail for detail in details if detail.startswith(f'SEARCH {table}')], details)
+
+    def test_formulaire_sans_la_liste_des_clients(self):
+        url = reverse('gestion_credits:credit_create') + '?type=unique'
+        with CaptureQueriesContext(connection) as avant:
+            response = self.client.get(url)
+        self.assertContains(response, reverse('gestion_credits:client_autocompletion'))
+        self.assertNotContains(response, 'Bennani00')
+        for i in range(25, 60):
+            Client.objects.create(nom=f'Bennani{i:02d}', prenom='Karim', cin=f'BK{i:03d}', telephone=f'0661000{i:03d}')
+        with CaptureQueriesContext(connection) as apres:
+            self.client.get(url)
+        self.assertEqual(len(apres), len(avant))
+
+        # Formulaire invalide : le client choisi reste la seule option rendue
+        response = self.client.post(url, {'client': self.sara.pk, 'numero_police': ''})
+        self.assertContains(response, f'<option value="{self.sara.pk}" selected>{self.sara}</option>', html=True)
+        self.assertNotContains(response, 'Bennani00')
+
+
+class GenerationPortefeuilleTests(TestCase):
+    """Portefeuille synthétique pour les tests de charge (generate_portfolio)"""
+
+    def contenu(self, prefixe):
+        """Données générées, sans identifiants ni dates d'insertion"""
+        credits = Credit.objects.filter(numero_police__startswith=prefixe)
+        return [
+            list(credits.order_by('numero_police').values_list(
+                'numero_police', 'client__cin', 'type_credit', 'montant_total', 'reste_a_payer', 'total_verse',
+                'statut_reglement', 'date_creation', 'agent__username',
+            )),
+            list(Echeance.objects.filter(credit__in=credits).order_by('credit__numero_police', 'numero_partie')
+                 .values_list('credit__numero_police', 'montant', 'date_echeance', 'est_traitee')),
+            list(ChequeGarantie.objects.filter(credit__in=credits).order_by('credit__numero_police', 'numero')
+                 .values_list('credit__numero_police', 'numero', 'montant', 'banque', 'date_echeance')),
+            list(Reglement.objects.filter(credit__in=credits)
+                 .order_by('credit__numero_police', 'date_reglement', 'date_creation', 'montant')
+                 .values_list('credit__numero_police', 'montant', 'date_reglement', 'mode_paiement', 'statut',
+                              'cheque_garantie__numero')),
+            list(Alerte.objects.filter(echeance__credit__in=credits)
+                 .order_by('echeance__credit__numero_police', 'echeance__numero_partie', 'type_alerte')
+                 .values_list('echeance__credit__numero_police', 'type_alerte', 'statut', 'date_rappel')),
+        ]
+
+    def test_commande(self):
+        sortie = StringIO()
+        call_command('generate_portfolio', '--clients', '7', '--credits-per-client', '3', '--seed', '5',
+                     '--taille-lot', '3', stdout=sortie)
+        self.assertIn('7 client(s), 21 crédit(s)', sortie.getvalue())
+        self.assertEqual(Credit.objects.filter(numero_police__startswith='GEN5-').count(), 21)
+
+        sortie = StringIO()
+        call_command('recalculer_soldes', '--verifier', stdout=sortie)
+        self.assertIn('cohérents', sortie.getvalue())
+
+        # Soldes calculés en mémoire, comme les calcule soldes.recalculer_soldes()
+        for credit in Credit.objects.prefetch_related('reglements'):
+            reglements = credit.reglements.all()
+            verse = sum(r.montant for r in reglements if r.statut != 'non_verse')
+            self.assertEqual(credit.reste_a_payer, max(0, credit.montant_total - sum(r.montant for r in reglements)))
+            self.assertEqual(credit.total_verse, verse)
+            self.assertEqual(credit.statut_reglement, 'regle' if credit.montant_total <= verse else 'non_regle')
+            if credit.type_credit == 'divise':
+                self.assertTrue(1 <= credit.cheques_garantie.count() <= 10)
+                self.assertTrue(2 <= credit.echeances.count() <= 5)
+        self.assertFalse(Reglement.objects.filter(date_reglement__gt=date.today()).exists())
+
+        # Index des alertes, recherche et cumuls journaliers tenus malgré bulk_create
+        self.assertEqual(
+            IndexAlerte.objects.count(),
+            Echeance.objects.count() + ChequeGarantie.objects.count() + Alerte.objects.count(),
+        )
+        self.assertEqual(DocumentRecherche.objects.filter(source='action').count(), ActionLog.objects.count())
+        cumuls = StatJournaliere.objects.filter(categorie='reglement').aggregate(nombre=Sum('nombre'))
+        self.assertEqual(cumuls['nombre'], Reglement.objects.count())
+
+        with self.assertRaises(CommandError):
+            call_command('generate_portfolio', '--clients', '1', '--seed', '5', stdout=StringIO())
+
+    def test_deterministe_par_graine(self):
+        today = date(2025, 6, 30)
+        GenerateurPortefeuille(5, graine=3, today=today, taille_lot=2).generer()
+        premier = self.contenu('GEN3-')
+        self.assertTrue(premier[3])
+
+        Client.objects.all().delete()
+        GenerateurPortefeuille(5, graine=3, today=today, taille_lot=4).generer()
+        self.assertEqual(self.contenu('GEN3-'), premier)
+
+        Client.objects.all().delete()
+        GenerateurPortefeuille(5, graine=4, today=today, prefixe='GEN3').generer()
+        self.assertNotEqual(self.contenu('GEN3-'), premier)
+
+    def test_dates_de_creation(self):
+        today = date(2025, 6, 30)
+        saisis = []
+
+        def saisir_client(clients, compteurs):
+            # Écriture ordinaire pendant la génération : elle reste datée de l'instant de l'insertion
+            saisis.append(Client.objects.create(nom='Saisi', prenom='Pendant', cin=f'SAISI{clients}',
+                                                telephone=f'07{clients}'))
+
+        GenerateurPortefeuille(4, graine=2, today=today, taille_lot=2, on_lot=saisir_client).generer()
+
+        for modele, filtre in ((Client, 'cin__startswith'), (Credit, 'numero_police__startswith'),
+                               (Reglement, 'credit__numero_police__startswith'),
+                               (ChequeGarantie, 'credit__numero_police__startswith'),
+                               (ActionLog, 'client__cin__startswith')):
+            champ = 'date_action' if modele is ActionLog else 'date_creation'
+            generes = modele.objects.filter(**{filtre: 'GEN2-'})
+            self.assertFalse(generes.filter(**{f'{champ}__date__gt': today}).exists(), modele)
+        self.assertEqual(len(saisis), 2)
+        for client in saisis:
+            client.refresh_from_db()
+            self.assertEqual(timezone.localdate(client.date_creation), timezone.localdate())
@@ -15,9 +15,14 @@ urlpatterns = [
     # Tableau de bord
     path('dashboard/', views.dashboard, name='dashboard'),
     path('dashboard/stats/', views.dashboard_stats, name='dashboard_stats'),
+    path('dashboard/cache/', views.dashboard_cache, name='dashboard_cache'),
+    
+    # Notifications en direct (server-sent events)
+    path('evenements/', views.flux_evenements, name='flux_evenements'),
     
     # Gestion des clients
     path('clients/', views.client_list, name='client_list'),
+    path('clients/autocompletion/', views.client_autocompletion, name='client_autocompletion'),
     path('clients/create/', views.client_create, name='client_create'),
     path('clients/<int:pk>/', views.client_detail, name='client_detail'),
     path('clients/<int:pk>/update/', views.client_update, name='client_update'),
@@ -25,7 +30,9 @@ urlpatterns = [
     
     # Gestion des crédits
     path('credits/', views.credit_list, name='credit_list'),
+    path('credits/autocompletion/', views.credit_autocompletion, name='credit_autocompletion'),
     path('credits/create/', views.credit_create, name='credit_create'),
+    path('credits/export/', views.credit_export, name='credit_export'),
     path('credits/create/divise/', views.credit_create_divise_complet, name='credit_create_divise_complet'),
     path('credits/<int:pk>/', views.credit_detail, name='credit_detail'),
     path('credits/<int:pk>/delete/', views.credit_delete, name='credit_delete'),
@@ -41,6 +48,9 @@ urlpatterns = [
     path('credits/<int:credit_id>/reglements/create/', views.reglement_create, name='reglement_create'),
     path('reglements/<int:pk>/update/', views.reglement_update, name='reglement_update'),
     path('reglements/<int:pk>/delete/', views.reglement_delete, name='reglement_delete'),
+    path('reglements/', views.reglement_list, name='reglement_list'),
+    path('reglements/import/', views.import_reglements, name='import_reglements'),
+    path('reglements/export/', views.reglement_export, name='reglement_export'),
     
     # Paiement des échéances (nouveau système professionnel)
     path('credits/<int:credit_id>/paiement-echeance/create/', views.paiement_echeance_create, name='paiement_echeance_create'),
@@ -51,6 +61,7 @@ urlpatterns = [
     # Chèques de garantie
     path('credits/<int:credit_id>/cheques-garantie/create/', views.cheque_garantie_create, name='cheque_garantie_create'),
     path('cheques-garantie/<int:pk>/update/', views.cheque_garantie_update, name='cheque_garantie_update'),
+    path('cheques-garantie/export/', views.cheque_garantie_export, name='cheque_garantie_export'),
     path('cheques-garantie/<int:pk>/delete/', views.cheque_garantie_delete, name='cheque_garantie_delete'),
     
     # Gestion des alertes
@@ -59,4 +70,8 @@ urlpatterns = [
     
     # Historique des actions
     path('historique/', views.historique_actions, name='historique_actions'),
+    path('historique/export/', views.historique_export, name='historique_export'),
+    
+    # Recherche globale
+    path('recherche/', views.recherche_globale, name='recherche_globale'),
 ]
@@ -1,21 +1,55 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import condition
 from django.contrib.auth import login, authenticate, logout
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Q, Sum, Count
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Count, Prefetch, Q, Sum
 from django.utils import timezone
 from django.core.paginator import Paginator
 from datetime import date, timedelta, datetime
 from decimal import Decimal
+import hashlib
 import json
+import time
 
-from .models import Client, Credit, Echeance, Cheque, Alerte, ReportEcheance, ActionLog, Reglement, ChequeGarantie
+from .models import Client, Credit, Echeance, Cheque, Alerte, ReportEcheance, ActionLog, ActionArchivee, Reglement, ChequeGarantie, IndexAlerte, DocumentRecherche
 from .forms import (
     ClientForm, CreditForm, CreditUniqueForm, CreditDiviseForm, CreditDiviseCompletForm,
     EcheanceForm, ChequeForm, AlerteForm, ReportEcheanceForm, UserRegistrationForm,
-    ReglementForm, ChequeGarantieForm, PaiementEcheanceForm, AjoutPaiementForm
+    ReglementForm, ChequeGarantieForm, PaiementEcheanceForm, AjoutPaiementForm, ImportReglementsForm
 )
+from .alertes import assurer_bascule_quotidienne
+from .archives import inclure_archives, limite_archive
+from .autocompletion import (
+    clients_par_prefixe, credits_par_prefixe, decrire_client, decrire_credit, page_resultats
+)
+from .cache_tableau import (
+    compteurs as compteurs_cache_tableau, derniere_modification as derniere_modification_tableau,
+    versions as versions_tableau,
+)
+from .creation_credits import CreationCreditDivise
+from .echeancier import (
+    ajouter_mois, calculer_echeancier, enregistrer_echeancier, jours_feries, ligne_unique, numero_suivant
+)
+from .evenements import flux
+from .exports import (
+    EXPORT_ACTIONS, EXPORT_CHEQUES_GARANTIE, EXPORT_CREDITS, EXPORT_REGLEMENTS, reponse_export, xlsx_disponible
+)
+from .filtres import (
+    date_ou_none, filtre_resume_actions, filtrer_actions, filtrer_cheques_garantie, filtrer_clients,
+    filtrer_credits, filtrer_par_statut_reglement, filtrer_reglements
+)
+from .historique import filtres_disponibles, statistiques_historique
+from .imports import ErreurImport, ImportateurReglements, lire_lignes
+from .journal import journaliser
+from .paiements import ErreurPaiement, Paiement, PaiementService
+from .pagination import PaginateurCurseur, PaginateurCurseurEnchaine
+from .recherche import rechercher
+from .statistiques import INDICATEURS, compter_indicateurs, construire_contexte_dashboard
 from django.contrib.auth.models import User
 
 
@@ -30,174 +64,50 @@ def redirect_to_dashboard(request):
 @login_required
 def dashboard(request):
     """Tableau de bord principal optimisé pour le système de paiements flexibles"""
-    today = date.today()
-    
-    # === STATISTIQUES GLOBALES ===
-    total_credits = Credit.objects.count()
-    total_clients = Client.objects.count()
-    
-    # Calcul des paiements selon la nouvelle logique
-    total_paiements_especes = Reglement.objects.filter(
-        mode_paiement='especes'
-    ).aggregate(total=Sum('montant'))['total'] or 0
-    
-    total_paiements_cheques_verses = Reglement.objects.filter(
-        mode_paiement='cheque', 
-        statut='verse'
-    ).aggregate(total=Sum('montant'))['total'] or 0
-    
-    total_cheques_en_attente = Reglement.objects.filter(
-        mode_paiement='cheque', 
-        statut='non_verse'
-    ).aggregate(total=Sum('montant'))['total'] or 0
-    
-    total_paiements_verses = total_paiements_especes + total_paiements_cheques_verses
-    
-    # Montant total des crédits
-    montant_total_credits = Credit.objects.aggregate(total=Sum('montant_total'))['total'] or 0
-    
-    # Taux de recouvrement
-    taux_recouvrement = 0
-    if montant_total_credits > 0:
-        taux_recouvrement = (total_paiements_verses / montant_total_credits) * 100
-    
-    # === PAIEMENTS DU JOUR ===
-    paiements_aujourd_hui = Reglement.objects.filter(
-        date_reglement=today
-    ).select_related('credit__client').order_by('-montant')
-    
-    montant_paiements_aujourd_hui = paiements_aujourd_hui.aggregate(total=Sum('montant'))['total'] or 0
-    
-    # === CHÈQUES À ÉCHÉANCE PROCHE ===
-    cheques_echeance_proche = ChequeGarantie.objects.filter(
-        date_echeance__range=[today, today + timedelta(days=7)]
-    ).select_related('credit__client').order_by('date_echeance')
-    
-    # === CHÈQUES EN RETARD ===
-    cheques_en_retard = ChequeGarantie.objects.filter(
-        date_echeance__lt=today
-    ).select_related('credit__client').order_by('date_echeance')
-    
-    # === ALERTES ACTIVES ===
-    alertes_en_attente = Alerte.objects.filter(
-        statut='en_attente'
-    ).select_related('echeance__credit__client', 'agent').order_by('date_rappel')[:10]
-    
-    # === PERFORMANCE DES AGENTS ===
-    agents_performance = User.objects.filter(
-        reglements_crees__isnull=False
-    ).annotate(
-        total_paiements=Sum('reglements_crees__montant')
-    ).order_by('-total_paiements')[:5]
-    
-    # === STATISTIQUES PAR TYPE DE CRÉDIT ===
-    credits_uniques = Credit.objects.filter(type_credit='unique').count()
-    credits_divises = Credit.objects.filter(type_credit='divise').count()
-    
-    # Calculer les pourcentages pour les barres de progression
-    pourcentage_especes = 0
-    pourcentage_cheques_verses = 0
-    pourcentage_cheques_en_attente = 0
-    pourcentage_credits_uniques = 0
-    pourcentage_credits_divises = 0
-    
-    if montant_total_credits > 0:
-        pourcentage_especes = (total_paiements_especes / montant_total_credits) * 100
-        pourcentage_cheques_verses = (total_paiements_cheques_verses / montant_total_credits) * 100
-        pourcentage_cheques_en_attente = (total_cheques_en_attente / montant_total_credits) * 100
-    
-    if total_credits > 0:
-        pourcentage_credits_uniques = (credits_uniques / total_credits) * 100
-        pourcentage_credits_divises = (credits_divises / total_credits) * 100
-    
-    # === RÉPARTITION DES PAIEMENTS PAR MOIS (30 derniers jours) ===
-    paiements_30_jours = []
-    for i in range(30):
-        date_calcul = today - timedelta(days=i)
-        montant_jour = Reglement.objects.filter(
-            date_reglement=date_calcul
-        ).aggregate(total=Sum('montant'))['total'] or 0
-        paiements_30_jours.append({
-            'date': date_calcul.strftime('%d/%m'),
-            'montant': float(montant_jour)
-        })
-    
-    paiements_30_jours.reverse()  # Du plus ancien au plus récent
-    
-    # === TOP 5 DES CLIENTS PAR MONTANT DE CRÉDIT ===
-    top_clients = Client.objects.annotate(
-        total_credits=Sum('credits__montant_total')
-    ).filter(total_credits__isnull=False).order_by('-total_credits')[:5]
-    
-    context = {
-        # Statistiques globales
-        'total_credits': total_credits,
-        'total_clients': total_clients,
-        'montant_total_credits': montant_total_credits,
-        'total_paiements_verses': total_paiements_verses,
-        'total_paiements_especes': total_paiements_especes,
-        'total_paiements_cheques_verses': total_paiements_cheques_verses,
-        'total_cheques_en_attente': total_cheques_en_attente,
-        'taux_recouvrement': taux_recouvrement,
-        
-        # Paiements du jour
-        'paiements_aujourd_hui': paiements_aujourd_hui,
-        'montant_paiements_aujourd_hui': montant_paiements_aujourd_hui,
-        
-        # Chèques
-        'cheques_echeance_proche': cheques_echeance_proche,
-        'cheques_en_retard': cheques_en_retard,
-        
-        # Alertes
-        'alertes_en_attente': alertes_en_attente,
-        
-        # Performance
-        'agents_performance': agents_performance,
-        
-        # Types de crédits
-        'credits_uniques': credits_uniques,
-        'credits_divises': credits_divises,
-        
-        # Pourcentages pour les barres de progression
-        'pourcentage_especes': pourcentage_especes,
-        'pourcentage_cheques_verses': pourcentage_cheques_verses,
-        'pourcentage_cheques_en_attente': pourcentage_cheques_en_attente,
-        'pourcentage_credits_uniques': pourcentage_credits_uniques,
-        'pourcentage_credits_divises': pourcentage_credits_divises,
-        
-        # Graphiques
-        'paiements_30_jours': paiements_30_jours,
-        'top_clients': top_clients,
-        
-        # Date
-        'today': today,
-    }
-    
+    context = construire_contexte_dashboard(date.today(), avec_cache=True)
     return render(request, 'gestion_credits/dashboard.html', context)
 
 
+@login_required
+async def flux_evenements(request):
+    """Notifications en direct (server-sent events) : alertes, règlements, niveaux des alertes
+
+    Servie par l'application ASGI ; derrière un serveur WSGI, qui ne peut pas garder
+    la connexion ouverte, la réponse invite seulement le navigateur à réessayer plus tard.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('retry: 60000\n\n', content_type='text/event-stream')
+    user = await request.auser()
+    response = StreamingHttpResponse(
+        flux(user.pk, tout_voir=user.is_staff), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+def dashboard_cache(request):
+    """Compteurs du cache du tableau de bord (suivi), réservés à l'équipe"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Accès réservé'}, status=403)
+    return JsonResponse(compteurs_cache_tableau())
+
+
 @login_required
 def client_list(request):
     """Liste des clients"""
     search_query = request.GET.get('search', '')
-    clients = Client.objects.all()
+    # Nombre de crédits de chaque client calculé dans la requête de la page
+    clients = filtrer_clients(request.GET).annotate(nb_credits=Count('credits'))
     
-    if search_query:
-        clients = clients.filter(
-            Q(nom__icontains=search_query) |
-            Q(prenom__icontains=search_query) |
-            Q(cin__icontains=search_query) |
-            Q(telephone__icontains=search_query)
-        )
-    
-    # Pagination
-    paginator = Paginator(clients, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par curseur sur (nom, prénom, id)
+    page_obj = PaginateurCurseur(clients, ['nom', 'prenom', 'id'], 20).page(request.GET.get('curseur'))
     
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
+        'filtres_query': _filtres_query(request),
     }
     return render(request, 'gestion_credits/client_list.html', context)
 
@@ -211,20 +121,12 @@ def client_create(request):
             client = form.save()
             
             # Créer une action dans l'historique pour la création du client
-            ActionLog.objects.create(
+            journaliser(
                 type_action='client_creation',
                 description=f'Client créé : {client.nom_complet} - CIN: {client.cin} - Téléphone: {client.telephone}',
                 statut='succes',
                 agent=request.user,
                 client=client,
-                donnees_apres={
-                    'nom': client.nom,
-                    'prenom': client.prenom,
-                    'cin': client.cin,
-                    'telephone': client.telephone,
-                    'email': client.email,
-                    'adresse': client.adresse
-                }
             )
             
             messages.success(request, f'Client {client.nom_complet} créé avec succès.')
@@ -243,34 +145,16 @@ def client_update(request, pk):
     if request.method == 'POST':
         form = ClientForm(request.POST, instance=client)
         if form.is_valid():
-            # Sauvegarder l'état avant modification
-            donnees_avant = {
-                'nom': client.nom,
-                'prenom': client.prenom,
-                'cin': client.cin,
-                'telephone': client.telephone,
-                'email': client.email,
-                'adresse': client.adresse
-            }
-            
             client = form.save()
             
             # Créer une action dans l'historique pour la modification du client
-            ActionLog.objects.create(
+            # (les champs modifiés sont repris par l'audit, voir audit.py)
+            journaliser(
                 type_action='client_modification',
                 description=f'Client modifié : {client.nom_complet} - CIN: {client.cin}',
                 statut='succes',
                 agent=request.user,
                 client=client,
-                donnees_avant=donnees_avant,
-                donnees_apres={
-                    'nom': client.nom,
-                    'prenom': client.prenom,
-                    'cin': client.cin,
-                    'telephone': client.telephone,
-                    'email': client.email,
-                    'adresse': client.adresse
-                }
             )
             
             messages.success(request, f'Client {client.nom_complet} modifié avec succès.')
@@ -315,63 +199,28 @@ def credit_list(request):
     type_filter = request.GET.get('type', '')
     statut_filter = request.GET.get('statut', '')
     
-    # Récupérer tous les crédits avec leurs règlements
-    credits = Credit.objects.all().select_related('client', 'agent').prefetch_related('reglements')
-    
-    # Appliquer les filtres de recherche
-    if search_query:
-        credits = credits.filter(
-            Q(client__nom__icontains=search_query) |
-            Q(client__prenom__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(numero_police__icontains=search_query)
-        )
-    
-    if type_filter:
-        credits = credits.filter(type_credit=type_filter)
-    
-    # Séparer les crédits payés des crédits non réglés selon la nouvelle logique
-    credits_payes = []
-    credits_non_regles = []
-    
-    for credit in credits:
-        # Calculer le reste à payer selon la nouvelle logique
-        # Seuls les règlements effectivement versés comptent
-        total_reglements_verses = 0
-        
-        for reglement in credit.reglements.all():
-            if reglement.mode_paiement == 'especes':
-                # Les paiements en espèces comptent toujours
-                total_reglements_verses += reglement.montant
-            elif reglement.mode_paiement == 'cheque' and reglement.statut == 'verse':
-                # Seuls les chèques versés comptent
-                total_reglements_verses += reglement.montant
-        
-        reste_a_payer = credit.montant_total - total_reglements_verses
-        
-        # Un crédit est "réglé" si le reste à payer est <= 0
-        if reste_a_payer <= 0:
-            credits_payes.append(credit)
-        else:
-            credits_non_regles.append(credit)
-    
-    # Appliquer le filtre de statut si spécifié
-    if statut_filter == 'payes':
-        credits_a_afficher = credits_payes
-    elif statut_filter == 'non_regles':
-        credits_a_afficher = credits_non_regles
-    else:
-        # Par défaut, afficher tous les crédits
-        credits_a_afficher = list(credits)
-    
-    # Statistiques
-    total_credits = len(credits)
-    total_payes = len(credits_payes)
-    total_non_regles = len(credits_non_regles)
-    
-    # Calculer les montants
-    montant_total_payes = sum(credit.montant_total for credit in credits_payes)
-    montant_total_non_regles = sum(credit.montant_total for credit in credits_non_regles)
+    # Appliquer les filtres de recherche ; les échéances affichées pour chaque crédit sont
+    # chargées en une requête par liste, avec les seules colonnes utilisées par le gabarit
+    credits = filtrer_credits(request.GET).select_related('client', 'agent').prefetch_related(
+        Prefetch('echeances', queryset=Echeance.objects.only('credit_id', 'numero_partie', 'montant', 'est_traitee'))
+    )
+    
+    # Un crédit est "réglé" quand les espèces et chèques versés couvrent le montant
+    # (statut_reglement est tenu à jour à chaque enregistrement de règlement)
+    credits_payes = filtrer_par_statut_reglement(credits, 'payes')
+    credits_non_regles = filtrer_par_statut_reglement(credits, 'non_regles')
+    
+    # Statistiques en une seule requête
+    stats = credits.aggregate(
+        total_credits=Count('id'),
+        total_payes=Count('id', filter=Q(statut_reglement='regle')),
+        total_non_regles=Count('id', filter=Q(statut_reglement='non_regle')),
+        montant_total_payes=Sum('montant_total', filter=Q(statut_reglement='regle')),
+        montant_total_non_regles=Sum('montant_total', filter=Q(statut_reglement='non_regle')),
+    )
+    
+    # Appliquer le filtre de statut si spécifié (par défaut, tous les crédits)
+    credits_a_afficher = filtrer_par_statut_reglement(credits, statut_filter)
     
     # Pagination
     paginator = Paginator(credits_a_afficher, 15)
@@ -386,11 +235,11 @@ def credit_list(request):
         'type_choices': Credit.TYPE_CHOICES,
         
         # Statistiques
-        'total_credits': total_credits,
-        'total_payes': total_payes,
-        'total_non_regles': total_non_regles,
-        'montant_total_payes': montant_total_payes,
-        'montant_total_non_regles': montant_total_non_regles,
+        'total_credits': stats['total_credits'],
+        'total_payes': stats['total_payes'],
+        'total_non_regles': stats['total_non_regles'],
+        'montant_total_payes': stats['montant_total_payes'] or 0,
+        'montant_total_non_regles': stats['montant_total_non_regles'] or 0,
         
         # Crédits séparés pour affichage
         'credits_payes': credits_payes[:5],  # Afficher seulement les 5 premiers
@@ -399,6 +248,18 @@ def credit_list(request):
     return render(request, 'gestion_credits/credit_list.html', context)
 
 
+def _creer_credit_divise(request, form):
+    """Créer le crédit divisé d'un formulaire valide ; None si un chèque est invalide (erreurs ajoutées au formulaire)"""
+    creation = CreationCreditDivise(form, request.POST, request.user)
+    if not creation.valider():
+        for erreur in creation.erreurs:
+            form.add_error(None, erreur)
+        return None
+    credit = creation.creer()
+    messages.success(request, f'Crédit divisé créé avec succès pour {credit.client.nom_complet}.')
+    return credit
+
+
 @login_required
 def credit_create(request):
     """Créer un crédit (unique ou divisé)"""
@@ -414,20 +275,13 @@ def credit_create(request):
                 credit.save()
                 
                 # Créer un log d'action pour la création du crédit
-                ActionLog.objects.create(
+                journaliser(
                     type_action='credit_creation',
                     description=f'Crédit unique créé pour {credit.client.nom_complet} - Police {credit.numero_police} - Montant: {credit.montant_total} DH',
                     statut='succes',
                     agent=request.user,
                     client=credit.client,
                     credit=credit,
-                    donnees_apres={
-                        'numero_police': credit.numero_police,
-                        'montant_total': str(credit.montant_total),
-                        'type_credit': credit.type_credit,
-                        'description': credit.description,
-                        'client': credit.client.nom_complet
-                    }
                 )
                 
                 # Créer l'échéance unique
@@ -440,9 +294,9 @@ def credit_create(request):
                     elif credit.duree_semaines:
                         date_echeance = date.today() + timedelta(weeks=credit.duree_semaines)
                     elif credit.duree_mois:
-                        date_echeance = date.today() + timedelta(days=credit.duree_mois * 30)
+                        date_echeance = ajouter_mois(date.today(), credit.duree_mois)
                     else:
-                        date_echeance = date.today() + timedelta(days=30)
+                        date_echeance = ajouter_mois(date.today(), 1)
                 
                 # Vérifier si un chèque de garantie est fourni
                 has_cheque_garantie = form.cleaned_data.get('has_cheque_garantie', False)
@@ -458,19 +312,13 @@ def credit_create(request):
                     )
                     
                     # Log pour la création de l'échéance
-                    ActionLog.objects.create(
+                    journaliser(
                         type_action='echeance_creation',
                         description=f'Échéance créée pour le crédit {credit.numero_police} - Montant: {echeance.montant} DH - Date: {echeance.date_echeance}',
                         statut='succes',
                         agent=request.user,
                         credit=credit,
                         echeance=echeance,
-                        donnees_apres={
-                            'numero_partie': echeance.numero_partie,
-                            'montant': str(echeance.montant),
-                            'date_echeance': str(echeance.date_echeance),
-                            'est_especes': echeance.est_especes
-                        }
                     )
                     
                     # Créer le chèque de garantie
@@ -526,127 +374,9 @@ def credit_create(request):
         if request.method == 'POST':
             form = CreditDiviseCompletForm(request.POST)
             if form.is_valid():
-                try:
-                    # Créer le crédit
-                    credit = form.save(commit=False)
-                    credit.type_credit = 'divise'
-                    credit.agent = request.user
-                    credit.save()
-                    
-                    # Récupérer les données du formulaire
-                    montant_total = credit.montant_total
-                    montant_especes = form.cleaned_data['montant_especes']
-                    type_garantie = form.cleaned_data.get('type_garantie')
-                    
-                    # Créer automatiquement un règlement pour le montant payé en espèces
-                    if montant_especes and montant_especes > 0:
-                        Reglement.objects.create(
-                            credit=credit,
-                            montant=montant_especes,
-                            date_reglement=date.today(),
-                            mode_paiement='especes',
-                            statut=None,  # Pas de statut pour les espèces
-                            commentaire='Paiement initial en espèces lors de la création du crédit',
-                            agent=request.user
-                        )
-                    
-                    # Gérer les chèques de garantie selon le type choisi
-                    if type_garantie == 'unique':
-                        # Créer un seul chèque de garantie
-                        ChequeGarantie.objects.create(
-                            credit=credit,
-                            numero=form.cleaned_data['numero_cheque_unique'],
-                            montant=form.cleaned_data['montant_garantie_unique'],
-                            banque=form.cleaned_data['banque_unique'],
-                            date_emission=form.cleaned_data['date_emission_unique'],
-                            date_echeance=form.cleaned_data['date_reglement_prevu_unique'],
-                            commentaire=form.cleaned_data.get('commentaire_unique', '')
-                        )
-                        
-                        # Créer l'alerte pour le chèque de garantie unique
-                        Alerte.objects.create(
-                            echeance=None,
-                            type_alerte='cheque_garantie',
-                            message=f'Chèque de garantie unique à traiter pour {credit.client.nom_complet}',
-                            date_alerte=date.today(),
-                            date_rappel=form.cleaned_data['date_reglement_prevu_unique'],
-                            agent=request.user
-                        )
-                        
-                    elif type_garantie == 'multiple':
-                        # Créer plusieurs chèques de garantie
-                        nombre_cheques = form.cleaned_data['nombre_cheques']
-                        
-                        for i in range(1, nombre_cheques + 1):
-                            # Récupérer les données du formulaire pour chaque chèque
-                            numero_cheque = request.POST.get(f'numero_cheque_{i}')
-                            banque = request.POST.get(f'banque_{i}')
-                            date_emission_str = request.POST.get(f'date_emission_{i}')
-                            date_reglement_str = request.POST.get(f'date_reglement_prevu_{i}')
-                            montant_cheque_str = request.POST.get(f'montant_garantie_{i}')
-                            commentaire = request.POST.get(f'commentaire_{i}', '')
-                            
-                            # Validation des champs obligatoires
-                            if numero_cheque and banque and date_emission_str and date_reglement_str and montant_cheque_str:
-                                try:
-                                    date_emission = datetime.strptime(date_emission_str, '%Y-%m-%d').date()
-                                    date_reglement = datetime.strptime(date_reglement_str, '%Y-%m-%d').date()
-                                    montant_cheque = Decimal(montant_cheque_str)
-                                    
-                                    # Créer le chèque de garantie
-                                    ChequeGarantie.objects.create(
-                                        credit=credit,
-                                        numero=numero_cheque,
-                                        montant=montant_cheque,
-                                        banque=banque,
-                                        date_emission=date_emission,
-                                        date_echeance=date_reglement,
-                                        commentaire=commentaire
-                                    )
-                                    
-                                    # Créer l'alerte pour le chèque de garantie
-                                    Alerte.objects.create(
-                                        echeance=None,
-                                        type_alerte='cheque_garantie',
-                                        message=f'Chèque de garantie {i} à traiter pour {credit.client.nom_complet}',
-                                        date_alerte=date.today(),
-                                        date_rappel=date_reglement,
-                                        agent=request.user
-                                    )
-                                except (ValueError, TypeError) as e:
-                                    messages.error(request, f'Erreur dans les données du chèque {i}: {str(e)}')
-                                    continue
-                            else:
-                                messages.error(request, f'Données manquantes pour le chèque {i}')
-                                continue
-                    
-                    # Créer un log d'action pour la création du crédit
-                    ActionLog.objects.create(
-                        type_action='credit_creation',
-                        description=f'Crédit divisé créé pour {credit.client.nom_complet} - Police {credit.numero_police} - Montant: {credit.montant_total} DH - Espèces: {montant_especes} DH',
-                        statut='succes',
-                        agent=request.user,
-                        client=credit.client,
-                        credit=credit,
-                        donnees_apres={
-                            'numero_police': credit.numero_police,
-                            'montant_total': str(credit.montant_total),
-                            'montant_especes': str(montant_especes),
-                            'type_garantie': type_garantie,
-                            'type_credit': credit.type_credit,
-                            'description': credit.description,
-                            'client': credit.client.nom_complet
-                        }
-                    )
-                    
-                    messages.success(request, f'Crédit divisé créé avec succès pour {credit.client.nom_complet}.')
+                credit = _creer_credit_divise(request, form)
+                if credit is not None:
                     return redirect('gestion_credits:credit_detail', pk=credit.pk)
-                    
-                except Exception as e:
-                    messages.error(request, f'Erreur lors de la création du crédit: {str(e)}')
-                    # Supprimer le crédit créé en cas d'erreur
-                    if 'credit' in locals():
-                        credit.delete()
         else:
             form = CreditDiviseCompletForm()
         
@@ -660,112 +390,9 @@ def credit_create_divise_complet(request):
     if request.method == 'POST':
         form = CreditDiviseCompletForm(request.POST)
         if form.is_valid():
-            try:
-                # Créer le crédit
-                credit = form.save(commit=False)
-                credit.type_credit = 'divise'
-                credit.agent = request.user
-                credit.save()
-                
-                # Créer automatiquement un règlement pour le montant payé en espèces
-                montant_especes = form.cleaned_data['montant_especes']
-                if montant_especes and montant_especes > 0:
-                    Reglement.objects.create(
-                        credit=credit,
-                        montant=montant_especes,
-                        date_reglement=date.today(),
-                        mode_paiement='especes',
-                        statut=None,  # Pas de statut pour les espèces
-                        commentaire='Paiement initial en espèces lors de la création du crédit',
-                        agent=request.user
-                    )
-                    
-                    # Recalculer le reste à payer du crédit
-                    credit.recalculer_reste_a_payer()
-                
-                # Récupérer le type de garantie choisi
-                type_garantie = form.cleaned_data['type_garantie']
-                
-                if type_garantie == 'unique':
-                    # Créer un seul chèque de garantie
-                    ChequeGarantie.objects.create(
-                        credit=credit,
-                        numero=form.cleaned_data['numero_cheque_unique'],
-                        montant=form.cleaned_data['montant_garantie_unique'],
-                        banque=form.cleaned_data['banque_unique'],
-                        date_emission=form.cleaned_data['date_emission_unique'],
-                        date_echeance=form.cleaned_data['date_reglement_prevu_unique'],
-                        commentaire=form.cleaned_data.get('commentaire_unique', '')
-                    )
-                    
-                    # Créer l'alerte pour le chèque de garantie unique
-                    Alerte.objects.create(
-                        echeance=None,
-                        type_alerte='cheque_garantie',
-                        message=f'Chèque de garantie unique à traiter pour {credit.client.nom_complet}',
-                        date_alerte=date.today(),
-                        date_rappel=form.cleaned_data['date_reglement_prevu_unique'],
-                        agent=request.user
-                    )
-                    
-                elif type_garantie == 'multiple':
-                    # Créer plusieurs chèques de garantie
-                    nombre_cheques = form.cleaned_data['nombre_cheques']
-                    montant_especes = form.cleaned_data['montant_especes']
-                    montant_reste = credit.montant_total - montant_especes
-                    montant_partie = montant_reste / nombre_cheques
-                    
-                    for i in range(1, nombre_cheques + 1):
-                        # Récupérer les données du formulaire pour chaque chèque
-                        numero_cheque = request.POST.get(f'numero_cheque_{i}')
-                        banque = request.POST.get(f'banque_{i}')
-                        date_emission_str = request.POST.get(f'date_emission_{i}')
-                        date_reglement_str = request.POST.get(f'date_reglement_prevu_{i}')
-                        montant_cheque_str = request.POST.get(f'montant_garantie_{i}')
-                        commentaire = request.POST.get(f'commentaire_{i}', '')
-                        
-                        # Validation des champs obligatoires
-                        if numero_cheque and banque and date_emission_str and date_reglement_str and montant_cheque_str:
-                            try:
-                                date_emission = datetime.strptime(date_emission_str, '%Y-%m-%d').date()
-                                date_reglement = datetime.strptime(date_reglement_str, '%Y-%m-%d').date()
-                                montant_cheque = Decimal(montant_cheque_str)
-                                
-                                # Créer le chèque de garantie
-                                ChequeGarantie.objects.create(
-                                    credit=credit,
-                                    numero=numero_cheque,
-                                    montant=montant_cheque,
-                                    banque=banque,
-                                    date_emission=date_emission,
-                                    date_echeance=date_reglement,
-                                    commentaire=commentaire
-                                )
-                                
-                                # Créer l'alerte pour le chèque de garantie
-                                Alerte.objects.create(
-                                    echeance=None,
-                                    type_alerte='cheque_garantie',
-                                    message=f'Chèque de garantie {i} à traiter pour {credit.client.nom_complet}',
-                                    date_alerte=date.today(),
-                                    date_rappel=date_reglement,
-                                    agent=request.user
-                                )
-                            except (ValueError, TypeError) as e:
-                                messages.error(request, f'Erreur dans les données du chèque {i}: {str(e)}')
-                                continue
-                        else:
-                            messages.error(request, f'Données manquantes pour le chèque {i}')
-                            continue
-                
-                messages.success(request, f'Crédit divisé créé avec succès pour {credit.client.nom_complet}.')
+            credit = _creer_credit_divise(request, form)
+            if credit is not None:
                 return redirect('gestion_credits:credit_detail', pk=credit.pk)
-                
-            except Exception as e:
-                messages.error(request, f'Erreur lors de la création du crédit: {str(e)}')
-                # Supprimer le crédit créé en cas d'erreur
-                if 'credit' in locals():
-                    credit.delete()
     else:
         form = CreditDiviseCompletForm()
     
@@ -813,24 +440,12 @@ def credit_detail(request, pk):
     reste_a_payer = credit.montant_total - total_reglements_verses
     
     # Récupérer les chèques de garantie et les diviser par statut
-    cheques_garantie = credit.cheques_garantie.all()
-    cheques_verses = []
-    cheques_non_verses = []
-    
-    for cheque in cheques_garantie:
-        # Déterminer le statut du chèque en regardant les règlements correspondants
-        statut_cheque = 'non_verse'  # Par défaut
-        for reglement in reglements:
-            if (reglement.mode_paiement == 'cheque' and 
-                reglement.commentaire and 
-                cheque.numero in reglement.commentaire):
-                statut_cheque = reglement.statut or 'non_verse'
-                break
-        
-        if statut_cheque == 'verse':
-            cheques_verses.append(cheque)
-        else:
-            cheques_non_verses.append(cheque)
+    # (statut du règlement rattaché, calculé dans la même requête)
+    cheques_garantie = list(credit.cheques_garantie.annotate(
+        statut_versement=ChequeGarantie.expression_statut_versement()
+    ))
+    cheques_verses = [cheque for cheque in cheques_garantie if cheque.statut_versement == 'verse']
+    cheques_non_verses = [cheque for cheque in cheques_garantie if cheque.statut_versement != 'verse']
     
     # Calculer le total payé et le reste à payer
     total_paye = getattr(credit, 'total_paye', 0)
@@ -863,16 +478,20 @@ def reglement_create(request, credit_id):
     if request.method == 'POST':
         form = ReglementForm(request.POST, credit=credit)
         if form.is_valid():
-            reglement = form.save(commit=False)
-            reglement.credit = credit
-            reglement.agent = request.user
-            reglement.save()
-            
-            # Recalculer le reste à payer du crédit
-            credit.recalculer_reste_a_payer()
-            
-            messages.success(request, f'Règlement de {reglement.montant} DH ajouté avec succès.')
-            return redirect('gestion_credits:credit_detail', pk=credit.pk)
+            try:
+                reglement = PaiementService(request.user).enregistrer_paiement(Paiement(
+                    credit,
+                    form.cleaned_data['montant'],
+                    form.cleaned_data['date_reglement'],
+                    mode_paiement=form.cleaned_data['mode_paiement'],
+                    statut=form.cleaned_data.get('statut'),
+                    commentaire=form.cleaned_data.get('commentaire'),
+                ))
+            except ErreurPaiement as e:
+                form.add_error('montant', str(e))
+            else:
+                messages.success(request, f'Règlement de {reglement.montant} DH ajouté avec succès.')
+                return redirect('gestion_credits:credit_detail', pk=credit.pk)
     else:
         form = ReglementForm(credit=credit)
     
@@ -1002,260 +621,133 @@ def credit_delete(request, pk):
     return render(request, 'gestion_credits/credit_confirm_delete.html', context)
 
 
+def _lire_paiement_echeance(request, credit):
+    """Lire et valider le paiement saisi sur la page des paiements d'un crédit ; lève ErreurPaiement"""
+    type_paiement = request.POST.get('type_paiement')
+    montant_str = request.POST.get('montant')
+    date_paiement_str = request.POST.get('date_paiement')
+    commentaire = request.POST.get('commentaire', '')
+    
+    # Validation des champs obligatoires
+    if not all([type_paiement, montant_str, date_paiement_str]):
+        raise ErreurPaiement('Tous les champs obligatoires doivent être remplis.')
+    try:
+        montant = Decimal(montant_str)
+        date_paiement = datetime.strptime(date_paiement_str, '%Y-%m-%d').date()
+    except (ValueError, TypeError, ArithmeticError):
+        raise ErreurPaiement('Format de données invalide.')
+    if date_paiement > date.today():
+        raise ErreurPaiement('La date de paiement ne peut pas être dans le futur.')
+    
+    if type_paiement == 'especes':
+        return Paiement(
+            credit, montant, date_paiement,
+            mode_paiement='especes',
+            commentaire=f"Paiement en espèces - {commentaire}",
+            alerte={
+                'type_alerte': 'paiement',
+                'message': f'Paiement en espèces de {montant:.2f} DH reçu pour {credit.client.nom_complet}',
+                'date_rappel': date_paiement,
+            },
+        )
+    
+    if type_paiement != 'effet':
+        raise ErreurPaiement('Type de paiement inconnu.')
+    
+    # Informations de l'effet
+    banque = request.POST.get('banque')
+    numero_effet = request.POST.get('numero_effet')
+    date_emission_str = request.POST.get('date_emission')
+    date_echeance_str = request.POST.get('date_echeance')
+    statut_cheque = request.POST.get('statut_cheque', 'non_verse')
+    if not all([banque, numero_effet, date_emission_str, date_echeance_str]):
+        raise ErreurPaiement('Tous les champs pour l\'effet sont obligatoires.')
+    try:
+        date_emission = datetime.strptime(date_emission_str, '%Y-%m-%d').date()
+        date_echeance = datetime.strptime(date_echeance_str, '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        raise ErreurPaiement('Format de dates invalide pour l\'effet.')
+    if date_emission > date.today():
+        raise ErreurPaiement('La date d\'émission ne peut pas être dans le futur.')
+    if date_echeance < date.today():
+        raise ErreurPaiement('La date d\'échéance ne peut pas être dans le passé.')
+    
+    # Un règlement par effet, rattaché au chèque, avec une alerte seulement si l'effet reste à encaisser
+    return Paiement(
+        credit, montant, date_echeance,
+        mode_paiement='cheque',
+        statut=statut_cheque,
+        commentaire=f"Effet {numero_effet} - {banque} - {commentaire}",
+        effet={
+            'numero': numero_effet,
+            'montant': montant,
+            'banque': banque,
+            'date_emission': date_emission,
+            'date_echeance': date_echeance,
+            'commentaire': f"Effet pour {credit.client.nom_complet} - {commentaire}",
+        },
+        alerte={
+            'type_alerte': 'cheque_garantie',
+            'message': f'Effet {numero_effet} de {montant:.2f} DH à encaisser pour {credit.client.nom_complet}',
+            'date_rappel': date_echeance,
+        } if statut_cheque == 'non_verse' else None,
+    )
+
+
 @login_required
 def echeance_create_for_credit(request, credit_id):
     """Ajouter des paiements pour un crédit (espèces ou effets)"""
     credit = get_object_or_404(Credit, pk=credit_id)
     
     if request.method == 'POST':
-        # Récupérer les données du formulaire
-        type_paiement = request.POST.get('type_paiement')
-        montant_str = request.POST.get('montant')
-        date_paiement_str = request.POST.get('date_paiement')
-        commentaire = request.POST.get('commentaire', '')
-        
-        # Validation des champs obligatoires
-        if not all([type_paiement, montant_str, date_paiement_str]):
-            messages.error(request, 'Tous les champs obligatoires doivent être remplis.')
-            return render(request, 'gestion_credits/echeance_create_for_credit.html', {
-                'credit': credit,
-                'today': date.today(),
-                'reglements': credit.reglements.all().order_by('-date_reglement'),
-                'total_paye': getattr(credit, 'total_paye', 0),
-                'reste_a_payer': getattr(credit, 'reste_a_payer', credit.montant_total)
-            })
-        
-        try:
-            montant = Decimal(montant_str)
-            date_paiement = datetime.strptime(date_paiement_str, '%Y-%m-%d').date()
-            
-            # Validation du montant
-            if montant <= 0:
-                messages.error(request, 'Le montant doit être supérieur à 0.')
-                return render(request, 'gestion_credits/echeance_create_for_credit.html', {
-                    'credit': credit,
-                    'today': date.today(),
-                    'reglements': credit.reglements.all().order_by('-date_reglement'),
-                    'total_paye': getattr(credit, 'total_paye', 0),
-                    'reste_a_payer': getattr(credit, 'reste_a_payer', credit.montant_total)
-                })
-            
-            # Vérifier que le montant ne dépasse pas le reste à payer
-            reste_a_payer = getattr(credit, 'reste_a_payer', credit.montant_total)
-            if montant > reste_a_payer:
-                messages.error(request, f'Le montant ({montant:.2f} DH) ne peut pas dépasser le reste à payer ({reste_a_payer:.2f} DH).')
-                return render(request, 'gestion_credits/echeance_create_for_credit.html', {
-                    'credit': credit,
-                    'today': date.today(),
-                    'reglements': credit.reglements.all().order_by('-date_reglement'),
-                    'total_paye': getattr(credit, 'total_paye', 0),
-                    'reste_a_payer': reste_a_payer
-                })
-            
-            # Validation de la date
-            if date_paiement > date.today():
-                messages.error(request, 'La date de paiement ne peut pas être dans le futur.')
-                return render(request, 'gestion_credits/echeance_create_for_credit.html', {
-                    'credit': credit,
-                    'today': date.today(),
-                    'reglements': credit.reglements.all().order_by('-date_reglement'),
-                    'total_paye': getattr(credit, 'total_paye', 0),
-                    'reste_a_payer': reste_a_payer
-                })
-            
-        except (ValueError, TypeError):
-            messages.error(request, 'Format de données invalide.')
-            return render(request, 'gestion_credits/echeance_create_for_credit.html', {
-                'credit': credit,
-                'today': date.today(),
-                'reglements': credit.reglements.all().order_by('-date_reglement'),
-                'total_paye': getattr(credit, 'total_paye', 0),
-                'reste_a_payer': getattr(credit, 'reste_a_payer', credit.montant_total)
-            })
-        
-        # Créer le paiement selon le type
         try:
+            paiement = _lire_paiement_echeance(request, credit)
+            PaiementService(request.user).enregistrer_paiement(paiement)
+        except ErreurPaiement as e:
+            messages.error(request, str(e))
+        else:
+            type_paiement = request.POST.get('type_paiement')
             if type_paiement == 'especes':
-                # Créer un règlement en espèces
-                reglement = Reglement.objects.create(
-                    credit=credit,
-                    montant=montant,
-                    date_reglement=date_paiement,
-                    mode_paiement='especes',
-                    commentaire=f"Paiement en espèces - {commentaire}",
-                    agent=request.user
-                )
-                
-                # Créer une alerte pour le paiement
-                Alerte.objects.create(
-                    echeance=None,
-                    type_alerte='paiement',
-                    message=f'Paiement en espèces de {montant:.2f} DH reçu pour {credit.client.nom_complet}',
-                    date_alerte=date.today(),
-                    date_rappel=date_paiement,
-                    agent=request.user
-                )
-            
-                messages.success(request, f'Paiement en espèces de {montant:.2f} DH ajouté avec succès.')
-                
-            elif type_paiement == 'effet':
-                # Récupérer les informations de l'effet
-                banque = request.POST.get('banque')
-                numero_effet = request.POST.get('numero_effet')
-                date_emission_str = request.POST.get('date_emission')
-                date_echeance_str = request.POST.get('date_echeance')
-                statut_cheque = request.POST.get('statut_cheque', 'non_verse')
-                
-                # Validation des champs obligatoires pour les effets
-                if not all([banque, numero_effet, date_emission_str, date_echeance_str]):
-                    messages.error(request, 'Tous les champs pour l\'effet sont obligatoires.')
-                    return render(request, 'gestion_credits/echeance_create_for_credit.html', {
-                        'credit': credit,
-                        'today': date.today(),
-                        'reglements': credit.reglements.all().order_by('-date_reglement'),
-                        'total_paye': getattr(credit, 'total_paye', 0),
-                        'reste_a_payer': reste_a_payer
-                    })
-                
-                try:
-                    date_emission = datetime.strptime(date_emission_str, '%Y-%m-%d').date()
-                    date_echeance = datetime.strptime(date_echeance_str, '%Y-%m-%d').date()
-                    
-                    # Validation des dates
-                    if date_emission > date.today():
-                        messages.error(request, 'La date d\'émission ne peut pas être dans le futur.')
-                        return render(request, 'gestion_credits/echeance_create_for_credit.html', {
-                            'credit': credit,
-                            'today': date.today(),
-                            'reglements': credit.reglements.all().order_by('-date_reglement'),
-                            'total_paye': getattr(credit, 'total_paye', 0),
-                            'reste_a_payer': reste_a_payer
-                        })
-                    
-                    if date_echeance < date.today():
-                        messages.error(request, 'La date d\'échéance ne peut pas être dans le passé.')
-                        return render(request, 'gestion_credits/echeance_create_for_credit.html', {
-                            'credit': credit,
-                            'today': date.today(),
-                            'reglements': credit.reglements.all().order_by('-date_reglement'),
-                            'total_paye': getattr(credit, 'total_paye', 0),
-                            'reste_a_payer': reste_a_payer
-                        })
-                    
-                except (ValueError, TypeError):
-                    messages.error(request, 'Format de dates invalide pour l\'effet.')
-                    return render(request, 'gestion_credits/echeance_create_for_credit.html', {
-                        'credit': credit,
-                        'today': date.today(),
-                        'reglements': credit.reglements.all().order_by('-date_reglement'),
-                        'total_paye': getattr(credit, 'total_paye', 0),
-                        'reste_a_payer': reste_a_payer
-                    })
-                
-                # Créer un règlement par effet avec le statut approprié
-                reglement = Reglement.objects.create(
-                    credit=credit,
-                    montant=montant,
-                    date_reglement=date_echeance,
-                    mode_paiement='cheque',
-                    statut=statut_cheque,
-                    commentaire=f"Effet {numero_effet} - {banque} - {commentaire}",
-                    agent=request.user
-                )
-                
-                # Créer le chèque
-                cheque = ChequeGarantie.objects.create(
-                    credit=credit,
-                    numero=numero_effet,
-                    montant=montant,
-                    banque=banque,
-                    date_emission=date_emission,
-                    date_echeance=date_echeance,
-                    commentaire=f"Effet pour {credit.client.nom_complet} - {commentaire}"
-                )
-                
-                # Créer une alerte pour l'effet seulement si non versé
-                if statut_cheque == 'non_verse':
-                    Alerte.objects.create(
-                        echeance=None,
-                        type_alerte='cheque_garantie',
-                        message=f'Effet {numero_effet} de {montant:.2f} DH à encaisser pour {credit.client.nom_complet}',
-                        date_alerte=date.today(),
-                        date_rappel=date_echeance,
-                        agent=request.user
-                    )
-                
-                # Message de succès adapté au statut
-                if statut_cheque == 'verse':
-                    messages.success(request, f'Effet de {montant:.2f} DH déjà versé ajouté avec succès.')
-                else:
-                    messages.success(request, f'Effet de {montant:.2f} DH à encaisser ajouté avec succès.')
-            
-            # Mettre à jour le reste à payer du crédit
-            credit.reste_a_payer = max(0, reste_a_payer - montant)
-            credit.save()
+                messages.success(request, f'Paiement en espèces de {paiement.montant:.2f} DH ajouté avec succès.')
+            elif paiement.statut == 'verse':
+                messages.success(request, f'Effet de {paiement.montant:.2f} DH déjà versé ajouté avec succès.')
+            else:
+                messages.success(request, f'Effet de {paiement.montant:.2f} DH à encaisser ajouté avec succès.')
             
-            # Créer un log d'action
-            ActionLog.objects.create(
+            # Créer un log d'action (le reste à payer a été relu après l'enregistrement)
+            journaliser(
                 type_action='paiement_ajoute',
-                description=f'Paiement de {montant:.2f} DH ajouté pour {credit.client.nom_complet} - Police {credit.numero_police}',
+                description=f'Paiement de {paiement.montant:.2f} DH ajouté pour {credit.client.nom_complet} - Police {credit.numero_police}',
                 statut='succes',
                 agent=request.user,
                 client=credit.client,
                 credit=credit,
                 donnees_apres={
-                    'montant': str(montant),
+                    'montant': str(paiement.montant),
                     'type_paiement': type_paiement,
                     'reste_a_payer': str(credit.reste_a_payer),
-                    'date_paiement': date_paiement.strftime('%Y-%m-%d')
+                    'date_paiement': request.POST.get('date_paiement'),
                 }
             )
-            
             return redirect('gestion_credits:credit_detail', pk=credit.pk)
-            
-        except Exception as e:
-            messages.error(request, f'Erreur lors de l\'ajout du paiement : {str(e)}')
-            return render(request, 'gestion_credits/echeance_create_for_credit.html', {
-                'credit': credit,
-                'today': date.today(),
-                'reglements': credit.reglements.all().order_by('-date_reglement'),
-                'total_paye': getattr(credit, 'total_paye', 0),
-                'reste_a_payer': getattr(credit, 'reste_a_payer', credit.montant_total)
-            })
     
     # Récupérer l'historique des paiements
     reglements = credit.reglements.all().order_by('-date_reglement')
     
     # Récupérer les chèques de garantie et les diviser par statut
-    cheques_garantie = credit.cheques_garantie.all()
-    cheques_verses = []
-    cheques_non_verses = []
-    
-    for cheque in cheques_garantie:
-        # Déterminer le statut du chèque en regardant les règlements correspondants
-        statut_cheque = 'non_verse'  # Par défaut
-        for reglement in reglements:
-            if (reglement.mode_paiement == 'cheque' and 
-                reglement.commentaire and 
-                cheque.numero in reglement.commentaire):
-                statut_cheque = reglement.statut or 'non_verse'
-                break
-        
-        if statut_cheque == 'verse':
-            cheques_verses.append(cheque)
-        else:
-            cheques_non_verses.append(cheque)
-    
-    # Calculer le total payé et le reste à payer
-    total_paye = getattr(credit, 'total_paye', 0)
-    reste_a_payer = getattr(credit, 'reste_a_payer', credit.montant_total)
+    # (statut du règlement rattaché, calculé dans la même requête)
+    cheques_garantie = list(credit.cheques_garantie.annotate(
+        statut_versement=ChequeGarantie.expression_statut_versement()
+    ))
+    cheques_verses = [cheque for cheque in cheques_garantie if cheque.statut_versement == 'verse']
+    cheques_non_verses = [cheque for cheque in cheques_garantie if cheque.statut_versement != 'verse']
     
     context = {
         'credit': credit,
         'today': date.today(),
         'reglements': reglements,
-        'total_paye': total_paye,
-        'reste_a_payer': reste_a_payer,
+        'total_paye': credit.total_paye,
+        'reste_a_payer': credit.reste_a_payer,
         'cheques_garantie': cheques_garantie,
         'cheques_verses': cheques_verses,
         'cheques_non_verses': cheques_non_verses
@@ -1266,7 +758,7 @@ def echeance_create_for_credit(request, credit_id):
 
 @login_required
 def alerte_list(request):
-    """Système d'alertes professionnel et optimisé pour les paiements proches"""
+    """Système d'alertes : lecture paginée de l'index matérialisé des alertes"""
     today = date.today()
     
     # === FILTRES ET RECHERCHE ===
@@ -1276,140 +768,62 @@ def alerte_list(request):
     search_query = request.GET.get('search', '')
     agent_filter = request.GET.get('agent', '')
     
-    # === ALERTES URGENTES (AUJOURD'HUI ET EN RETARD) ===
-    alertes_urgentes = []
-    
-    # Chèques arrivant à échéance aujourd'hui
-    cheques_aujourd_hui = ChequeGarantie.objects.filter(
-        date_echeance=today
-    ).select_related('credit__client', 'credit__agent').order_by('montant')
-    
-    for cheque in cheques_aujourd_hui:
-        alertes_urgentes.append({
-            'type': 'cheque_echeance_aujourd_hui',
-            'urgence': 'critique',
-            'titre': f'Chèque à échéance aujourd\'hui',
-            'message': f'Chèque {cheque.numero} de {cheque.montant} DH',
-            'client': cheque.credit.client,
-            'credit': cheque.credit,
-            'agent': cheque.credit.agent,
-            'date_rappel': today,
-            'montant': cheque.montant,
-            'banque': cheque.banque,
-            'numero_cheque': cheque.numero,
-            'objet': cheque
-        })
-    
-    # Chèques en retard
-    cheques_en_retard = ChequeGarantie.objects.filter(
-        date_echeance__lt=today
-    ).select_related('credit__client', 'credit__agent').order_by('date_echeance')
-    
-    for cheque in cheques_en_retard:
-        jours_retard = (today - cheque.date_echeance).days
-        alertes_urgentes.append({
-            'type': 'cheque_en_retard',
-            'urgence': 'critique',
-            'titre': f'Chèque en retard de {jours_retard} jour(s)',
-            'message': f'Chèque {cheque.numero} de {cheque.montant} DH',
-            'client': cheque.credit.client,
-            'credit': cheque.credit,
-            'agent': cheque.credit.agent,
-            'date_rappel': cheque.date_echeance,
-            'montant': cheque.montant,
-            'banque': cheque.banque,
-            'numero_cheque': cheque.numero,
-            'jours_retard': jours_retard,
-            'objet': cheque
-        })
+    # Faire passer les éléments au niveau d'urgence du jour (une fois par jour)
+    assurer_bascule_quotidienne(today)
     
-    # === ALERTES IMPORTANTES (7 PROCHAINS JOURS) ===
-    alertes_importantes = []
-    
-    # Chèques arrivant à échéance dans les 7 prochains jours
-    cheques_semaine_prochaine = ChequeGarantie.objects.filter(
-        date_echeance__range=[today + timedelta(days=1), today + timedelta(days=7)]
-    ).select_related('credit__client', 'credit__agent').order_by('date_echeance')
-    
-    for cheque in cheques_semaine_prochaine:
-        jours_restants = (cheque.date_echeance - today).days
-        alertes_importantes.append({
-            'type': 'cheque_echeance_proche',
-            'urgence': 'importante',
-            'titre': f'Chèque à échéance dans {jours_restants} jour(s)',
-            'message': f'Chèque {cheque.numero} de {cheque.montant} DH',
-            'client': cheque.credit.client,
-            'credit': cheque.credit,
-            'agent': cheque.credit.agent,
-            'date_rappel': cheque.date_echeance,
-            'montant': cheque.montant,
-            'banque': cheque.banque,
-            'numero_cheque': cheque.numero,
-            'jours_restants': jours_restants,
-            'objet': cheque
-        })
+    alertes = IndexAlerte.objects.filter(niveau__lte=IndexAlerte.NIVEAU_INFORMATIF)
     
-    # === ALERTES INFORMATIVES (30 PROCHAINS JOURS) ===
-    alertes_informatives = []
-    
-    # Chèques arrivant à échéance dans les 30 prochains jours
-    cheques_mois_prochain = ChequeGarantie.objects.filter(
-        date_echeance__range=[today + timedelta(days=8), today + timedelta(days=30)]
-    ).select_related('credit__client', 'credit__agent').order_by('date_echeance')
-    
-    for cheque in cheques_mois_prochain:
-        jours_restants = (cheque.date_echeance - today).days
-        alertes_informatives.append({
-            'type': 'cheque_echeance_mensuelle',
-            'urgence': 'informatif',
-            'titre': f'Chèque à échéance dans {jours_restants} jour(s)',
-            'message': f'Chèque {cheque.numero} de {cheque.montant} DH',
-            'client': cheque.credit.client,
-            'credit': cheque.credit,
-            'agent': cheque.credit.agent,
-            'date_rappel': cheque.date_echeance,
-            'montant': cheque.montant,
-            'banque': cheque.banque,
-            'numero_cheque': cheque.numero,
-            'jours_restants': jours_restants,
-            'objet': cheque
-        })
+    if statut_filter:
+        alertes = alertes.filter(statut=statut_filter)
+    else:
+        # Par défaut, seules les alertes actives
+        alertes = alertes.exclude(statut='traitee')
     
-    # === FILTRAGE DES ALERTES ===
-    toutes_alertes = alertes_urgentes + alertes_importantes + alertes_informatives
+    if type_filter:
+        alertes = alertes.filter(type_alerte=type_filter)
     
-    # Filtre par agent
     if agent_filter:
-        toutes_alertes = [a for a in toutes_alertes if a['agent'].username == agent_filter]
+        alertes = alertes.filter(agent__username=agent_filter)
+    
+    if search_query:
+        alertes = alertes.filter(cle_recherche__contains=search_query.lower())
     
     # Filtre par urgence
     if urgence_filter == 'critique':
-        toutes_alertes = [a for a in toutes_alertes if a['urgence'] == 'critique']
+        niveaux = [IndexAlerte.NIVEAU_CRITIQUE]
     elif urgence_filter == 'importante':
-        toutes_alertes = [a for a in toutes_alertes if a['urgence'] in ['critique', 'importante']]
+        niveaux = [IndexAlerte.NIVEAU_CRITIQUE, IndexAlerte.NIVEAU_IMPORTANTE]
+    else:
+        niveaux = [IndexAlerte.NIVEAU_CRITIQUE, IndexAlerte.NIVEAU_IMPORTANTE, IndexAlerte.NIVEAU_INFORMATIF]
     
-    # Filtre par recherche
-    if search_query:
-        toutes_alertes = [a for a in toutes_alertes if 
-            search_query.lower() in a['client'].nom_complet.lower() or
-            search_query.lower() in a['credit'].numero_police.lower() or
-            search_query.lower() in a['numero_cheque'].lower()
-        ]
-    
-    # === STATISTIQUES ===
-    total_alertes = len(toutes_alertes)
-    alertes_critiques = len([a for a in toutes_alertes if a['urgence'] == 'critique'])
-    alertes_importantes = len([a for a in toutes_alertes if a['urgence'] == 'importante'])
-    alertes_informatives = len([a for a in toutes_alertes if a['urgence'] == 'informatif'])
-    
-    montant_total_urgent = sum(a['montant'] for a in toutes_alertes if a['urgence'] == 'critique')
-    montant_total_important = sum(a['montant'] for a in toutes_alertes if a['urgence'] == 'importante')
-    
-    # === PAGINATION ===
-    paginator = Paginator(toutes_alertes, 25)
+    # === STATISTIQUES (un seul GROUP BY par niveau) ===
+    stats = {
+        ligne['niveau']: ligne
+        for ligne in alertes.filter(niveau__in=niveaux).order_by().values('niveau').annotate(
+            nombre=Count('id'), montant=Sum('montant')
+        )
+    }
+    
+    def stat(niveau, cle):
+        return (stats.get(niveau) or {}).get(cle) or 0
+    
+    total_alertes = sum(ligne['nombre'] for ligne in stats.values())
+    
+    # === PAGINATION (en SQL ; le total vient déjà du GROUP BY) ===
+    paginator = Paginator(
+        alertes.filter(niveau__in=niveaux).select_related('client', 'credit', 'agent').order_by(
+            'niveau', 'date_echeance', 'id'
+        ),
+        25,
+    )
+    paginator.count = total_alertes
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
+    # Paramètres de filtre à conserver dans les liens de pagination
+    filtres = request.GET.copy()
+    filtres.pop('page', None)
+    
     # === AGENTS DISPONIBLES POUR FILTRE ===
     agents_disponibles = User.objects.filter(
         credits_geres__isnull=False
@@ -1418,11 +832,11 @@ def alerte_list(request):
     context = {
         'page_obj': page_obj,
         'total_alertes': total_alertes,
-        'alertes_critiques': alertes_critiques,
-        'alertes_importantes': alertes_importantes,
-        'alertes_informatives': alertes_informatives,
-        'montant_total_urgent': montant_total_urgent,
-        'montant_total_important': montant_total_important,
+        'alertes_critiques': stat(IndexAlerte.NIVEAU_CRITIQUE, 'nombre'),
+        'alertes_importantes': stat(IndexAlerte.NIVEAU_IMPORTANTE, 'nombre'),
+        'alertes_informatives': stat(IndexAlerte.NIVEAU_INFORMATIF, 'nombre'),
+        'montant_total_urgent': stat(IndexAlerte.NIVEAU_CRITIQUE, 'montant'),
+        'montant_total_important': stat(IndexAlerte.NIVEAU_IMPORTANTE, 'montant'),
         
         # Filtres
         'statut_filter': statut_filter,
@@ -1431,6 +845,9 @@ def alerte_list(request):
         'search_query': search_query,
         'agent_filter': agent_filter,
         'agents_disponibles': agents_disponibles,
+        'statut_choices': Alerte.STATUT_CHOICES,
+        'type_choices': Alerte.TYPE_CHOICES,
+        'filtres_query': filtres.urlencode(),
         
         # Date
         'today': today,
@@ -1501,25 +918,60 @@ def user_logout(request):
 
 
 # Vues AJAX pour le tableau de bord
+def _indicateurs_demandes(request):
+    """Indicateurs demandés par ?fields= (tous par défaut), None si l'un d'eux est inconnu"""
+    champs = [champ for champ in request.GET.get('fields', '').split(',') if champ]
+    if not champs:
+        return list(INDICATEURS)
+    if any(champ not in INDICATEURS for champ in champs):
+        return None
+    return list(dict.fromkeys(champs))
+
+
+def _modeles_indicateurs(champs):
+    return {INDICATEURS[champ][0] for champ in champs}
+
+
+def _etag_dashboard_stats(request):
+    """Jeton de version des indicateurs : jour, versions des modèles comptés (cache_tableau) et champs"""
+    champs = _indicateurs_demandes(request)
+    if champs is None:
+        return None
+    versions = versions_tableau(_modeles_indicateurs(champs))
+    signature = ':'.join([
+        date.today().isoformat(),
+        *sorted(f'{modele._meta.model_name}={version}' for modele, version in versions.items()),
+        *champs,
+    ])
+    return hashlib.md5(signature.encode(), usedforsecurity=False).hexdigest()
+
+
+def _last_modified_dashboard_stats(request):
+    champs = _indicateurs_demandes(request)
+    if champs is None:
+        return None
+    # Le changement de jour modifie aussi les indicateurs
+    debut_jour = timezone.make_aware(datetime.combine(date.today(), datetime.min.time()))
+    return max(debut_jour, derniere_modification_tableau(_modeles_indicateurs(champs)))
+
+
 @login_required
+@condition(etag_func=_etag_dashboard_stats, last_modified_func=_last_modified_dashboard_stats)
 def dashboard_stats(request):
-    """Statistiques AJAX pour le tableau de bord"""
-    today = date.today()
-    
-    stats = {
-        'echeances_aujourd_hui': Echeance.objects.filter(
-            date_echeance=today, est_traitee=False
-        ).count(),
-        'echeances_semaine': Echeance.objects.filter(
-            date_echeance__range=[today, today + timedelta(days=7)],
-            est_traitee=False
-        ).count(),
-        'echeances_retard': Echeance.objects.filter(
-            date_echeance__lt=today, est_traitee=False
-        ).count(),
-        'alertes_en_attente': Alerte.objects.filter(statut='en_attente').count(),
-    }
-    
+    """Statistiques AJAX pour le tableau de bord
+
+    ?fields=echeances_retard,alertes_en_attente limite la réponse aux indicateurs
+    affichés. Un client qui renvoie l'ETag (If-None-Match) ou la date
+    (If-Modified-Since) reçoit 304 Not Modified sans aucun comptage tant que les
+    échéances et alertes n'ont pas changé.
+    """
+    champs = _indicateurs_demandes(request)
+    if champs is None:
+        return JsonResponse(
+            {'error': f"Champs disponibles : {', '.join(INDICATEURS)}"}, status=400
+        )
+
+    stats = compter_indicateurs(date.today(), champs)
     return JsonResponse(stats)
 
 
@@ -1608,66 +1060,29 @@ def historique_actions(request):
     date_fin = request.GET.get('date_fin', '')
     search_query = request.GET.get('search', '')
     
-    # Récupération des actions avec relations
-    actions = ActionLog.objects.all().select_related(
+    # Récupération des actions filtrées avec relations
+    actions = filtrer_actions(request.GET).select_related(
         'agent', 'client', 'credit', 'echeance'
     ).order_by('-date_action')
     
-    # Application des filtres
-    if type_action_filter:
-        actions = actions.filter(type_action=type_action_filter)
-    
-    if statut_filter:
-        actions = actions.filter(statut=statut_filter)
-    
-    if agent_filter:
-        actions = actions.filter(agent__username__icontains=agent_filter)
-    
-    if client_filter:
-        actions = actions.filter(
-            Q(client__nom__icontains=client_filter) |
-            Q(client__prenom__icontains=client_filter)
-        )
-    
-    if date_debut:
-        try:
-            date_debut_obj = datetime.strptime(date_debut, '%Y-%m-%d').date()
-            actions = actions.filter(date_action__date__gte=date_debut_obj)
-        except ValueError:
-            pass
-    
-    if date_fin:
-        try:
-            date_fin_obj = datetime.strptime(date_fin, '%Y-%m-%d').date()
-            actions = actions.filter(date_action__date__lte=date_fin_obj)
-        except ValueError:
-            pass
-    
-    if search_query:
-        actions = actions.filter(
-            Q(description__icontains=search_query) |
-            Q(agent__username__icontains=search_query) |
-            Q(client__nom__icontains=search_query) |
-            Q(client__prenom__icontains=search_query) |
-            Q(credit__numero_police__icontains=search_query)
-        )
-    
-    # Statistiques globales
-    total_actions = actions.count()
-    actions_aujourd_hui = actions.filter(date_action__date=date.today()).count()
-    actions_cette_semaine = actions.filter(
-        date_action__date__gte=date.today() - timedelta(days=7)
-    ).count()
-    
-    # Répartition par type d'action
-    repartition_types = actions.values('type_action').annotate(
-        count=Count('id')
-    ).order_by('-count')[:10]
-    
-    # Répartition par statut
-    repartition_statuts = actions.values('statut').annotate(
-        count=Count('id')
-    ).order_by('-count')
+    # L'historique archivé n'est interrogé que si la date de début remonte avant la limite de l'archive
+    debut = date_ou_none(date_debut)
+    fin = date_ou_none(date_fin)
+    limite = limite_archive()
+    avec_archives = inclure_archives(debut)
+    archivees = None
+    if avec_archives:
+        archivees = filtrer_actions(request.GET, modele=ActionArchivee).select_related(
+            'agent', 'client', 'credit', 'echeance'
+        ).order_by('-date_action')
+    
+    # Compteurs et répartitions en une requête groupée (cumuls journaliers si les filtres s'y appliquent)
+    statistiques = statistiques_historique(
+        actions, timezone.localdate(),
+        filtre_cumuls=filtre_resume_actions(request.GET, champ_type='mode'),
+        debut=debut, fin=fin, depuis=limite,
+        archivees=archivees, filtres_resume=filtre_resume_actions(request.GET) if avec_archives else None,
+    )
     
     # Actions urgentes (nécessitant une attention)
     actions_urgentes = actions.filter(
@@ -1675,20 +1090,24 @@ def historique_actions(request):
         statut__in=['en_cours', 'en_attente']
     )[:5]
     
-    # Pagination
-    paginator = Paginator(actions, 25)  # 25 actions par page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par curseur sur (date_action, id) : index de date_action, sans OFFSET ;
+    # les actions archivées (toutes antérieures aux actions courantes) viennent à la suite
+    ordre = ['-date_action', '-id']
+    if not avec_archives:
+        paginateur = PaginateurCurseur(actions, ordre, 25)
+    elif fin is not None and fin < limite:
+        paginateur = PaginateurCurseur(archivees, ordre, 25)
+    else:
+        paginateur = PaginateurCurseurEnchaine([actions, archivees], ordre, 25)
+    page_obj = paginateur.page(request.GET.get('curseur'))
     
         # Préparation du contexte
     context = {
         'page_obj': page_obj,
-        'total_actions': total_actions,
-        'actions_aujourd_hui': actions_aujourd_hui,
-        'actions_cette_semaine': actions_cette_semaine,
-        'repartition_types': repartition_types,
-        'repartition_statuts': repartition_statuts,
+        **statistiques,
         'actions_urgentes': actions_urgentes,
+        'limite_archive': limite,
+        'avec_archives': avec_archives,
         
         # Filtres appliqués
         'type_action_filter': type_action_filter,
@@ -1698,24 +1117,162 @@ def historique_actions(request):
         'date_debut': date_debut,
         'date_fin': date_fin,
         'search_query': search_query,
+        'filtres_query': _filtres_query(request),
         
         # Choix pour les filtres
         'type_action_choices': ActionLog.TYPE_ACTION_CHOICES,
         'statut_choices': ActionLog.STATUT_CHOICES,
         
-        # Agents disponibles pour le filtre
-        'agents_disponibles': User.objects.filter(
-            actions_effectuees__isnull=False
-        ).distinct().order_by('username'),
-        
-        # Clients disponibles pour le filtre
-        'clients_disponibles': Client.objects.filter(
-            actions_historique__isnull=False
-        ).distinct().order_by('nom')[:50],  # Limiter à 50 clients
+        # Agents et clients disponibles pour les filtres (mis en cache)
+        **filtres_disponibles(),
     }
     
     return render(request, 'gestion_credits/historique_actions.html', context)
 
+def _filtres_query(request):
+    """Paramètres de filtre de la page, à conserver dans les liens de pagination"""
+    filtres = request.GET.copy()
+    for cle in ('page', 'curseur'):
+        filtres.pop(cle, None)
+    return filtres.urlencode()
+
+
+@login_required
+def reglement_list(request):
+    """Grand livre des règlements, filtré par période, mode, statut et police"""
+    reglements = filtrer_reglements(request.GET).select_related('credit__client', 'agent')
+    
+    # Pagination par curseur sur (date_reglement, id)
+    page_obj = PaginateurCurseur(reglements, ['-date_reglement', '-id'], 25).page(request.GET.get('curseur'))
+    
+    context = {
+        'page_obj': page_obj,
+        'filtres_query': _filtres_query(request),
+        'date_debut': request.GET.get('date_debut', ''),
+        'date_fin': request.GET.get('date_fin', ''),
+        'mode_paiement_filter': request.GET.get('mode_paiement', ''),
+        'statut_filter': request.GET.get('statut', ''),
+        'police_filter': request.GET.get('police', ''),
+        'mode_paiement_choices': Reglement.MODE_PAIEMENT_CHOICES,
+        'statut_choices': Reglement.STATUT_CHOICES,
+    }
+    return render(request, 'gestion_credits/reglement_list.html', context)
+
+
+def _exporter(request, export, queryset, vue_retour):
+    """Exporter le queryset au format demandé (?format=csv|xlsx)"""
+    format_fichier = 'xlsx' if request.GET.get('format') == 'xlsx' else 'csv'
+    if format_fichier == 'xlsx' and not xlsx_disponible():
+        messages.error(request, "L'export Excel nécessite le paquet openpyxl ; utilisez l'export CSV.")
+        retour = request.META.get('HTTP_REFERER')
+        if retour and url_has_allowed_host_and_scheme(retour, allowed_hosts={request.get_host()}):
+            return redirect(retour)
+        return redirect(vue_retour)
+    return reponse_export(request, export, queryset, format_fichier)
+
+
+@login_required
+def credit_export(request):
+    """Exporter la liste des crédits avec les filtres courants"""
+    credits = filtrer_par_statut_reglement(filtrer_credits(request.GET), request.GET.get('statut', ''))
+    return _exporter(request, EXPORT_CREDITS, credits, 'gestion_credits:credit_list')
+
+
+@login_required
+def reglement_export(request):
+    """Exporter le grand livre des règlements (période, mode, statut, police)"""
+    return _exporter(request, EXPORT_REGLEMENTS, filtrer_reglements(request.GET), 'gestion_credits:credit_list')
+
+
+@login_required
+def cheque_garantie_export(request):
+    """Exporter les chèques de garantie (période d'échéance, police)"""
+    return _exporter(request, EXPORT_CHEQUES_GARANTIE, filtrer_cheques_garantie(request.GET), 'gestion_credits:credit_list')
+
+
+@login_required
+def historique_export(request):
+    """Exporter l'historique des actions avec tous les filtres de la page (archive comprise, comme la page)"""
+    actions = filtrer_actions(request.GET)
+    if inclure_archives(date_ou_none(request.GET.get('date_debut'))):
+        actions = [actions, filtrer_actions(request.GET, modele=ActionArchivee)]
+    return _exporter(request, EXPORT_ACTIONS, actions, 'gestion_credits:historique_actions')
+
+
+@login_required
+def recherche_globale(request):
+    """Recherche plein texte dans les clients, crédits et l'historique (JSON, meilleurs résultats d'abord)"""
+    debut = time.monotonic()
+    recherche_saisie = request.GET.get('q', '').strip()
+    sources = [source for source in request.GET.getlist('source') if source in dict(DocumentRecherche.SOURCE_CHOICES)]
+    try:
+        limite = min(max(int(request.GET.get('limite', 20)), 1), 100)
+    except ValueError:
+        limite = 20
+    
+    documents = rechercher(recherche_saisie, sources, limite) if recherche_saisie else []
+    
+    # Les actions renvoient vers le crédit (ou le client) concerné
+    cibles_actions = {
+        action_id: (credit_id, client_id)
+        for action_id, credit_id, client_id in ActionLog.objects.filter(
+            pk__in=[document.objet_id for document in documents if document.source == 'action']
+        ).values_list('pk', 'credit_id', 'client_id')
+    } if any(document.source == 'action' for document in documents) else {}
+    
+    resultats = []
+    for document in documents:
+        if document.source == 'client':
+            url = reverse('gestion_credits:client_detail', kwargs={'pk': document.objet_id})
+        elif document.source == 'credit':
+            url = reverse('gestion_credits:credit_detail', kwargs={'pk': document.objet_id})
+        else:
+            credit_id, client_id = cibles_actions.get(document.objet_id, (None, None))
+            if credit_id:
+                url = reverse('gestion_credits:credit_detail', kwargs={'pk': credit_id})
+            elif client_id:
+                url = reverse('gestion_credits:client_detail', kwargs={'pk': client_id})
+            else:
+                url = reverse('gestion_credits:historique_actions')
+        resultats.append({
+            'source': document.source,
+            'id': document.objet_id,
+            'titre': document.titre,
+            'detail': document.detail,
+            'url': url,
+            'score': round(document.score or 0, 4),
+        })
+    
+    return JsonResponse({
+        'recherche': recherche_saisie,
+        'resultats': resultats,
+        'duree_ms': round((time.monotonic() - debut) * 1000, 1),
+    })
+
+
+def _page_demandee(request):
+    try:
+        return max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return 1
+
+
+@login_required
+def client_autocompletion(request):
+    """Clients dont le nom, le prénom, le CIN ou le téléphone commence par la saisie (JSON, paginé)"""
+    return JsonResponse(page_resultats(
+        clients_par_prefixe(request.GET.get('q', '')), _page_demandee(request), decrire_client
+    ))
+
+
+@login_required
+def credit_autocompletion(request):
+    """Crédits dont le numéro de police commence par la saisie (JSON, paginé)"""
+    return JsonResponse(page_resultats(
+        credits_par_prefixe(request.GET.get('q', '')), _page_demandee(request), decrire_credit
+    ))
+
+
 
 @login_required
 def paiement_echeance_create(request, credit_id):
@@ -1725,136 +1282,51 @@ def paiement_echeance_create(request, credit_id):
     if request.method == 'POST':
         form = PaiementEcheanceForm(request.POST, credit=credit)
         if form.is_valid():
+            mode_paiement = form.cleaned_data['mode_paiement']
+            type_echeance = form.cleaned_data['type_echeance']
+            frequence = None
+            
+            numero_depart = numero_suivant(credit)
+            if type_echeance == 'unique':
+                lignes = [ligne_unique(
+                    form.cleaned_data['montant_echeance_unique'], form.cleaned_data['date_echeance_unique'], numero_depart,
+                )]
+            else:
+                # Échéancier calendaire sur le reste à payer (jours fériés reportés)
+                frequence = form.cleaned_data['frequence_paiement']
+                lignes = calculer_echeancier(
+                    credit.reste_a_payer,
+                    form.cleaned_data['nombre_echeances'],
+                    form.cleaned_data['date_premiere_echeance'],
+                    frequence,
+                    numero_depart=numero_depart,
+                    feries=jours_feries(),
+                )
+            
+            effet = None
+            if mode_paiement == 'effets':
+                effet = {
+                    'numero': form.cleaned_data['numero_effet'],
+                    'banque': form.cleaned_data['banque_emetteur'],
+                    'date_emission': form.cleaned_data['date_emission_effet'],
+                }
+            
             try:
-                mode_paiement = form.cleaned_data['mode_paiement']
-                type_echeance = form.cleaned_data['type_echeance']
-                
-                if type_echeance == 'unique':
-                    # Créer une seule échéance
-                    montant = form.cleaned_data['montant_echeance_unique']
-                    date_echeance = form.cleaned_data['date_echeance_unique']
-                    
-                    # Créer l'échéance
-                    echeance = Echeance.objects.create(
-                        credit=credit,
-                        numero_partie=credit.echeances.count() + 1,
-                        montant=montant,
-                        date_echeance=date_echeance,
-                        est_especes=(mode_paiement == 'especes'),
-                        commentaire=form.cleaned_data.get('commentaire', '')
-                    )
-                    
-                    # Créer le règlement correspondant
-                    Reglement.objects.create(
-                        credit=credit,
-                        montant=montant,
-                        date_reglement=date.today(),
-                        mode_paiement='especes' if mode_paiement == 'especes' else 'cheque',
-                        statut='verse' if mode_paiement == 'especes' else 'non_verse',
-                        commentaire=f"Échéance unique - {form.cleaned_data.get('commentaire', '')}",
-                        agent=request.user
-                    )
-                    
-                    # Si c'est un effet, créer un chèque de garantie
-                    if mode_paiement == 'effets':
-                        Cheque.objects.create(
-                            echeance=echeance,
-                            numero_cheque=form.cleaned_data['numero_effet'],
-                            banque=form.cleaned_data['banque_emetteur'],
-                            date_emission=form.cleaned_data['date_emission_effet'],
-                            date_reglement_prevu=date_echeance,
-                            montant=montant,
-                            statut='garantie',
-                            remarques=form.cleaned_data.get('commentaire', '')
-                        )
-                    
-                    # Créer l'alerte
-                    Alerte.objects.create(
-                        echeance=echeance,
-                        type_alerte='echeance',
-                        message=f'Échéance unique pour {credit.client.nom_complet} - {montant} DH',
-                        date_alerte=date.today(),
-                        date_rappel=date_echeance,
-                        agent=request.user
-                    )
-                    
-                    messages.success(request, f'Échéance unique créée avec succès pour {montant} DH.')
-                    
-                elif type_echeance == 'multiple':
-                    # Créer plusieurs échéances échelonnées
-                    nombre_echeances = form.cleaned_data['nombre_echeances']
-                    frequence = form.cleaned_data['frequence_paiement']
-                    date_premiere = form.cleaned_data['date_premiere_echeance']
-                    montant_total = credit.reste_a_payer
-                    montant_partie = montant_total / nombre_echeances
-                    
-                    # Calculer les intervalles selon la fréquence
-                    if frequence == 'hebdomadaire':
-                        intervalle_jours = 7
-                    elif frequence == 'bimensuelle':
-                        intervalle_jours = 15
-                    elif frequence == 'mensuelle':
-                        intervalle_jours = 30
-                    elif frequence == 'trimestrielle':
-                        intervalle_jours = 90
-                    
-                    for i in range(nombre_echeances):
-                        # Calculer la date de cette échéance
-                        date_echeance = date_premiere + timedelta(days=i * intervalle_jours)
-                        
-                        # Créer l'échéance
-                        echeance = Echeance.objects.create(
-                            credit=credit,
-                            numero_partie=credit.echeances.count() + 1,
-                            montant=montant_partie,
-                            date_echeance=date_echeance,
-                            est_especes=(mode_paiement == 'especes'),
-                            commentaire=f"Échéance {i+1}/{nombre_echeances} - {frequence} - {form.cleaned_data.get('commentaire', '')}"
-                        )
-                        
-                        # Créer le règlement correspondant
-                        Reglement.objects.create(
-                            credit=credit,
-                            montant=montant_partie,
-                            date_reglement=date.today(),
-                            mode_paiement='especes' if mode_paiement == 'especes' else 'cheque',
-                            statut='verse' if mode_paiement == 'especes' else 'non_verse',
-                            commentaire=f"Échéance {i+1}/{nombre_echeances} - {frequence}",
-                            agent=request.user
-                        )
-                        
-                        # Si c'est un effet, créer un chèque de garantie
-                        if mode_paiement == 'effets':
-                            Cheque.objects.create(
-                                echeance=echeance,
-                                numero_cheque=f"{form.cleaned_data['numero_effet']}-{i+1}",
-                                banque=form.cleaned_data['banque_emetteur'],
-                                date_emission=form.cleaned_data['date_emission_effet'],
-                                date_reglement_prevu=date_echeance,
-                                montant=montant_partie,
-                                statut='garantie',
-                                remarques=f"Échéance {i+1}/{nombre_echeances} - {form.cleaned_data.get('commentaire', '')}"
-                            )
-                        
-                        # Créer l'alerte
-                        Alerte.objects.create(
-                            echeance=echeance,
-                            type_alerte='echeance',
-                            message=f'Échéance {i+1}/{nombre_echeances} pour {credit.client.nom_complet} - {montant_partie} DH',
-                            date_alerte=date.today(),
-                            date_rappel=date_echeance,
-                            agent=request.user
-                        )
-                    
-                    messages.success(request, f'{nombre_echeances} échéances créées avec succès selon un échéancier {frequence}.')
-                
-                # Recalculer le reste à payer du crédit
-                credit.recalculer_reste_a_payer()
-                
+                enregistrer_echeancier(
+                    credit, lignes, request.user,
+                    mode_paiement=mode_paiement,
+                    frequence=frequence,
+                    commentaire=form.cleaned_data.get('commentaire', ''),
+                    effet=effet,
+                )
+            except ErreurPaiement as e:
+                messages.error(request, f'Erreur lors de la création des échéances: {e}')
+            else:
+                if frequence is None:
+                    messages.success(request, f'Échéance unique créée avec succès pour {lignes[0].montant} DH.')
+                else:
+                    messages.success(request, f'{len(lignes)} échéances créées avec succès selon un échéancier {frequence}.')
                 return redirect('gestion_credits:credit_detail', pk=credit.pk)
-                
-            except Exception as e:
-                messages.error(request, f'Erreur lors de la création des échéances: {str(e)}')
     else:
         form = PaiementEcheanceForm(credit=credit)
     
@@ -1873,52 +1345,41 @@ def ajout_paiement_create(request, credit_id):
     if request.method == 'POST':
         form = AjoutPaiementForm(request.POST, credit=credit)
         if form.is_valid():
+            mode_paiement = form.cleaned_data['mode_paiement']
+            montant = form.cleaned_data['montant']
+            date_paiement = form.cleaned_data['date_paiement']
+            commentaire = form.cleaned_data.get('commentaire', '')
+            
+            # Si c'est un effet, le règlement est rattaché à un chèque de garantie
+            effet = None
+            if mode_paiement == 'effets':
+                effet = {
+                    'numero': form.cleaned_data['numero_effet'],
+                    'montant': montant,
+                    'banque': form.cleaned_data['banque_emetteur'],
+                    'date_emission': form.cleaned_data['date_emission_effet'],
+                    'date_echeance': date_paiement,
+                    'commentaire': f"Effet pour paiement: {commentaire}",
+                }
+            
             try:
-                mode_paiement = form.cleaned_data['mode_paiement']
-                montant = form.cleaned_data['montant']
-                date_paiement = form.cleaned_data['date_paiement']
-                commentaire = form.cleaned_data.get('commentaire', '')
-                
-                # Vérifier que le montant ne dépasse pas le reste à payer
-                if montant > credit.reste_a_payer:
-                    messages.error(request, f'Le montant ({montant} DH) ne peut pas dépasser le reste à payer ({credit.reste_a_payer} DH).')
-                    return render(request, 'gestion_credits/ajout_paiement_form.html', {'form': form, 'credit': credit})
-                
-                # Créer le règlement
-                reglement = Reglement.objects.create(
-                    credit=credit,
-                    montant=montant,
-                    date_reglement=date_paiement,
+                PaiementService(request.user).enregistrer_paiement(Paiement(
+                    credit, montant, date_paiement,
                     mode_paiement='especes' if mode_paiement == 'especes' else 'cheque',
-                    statut='verse' if mode_paiement == 'especes' else 'non_verse',
                     commentaire=commentaire,
-                    agent=request.user
-                )
-                
-                # Si c'est un effet, créer un chèque de garantie
-                if mode_paiement == 'effets':
-                    numero_effet = form.cleaned_data['numero_effet']
-                    banque = form.cleaned_data['banque_emetteur']
-                    date_emission = form.cleaned_data['date_emission_effet']
-                    
-                    # Créer le chèque de garantie
-                    ChequeGarantie.objects.create(
-                        credit=credit,
-                        numero=numero_effet,
-                        montant=montant,
-                        banque=banque,
-                        date_emission=date_emission,
-                        date_echeance=date_paiement,
-                        commentaire=f"Effet pour paiement: {commentaire}"
-                    )
-                
-                # Recalculer le reste à payer du crédit
-                credit.recalculer_reste_a_payer()
-                
+                    effet=effet,
+                ))
+            except ErreurPaiement as e:
+                form.add_error('montant', str(e))
+            else:
                 # Créer un log d'action
-                ActionLog.objects.create(
+                journaliser(
+                    type_action='echeance_paiement',
+                    description=f'Paiement de {montant} DH ({mode_paiement}) ajouté pour {credit.client.nom_complet} - Police {credit.numero_police}',
+                    statut='succes',
                     agent=request.user,
-                    action='ajout_paiement',
+                    client=credit.client,
+                    credit=credit,
                     donnees_avant={
                         'numero_police': credit.numero_police,
                         'reste_a_payer_avant': str(credit.reste_a_payer + montant),
@@ -1936,9 +1397,6 @@ def ajout_paiement_create(request, credit_id):
                 
                 messages.success(request, f'Paiement de {montant} DH ajouté avec succès en mode {mode_paiement}.')
                 return redirect('gestion_credits:credit_detail', pk=credit.pk)
-                
-            except Exception as e:
-                messages.error(request, f'Erreur lors de l\'ajout du paiement: {str(e)}')
     else:
         form = AjoutPaiementForm(credit=credit)
     
@@ -1949,120 +1407,102 @@ def ajout_paiement_create(request, credit_id):
     return render(request, 'gestion_credits/ajout_paiement_form.html', context)
 
 
+@login_required
+def import_reglements(request):
+    """Importer en masse des règlements depuis un relevé CSV ou XLSX"""
+    rapport = None
+    rejets = []
+    
+    if request.method == 'POST':
+        form = ImportReglementsForm(request.POST, request.FILES)
+        if form.is_valid():
+            fichier = form.cleaned_data['fichier']
+            importateur = ImportateurReglements(request.user, taille_lot=form.cleaned_data['taille_lot'])
+            try:
+                rapport = importateur.importer(
+                    lire_lignes(fichier.file, fichier.name),
+                    nom_fichier=fichier.name,
+                    simulation=form.cleaned_data['simulation'],
+                )
+                rejets = importateur.rejets
+                if form.cleaned_data['simulation']:
+                    messages.info(request, f"Simulation : {rapport['importes']} ligne(s) valide(s), {rapport['rejets']} rejet(s). Aucune donnée enregistrée.")
+                elif rapport['rejets']:
+                    messages.warning(request, f"{rapport['importes']} règlement(s) importé(s), {rapport['rejets']} ligne(s) rejetée(s).")
+                else:
+                    messages.success(request, f"{rapport['importes']} règlement(s) importé(s) avec succès.")
+            except ErreurImport as e:
+                messages.error(request, str(e))
+    else:
+        form = ImportReglementsForm()
+    
+    context = {
+        'form': form,
+        'rapport': rapport,
+        'rejets': rejets,
+    }
+    return render(request, 'gestion_credits/import_reglements.html', context)
+
+
 @login_required
 def payer_cheque_especes(request, credit_id):
     """Permettre à un agent de marquer un chèque non versé comme payé en espèces par le client"""
     credit = get_object_or_404(Credit, pk=credit_id)
     
     if request.method == 'POST':
+        cheque_id = request.POST.get('cheque_id')
+        montant_str = request.POST.get('montant', '0').strip().replace(',', '.')
+        date_paiement_str = request.POST.get('date_paiement', '')
+        commentaire = request.POST.get('commentaire', '')
+        
+        # Validation des données
+        if not cheque_id or not montant_str or not date_paiement_str:
+            messages.error(request, "Données manquantes pour le traitement du paiement.")
+            return redirect('gestion_credits:echeance_create_for_credit', credit_id=credit.pk)
+        
         try:
-            cheque_id = request.POST.get('cheque_id')
-            montant_str = request.POST.get('montant', '0')
-            date_paiement_str = request.POST.get('date_paiement', '')
-            commentaire = request.POST.get('commentaire', '')
-            
-            # Validation des données
-            if not cheque_id or not montant_str or not date_paiement_str:
-                messages.error(request, "Données manquantes pour le traitement du paiement.")
-                return redirect('gestion_credits:echeance_create_for_credit', credit_id=credit.pk)
-            
-            # Nettoyer et valider le montant
-            montant_str = montant_str.strip().replace(',', '.')
-            if not montant_str or montant_str == '':
-                messages.error(request, 'Le montant ne peut pas être vide.')
-                return redirect('gestion_credits:echeance_create_for_credit', credit_id=credit.pk)
-            
-            try:
-                montant = Decimal(montant_str)
-                if montant <= 0:
-                    messages.error(request, 'Le montant doit être supérieur à 0.')
-                    return redirect('gestion_credits:echeance_create_for_credit', credit_id=credit.pk)
-            except (ValueError, TypeError, Exception) as e:
-                messages.error(request, f'Format de montant invalide : {montant_str}. Utilisez un nombre décimal valide (ex: 100.50).')
-                return redirect('gestion_credits:echeance_create_for_credit', credit_id=credit.pk)
-            
-            try:
-                date_paiement = datetime.strptime(date_paiement_str, '%Y-%m-%d').date()
-            except ValueError:
-                messages.error(request, 'Format de date invalide.')
-                return redirect('gestion_credits:echeance_create_for_credit', credit_id=credit.pk)
-            
-            # Récupérer le chèque de garantie
-            cheque = get_object_or_404(ChequeGarantie, pk=cheque_id, credit=credit)
-            
-            # Vérifier que le chèque n'est pas déjà versé
-            if hasattr(cheque, 'reglement') and cheque.reglement.statut == 'verse':
-                messages.error(request, 'Ce chèque est déjà versé.')
-                return redirect('gestion_credits:echeance_create_for_credit', credit_id=credit.pk)
-            
-            # Trouver le règlement existant pour ce chèque (s'il existe)
-            reglement_existant = None
-            for reglement in credit.reglements.all():
-                if (reglement.mode_paiement == 'cheque' and 
-                    reglement.commentaire and 
-                    cheque.numero in reglement.commentaire):
-                    reglement_existant = reglement
-                    break
-            
-            # Si un règlement existe, le mettre à jour en espèces
-            if reglement_existant:
-                reglement_existant.mode_paiement = 'especes'
-                reglement_existant.statut = 'verse'
-                reglement_existant.date_reglement = date_paiement
-                reglement_existant.commentaire = f"Paiement en espèces du chèque {cheque.numero} - {commentaire}"
-                reglement_existant.save()
-                reglement = reglement_existant
-            else:
-                # Créer un nouveau règlement en espèces
-                reglement = Reglement.objects.create(
-                    credit=credit,
-                    montant=montant,
-                    date_reglement=date_paiement,
-                    mode_paiement='especes',
-                    statut='verse',
-                    commentaire=f"Paiement en espèces du chèque {cheque.numero} - {commentaire}",
-                    agent=request.user
-                )
-            
-            # Supprimer le chèque de garantie car il a été payé en espèces
-            # Le règlement en espèces remplace complètement le chèque
-            numero_cheque_supprime = cheque.numero
-            cheque.delete()
-            
-            # Créer une alerte pour notifier le paiement
-            Alerte.objects.create(
-                echeance=None,
-                type_alerte='paiement_especes_cheque',
-                message=f'Chèque {numero_cheque_supprime} payé en espèces de {montant:.2f} DH par {credit.client.nom_complet}',
-                date_alerte=date.today(),
-                date_rappel=date_paiement,
-                agent=request.user
-            )
-            
-            # Créer un log d'action
-            ActionLog.objects.create(
-                type_action='cheque_paye_especes',
-                description=f'Chèque {numero_cheque_supprime} de {montant:.2f} DH payé en espèces pour {credit.client.nom_complet}',
-                statut='succes',
-                agent=request.user,
-                client=credit.client,
-                credit=credit,
-                donnees_apres={
-                    'numero_cheque': numero_cheque_supprime,
-                    'montant': str(montant),
-                    'date_paiement': date_paiement.strftime('%Y-%m-%d'),
-                    'mode_paiement': 'especes',
-                    'commentaire': commentaire
-                }
-            )
-            
-            messages.success(request, f'Chèque {numero_cheque_supprime} supprimé et remplacé par un paiement en espèces de {montant:.2f} DH !')
+            montant = Decimal(montant_str)
+        except ArithmeticError:
+            messages.error(request, f'Format de montant invalide : {montant_str}. Utilisez un nombre décimal valide (ex: 100.50).')
             return redirect('gestion_credits:echeance_create_for_credit', credit_id=credit.pk)
-            
-        except (ValueError, TypeError) as e:
-            messages.error(request, f'Format de données invalide : {str(e)}')
-        except Exception as e:
-            messages.error(request, f'Erreur lors du traitement du paiement : {str(e)}')
+        if montant <= 0:
+            messages.error(request, 'Le montant doit être supérieur à 0.')
+            return redirect('gestion_credits:echeance_create_for_credit', credit_id=credit.pk)
+        
+        try:
+            date_paiement = datetime.strptime(date_paiement_str, '%Y-%m-%d').date()
+        except ValueError:
+            messages.error(request, 'Format de date invalide.')
+            return redirect('gestion_credits:echeance_create_for_credit', credit_id=credit.pk)
+        
+        # Récupérer le chèque de garantie avec son règlement rattaché (s'il existe)
+        cheque = get_object_or_404(
+            ChequeGarantie.objects.select_related('reglement', 'credit__client'), pk=cheque_id, credit=credit
+        )
+        try:
+            PaiementService(request.user).payer_cheque_en_especes(cheque, montant, date_paiement, commentaire)
+        except ErreurPaiement as e:
+            messages.error(request, str(e))
+            return redirect('gestion_credits:echeance_create_for_credit', credit_id=credit.pk)
+        
+        # Créer un log d'action
+        journaliser(
+            type_action='cheque_paye_especes',
+            description=f'Chèque {cheque.numero} de {montant:.2f} DH payé en espèces pour {credit.client.nom_complet}',
+            statut='succes',
+            agent=request.user,
+            client=credit.client,
+            credit=credit,
+            donnees_apres={
+                'numero_cheque': cheque.numero,
+                'montant': str(montant),
+                'date_paiement': date_paiement.strftime('%Y-%m-%d'),
+                'mode_paiement': 'especes',
+                'commentaire': commentaire
+            }
+        )
+        
+        messages.success(request, f'Chèque {cheque.numero} supprimé et remplacé par un paiement en espèces de {montant:.2f} DH !')
     
-    # Si erreur ou méthode GET, rediriger vers la page du crédit
+    # Après traitement, ou méthode GET, retour à la page des paiements du crédit
     return redirect('gestion_credits:echeance_create_for_credit', credit_id=credit.pk)
\ No newline at end of file
@@ -13,7 +13,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sanlam_credits.settings')
 django.setup()
 
 from django.contrib.auth.models import User
-from gestion_credits.models import Client, Credit, Reglement, ChequeGarantie, Alerte
+from gestion_credits.models import Client, Credit, Reglement, ChequeGarantie, Alerte, DocumentRecherche
 
 def migrate_to_mysql():
     print("🔄 Migration vers MySQL en cours...")
@@ -269,6 +269,13 @@ def migrate_to_mysql():
             if created:
                 print(f"✅ Alerte créée: {alerte.message}")
         
+        # Index de recherche plein texte (FULLTEXT créé par la migration 0011)
+        print("🔎 Indexation de la recherche plein texte...")
+        execute_from_command_line(['manage.py', 'reconstruire_recherche'])
+        print("ℹ️  Pour rechercher les mots de 2 lettres, régler innodb_ft_min_token_size=2 "
+              "et innodb_ft_enable_stopword=OFF dans my.cnf, puis reconstruire l'index "
+              "(OPTIMIZE TABLE gestion_credits_documentrecherche).")
+        
         print("\n🎉 Migration vers MySQL terminée avec succès !")
         print("\n📊 Résumé des données migrées :")
         print(f"- Utilisateurs: {User.objects.count()}")
@@ -277,6 +284,7 @@ def migrate_to_mysql():
         print(f"- Règlements: {Reglement.objects.count()}")
         print(f"- Chèques de garantie: {ChequeGarantie.objects.count()}")
         print(f"- Alertes: {Alerte.objects.count()}")
+        print(f"- Documents de recherche: {DocumentRecherche.objects.count()}")
         
         print("\n🔑 Comptes de connexion :")
         print("Administrateur: admin/admin123")
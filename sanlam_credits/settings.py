@@ -46,6 +46,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'gestion_credits.middleware.MiddlewareAudit',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -120,6 +121,41 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# Caches : cache local du processus par défaut ; les blocs du tableau de bord
+# (gestion_credits/cache_tableau.py) sont partagés entre les processus par des fichiers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'tableau': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'tableau',
+    },
+}
+
+# Alias du cache des blocs du tableau de bord et durée de conservation (secondes)
+TABLEAU_CACHE = 'tableau'
+TABLEAU_CACHE_DUREE = 600
+
+# Notifications en direct (gestion_credits/evenements.py) : intervalle (secondes)
+# des battements qui maintiennent ouvertes les connexions inactives
+EVENEMENTS_BATTEMENT = 15
+
+# Journal des actions (gestion_credits/journal.py) : écriture par lots en arrière-plan,
+# tous les JOURNAL_TAILLE_LOT enregistrements ou toutes les JOURNAL_DELAI_MS millisecondes
+JOURNAL_ASYNCHRONE = True
+JOURNAL_TAILLE_LOT = 100
+JOURNAL_DELAI_MS = 200
+JOURNAL_TAILLE_MAX_FILE = 10000
+
+# Archivage de l'historique (commande archiver_actions) : mois complets conservés dans
+# ActionLog, puis durée de conservation des actions archivées (None : sans limite)
+JOURNAL_HORIZON_MOIS = 12
+JOURNAL_CONSERVATION_ARCHIVES_MOIS = None
+
+# Calendrier des jours fériés de l'échéancier (gestion_credits/echeancier.py) ; None : fichier de l'application
+ECHEANCIER_JOURS_FERIES = None
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 